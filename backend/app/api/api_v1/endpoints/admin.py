@@ -1,6 +1,7 @@
 """Admin dashboard endpoints."""
 
 import asyncio
+from collections import defaultdict
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Mapping, Sequence, cast
 
@@ -19,9 +20,14 @@ from app.schemas.oidc import (
     OIDCTestConnectionRequest,
     OIDCTestConnectionResponse,
 )
+from app.services.ingest_cache import invalidate_user_resolutions
+from app.services.message_caches import invalidate_deleted_messages
+from app.services.message_repository import MessageRepository
 from app.services.oidc_service import oidc_service
+from app.services.query_budget import get_query_metrics
 from app.services.rate_limit_service import RateLimitService
 from app.services.rolling_message_service import RollingMessageService
+from app.services.stats_snapshot import StatsSnapshotService
 from app.services.storage_metrics import StorageMetricsService
 from app.services.user import UserService
 
@@ -54,7 +60,10 @@ async def get_admin_statistics(
     db: AsyncIOMotorDatabase = Depends(get_db),
     admin_user: UserInDB = Depends(require_admin),
 ) -> Dict[str, Any]:
-    """Get system-wide statistics for admin dashboard."""
+    """Get system-wide statistics for admin dashboard.
+
+    Reads materialized snapshots rather than counting every collection.
+    """
     # Aggregate user statistics
     user_stats_pipeline = [
         {
@@ -89,27 +98,17 @@ async def get_admin_statistics(
     user_stats_task = db.users.aggregate(user_stats_typed).to_list(None)
     top_users_task = db.users.aggregate(top_users_typed).to_list(None)
     total_users_task = db.users.count_documents({})
+    system_metrics_task = StatsSnapshotService(db).get_system_metrics()
 
-    user_stats, top_users, total_users = await asyncio.gather(
-        user_stats_task, top_users_task, total_users_task
+    user_stats, top_users, total_users, system_metrics = await asyncio.gather(
+        user_stats_task, top_users_task, total_users_task, system_metrics_task
     )
 
-    # Calculate system totals
-    total_sessions = await db.sessions.count_documents({})
-
-    # Count messages across rolling collections
-    all_collections = await db.list_collection_names()
-    message_collections = [c for c in all_collections if c.startswith("messages_")]
-    total_messages = 0
-    if message_collections:
-        for coll_name in message_collections:
-            count = await db[coll_name].count_documents({})
-            total_messages += count
-    else:
-        # Fallback to single messages collection if it exists
-        total_messages = await db.messages.count_documents({})
-
-    total_projects = await db.projects.count_documents({})
+    # System totals come from the system_stats snapshot
+    breakdown = system_metrics["breakdown"]
+    total_sessions = breakdown["sessions_count"]
+    total_messages = breakdown["messages_count"]
+    total_projects = breakdown["projects_count"]
 
     # Format user stats by role
     users_by_role = {}
@@ -123,33 +122,18 @@ async def get_admin_statistics(
         }
         total_storage_bytes += stat["total_storage"]
 
-    # Format top users and calculate actual counts
+    # Format top users; counts are the per-user storage snapshot
     formatted_top_users = []
     for user in top_users:
-        # Calculate actual project count for this user
-        user_project_count = await db.projects.count_documents({"user_id": user["_id"]})
-
-        # Calculate actual session count for this user
-        # Sessions don't have user_id directly - they belong to projects which belong to users
-        user_projects = await db.projects.find(
-            {"user_id": user["_id"]}, {"_id": 1}
-        ).to_list(None)
-        project_ids = [p["_id"] for p in user_projects]
-        user_session_count = (
-            await db.sessions.count_documents({"projectId": {"$in": project_ids}})
-            if project_ids
-            else 0
-        )
-
         formatted_top_users.append(
             {
                 "id": str(user["_id"]),
                 "username": user.get("username", "N/A"),
                 "email": user.get("email", "N/A"),
                 "total_disk_usage": user.get("total_disk_usage", 0),
-                "session_count": user_session_count,
+                "session_count": user.get("session_count", 0),
                 "message_count": user.get("message_count", 0),
-                "project_count": user_project_count,
+                "project_count": user.get("project_count", 0),
             }
         )
 
@@ -199,21 +183,6 @@ async def get_admin_users(
 
     users = []
     async for user in cursor:
-        # Calculate actual project count for this user
-        user_project_count = await db.projects.count_documents({"user_id": user["_id"]})
-
-        # Calculate actual session count for this user
-        # Sessions don't have user_id directly - they belong to projects which belong to users
-        user_projects = await db.projects.find(
-            {"user_id": user["_id"]}, {"_id": 1}
-        ).to_list(None)
-        project_ids = [p["_id"] for p in user_projects]
-        user_session_count = (
-            await db.sessions.count_documents({"projectId": {"$in": project_ids}})
-            if project_ids
-            else 0
-        )
-
         users.append(
             {
                 "id": str(user["_id"]),
@@ -222,8 +191,8 @@ async def get_admin_users(
                 "role": user.get("role"),
                 "created_at": user.get("created_at"),
                 "updated_at": user.get("updated_at"),
-                "project_count": user_project_count,
-                "session_count": user_session_count,
+                "project_count": user.get("project_count", 0),
+                "session_count": user.get("session_count", 0),
                 "message_count": user.get("message_count", 0),
                 "total_disk_usage": user.get("total_disk_usage", 0),
                 "api_key_count": len(user.get("api_keys", [])),
@@ -277,6 +246,20 @@ async def recalculate_all_storage(
     }
 
 
+@router.post("/stats/reconcile")
+async def reconcile_statistics(
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    admin_user: UserInDB = Depends(require_admin),
+) -> Dict[str, Any]:
+    """Rebuild the system statistics snapshot and recompute dirty users."""
+    result = await StatsSnapshotService(db).reconcile()
+
+    return {
+        "message": "Statistics snapshot reconciled",
+        "result": convert_bson_types(result),
+    }
+
+
 @router.delete("/users/{user_id}/cascade")
 async def delete_user_cascade(
     user_id: str,
@@ -292,13 +275,14 @@ async def delete_user_cascade(
     user_oid = ObjectId(user_id)
 
     # Delete in order of dependencies
-    delete_tasks = [
-        db.messages.delete_many({"user_id": user_oid}),
+    messages_deleted, sessions_result, projects_result = await asyncio.gather(
+        MessageRepository(db).delete_many({"user_id": user_oid}),
         db.sessions.delete_many({"user_id": user_oid}),
         db.projects.delete_many({"user_id": user_oid}),
-    ]
-
-    results = await asyncio.gather(*delete_tasks)
+    )
+    invalidate_user_resolutions(user_id)
+    if messages_deleted:
+        await invalidate_deleted_messages(db, {"user_id": user_oid})
 
     # Finally delete the user
     user_result = await db.users.delete_one({"_id": user_oid})
@@ -306,11 +290,17 @@ async def delete_user_cascade(
     if user_result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
 
+    await StatsSnapshotService(db).record_user_removed(
+        projects=projects_result.deleted_count,
+        sessions=sessions_result.deleted_count,
+        messages=messages_deleted,
+    )
+
     return {
         "deleted": {
-            "messages": results[0].deleted_count,
-            "sessions": results[1].deleted_count,
-            "projects": results[2].deleted_count,
+            "messages": messages_deleted,
+            "sessions": sessions_result.deleted_count,
+            "projects": projects_result.deleted_count,
             "user": 1,
         }
     }
@@ -415,6 +405,17 @@ async def reset_user_password(
     }
 
 
+@router.get("/query-metrics")
+async def get_query_metrics_endpoint(
+    admin_user: UserInDB = Depends(require_admin),
+) -> Dict[str, Any]:
+    """Get query budget timeouts, partial responses and cancellations.
+
+    Counters are per budget path prefix and cover this process since start.
+    """
+    return {"endpoints": get_query_metrics().snapshot()}
+
+
 @router.get("/storage/breakdown")
 async def get_storage_breakdown(
     db: AsyncIOMotorDatabase = Depends(get_db),
@@ -423,8 +424,8 @@ async def get_storage_breakdown(
     """Get storage breakdown by collection and user."""
     storage_service = StorageMetricsService(db)
 
-    # Get system metrics
-    system_metrics = await storage_service.calculate_system_metrics()
+    # Get system metrics from the system_stats snapshot
+    system_metrics = await StatsSnapshotService(db).get_system_metrics()
 
     # Get top users by storage
     top_users = await storage_service.get_top_users_by_storage(limit=20)
@@ -444,32 +445,17 @@ async def get_storage_breakdown(
         "by_user": [],  # This would require additional aggregation if needed
     }
 
-    # Format top users and calculate actual counts
+    # Format top users; counts are the per-user storage snapshot
     formatted_top_users = []
     for user in top_users:
-        # Calculate actual project count for this user
-        user_project_count = await db.projects.count_documents({"user_id": user["_id"]})
-
-        # Calculate actual session count for this user
-        # Sessions don't have user_id directly - they belong to projects which belong to users
-        user_projects = await db.projects.find(
-            {"user_id": user["_id"]}, {"_id": 1}
-        ).to_list(None)
-        project_ids = [p["_id"] for p in user_projects]
-        user_session_count = (
-            await db.sessions.count_documents({"projectId": {"$in": project_ids}})
-            if project_ids
-            else 0
-        )
-
         formatted_top_users.append(
             {
                 "user_id": str(user.get("_id", "")),
                 "username": user.get("username", "Unknown"),
                 "total_disk_usage": user.get("total_disk_usage", 0),
-                "session_count": user_session_count,
+                "session_count": user.get("session_count", 0),
                 "message_count": user.get("message_count", 0),
-                "project_count": user_project_count,
+                "project_count": user.get("project_count", 0),
             }
         )
 
@@ -930,6 +916,18 @@ async def transfer_project_ownership(
             status_code=500, detail="Failed to update project ownership"
         )
 
+    # Keep the denormalized tenant fields on sessions and messages in sync
+    new_owner_oid = ObjectId(request.new_owner_id)
+    await db.sessions.update_many(
+        {"projectId": ObjectId(request.project_id)},
+        {"$set": {"user_id": new_owner_oid}},
+    )
+    await RollingMessageService(db).update_many(
+        {"projectId": ObjectId(request.project_id)},
+        {"$set": {"user_id": new_owner_oid}},
+    )
+    invalidate_user_resolutions(project.get("user_id"), new_owner_oid)
+
     return ProjectOwnershipResponse(
         success=True,
         message=f"Successfully transferred project ownership to {new_owner['username']}",
@@ -1167,6 +1165,16 @@ async def migrate_messages_to_rolling_collections(
     if not old_messages:
         return {"message": "No messages to migrate", "migrated": 0}
 
+    # Map each session of the batch to its collections once, before writing
+    session_partitions: Dict[str, set[str]] = defaultdict(set)
+    for msg in old_messages:
+        if msg.get("sessionId"):
+            session_partitions[msg["sessionId"]].add(
+                rolling_service.get_message_collection_name(msg)
+            )
+    for session_id, names in session_partitions.items():
+        await rolling_service.record_session_partitions(session_id, names)
+
     # Migrate messages
     migrated_count = 0
     failed_count = 0
@@ -1,6 +1,8 @@
 """Analytics API endpoints."""
 
+import re
 from typing import Any
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from fastapi import HTTPException, Query
 
@@ -17,6 +19,8 @@ from app.schemas.analytics import (
     CostPrediction,
     CostSummary,
     CreateBenchmarkRequest,
+    DashboardBundle,
+    DashboardWidget,
     DirectoryUsageResponse,
     ErrorDetailsResponse,
     GitBranchAnalyticsResponse,
@@ -39,6 +43,20 @@ from app.services.analytics import AnalyticsService
 
 router = APIRouter()
 
+# UTC offsets MongoDB accepts as a timezone, e.g. "+05:30" or "-0800"
+UTC_OFFSET_PATTERN = re.compile(r"^[+-]\d{2}(:?\d{2})?$")
+
+
+def _is_valid_timezone(timezone: str) -> bool:
+    """Whether MongoDB date operators accept ``timezone``."""
+    if UTC_OFFSET_PATTERN.match(timezone):
+        return True
+    try:
+        ZoneInfo(timezone)
+    except (ValueError, ZoneInfoNotFoundError):
+        return False
+    return True
+
 
 @router.get("/summary", response_model=AnalyticsSummary)
 async def get_analytics_summary(
@@ -119,6 +137,32 @@ async def get_token_usage(
     return await service.get_token_usage(time_range, group_by)
 
 
+@router.get("/dashboard", response_model=DashboardBundle)
+async def get_dashboard_bundle(
+    db: CommonDeps,
+    user_id: AuthDeps,
+    widgets: list[DashboardWidget] = Query(
+        ..., description="Widgets to compute in one pass"
+    ),
+    time_range: TimeRange = Query(TimeRange.LAST_30_DAYS),
+    timezone: str = Query("UTC", description="Timezone for the activity heatmap"),
+    group_by: str = Query("day", pattern="^(hour|day|week|month)$"),
+    project_id: str | None = Query(None),
+) -> DashboardBundle:
+    """Get several dashboard widgets at once.
+
+    Computes the requested widgets in a single aggregation per monthly
+    partition instead of one scan per widget.
+    """
+    if not _is_valid_timezone(timezone):
+        raise HTTPException(status_code=400, detail=f"Invalid timezone: {timezone}")
+
+    service = AnalyticsService(db, user_id=user_id)
+    return await service.get_dashboard_bundle(
+        widgets, time_range, timezone, group_by, project_id
+    )
+
+
 @router.get("/projects/comparison")
 async def compare_projects(
     db: CommonDeps,
@@ -1,7 +1,7 @@
 """Export API endpoints for MCP integration."""
 
 from datetime import UTC, datetime
-from typing import Any, AsyncGenerator, Dict, Optional, Union
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union
 
 from bson import ObjectId
 from fastapi import HTTPException, Query
@@ -11,6 +11,7 @@ from app.api.dependencies import AuthDeps, CommonDeps
 from app.core.custom_router import APIRouter
 from app.core.exceptions import NotFoundError
 from app.core.logging import get_logger
+from app.services.message_repository import MessageRepository
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -41,23 +42,19 @@ async def export_session_for_mcp(
         raise NotFoundError("Session", session_id)
 
     # Get all messages for the session
-    messages_cursor = db.messages.find({"sessionId": session["sessionId"]}).sort(
-        "timestamp", 1
-    )
-
-    messages = await messages_cursor.to_list(None)
+    messages = await MessageRepository(db).find({"sessionId": session["sessionId"]})
 
     # Process messages into structured format
-    processed_messages = []
-    message_map = {}  # For building thread structure
+    processed_messages: List[Dict[str, Any]] = []
+    # For building thread structure
+    message_map: Dict[str, Dict[str, Any]] = {}
 
     for msg in messages:
-        processed_msg = {
+        timestamp = msg.get("timestamp")
+        processed_msg: Dict[str, Any] = {
             "id": str(msg["_id"]),
             "uuid": msg.get("uuid"),
-            "timestamp": msg.get("timestamp").isoformat()
-            if msg.get("timestamp")
-            else None,
+            "timestamp": timestamp.isoformat() if timestamp else None,
             "type": msg.get("type"),
             "role": msg.get("userType"),
             "parent_uuid": msg.get("parentUuid"),
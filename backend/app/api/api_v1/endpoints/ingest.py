@@ -1,10 +1,11 @@
 """Ingestion API endpoints."""
 
+import json
 import logging
 from datetime import UTC, datetime
 from typing import Any
 
-from fastapi import BackgroundTasks, HTTPException
+from fastapi import BackgroundTasks, HTTPException, Query, Request, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.api.dependencies import AuthDeps, CommonDeps
@@ -13,9 +14,13 @@ from app.core.exceptions import ValidationError
 from app.schemas.ingest import (
     BatchIngestRequest,
     BatchIngestResponse,
+    IngestTicketResponse,
+    IngestTicketStatus,
     MessageIngest,
 )
 from app.services.ingest import IngestService
+from app.services.ingest_queue import get_ingest_queue
+from app.services.ingest_stream import NDJSONDecoder, ingest_ndjson
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -70,6 +75,105 @@ async def ingest_batch(
         raise HTTPException(status_code=500, detail="Failed to process batch")
 
 
+@router.post("/batch/async", response_model=IngestTicketResponse, status_code=202)
+async def ingest_batch_async(
+    request: BatchIngestRequest, db: CommonDeps, user_id: AuthDeps
+) -> IngestTicketResponse:
+    """Queue a batch of messages for background ingestion.
+
+    The batch is validated and persisted to a durable queue, then the request
+    returns 202 with a ticket without waiting for the write. Poll
+    ``GET /ingest/tickets/{ticket}`` for progress and results.
+    """
+    if len(request.messages) > 1000:
+        raise HTTPException(
+            status_code=400, detail="Batch size exceeds maximum of 1000 messages"
+        )
+
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="No messages provided")
+
+    ticket = await get_ingest_queue(db).enqueue(
+        user_id, request.messages, overwrite_mode=request.overwrite_mode
+    )
+
+    return IngestTicketResponse(
+        ticket=ticket,
+        status="queued",
+        messages_queued=len(request.messages),
+        message="Batch queued for ingestion",
+    )
+
+
+@router.get("/tickets/{ticket}", response_model=IngestTicketStatus)
+async def get_ingest_ticket(
+    ticket: str, db: CommonDeps, user_id: AuthDeps
+) -> IngestTicketStatus:
+    """Get the status of an asynchronous ingestion ticket."""
+    status = await get_ingest_queue(db).get_status(user_id, ticket)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    return IngestTicketStatus(**status)
+
+
+@router.post("/stream")
+async def ingest_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: CommonDeps,
+    user_id: AuthDeps,
+    overwrite_mode: bool = Query(
+        False, description="Update existing messages on UUID conflicts"
+    ),
+    batch_size: int = Query(
+        100, ge=1, le=1000, description="Messages written per micro-batch"
+    ),
+) -> Response:
+    """Ingest messages streamed as newline-delimited JSON.
+
+    The body is ``application/x-ndjson`` with one message per line, optionally
+    compressed with ``Content-Encoding: gzip`` or ``zstd``. Lines are validated
+    and written in micro-batches while the upload arrives, so the body is never
+    parsed as a whole and has no message limit.
+
+    The response is NDJSON with one status record per line: ``invalid`` for
+    each line that failed validation, ``batch`` for each written micro-batch
+    (with its line range and stats), ``error`` if the body is corrupt, and a
+    final ``summary``.
+    """
+    try:
+        decoder = NDJSONDecoder(request.headers.get("content-encoding"))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    # The body is consumed here rather than from a streaming response: HTTP/1.1
+    # clients only read the response once the upload is done, and the
+    # response's disconnect listener would compete for body chunks
+    ingest_service = IngestService(db, user_id)
+    records = [
+        record
+        async for record in ingest_ndjson(
+            ingest_service,
+            request.stream(),
+            decoder,
+            batch_size=batch_size,
+            overwrite_mode=overwrite_mode,
+        )
+    ]
+
+    if len(records) == 1 and records[0]["lines"] == 0:
+        raise HTTPException(status_code=400, detail="No messages provided")
+
+    # Schedule background tasks
+    projects_created = records[-1]["stats"].get("projects_created")
+    if projects_created:
+        background_tasks.add_task(update_project_metadata, db, projects_created)
+
+    body = "\n".join(json.dumps(record, default=str) for record in records) + "\n"
+    return Response(content=body, media_type="application/x-ndjson")
+
+
 @router.post("/message", response_model=BatchIngestResponse)
 async def ingest_single(
     message: MessageIngest, db: CommonDeps, user_id: AuthDeps
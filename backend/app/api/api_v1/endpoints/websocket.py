@@ -7,9 +7,11 @@ from typing import Any
 from fastapi import Depends, HTTPException, WebSocket, WebSocketDisconnect
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
-from app.api.dependencies import get_database
+from app.api.dependencies import get_database, get_websocket_role
 from app.core.custom_router import APIRouter
+from app.models.user import UserRole
 from app.schemas.websocket import LiveSessionStats, LiveStatsResponse
+from app.services.message_repository import MessageRepository, sum_partials
 from app.services.websocket_manager import RealtimeStatsService, connection_manager
 
 logger = logging.getLogger(__name__)
@@ -97,8 +99,11 @@ async def websocket_global_stats_endpoint(
     logger.info("WebSocket global stats connection attempt")
 
     try:
-        # Connect the WebSocket for global stats
-        await connection_manager.connect(websocket, None)
+        # Connect the WebSocket for global stats; admins also get job progress
+        role = await get_websocket_role(websocket, db)
+        await connection_manager.connect(
+            websocket, None, is_admin=role == UserRole.ADMIN
+        )
 
         # Handle messages in the background
         await connection_manager.handle_websocket_messages(websocket, None)
@@ -121,58 +126,53 @@ async def get_live_session_stats(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    messages_collection = db.messages
-
-    # Get message count
-    message_count = await messages_collection.count_documents({"sessionId": session_id})
+    messages = MessageRepository(db)
+    session_filter = {"sessionId": session_id}
 
     # Get tool usage count
     tool_pipeline: list[dict[str, Any]] = [
-        {"$match": {"sessionId": session_id}},
+        {"$match": session_filter},
         {"$unwind": {"path": "$toolsUsed", "preserveNullAndEmptyArrays": True}},
         {"$match": {"toolsUsed": {"$ne": None}}},
         {"$count": "total_tools"},
     ]
-    tool_result = await messages_collection.aggregate(tool_pipeline).to_list(1)
-    tool_usage_count = tool_result[0]["total_tools"] if tool_result else 0
 
     # Get token count
     token_pipeline: list[dict[str, Any]] = [
-        {"$match": {"sessionId": session_id}},
+        {"$match": session_filter},
         {
             "$group": {
                 "_id": None,
-                "total_tokens": {
-                    "$sum": {
-                        "$add": [
-                            {"$ifNull": ["$inputTokens", 0]},
-                            {"$ifNull": ["$outputTokens", 0]},
-                        ]
-                    }
-                },
+                "total_tokens": {"$sum": "$tokens.total"},
             }
         },
     ]
-    token_result = await messages_collection.aggregate(token_pipeline).to_list(1)
-    token_count = token_result[0]["total_tokens"] if token_result else 0
 
     # Get cost
     cost_pipeline: list[dict[str, Any]] = [
-        {"$match": {"sessionId": session_id}},
-        {"$group": {"_id": None, "total_cost": {"$sum": {"$ifNull": ["$costUsd", 0]}}}},
+        {"$match": session_filter},
+        {"$group": {"_id": None, "total_cost": {"$sum": "$cost"}}},
     ]
-    cost_result = await messages_collection.aggregate(cost_pipeline).to_list(1)
-    raw_cost = cost_result[0]["total_cost"] if cost_result else 0.0
-    # Convert Decimal128 to float if necessary
-    if hasattr(raw_cost, "to_decimal"):
-        cost = float(raw_cost.to_decimal())
-    else:
-        cost = float(raw_cost)
-
-    # Get last activity
-    last_message = await messages_collection.find_one(
-        {"sessionId": session_id}, sort=[("timestamp", -1)]
+
+    # Each query only touches the collections the session spans
+    (
+        message_count,
+        tool_result,
+        token_result,
+        cost_result,
+        last_message,
+    ) = await asyncio.gather(
+        messages.count(session_filter),
+        messages.aggregate_partitions(tool_pipeline, session_filter),
+        messages.aggregate_partitions(token_pipeline, session_filter),
+        messages.aggregate_partitions(cost_pipeline, session_filter),
+        # Get last activity
+        messages.find_first(session_filter, {"timestamp": 1}, sort_order="desc"),
     )
+    tool_usage_count = sum_partials(tool_result, "total_tools")
+    token_count = sum_partials(token_result, "total_tokens")
+    # Decimal128 partials are converted to float
+    cost = float(sum_partials(cost_result, "total_cost", 0.0))
     last_activity = last_message.get("timestamp") if last_message else None
 
     # Determine if session is active (activity within last 5 minutes)
@@ -198,11 +198,7 @@ async def get_live_global_stats(
     db: AsyncIOMotorDatabase = Depends(get_database),
 ) -> LiveStatsResponse:
     """Get current live global statistics."""
-    messages_collection = db.messages
-    sessions_collection = db.sessions
-
-    # Get total message count
-    total_messages = await messages_collection.count_documents({})
+    messages = MessageRepository(db)
 
     # Get total tool usage count
     tool_pipeline: list[dict[str, Any]] = [
@@ -210,62 +206,46 @@ async def get_live_global_stats(
         {"$match": {"toolsUsed": {"$ne": None}}},
         {"$count": "total_tools"},
     ]
-    tool_result = await messages_collection.aggregate(tool_pipeline).to_list(1)
-    total_tools = tool_result[0]["total_tools"] if tool_result else 0
 
     # Get total token count
     token_pipeline: list[dict[str, Any]] = [
         {
             "$group": {
                 "_id": None,
-                "total_tokens": {
-                    "$sum": {
-                        "$add": [
-                            {"$ifNull": ["$inputTokens", 0]},
-                            {"$ifNull": ["$outputTokens", 0]},
-                        ]
-                    }
-                },
+                "total_tokens": {"$sum": "$tokens.total"},
             }
         }
     ]
-    token_result = await messages_collection.aggregate(token_pipeline).to_list(1)
-    total_tokens = token_result[0]["total_tokens"] if token_result else 0
 
     # Get total cost
     cost_pipeline: list[dict[str, Any]] = [
-        {"$group": {"_id": None, "total_cost": {"$sum": {"$ifNull": ["$costUsd", 0]}}}}
+        {"$group": {"_id": None, "total_cost": {"$sum": "$cost"}}}
     ]
-    cost_result = await messages_collection.aggregate(cost_pipeline).to_list(1)
-    raw_total_cost = cost_result[0]["total_cost"] if cost_result else 0.0
-    # Convert Decimal128 to float if necessary
-    if hasattr(raw_total_cost, "to_decimal"):
-        total_cost = float(raw_total_cost.to_decimal())
-    else:
-        total_cost = float(raw_total_cost)
-
-    # Get active sessions count (sessions with activity in last 5 minutes)
+
+    # Get active sessions count (sessions with activity in last 5 minutes);
+    # the timestamp range routes this to the current month's collection
     from datetime import UTC, datetime, timedelta
 
     cutoff_time = datetime.now(UTC) - timedelta(minutes=5)
 
-    active_sessions_pipeline: list[dict[str, Any]] = [
-        {
-            "$lookup": {
-                "from": "messages",
-                "localField": "sessionId",
-                "foreignField": "sessionId",
-                "as": "messages",
-            }
-        },
-        {"$match": {"messages.timestamp": {"$gte": cutoff_time}}},
-        {"$count": "active_sessions"},
-    ]
-
-    active_result = await sessions_collection.aggregate(
-        active_sessions_pipeline
-    ).to_list(1)
-    active_sessions = active_result[0]["active_sessions"] if active_result else 0
+    (
+        total_messages,
+        tool_result,
+        token_result,
+        cost_result,
+        active,
+    ) = await asyncio.gather(
+        messages.count({}),
+        messages.aggregate_partitions(tool_pipeline, {}),
+        messages.aggregate_partitions(token_pipeline, {}),
+        messages.aggregate_partitions(cost_pipeline, {}),
+        messages.distinct("sessionId", {"timestamp": {"$gte": cutoff_time}}),
+    )
+    total_tools = sum_partials(tool_result, "total_tools")
+    total_tokens = sum_partials(token_result, "total_tokens")
+    # Decimal128 partials are converted to float
+    total_cost = float(sum_partials(cost_result, "total_cost", 0.0))
+    active_sessions = len(active)
 
     return LiveStatsResponse(
         total_messages=total_messages,
@@ -2,7 +2,7 @@
 
 from typing import Annotated, Optional
 
-from fastapi import Depends, Header, HTTPException, Request
+from fastapi import Depends, Header, HTTPException, Request, WebSocket
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
@@ -129,6 +129,60 @@ async def require_admin(
     return current_user
 
 
+async def get_websocket_role(
+    websocket: WebSocket, db: AsyncIOMotorDatabase
+) -> Optional[UserRole]:
+    """Resolve the role of the user opening a WebSocket, if any.
+
+    HTTP middleware does not run for WebSockets, so this repeats the checks of
+    ``verify_api_key_or_jwt``. Browsers cannot set headers on a WebSocket, so
+    the JWT may also come in the ``token`` query parameter. Returns None for
+    unauthenticated connections instead of rejecting them.
+    """
+    x_real_ip = websocket.headers.get("X-Real-IP", "")
+    x_forwarded_for = websocket.headers.get("X-Forwarded-For", "")
+    client_host = websocket.client.host if websocket.client else ""
+
+    localhost_ips = {"127.0.0.1", "localhost", "::1"}
+    if (
+        client_host in localhost_ips
+        or x_real_ip in localhost_ips
+        or x_forwarded_for.split(",")[0].strip() in localhost_ips
+    ):
+        # Localhost connects as the default development admin
+        default_user = await db.users.find_one({"username": "admin"})
+        if not default_user:
+            return UserRole.ADMIN
+        return UserRole(default_user.get("role", "admin"))
+
+    if "session" in websocket.scope:
+        user_data = websocket.session.get("user")
+        if user_data:
+            return UserRole(user_data.get("role", "user"))
+
+    auth_header = websocket.headers.get("Authorization", "")
+    token = (
+        auth_header.replace("Bearer ", "")
+        if auth_header.startswith("Bearer ")
+        else websocket.query_params.get("token")
+    )
+    if token:
+        token_data = AuthService.decode_access_token(token)
+        if token_data:
+            return UserRole(token_data.role)
+
+    api_key = websocket.headers.get("X-API-Key")
+    if api_key:
+        try:
+            await verify_tenant_from_api_key(api_key, db, websocket)
+        except HTTPException:
+            return None
+        context = await get_tenant_context(websocket)
+        return context.user_role
+
+    return None
+
+
 # Common dependencies
 CommonDeps = Annotated[AsyncIOMotorDatabase, Depends(get_db)]
 AuthDeps = Annotated[str, Depends(verify_api_key_or_jwt)]
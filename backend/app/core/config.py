@@ -1,6 +1,6 @@
 """Application configuration."""
 
-from typing import ClassVar
+from typing import ClassVar, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -50,6 +50,24 @@ class Settings(BaseSettings):
     BACKUP_RETENTION_DAYS: int = 30
     BACKUP_MAX_SIZE_GB: int = 100
 
+    # Message fields larger than this (in BSON bytes) move to the blob store
+    BLOB_THRESHOLD_BYTES: int = 16 * 1024
+
+    # Columnar snapshots of closed monthly message collections. The snapshot
+    # registry lives in MongoDB, so this must be storage every replica mounts;
+    # snapshots are disabled while it is unset.
+    SNAPSHOT_STORAGE_PATH: Optional[str] = None
+
+    # Identical analytics/search results are reused for this long (0 disables)
+    REQUEST_MEMO_TTL_SECONDS: float = 5.0
+
+    # Server-side query time budget in seconds per request path prefix; the
+    # longest matching prefix applies
+    QUERY_BUDGETS: dict[str, float] = {
+        "/api/v1/analytics": 30.0,
+        "/api/v1/search": 15.0,
+    }
+
     # Session Configuration for OIDC
     SESSION_SECRET_KEY: str = "change-this-to-a-secure-secret-key-in-production"
     SESSION_COOKIE_NAME: str = "claudelens_session"
@@ -129,70 +129,55 @@ async def create_indexes(db: AsyncIOMotorDatabase) -> None:
     sessions = db.sessions
     await create_index_if_not_exists(sessions, [("sessionId", 1)], unique=True)
     await create_index_if_not_exists(sessions, [("projectId", 1)])
+    # Tenant-scoped listing (user_id is denormalized onto sessions at ingest)
+    await create_index_if_not_exists(sessions, [("user_id", 1), ("startedAt", -1)])
+    await create_index_if_not_exists(
+        sessions, [("user_id", 1), ("projectId", 1), ("startedAt", -1)]
+    )
     await create_index_if_not_exists(sessions, [("startedAt", -1)])
     await create_index_if_not_exists(sessions, [("summary", "text")])
     # Additional indexes for analytics queries
     await create_index_if_not_exists(sessions, [("updatedAt", -1)])
     await create_index_if_not_exists(sessions, [("updatedAt", -1), ("messageCount", 1)])
-
-    # Messages indexes
-    messages = db.messages
-    await create_index_if_not_exists(messages, [("sessionId", 1), ("timestamp", 1)])
-    await create_index_if_not_exists(messages, [("uuid", 1)], unique=True)
-    await create_index_if_not_exists(messages, [("parentUuid", 1)])
+    # Depth analytics over the tree stats ingest keeps on each session
     await create_index_if_not_exists(
-        messages,
-        [("message.content", "text"), ("content", "text"), ("toolUseResult", "text")],
+        sessions, [("user_id", 1), ("endedAt", -1), ("maxDepth", 1)]
     )
-    await create_index_if_not_exists(messages, [("type", 1)])
-    await create_index_if_not_exists(messages, [("timestamp", -1)])
-    await create_index_if_not_exists(messages, [("message.model", 1)])
-    await create_index_if_not_exists(messages, [("costUsd", 1)])
+    await create_index_if_not_exists(sessions, [("endedAt", -1), ("maxDepth", 1)])
 
-    # Additional indexes for analytics queries
-    # For date range queries in analytics
-    await create_index_if_not_exists(messages, [("createdAt", -1)])
-    await create_index_if_not_exists(messages, [("createdAt", -1), ("model", 1)])
-    await create_index_if_not_exists(messages, [("createdAt", -1), ("cost", 1)])
+    # Message indexes live on the monthly messages_YYYY_MM collections and are
+    # created by RollingMessageService when each collection is first used
 
-    # Compound index for directory analytics
-    await create_index_if_not_exists(messages, [("createdAt", -1), ("directory", 1)])
+    # Sync state indexes
+    sync_state = db.sync_state
+    await create_index_if_not_exists(sync_state, [("projectPath", 1)], unique=True)
 
-    # For tool usage queries
+    # Asynchronous ingest queue indexes
+    ingest_queue = db.ingest_queue
+    await create_index_if_not_exists(ingest_queue, [("status", 1), ("created_at", 1)])
     await create_index_if_not_exists(
-        messages, [("createdAt", -1), ("toolCalls.name", 1)]
+        ingest_queue, [("user_id", 1), ("status", 1), ("created_at", 1)]
     )
-
-    # For response time queries
-    await create_index_if_not_exists(messages, [("createdAt", -1), ("responseTime", 1)])
-
-    # For git branch queries
-    await create_index_if_not_exists(messages, [("createdAt", -1), ("gitBranch", 1)])
-    # Compound index for git branch analytics aggregation
-    await create_index_if_not_exists(messages, [("timestamp", -1), ("gitBranch", 1)])
-    await create_index_if_not_exists(messages, [("gitBranch", 1), ("timestamp", -1)])
-    # Index for sessionId filtering in git branch analytics
+    await create_index_if_not_exists(ingest_queue, [("ticket", 1), ("user_id", 1)])
+    # Finished entries expire once their retention period has passed
     await create_index_if_not_exists(
-        messages, [("sessionId", 1), ("timestamp", -1), ("gitBranch", 1)]
+        ingest_queue, [("expires_at", 1)], expire_after_seconds=0
     )
 
-    # Model field (if different from message.model)
-    await create_index_if_not_exists(messages, [("model", 1)])
-
-    # Directory field for analytics
-    await create_index_if_not_exists(messages, [("directory", 1)])
-
-    # Sync state indexes
-    sync_state = db.sync_state
-    await create_index_if_not_exists(sync_state, [("projectPath", 1)], unique=True)
-
 
 async def create_index_if_not_exists(
-    collection: Any, keys: list[tuple[str, Any]], unique: bool = False
+    collection: Any,
+    keys: list[tuple[str, Any]],
+    unique: bool = False,
+    expire_after_seconds: int | None = None,
 ) -> None:
     """Create an index if it doesn't already exist."""
+    options: dict[str, Any] = {}
+    if expire_after_seconds is not None:
+        options["expireAfterSeconds"] = expire_after_seconds
+
     try:
-        index_name = await collection.create_index(keys, unique=unique)
+        index_name = await collection.create_index(keys, unique=unique, **options)
         logger.info(f"Created index {index_name} on {collection.name}")
     except errors.OperationFailure as e:
         if "already exists" in str(e):
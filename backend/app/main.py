@@ -21,6 +21,7 @@ from app.core.logging import get_logger, setup_logging
 from app.middleware.auth import AuthenticationMiddleware
 from app.middleware.forwarded_headers import ForwardedHeadersMiddleware
 from app.middleware.logging import LoggingMiddleware
+from app.middleware.query_deadline import QueryDeadlineMiddleware
 from app.middleware.rate_limit_tracking import RateLimitTrackingMiddleware
 
 # Configure logging
@@ -81,6 +82,10 @@ app = FastAPI(
 # IMPORTANT: ForwardedHeadersMiddleware must be added first to handle proxy headers
 app.add_middleware(ForwardedHeadersMiddleware)
 
+# Added early so it runs close to the routes, after auth and rate limiting;
+# query budgets then cover only the handler
+app.add_middleware(QueryDeadlineMiddleware)
+
 # IMPORTANT: SessionMiddleware must be added before OAuth initialization
 app.add_middleware(
     SessionMiddleware,
@@ -0,0 +1,97 @@
+"""Middleware applying query budgets and stopping work for departed clients."""
+
+import asyncio
+from typing import Any, Dict
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.logging import get_logger
+from app.services.query_budget import budget_for_path, get_query_metrics, query_budget
+
+logger = get_logger(__name__)
+
+PARTIAL_RESULTS_HEADER = b"x-partial-results"
+
+
+class QueryDeadlineMiddleware:
+    """
+    Run budgeted requests under a ``QueryBudget`` and cancel them on disconnect.
+
+    Requests under a prefix of ``settings.QUERY_BUDGETS`` get a query budget.
+    Their handler runs as a separate task while the client connection is
+    watched; if the client disconnects before the response is complete the
+    handler is cancelled, which cancels its per-partition queries and
+    releases their server-side cursors. Responses built from partial results
+    carry an ``X-Partial-Results: true`` header.
+
+    This is a plain ASGI middleware: ``BaseHTTPMiddleware`` does not deliver
+    the disconnect to the wrapped handler.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Serve one request."""
+        budget_config = (
+            budget_for_path(scope["path"]) if scope["type"] == "http" else None
+        )
+        if budget_config is None:
+            await self.app(scope, receive, send)
+            return
+
+        endpoint, seconds = budget_config
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        state: Dict[str, Any] = {"response_complete": False}
+
+        async def listen() -> None:
+            """Forward client messages until the client goes away."""
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        with query_budget(endpoint, seconds) as budget:
+
+            async def send_with_status(message: Message) -> None:
+                if message["type"] == "http.response.start" and budget.partial:
+                    get_query_metrics().record_partial(endpoint)
+                    message = {
+                        **message,
+                        "headers": [
+                            *message.get("headers", []),
+                            (PARTIAL_RESULTS_HEADER, b"true"),
+                        ],
+                    }
+                if message["type"] == "http.response.body" and not message.get(
+                    "more_body", False
+                ):
+                    state["response_complete"] = True
+                await send(message)
+
+            async def handle() -> None:
+                await self.app(scope, messages.get, send_with_status)
+
+            handler: asyncio.Task[None] = asyncio.create_task(handle())
+            listener = asyncio.create_task(listen())
+            try:
+                await asyncio.wait(
+                    {handler, listener}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not handler.done() and not state["response_complete"]:
+                    handler.cancel()
+                    get_query_metrics().record_cancelled(endpoint)
+                    logger.info(
+                        f"Client disconnected, cancelled {scope['path']} "
+                        f"after {seconds - budget.remaining():.1f}s"
+                    )
+                    try:
+                        await handler
+                    except asyncio.CancelledError:
+                        pass
+                    return
+                await handler
+            finally:
+                listener.cancel()
+                handler.cancel()
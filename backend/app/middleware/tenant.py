@@ -5,8 +5,9 @@ import logging
 from typing import Optional
 
 from bson import ObjectId
-from fastapi import HTTPException, Request
+from fastapi import HTTPException
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from starlette.requests import HTTPConnection
 
 from app.models.user import UserRole
 
@@ -23,15 +24,15 @@ class TenantContext:
         self.permissions: list = []
 
 
-async def get_tenant_context(request: Request) -> TenantContext:
-    """Get tenant context from request state."""
+async def get_tenant_context(request: HTTPConnection) -> TenantContext:
+    """Get tenant context from request or websocket state."""
     if not hasattr(request.state, "tenant_context"):
         request.state.tenant_context = TenantContext()
     return request.state.tenant_context  # type: ignore
 
 
 async def verify_tenant_from_api_key(
-    api_key: str, db: AsyncIOMotorDatabase, request: Request
+    api_key: str, db: AsyncIOMotorDatabase, request: HTTPConnection
 ) -> str:
     """Verify tenant from API key and inject into request context."""
     # Hash the provided key
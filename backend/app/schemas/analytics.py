@@ -139,6 +139,30 @@ class TokenUsageStats(BaseModel):
     group_by: str
 
 
+class DashboardWidget(str, Enum):
+    """Widgets that can be requested together from the dashboard bundle."""
+
+    SUMMARY = "summary"
+    ACTIVITY_HEATMAP = "activity_heatmap"
+    COST = "cost"
+    MODELS = "model_usage"
+    TOKENS = "token_usage"
+
+
+class DashboardBundle(BaseModel):
+    """Dashboard widgets computed in one pass over the messages."""
+
+    widgets: list[DashboardWidget]
+    time_range: TimeRange
+
+    # Only the requested widgets are set
+    summary: AnalyticsSummary | None = None
+    activity_heatmap: ActivityHeatmap | None = None
+    cost: CostAnalytics | None = None
+    model_usage: ModelUsageStats | None = None
+    token_usage: TokenUsageStats | None = None
+
+
 class ToolUsageSummary(BaseModel):
     """Tool usage summary for stat card."""
 
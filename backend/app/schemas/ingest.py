@@ -137,3 +137,31 @@ class BatchIngestResponse(BaseModel):
     stats: IngestStats
     message: str
     errors: list[dict[str, Any]] | None = None
+
+
+class IngestTicketResponse(BaseModel):
+    """Response from queueing a batch for asynchronous ingestion."""
+
+    ticket: str = Field(..., description="Ticket for polling ingestion status")
+    status: str = Field("queued", description="Ticket status")
+    messages_queued: int = Field(..., description="Messages accepted into the queue")
+    message: str
+
+
+class IngestTicketStatus(BaseModel):
+    """Progress of an asynchronous ingestion ticket."""
+
+    ticket: str
+    status: str = Field(
+        ..., description="Ticket status (queued, processing, completed, failed)"
+    )
+    messages_total: int = Field(..., description="Messages in the ticket")
+    parts: int = Field(1, description="Queue entries the ticket was split into")
+    parts_completed: int = Field(0, description="Queue entries already written")
+    attempts: int = Field(0, description="Highest attempt count of any entry")
+    stats: IngestStats | None = Field(
+        None, description="Statistics from the entries written so far"
+    )
+    error: str | None = Field(None, description="Last error, if any attempt failed")
+    created_at: datetime
+    completed_at: datetime | None = None
@@ -139,6 +139,20 @@ class ImportProgressEvent(BaseModel):
     )
 
 
+class StorageProgressEvent(BaseModel):
+    """WebSocket event for storage recalculation progress updates."""
+
+    type: Literal["storage_progress"] = "storage_progress"
+    job_id: str = Field(..., description="Storage recalculation job ID")
+    progress: dict = Field(..., description="Progress information")
+    message: str = Field("", description="Progress message")
+    completed: bool = Field(False, description="Whether recalculation is complete")
+    error: str | None = Field(None, description="Error message if recalculation failed")
+    timestamp: datetime = Field(
+        default_factory=datetime.utcnow, description="Event timestamp"
+    )
+
+
 # Union type for all WebSocket events
 WebSocketEvent = Union[
     StatUpdateEvent,
@@ -149,6 +163,7 @@ WebSocketEvent = Union[
     DeletionProgressEvent,
     ExportProgressEvent,
     ImportProgressEvent,
+    StorageProgressEvent,
 ]
 
 
@@ -1,10 +1,10 @@
 """Analytics service implementation."""
 
-import math
 import re
 import statistics
 from datetime import UTC, datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -40,6 +40,8 @@ from app.schemas.analytics import (
     CostPredictionPoint,
     CostSummary,
     CostTimePoint,
+    DashboardBundle,
+    DashboardWidget,
     DepthCorrelations,
     DepthDistribution,
     DepthRecommendations,
@@ -80,7 +82,78 @@ from app.schemas.analytics import (
     TopicExtractionResponse,
     TopicSuggestionResponse,
 )
+from app.services.analytics_kernels import (
+    group_sums,
+    heatmap_bins,
+    moving_average_forecast,
+    nearest_rank,
+    pearson,
+)
+from app.services.benchmark_kpis import (
+    RAW_METRIC_KEYS,
+    entity_kpis,
+    kpi_pipeline,
+    merge_partials,
+    normalize_column,
+    percentile_ranks,
+)
+from app.services.blob_store import BlobStore
+from app.services.conversation_tree import ConversationTree
+from app.services.partition_snapshot import ColumnarPartition, PartitionSnapshotStore
+from app.services.query_budget import current_budget
+from app.services.request_coalescer import coalesced
 from app.services.rolling_message_service import RollingMessageService
+from app.services.tool_errors import classify_tool_result
+from app.services.topic_extraction import (
+    WATERMARK_LAG,
+    SessionTopics,
+    SessionTopicStore,
+    TopicMatcher,
+)
+
+# Fields read by conversation flow analytics
+FLOW_PROJECTION = {
+    "_id": 0,
+    "uuid": 1,
+    "parentUuid": 1,
+    "type": 1,
+    "isSidechain": 1,
+    "costUsd": 1,
+    "durationMs": 1,
+    "timestamp": 1,
+    "message.content": 1,
+    "message.tool_calls": 1,
+    # Only presence is needed; the result itself can be large
+    "hasToolUseResult": {"$toBool": {"$ifNull": ["$toolUseResult", False]}},
+}
+
+# Fields read by topic extraction
+TOPIC_PROJECTION = {
+    # _id tells apart messages already folded in near the watermark
+    "_id": 1,
+    "sessionId": 1,
+    "type": 1,
+    "content": 1,
+    "cwd": 1,
+    "createdAt": 1,
+    "messageData.name": 1,
+}
+
+# Tools whose use makes a topic more likely
+TOPIC_TOOLS = {
+    "Web Development": ["Read", "Edit", "Write", "Grep"],
+    "API Integration": ["WebFetch", "Bash"],
+    "Database Operations": ["Bash", "Read", "Edit"],
+    "DevOps/Deployment": ["Bash", "Read", "Write"],
+    "Testing/QA": ["Bash", "Read", "Edit"],
+    "Documentation": ["Read", "Write", "Edit"],
+}
+
+# Minimum relevance for a topic to count towards topic suggestions
+TOPIC_CONFIDENCE_THRESHOLD = 0.3
+
+# Compiled from the topic rules on first use
+_topic_matcher: Optional[TopicMatcher] = None
 
 
 class AnalyticsService:
@@ -162,6 +235,31 @@ class AnalyticsService:
             pipeline, start_date, end_date
         )
 
+    async def _aggregate_with_snapshots(
+        self,
+        pipeline: List[Dict],
+        time_range: TimeRange,
+        scan: Callable[[ColumnarPartition, datetime, datetime], List[Dict]],
+    ) -> List[Dict]:
+        """Aggregate across rolling collections, reading closed months locally.
+
+        Collections with a current columnar snapshot are passed to ``scan``,
+        which must return rows shaped like the pipeline's per-collection
+        output; the rest run ``pipeline`` in MongoDB.
+        """
+        start_date, end_date = self._get_time_range_bounds(time_range)
+        collections = await self.rolling_service.get_collections_for_range(
+            start_date, end_date
+        )
+        snapshots = await PartitionSnapshotStore(self.db).load(collections)
+
+        results = await self.rolling_service.aggregate_collections(
+            [c for c in collections if c not in snapshots], pipeline
+        )
+        for partition in snapshots.values():
+            results.extend(scan(partition, start_date, end_date))
+        return results
+
     def _extract_dates_from_pipeline(
         self, pipeline: List[Dict]
     ) -> tuple[datetime, datetime]:
@@ -205,47 +303,20 @@ class AnalyticsService:
 
         return None
 
+    @coalesced
     async def get_summary(self, time_range: TimeRange) -> AnalyticsSummary:
         """Get analytics summary optimized for dashboard performance."""
-        time_filter = self._get_time_filter(time_range)
-
-        # Add user filter for messages by filtering to user's sessions
-        if self.user_id:
-            from bson import ObjectId
-
-            # Get user's projects first
-            user_projects = await self.db.projects.find(
-                {"user_id": ObjectId(self.user_id)}, {"_id": 1}
-            ).to_list(None)
-            project_ids = [p["_id"] for p in user_projects]
-
-            # Get sessions belonging to user's projects
-            user_sessions = await self.db.sessions.find(
-                {"projectId": {"$in": project_ids}}, {"sessionId": 1}
-            ).to_list(None)
-            session_ids = [s["sessionId"] for s in user_sessions]
-            if session_ids:
-                time_filter["sessionId"] = {"$in": session_ids}
-            else:
-                # No sessions for this user, return empty stats
-                return AnalyticsSummary(
-                    total_messages=0,
-                    total_sessions=0,
-                    total_projects=0,
-                    total_cost=0.0,
-                    messages_trend=0,
-                    cost_trend=0,
-                    most_active_project=None,
-                    most_used_model=None,
-                    time_range=time_range,
-                )
+        # Messages carry the user_id of the project they belong to
+        time_filter = self._add_user_filter(self._get_time_filter(time_range))
 
         # Get current period stats and most active project in a single optimized query
         current_stats = await self._get_period_stats_with_project(time_filter)
 
         # Previous period stats for trends (only if needed)
         if time_range != TimeRange.ALL_TIME:
-            prev_filter = self._get_previous_period_filter(time_range)
+            prev_filter = self._add_user_filter(
+                self._get_previous_period_filter(time_range)
+            )
             prev_stats = await self._get_period_stats(prev_filter)
 
             # Calculate trends
@@ -271,6 +342,7 @@ class AnalyticsService:
             time_range=time_range,
         )
 
+    @coalesced
     async def get_activity_heatmap(
         self, time_range: TimeRange, timezone: str = "UTC"
     ) -> ActivityHeatmap:
@@ -280,6 +352,357 @@ class AnalyticsService:
         # Aggregation pipeline for heatmap
         pipeline: list[dict[str, Any]] = [
             {"$match": time_filter},
+            *self._heatmap_stages(timezone),
+        ]
+
+        try:
+            zone: Optional[ZoneInfo] = ZoneInfo(timezone)
+        except (ValueError, ZoneInfoNotFoundError):
+            # UTC offsets are left to MongoDB
+            zone = None
+
+        def scan(
+            partition: ColumnarPartition, start: datetime, end: datetime
+        ) -> List[Dict]:
+            """Heatmap rows of a closed month from its snapshot."""
+            cells: Dict[tuple[int, int], Dict[str, Any]] = {}
+            slots: Dict[int, tuple[int, int]] = {}
+            for timestamp, cost, duration in partition.scan(
+                ("timestamp", "cost", "durationMs"), start, end
+            ):
+                minute = timestamp // 60_000
+                slot = slots.get(minute)
+                if slot is None:
+                    local = datetime.fromtimestamp(minute * 60, zone)
+                    slot = slots[minute] = (local.isoweekday() % 7, local.hour)
+                cell = cells.get(slot)
+                if cell is None:
+                    cell = cells[slot] = {
+                        "day": slot[0],
+                        "hour": slot[1],
+                        "count": 0,
+                        "costSum": 0.0,
+                        "costCount": 0,
+                        "durationSum": 0.0,
+                        "durationCount": 0,
+                    }
+                cell["count"] += 1
+                if cost is not None:
+                    cell["costSum"] += cost
+                    cell["costCount"] += 1
+                if duration is not None:
+                    cell["durationSum"] += duration
+                    cell["durationCount"] += 1
+            return list(cells.values())
+
+        if zone is None:
+            results = await self._aggregate_messages(pipeline)
+        else:
+            results = await self._aggregate_with_snapshots(pipeline, time_range, scan)
+        return self._heatmap_from_rows(results, time_range, timezone)
+
+    @coalesced
+    async def get_cost_analytics(
+        self, time_range: TimeRange, group_by: str, project_id: str | None = None
+    ) -> CostAnalytics:
+        """Get cost analytics over time."""
+        time_filter = self._get_time_filter(time_range)
+
+        # Add project filter if specified
+        if project_id:
+            session_ids = await self._project_session_ids(project_id)
+            time_filter["sessionId"] = {"$in": session_ids}
+
+        # Determine date grouping
+        date_format = self._get_date_format(group_by)
+
+        # Aggregation pipeline
+        pipeline: list[dict[str, Any]] = [
+            {"$match": {**time_filter, "costUsd": {"$exists": True}}},
+            *self._cost_stages(date_format),
+        ]
+
+        project_sessions = set(time_filter["sessionId"]["$in"]) if project_id else None
+
+        def scan(
+            partition: ColumnarPartition, start: datetime, end: datetime
+        ) -> List[Dict]:
+            """Cost rows of a closed month from its snapshot."""
+            buckets: Dict[str, Dict[str, Any]] = {}
+            keys: Dict[int, str] = {}
+            for timestamp, has_cost, cost, model, session_id in partition.scan(
+                ("timestamp", "hasCostUsd", "cost", "model", "sessionId"),
+                start,
+                end,
+            ):
+                if not has_cost:
+                    continue
+                if project_sessions is not None and session_id not in project_sessions:
+                    continue
+                hour = timestamp // 3_600_000
+                key = keys.get(hour)
+                if key is None:
+                    key = keys[hour] = datetime.fromtimestamp(
+                        hour * 3600, UTC
+                    ).strftime(date_format)
+                bucket = buckets.setdefault(
+                    key, {"_id": key, "totalCost": 0.0, "messageCount": 0, "models": {}}
+                )
+                bucket["totalCost"] += cost or 0.0
+                bucket["messageCount"] += 1
+                bucket["models"][model] = bucket["models"].get(model, 0.0) + (
+                    cost or 0.0
+                )
+            return [
+                {
+                    "_id": bucket["_id"],
+                    "totalCost": bucket["totalCost"],
+                    "messageCount": bucket["messageCount"],
+                    "costByModel": [
+                        {"model": model, "cost": cost}
+                        for model, cost in bucket.pop("models").items()
+                    ],
+                }
+                for bucket in buckets.values()
+            ]
+
+        results = await self._aggregate_with_snapshots(pipeline, time_range, scan)
+
+        return self._cost_from_rows(results, time_range, group_by)
+
+    @coalesced
+    async def get_model_usage(
+        self, time_range: TimeRange, project_id: str | None = None
+    ) -> ModelUsageStats:
+        """Get model usage statistics."""
+        time_filter = self._get_time_filter(time_range)
+
+        # Add project filter if specified
+        if project_id:
+            session_ids = await self._project_session_ids(project_id)
+            time_filter["sessionId"] = {"$in": session_ids}
+
+        # Aggregation pipeline
+        pipeline: list[dict[str, Any]] = [
+            {"$match": {**time_filter, "model": {"$exists": True, "$nin": [None, ""]}}},
+            *self._model_usage_stages(),
+        ]
+
+        results = await self._aggregate_messages(pipeline)
+
+        return self._model_usage_from_rows(results, time_range)
+
+    @coalesced
+    async def get_token_usage(
+        self, time_range: TimeRange, group_by: str
+    ) -> TokenUsageStats:
+        """Get token usage statistics."""
+        time_filter = self._get_time_filter(time_range)
+        date_format = self._get_date_format(group_by)
+
+        # Aggregation pipeline
+        pipeline: list[dict[str, Any]] = [
+            {"$match": time_filter},
+            *self._token_usage_stages(date_format),
+        ]
+
+        results = await self._aggregate_messages(pipeline)
+
+        return self._token_usage_from_rows(results, time_range, group_by)
+
+    @coalesced
+    async def get_dashboard_bundle(
+        self,
+        widgets: list[DashboardWidget],
+        time_range: TimeRange,
+        timezone: str = "UTC",
+        group_by: str = "day",
+        project_id: str | None = None,
+    ) -> DashboardBundle:
+        """Compute several dashboard widgets in one scan of each partition.
+
+        Every widget is a branch of a single ``$facet`` run once per monthly
+        collection. Branches emit sums and counts keyed by session, cell,
+        period or model, so rows from different partitions merge exactly.
+        ``project_id`` scopes the cost and model widgets, as it does for
+        their own endpoints.
+        """
+        selected = set(widgets)
+        time_filter = self._get_time_filter(time_range)
+        start_date, end_date = self._get_time_range_bounds(time_range)
+        date_format = self._get_date_format(group_by)
+        project_filter: dict[str, Any] = {}
+        if project_id and selected & {DashboardWidget.COST, DashboardWidget.MODELS}:
+            session_ids = await self._project_session_ids(project_id)
+            project_filter = {"sessionId": {"$in": session_ids}}
+
+        branches: dict[str, list[dict[str, Any]]] = {}
+        if DashboardWidget.SUMMARY in selected:
+            branches["summary"] = [
+                {"$match": self._add_user_filter(dict(time_filter))},
+                *self._summary_session_stages(),
+            ]
+            if time_range != TimeRange.ALL_TIME:
+                previous_filter = self._add_user_filter(
+                    self._get_previous_period_filter(time_range)
+                )
+                start_date = previous_filter["timestamp"]["$gte"]
+                branches["summary_previous"] = [
+                    {"$match": previous_filter},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "messages": {"$sum": 1},
+                            "cost": {"$sum": "$cost"},
+                        }
+                    },
+                ]
+        if DashboardWidget.ACTIVITY_HEATMAP in selected:
+            branches["heatmap"] = [
+                {"$match": time_filter},
+                *self._heatmap_stages(timezone),
+            ]
+        if DashboardWidget.COST in selected:
+            branches["cost"] = [
+                {
+                    "$match": {
+                        **time_filter,
+                        **project_filter,
+                        "costUsd": {"$exists": True},
+                    }
+                },
+                *self._cost_stages(date_format),
+            ]
+        if DashboardWidget.MODELS in selected:
+            branches["models"] = [
+                {
+                    "$match": {
+                        **time_filter,
+                        **project_filter,
+                        "model": {"$exists": True, "$nin": [None, ""]},
+                    }
+                },
+                *self._model_usage_stages(),
+            ]
+        if DashboardWidget.TOKENS in selected:
+            branches["tokens"] = [
+                {"$match": time_filter},
+                *self._token_usage_stages(date_format),
+            ]
+
+        rows: dict[str, list[dict[str, Any]]] = {name: [] for name in branches}
+        if branches:
+            collections = await self.rolling_service.get_collections_for_range(
+                start_date, end_date
+            )
+            partitions = await self.rolling_service.aggregate_collections(
+                collections,
+                [
+                    {"$match": {"timestamp": {"$gte": start_date}}},
+                    {"$facet": branches},
+                ],
+            )
+            for partition in partitions:
+                for name in branches:
+                    rows[name].extend(partition.get(name, []))
+
+        bundle = DashboardBundle(time_range=time_range, widgets=widgets)
+        if "summary" in rows:
+            bundle.summary = await self._summary_from_rows(
+                rows["summary"], rows.get("summary_previous"), time_range
+            )
+        if "heatmap" in rows:
+            bundle.activity_heatmap = self._heatmap_from_rows(
+                rows["heatmap"], time_range, timezone
+            )
+        if "cost" in rows:
+            bundle.cost = self._cost_from_rows(rows["cost"], time_range, group_by)
+        if "models" in rows:
+            bundle.model_usage = self._model_usage_from_rows(rows["models"], time_range)
+        if "tokens" in rows:
+            bundle.token_usage = self._token_usage_from_rows(
+                rows["tokens"], time_range, group_by
+            )
+        return bundle
+
+    async def _project_session_ids(self, project_id: str) -> list[str]:
+        """Session ids of a project."""
+        session_ids: list[str] = await self.db.sessions.distinct(
+            "sessionId", {"projectId": ObjectId(project_id)}
+        )
+        return session_ids
+
+    def _summary_session_stages(self) -> list[dict[str, Any]]:
+        """Per-session message counts and costs for the summary."""
+        return [
+            {
+                "$group": {
+                    "_id": "$sessionId",
+                    "messages": {"$sum": 1},
+                    "cost": {"$sum": "$cost"},
+                }
+            }
+        ]
+
+    async def _summary_from_rows(
+        self,
+        rows: list[dict[str, Any]],
+        previous_rows: list[dict[str, Any]] | None,
+        time_range: TimeRange,
+    ) -> AnalyticsSummary:
+        """Build the summary from per-session rows of every partition.
+
+        Sessions are deduplicated across partitions before they are counted
+        and mapped to projects.
+        """
+        sessions: dict[Any, list[float]] = {}
+        for row in rows:
+            totals = sessions.setdefault(row["_id"], [0, 0.0])
+            totals[0] += row["messages"]
+            totals[1] += self._safe_float(row.get("cost"))
+        total_messages = int(sum(t[0] for t in sessions.values()))
+        total_cost = sum(t[1] for t in sessions.values())
+
+        # Messages per project, through the sessions collection
+        project_messages: dict[Any, int] = {}
+        if sessions:
+            async for session in self.db.sessions.find(
+                {"sessionId": {"$in": list(sessions)}},
+                {"sessionId": 1, "projectId": 1},
+            ):
+                project = session.get("projectId")
+                project_messages[project] = project_messages.get(project, 0) + int(
+                    sessions[session["sessionId"]][0]
+                )
+
+        most_active_project = None
+        if project_messages:
+            top = max(project_messages, key=lambda p: project_messages[p])
+            project = await self.db.projects.find_one({"_id": top}, {"name": 1})
+            most_active_project = project["name"] if project else None
+
+        messages_trend = cost_trend = 0.0
+        if previous_rows is not None:
+            previous_messages = sum(r["messages"] for r in previous_rows)
+            previous_cost = sum(self._safe_float(r.get("cost")) for r in previous_rows)
+            messages_trend = self._calculate_trend(total_messages, previous_messages)
+            cost_trend = self._calculate_trend(total_cost, previous_cost)
+
+        return AnalyticsSummary(
+            total_messages=total_messages,
+            total_sessions=len(sessions),
+            total_projects=len(project_messages),
+            total_cost=round(total_cost, 2),
+            messages_trend=messages_trend,
+            cost_trend=cost_trend,
+            most_active_project=most_active_project,
+            most_used_model=None,  # Not used by Dashboard, removed for performance
+            time_range=time_range,
+        )
+
+    def _heatmap_stages(self, timezone: str) -> list[dict[str, Any]]:
+        """Heatmap cell sums and counts for matched messages."""
+        return [
             {
                 "$project": {
                     "hour": {"$hour": {"date": "$timestamp", "timezone": timezone}},
@@ -294,53 +717,59 @@ class AnalyticsService:
                             1,
                         ]
                     },  # Convert to 0-6 (Mon-Sun)
-                    "costUsd": 1,
+                    "cost": 1,
                     "durationMs": 1,
                 }
             },
+            # Sums and counts rather than averages, so cells split across
+            # monthly partitions merge exactly
             {
                 "$group": {
                     "_id": {"hour": "$hour", "dayOfWeek": "$dayOfWeek"},
                     "count": {"$sum": 1},
-                    "avgCost": {"$avg": "$costUsd"},
-                    "avgResponseTime": {"$avg": "$durationMs"},
+                    "costSum": {"$sum": "$cost"},
+                    "costCount": {"$sum": {"$cond": [{"$isNumber": "$cost"}, 1, 0]}},
+                    "durationSum": {"$sum": "$durationMs"},
+                    "durationCount": {
+                        "$sum": {"$cond": [{"$isNumber": "$durationMs"}, 1, 0]}
+                    },
+                }
+            },
+            {
+                "$project": {
+                    "_id": 0,
+                    "hour": "$_id.hour",
+                    "day": "$_id.dayOfWeek",
+                    "count": 1,
+                    "costSum": 1,
+                    "costCount": 1,
+                    "durationSum": 1,
+                    "durationCount": 1,
                 }
             },
         ]
 
-        results = await self._aggregate_messages(pipeline)
-
-        # Convert to heatmap cells
-        cells = []
-        hour_counts: dict[int, int] = {}
-        day_counts: dict[int, int] = {}
-
+    def _heatmap_from_rows(
+        self, results: list[dict[str, Any]], time_range: TimeRange, timezone: str
+    ) -> ActivityHeatmap:
+        """Build the heatmap from cell rows of every partition."""
         for result in results:
-            hour = result["_id"]["hour"]
-            day = result["_id"]["dayOfWeek"]
-            count = result["count"]
-
-            # Track for peak calculations
-            hour_counts[hour] = hour_counts.get(hour, 0) + count
-            day_counts[day] = day_counts.get(day, 0) + count
-
-            cells.append(
-                HeatmapCell(
-                    day_of_week=day,
-                    hour=hour,
-                    count=count,
-                    avg_cost=round(self._safe_float(result["avgCost"]), 4)
-                    if result["avgCost"]
-                    else None,
-                    avg_response_time=result["avgResponseTime"],
-                )
+            result["costSum"] = self._safe_float(result.get("costSum"))
+
+        # Bin into heatmap cells
+        heatmap = heatmap_bins(results)
+        cells = [
+            HeatmapCell(
+                day_of_week=cell["day"],
+                hour=cell["hour"],
+                count=cell["count"],
+                avg_cost=round(cell["avg_cost"], 4) if cell["avg_cost"] else None,
+                avg_response_time=cell["avg_response_time"],
             )
-
-        # Find peak times
-        peak_hour = (
-            max(hour_counts, key=lambda x: hour_counts[x]) if hour_counts else None
-        )
-        peak_day = max(day_counts, key=lambda x: day_counts[x]) if day_counts else None
+            for cell in heatmap["cells"]
+        ]
+        peak_hour = heatmap["peak_hour"]
+        peak_day = heatmap["peak_day"]
 
         total_messages = sum(cell.count for cell in cells)
 
@@ -353,25 +782,9 @@ class AnalyticsService:
             peak_day=peak_day,
         )
 
-    async def get_cost_analytics(
-        self, time_range: TimeRange, group_by: str, project_id: str | None = None
-    ) -> CostAnalytics:
-        """Get cost analytics over time."""
-        time_filter = self._get_time_filter(time_range)
-
-        # Add project filter if specified
-        if project_id:
-            session_ids = await self.db.sessions.distinct(
-                "sessionId", {"projectId": ObjectId(project_id)}
-            )
-            time_filter["sessionId"] = {"$in": session_ids}
-
-        # Determine date grouping
-        date_format = self._get_date_format(group_by)
-
-        # Aggregation pipeline
-        pipeline: list[dict[str, Any]] = [
-            {"$match": {**time_filter, "costUsd": {"$exists": True}}},
+    def _cost_stages(self, date_format: str) -> list[dict[str, Any]]:
+        """Cost per period, with a per-model breakdown, for matched messages."""
+        return [
             {
                 "$group": {
                     "_id": {
@@ -383,7 +796,7 @@ class AnalyticsService:
                         },
                         "model": "$model",
                     },
-                    "cost": {"$sum": "$costUsd"},
+                    "cost": {"$sum": "$cost"},
                     "count": {"$sum": 1},
                 }
             },
@@ -398,7 +811,24 @@ class AnalyticsService:
             {"$sort": {"_id": 1}},
         ]
 
-        results = await self._aggregate_messages(pipeline)
+    def _cost_from_rows(
+        self, rows: list[dict[str, Any]], time_range: TimeRange, group_by: str
+    ) -> CostAnalytics:
+        """Build cost analytics from period rows of every partition."""
+        date_format = self._get_date_format(group_by)
+
+        # Merge periods split across monthly collections
+        periods: dict[str, dict[str, Any]] = {}
+        for result in rows:
+            period = periods.setdefault(
+                result["_id"], {"cost": 0.0, "count": 0, "by_model": {}}
+            )
+            period["cost"] += self._safe_float(result["totalCost"])
+            period["count"] += result["messageCount"]
+            for model_cost in result["costByModel"]:
+                model = model_cost.get("model") or "unknown"
+                cost = self._safe_float(model_cost.get("cost", 0))
+                period["by_model"][model] = period["by_model"].get(model, 0) + cost
 
         # Process results
         data_points = []
@@ -406,29 +836,27 @@ class AnalyticsService:
         total_messages = 0
         cost_by_model_global: dict[str, float] = {}
 
-        for result in results:
+        for key in sorted(periods):
+            period = periods[key]
             # Parse timestamp
-            timestamp = datetime.strptime(result["_id"], date_format)
+            timestamp = datetime.strptime(key, date_format)
 
             # Process model costs
-            cost_by_model = {}
-            for model_cost in result["costByModel"]:
-                model = model_cost.get("model") or "unknown"
-                cost = self._safe_float(model_cost.get("cost", 0))
-                cost_by_model[model] = cost
+            cost_by_model = period["by_model"]
+            for model, cost in cost_by_model.items():
                 cost_by_model_global[model] = cost_by_model_global.get(model, 0) + cost
 
             data_points.append(
                 CostDataPoint(
                     timestamp=timestamp,
-                    cost=round(self._safe_float(result["totalCost"]), 4),
-                    message_count=result["messageCount"],
+                    cost=round(period["cost"], 4),
+                    message_count=period["count"],
                     cost_by_model=cost_by_model,
                 )
             )
 
-            total_cost += self._safe_float(result["totalCost"])
-            total_messages += result["messageCount"]
+            total_cost += period["cost"]
+            total_messages += period["count"]
 
         avg_cost = total_cost / total_messages if total_messages > 0 else 0
 
@@ -441,37 +869,57 @@ class AnalyticsService:
             cost_by_model={k: round(v, 2) for k, v in cost_by_model_global.items()},
         )
 
-    async def get_model_usage(
-        self, time_range: TimeRange, project_id: str | None = None
-    ) -> ModelUsageStats:
-        """Get model usage statistics."""
-        time_filter = self._get_time_filter(time_range)
+    def _model_usage_stages(self) -> list[dict[str, Any]]:
+        """Per-model sums and counts for matched messages."""
 
-        # Add project filter if specified
-        if project_id:
-            session_ids = await self.db.sessions.distinct(
-                "sessionId", {"projectId": ObjectId(project_id)}
-            )
-            time_filter["sessionId"] = {"$in": session_ids}
+        def numbered(field: str) -> dict[str, Any]:
+            return {"$sum": {"$cond": [{"$isNumber": field}, 1, 0]}}
 
-        # Aggregation pipeline
-        pipeline: list[dict[str, Any]] = [
-            {"$match": {**time_filter, "model": {"$exists": True, "$nin": [None, ""]}}},
+        return [
+            # Sums and counts rather than averages, so models seen in
+            # several monthly partitions merge exactly
             {
                 "$group": {
                     "_id": "$model",
                     "count": {"$sum": 1},
-                    "totalCost": {"$sum": "$costUsd"},
-                    "avgResponseTime": {"$avg": "$durationMs"},
-                    "avgInputTokens": {"$avg": "$tokensInput"},
-                    "avgOutputTokens": {"$avg": "$tokensOutput"},
+                    "totalCost": {"$sum": "$cost"},
+                    "durationSum": {"$sum": "$durationMs"},
+                    "durationCount": numbered("$durationMs"),
+                    "inputSum": {"$sum": "$tokens.input"},
+                    "inputCount": numbered("$tokens.input"),
+                    "outputSum": {"$sum": "$tokens.output"},
+                    "outputCount": numbered("$tokens.output"),
                 }
             },
             {"$match": {"_id": {"$ne": None}}},  # Additional filter after grouping
-            {"$sort": {"count": -1}},
         ]
 
-        results = await self._aggregate_messages(pipeline)
+    def _model_usage_from_rows(
+        self, rows: list[dict[str, Any]], time_range: TimeRange
+    ) -> ModelUsageStats:
+        """Build model usage from per-model rows of every partition."""
+        fields = (
+            "count",
+            "totalCost",
+            "durationSum",
+            "durationCount",
+            "inputSum",
+            "inputCount",
+            "outputSum",
+            "outputCount",
+        )
+        merged: dict[str, dict[str, float]] = {}
+        for row in rows:
+            # Skip if model is None (extra safety check)
+            if row["_id"] is None:
+                continue
+            totals = merged.setdefault(row["_id"], dict.fromkeys(fields, 0.0))
+            for field in fields:
+                totals[field] += self._safe_float(row.get(field))
+
+        def average(totals: dict[str, float], prefix: str) -> float:
+            count = totals[f"{prefix}Count"]
+            return totals[f"{prefix}Sum"] / count if count else 0
 
         # Process results
         models = []
@@ -480,13 +928,9 @@ class AnalyticsService:
         most_used = None
         least_used = None
 
-        for result in results:
-            model = result["_id"]
-            # Skip if model is None (extra safety check)
-            if model is None:
-                continue
-            count = result["count"]
-            total_cost = self._safe_float(result.get("totalCost", 0))
+        for model, totals in sorted(merged.items(), key=lambda m: -m[1]["count"]):
+            count = int(totals["count"])
+            total_cost = totals["totalCost"]
 
             # Track most/least used (moved after None check)
             if count > max_count:
@@ -504,9 +948,9 @@ class AnalyticsService:
                     avg_cost_per_message=round(
                         total_cost / count if count > 0 else 0, 4
                     ),
-                    avg_response_time_ms=result.get("avgResponseTime") or 0,
-                    avg_tokens_input=result.get("avgInputTokens") or 0,
-                    avg_tokens_output=result.get("avgOutputTokens") or 0,
+                    avg_response_time_ms=average(totals, "duration"),
+                    avg_tokens_input=average(totals, "input"),
+                    avg_tokens_output=average(totals, "output"),
                 )
             )
 
@@ -518,30 +962,35 @@ class AnalyticsService:
             least_used=least_used,
         )
 
-    async def get_token_usage(
-        self, time_range: TimeRange, group_by: str
-    ) -> TokenUsageStats:
-        """Get token usage statistics."""
-        time_filter = self._get_time_filter(time_range)
-        date_format = self._get_date_format(group_by)
-
-        # Aggregation pipeline
-        pipeline: list[dict[str, Any]] = [
-            {"$match": time_filter},
+    def _token_usage_stages(self, date_format: str) -> list[dict[str, Any]]:
+        """Token sums per period for matched messages."""
+        return [
             {
                 "$group": {
                     "_id": {
                         "$dateToString": {"format": date_format, "date": "$timestamp"}
                     },
-                    "inputTokens": {"$sum": "$tokensInput"},
-                    "outputTokens": {"$sum": "$tokensOutput"},
+                    "inputTokens": {"$sum": "$tokens.input"},
+                    "outputTokens": {"$sum": "$tokens.output"},
                     "messageCount": {"$sum": 1},
                 }
             },
             {"$sort": {"_id": 1}},
         ]
 
-        results = await self._aggregate_messages(pipeline)
+    def _token_usage_from_rows(
+        self, rows: list[dict[str, Any]], time_range: TimeRange, group_by: str
+    ) -> TokenUsageStats:
+        """Build token usage from period rows of every partition."""
+        date_format = self._get_date_format(group_by)
+
+        # Merge periods split across monthly collections
+        periods: dict[str, list[int]] = {}
+        for row in rows:
+            totals = periods.setdefault(row["_id"], [0, 0, 0])
+            totals[0] += row["inputTokens"] or 0
+            totals[1] += row["outputTokens"] or 0
+            totals[2] += row["messageCount"]
 
         # Process results
         data_points = []
@@ -549,10 +998,9 @@ class AnalyticsService:
         total_output = 0
         total_messages = 0
 
-        for result in results:
-            timestamp = datetime.strptime(result["_id"], date_format)
-            input_tokens = result["inputTokens"] or 0
-            output_tokens = result["outputTokens"] or 0
+        for key in sorted(periods):
+            input_tokens, output_tokens, message_count = periods[key]
+            timestamp = datetime.strptime(key, date_format)
 
             data_points.append(
                 TokenDataPoint(
@@ -565,7 +1013,7 @@ class AnalyticsService:
 
             total_input += input_tokens
             total_output += output_tokens
-            total_messages += result["messageCount"]
+            total_messages += message_count
 
         avg_input = total_input / total_messages if total_messages > 0 else 0
         avg_output = total_output / total_messages if total_messages > 0 else 0
@@ -580,6 +1028,7 @@ class AnalyticsService:
             group_by=group_by,
         )
 
+    @coalesced
     async def compare_projects(
         self, project_ids: list[str], time_range: TimeRange
     ) -> dict[str, Any]:
@@ -613,7 +1062,7 @@ class AnalyticsService:
                 "$group": {
                     "_id": "$session.projectId",
                     "messageCount": {"$sum": 1},
-                    "totalCost": {"$sum": "$costUsd"},
+                    "totalCost": {"$sum": "$cost"},
                     "avgResponseTime": {"$avg": "$durationMs"},
                     "models": {"$addToSet": "$model"},
                     "sessions": {"$addToSet": "$sessionId"},
@@ -684,6 +1133,7 @@ class AnalyticsService:
 
         return comparison
 
+    @coalesced
     async def analyze_trends(
         self, time_range: TimeRange, metric: str
     ) -> dict[str, Any]:
@@ -714,7 +1164,7 @@ class AnalyticsService:
         if metric == "messages":
             group_stage["value"] = {"$sum": 1}
         elif metric == "costs":
-            group_stage["value"] = {"$sum": "$costUsd"}
+            group_stage["value"] = {"$sum": "$cost"}
         elif metric == "sessions":
             group_stage["value"] = {"$addToSet": "$sessionId"}
         elif metric == "response_time":
@@ -832,7 +1282,7 @@ class AnalyticsService:
                             "$group": {
                                 "_id": None,
                                 "count": {"$sum": 1},
-                                "totalCost": {"$sum": "$costUsd"},
+                                "totalCost": {"$sum": "$cost"},
                             }
                         }
                     ],
@@ -913,7 +1363,7 @@ class AnalyticsService:
                             "$group": {
                                 "_id": None,
                                 "count": {"$sum": 1},
-                                "totalCost": {"$sum": "$costUsd"},
+                                "totalCost": {"$sum": "$cost"},
                             }
                         }
                     ],
@@ -1044,6 +1494,7 @@ class AnalyticsService:
 
         return {"timestamp": {"$gte": start, "$lt": end}}
 
+    @coalesced
     async def get_tool_usage_summary(
         self,
         session_id: str | None = None,
@@ -1149,6 +1600,7 @@ class AnalyticsService:
             most_used_tool=most_used_tool,
         )
 
+    @coalesced
     async def get_tool_usage_detailed(
         self,
         session_id: str | None = None,
@@ -1307,6 +1759,7 @@ class AnalyticsService:
         # Default category
         return "other"
 
+    @coalesced
     async def get_conversation_flow(
         self, session_id: str, include_sidechains: bool = True
     ) -> ConversationFlowAnalytics:
@@ -1340,6 +1793,7 @@ class AnalyticsService:
             skip=0,
             limit=10000,  # Reasonable limit for conversation flow
             sort_order="asc",
+            projection=FLOW_PROJECTION,
         )
         # Filter to only required fields
         messages = [
@@ -1352,7 +1806,7 @@ class AnalyticsService:
                 "durationMs": doc.get("durationMs"),
                 "timestamp": doc.get("timestamp"),
                 "message": doc.get("message"),
-                "toolUseResult": doc.get("toolUseResult"),
+                "hasToolUseResult": doc.get("hasToolUseResult"),
             }
             for doc in messages_docs
         ]
@@ -1391,7 +1845,7 @@ class AnalyticsService:
                 and message_field.get("tool_calls")
             ):
                 tool_count = len(message_field["tool_calls"])
-            elif msg.get("toolUseResult"):
+            elif msg.get("hasToolUseResult"):
                 tool_count = 1
 
             # Generate summary from message content
@@ -1455,6 +1909,7 @@ class AnalyticsService:
             session_id=session_id,
         )
 
+    @coalesced
     async def get_session_health(
         self,
         session_id: str | None = None,
@@ -1467,73 +1922,19 @@ class AnalyticsService:
         if session_id:
             match_filter["sessionId"] = session_id
 
-        # Pipeline to analyze toolUseResult fields for success/error detection
+        # Tool results are classified at ingest
         pipeline: list[dict[str, Any]] = [
-            {
-                "$match": {
-                    **match_filter,
-                    "toolUseResult": {"$exists": True, "$ne": None},
-                }
-            },
-            {
-                "$project": {
-                    "sessionId": 1,
-                    "timestamp": 1,
-                    "toolUseResult": 1,
-                    "isSuccess": {
-                        "$cond": {
-                            "if": {
-                                "$or": [
-                                    {
-                                        "$regexMatch": {
-                                            "input": {
-                                                "$convert": {
-                                                    "input": "$toolUseResult",
-                                                    "to": "string",
-                                                    "onError": "",
-                                                    "onNull": "",
-                                                }
-                                            },
-                                            "regex": "error|Error|ERROR|failed|Failed|FAILED",
-                                        }
-                                    },
-                                    {
-                                        "$ne": [
-                                            {"$ifNull": ["$toolUseResult.error", None]},
-                                            None,
-                                        ]
-                                    },
-                                    {
-                                        "$ne": [
-                                            {
-                                                "$ifNull": [
-                                                    "$toolUseResult.stderr",
-                                                    None,
-                                                ]
-                                            },
-                                            None,
-                                        ]
-                                    },
-                                    {
-                                        "$eq": [
-                                            {"$ifNull": ["$toolUseResult.exitCode", 0]},
-                                            {"$ne": [0, 0]},
-                                        ]
-                                    },
-                                ]
-                            },
-                            "then": False,
-                            "else": True,
-                        }
-                    },
-                }
-            },
+            {"$match": {**match_filter, "type": "tool_result"}},
             {
                 "$group": {
                     "_id": None,
                     "total_operations": {"$sum": 1},
-                    "successful_operations": {"$sum": {"$cond": ["$isSuccess", 1, 0]}},
-                    "error_count": {"$sum": {"$cond": ["$isSuccess", 0, 1]}},
+                    "successful_operations": {
+                        "$sum": {"$cond": [{"$eq": ["$isError", True]}, 0, 1]}
+                    },
+                    "error_count": {
+                        "$sum": {"$cond": [{"$eq": ["$isError", True]}, 1, 0]}
+                    },
                 }
             },
         ]
@@ -1574,6 +1975,7 @@ class AnalyticsService:
             health_status=health_status,
         )
 
+    @coalesced
     async def get_detailed_errors(
         self,
         session_id: str | None = None,
@@ -1599,125 +2001,48 @@ class AnalyticsService:
         error_by_type: dict[str, int] = {}
         error_by_tool: dict[str, int] = {}
 
-        # 1. Find tool execution errors with better detection and tool name resolution
+        # 1. Tool execution errors, classified at ingest
+        tool_error_filter: Dict[str, Any] = {
+            **match_filter,
+            "type": "tool_result",
+            "isError": True,
+        }
+        if error_severity:
+            tool_error_filter["errorSeverity"] = error_severity
         tool_error_pipeline: List[Dict[str, Any]] = [
-            {
-                "$match": {
-                    **match_filter,
-                    "type": "tool_result",
-                    "toolUseResult": {"$exists": True, "$ne": None},
-                }
-            },
-            {
-                "$lookup": {
-                    "from": "messages",
-                    "let": {"parent_uuid": "$parentUuid"},
-                    "pipeline": [
-                        {"$match": {"$expr": {"$eq": ["$uuid", "$$parent_uuid"]}}},
-                        {"$project": {"messageData.name": 1}},
-                    ],
-                    "as": "tool_use_info",
-                }
-            },
+            {"$match": tool_error_filter},
             {"$sort": {"timestamp": -1}},
             {"$limit": 100},
         ]
 
         tool_results = await self._aggregate_messages(tool_error_pipeline)
+        # Error details quote the full result, not the inline preview
+        await BlobStore(self.db).hydrate(tool_results, ["toolUseResult"])
 
         for doc in tool_results:
-            tool_result = doc.get("toolUseResult", {})
-
-            # Extract tool name from parent tool_use message
-            tool_name = "unknown"
-            if doc.get("tool_use_info"):
-                tool_name = (
-                    doc["tool_use_info"][0]
-                    .get("messageData", {})
-                    .get("name", "unknown")
-                )
-
-            # Better error detection logic
-            error_detail = None
-
-            # Check for explicit error field
-            if (
-                isinstance(tool_result, dict)
-                and "error" in tool_result
-                and tool_result["error"]
-            ):
-                error_detail = ErrorDetail(
-                    timestamp=doc["timestamp"],
-                    tool=tool_name,
-                    error_type="execution_error",
-                    severity="critical",
-                    message=str(tool_result["error"])[:500],
-                    context=f"Session: {doc['sessionId'][:8]}...",
-                )
-
-            # Check for meaningful stderr (not just warnings)
-            elif (
-                isinstance(tool_result, dict)
-                and "stderr" in tool_result
-                and tool_result["stderr"]
-            ):
-                stderr = str(tool_result["stderr"])
-                # Only consider it an error if it contains actual error indicators
-                error_indicators = [
-                    "error:",
-                    "fatal:",
-                    "exception",
-                    "traceback",
-                    "permission denied",
-                    "not found",
-                    "no such file",
-                    "cannot",
-                    "failed to",
-                    "unable to",
-                ]
-                if any(indicator in stderr.lower() for indicator in error_indicators):
-                    error_detail = ErrorDetail(
-                        timestamp=doc["timestamp"],
-                        tool=tool_name,
-                        error_type="stderr_error",
-                        severity="warning",
-                        message=stderr[:500],
-                        context=f"Command: {tool_result.get('command', 'unknown')[:50]}",
-                    )
-
-            # Check for non-zero exit codes
-            elif (
-                isinstance(tool_result, dict)
-                and "exitCode" in tool_result
-                and tool_result["exitCode"] != 0
-            ):
-                stdout = tool_result.get("stdout", "")
-                stderr = tool_result.get("stderr", "")
-                message = f"Exit code {tool_result['exitCode']}"
-                if stderr:
-                    message += f": {stderr[:200]}"
-                elif stdout:
-                    message += f": {stdout[:200]}"
-
-                error_detail = ErrorDetail(
-                    timestamp=doc["timestamp"],
-                    tool=tool_name,
-                    error_type="exit_code_error",
-                    severity="warning",
-                    message=message,
-                    context=f"Session: {doc['sessionId'][:8]}...",
-                )
+            classified = classify_tool_result(doc)
+            error_type = doc.get("errorType", "tool_error")
+            tool_result = doc.get("toolUseResult")
+            if error_type == "stderr_error" and isinstance(tool_result, dict):
+                context = f"Command: {str(tool_result.get('command', 'unknown'))[:50]}"
+            else:
+                context = f"Session: {doc['sessionId'][:8]}..."
 
-            if error_detail:
-                # Apply severity filter
-                if not error_severity or error_detail.severity == error_severity:
-                    errors.append(error_detail)
-                    error_by_type[error_detail.error_type] = (
-                        error_by_type.get(error_detail.error_type, 0) + 1
-                    )
-                    error_by_tool[error_detail.tool] = (
-                        error_by_tool.get(error_detail.tool, 0) + 1
-                    )
+            error_detail = ErrorDetail(
+                timestamp=doc["timestamp"],
+                tool=doc.get("toolName", "unknown"),
+                error_type=error_type,
+                severity=doc.get("errorSeverity", "warning"),
+                message=classified.message if classified else "",
+                context=context,
+            )
+            errors.append(error_detail)
+            error_by_type[error_detail.error_type] = (
+                error_by_type.get(error_detail.error_type, 0) + 1
+            )
+            error_by_tool[error_detail.tool] = (
+                error_by_tool.get(error_detail.tool, 0) + 1
+            )
 
         # 2. Find API errors in assistant messages
         api_error_pipeline: List[Dict[str, Any]] = [
@@ -1855,6 +2180,7 @@ class AnalyticsService:
 
         return ErrorDetailsResponse(errors=errors, error_summary=error_summary)
 
+    @coalesced
     async def get_success_rate(
         self,
         session_id: str | None = None,
@@ -1869,68 +2195,17 @@ class AnalyticsService:
 
         # Pipeline to calculate success rates
         pipeline: list[dict[str, Any]] = [
-            {
-                "$match": {
-                    **match_filter,
-                    "toolUseResult": {"$exists": True, "$ne": None},
-                }
-            },
-            {
-                "$project": {
-                    "isSuccess": {
-                        "$cond": {
-                            "if": {
-                                "$or": [
-                                    {
-                                        "$regexMatch": {
-                                            "input": {
-                                                "$convert": {
-                                                    "input": "$toolUseResult",
-                                                    "to": "string",
-                                                    "onError": "",
-                                                    "onNull": "",
-                                                }
-                                            },
-                                            "regex": "error|Error|ERROR|failed|Failed|FAILED",
-                                        }
-                                    },
-                                    {
-                                        "$ne": [
-                                            {"$ifNull": ["$toolUseResult.error", None]},
-                                            None,
-                                        ]
-                                    },
-                                    {
-                                        "$ne": [
-                                            {
-                                                "$ifNull": [
-                                                    "$toolUseResult.stderr",
-                                                    None,
-                                                ]
-                                            },
-                                            None,
-                                        ]
-                                    },
-                                    {
-                                        "$eq": [
-                                            {"$ifNull": ["$toolUseResult.exitCode", 0]},
-                                            {"$ne": [0, 0]},
-                                        ]
-                                    },
-                                ]
-                            },
-                            "then": False,
-                            "else": True,
-                        }
-                    }
-                }
-            },
+            {"$match": {**match_filter, "type": "tool_result"}},
             {
                 "$group": {
                     "_id": None,
                     "total_operations": {"$sum": 1},
-                    "successful_operations": {"$sum": {"$cond": ["$isSuccess", 1, 0]}},
-                    "failed_operations": {"$sum": {"$cond": ["$isSuccess", 0, 1]}},
+                    "successful_operations": {
+                        "$sum": {"$cond": [{"$eq": ["$isError", True]}, 0, 1]}
+                    },
+                    "failed_operations": {
+                        "$sum": {"$cond": [{"$eq": ["$isError", True]}, 1, 0]}
+                    },
                 }
             },
         ]
@@ -2008,38 +2283,16 @@ class AnalyticsService:
         self, nodes: list[ConversationFlowNode], edges: list[ConversationFlowEdge]
     ) -> ConversationFlowMetrics:
         """Calculate conversation flow metrics."""
-        # Build adjacency list for tree traversal
-        children: dict[str, list[str]] = {}
-        roots = set()
-
-        for node in nodes:
-            if node.parent_id is None:
-                roots.add(node.id)
-            else:
-                if node.parent_id not in children:
-                    children[node.parent_id] = []
-                children[node.parent_id].append(node.id)
-
-        # Calculate max depth
-        max_depth = 0
-        for root in roots:
-            depth = self._calculate_tree_depth(root, children, 0)
-            max_depth = max(max_depth, depth)
-
-        # Count branches (nodes with multiple children)
-        branch_count = sum(1 for node_id in children if len(children[node_id]) > 1)
+        tree = ConversationTree(
+            {"uuid": node.id, "parentUuid": node.parent_id} for node in nodes
+        )
 
         # Calculate sidechain percentage
         sidechain_count = sum(1 for node in nodes if node.is_sidechain)
         sidechain_percentage = (sidechain_count / len(nodes) * 100) if nodes else 0
 
         # Calculate average branch length
-        branch_lengths: list[int] = []
-        for root in roots:
-            lengths: list[int] = []
-            self._calculate_branch_lengths(root, children, 0, lengths)
-            branch_lengths.extend(lengths)
-
+        branch_lengths = tree.branch_lengths()
         avg_branch_length = (
             sum(branch_lengths) / len(branch_lengths) if branch_lengths else 0
         )
@@ -2054,8 +2307,8 @@ class AnalyticsService:
         )
 
         return ConversationFlowMetrics(
-            max_depth=max_depth,
-            branch_count=branch_count,
+            max_depth=tree.max_depth(),
+            branch_count=tree.branch_count(),
             sidechain_percentage=round(sidechain_percentage, 1),
             avg_branch_length=round(avg_branch_length, 1),
             total_nodes=len(nodes),
@@ -2063,37 +2316,7 @@ class AnalyticsService:
             avg_response_time_ms=avg_response_time_ms,
         )
 
-    def _calculate_tree_depth(
-        self, node_id: str, children: dict, current_depth: int
-    ) -> int:
-        """Recursively calculate the maximum depth of a tree."""
-        if node_id not in children:
-            return current_depth
-
-        max_child_depth = current_depth
-        for child_id in children[node_id]:
-            child_depth = self._calculate_tree_depth(
-                child_id, children, current_depth + 1
-            )
-            max_child_depth = max(max_child_depth, child_depth)
-
-        return max_child_depth
-
-    def _calculate_branch_lengths(
-        self, node_id: str, children: dict, current_length: int, lengths: list
-    ) -> None:
-        """Recursively calculate branch lengths."""
-        if node_id not in children:
-            # Leaf node - record the length
-            lengths.append(current_length)
-            return
-
-        # Continue down each branch
-        for child_id in children[node_id]:
-            self._calculate_branch_lengths(
-                child_id, children, current_length + 1, lengths
-            )
-
+    @coalesced
     async def get_directory_usage(
         self,
         time_range: TimeRange = TimeRange.LAST_30_DAYS,
@@ -2109,7 +2332,7 @@ class AnalyticsService:
             {
                 "$group": {
                     "_id": "$cwd",
-                    "total_cost": {"$sum": "$costUsd"},
+                    "total_cost": {"$sum": "$cost"},
                     "message_count": {"$sum": 1},
                     "session_count": {"$addToSet": "$sessionId"},
                     "last_active": {"$max": "$timestamp"},
@@ -2378,6 +2601,7 @@ class AnalyticsService:
             percentage_of_total=round(percentage, 2),
         )
 
+    @coalesced
     async def get_token_analytics(
         self, time_range: TimeRange, percentiles: list[int], group_by: str
     ) -> TokenAnalytics:
@@ -2388,13 +2612,7 @@ class AnalyticsService:
         base_filter = {
             **time_filter,
             "type": "assistant",
-            "$or": [
-                {"metadata.usage": {"$exists": True}},
-                {"inputTokens": {"$exists": True}},
-                {"outputTokens": {"$exists": True}},
-                {"tokensInput": {"$exists": True}},
-                {"tokensOutput": {"$exists": True}},
-            ],
+            "tokens.total": {"$gt": 0},
         }
 
         # Calculate overall percentiles for total tokens
@@ -2429,20 +2647,6 @@ class AnalyticsService:
                 "$arrayElemAt": ["$percentiles", percentiles.index(p)]
             }
 
-        # Calculate total tokens from all possible fields
-        total_tokens_expr = {
-            "$add": [
-                {"$ifNull": ["$inputTokens", 0]},
-                {"$ifNull": ["$outputTokens", 0]},
-                {"$ifNull": ["$tokensInput", 0]},
-                {"$ifNull": ["$tokensOutput", 0]},
-                {"$ifNull": ["$metadata.usage.input_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.output_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.cache_creation_input_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.cache_read_input_tokens", 0]},
-            ]
-        }
-
         pipeline = [
             {"$match": base_filter},
             {
@@ -2451,7 +2655,7 @@ class AnalyticsService:
                     "count": {"$sum": 1},
                     "percentiles": {
                         "$percentile": {
-                            "input": total_tokens_expr,
+                            "input": "$tokens.total",
                             "p": percentile_input,
                             "method": "approximate",
                         }
@@ -2496,26 +2700,12 @@ class AnalyticsService:
                 "$dateToString": {"format": "%Y-%m-%d %H:00:00", "date": "$timestamp"}
             }
 
-        # Expression to calculate total tokens
-        total_tokens_expr = {
-            "$add": [
-                {"$ifNull": ["$inputTokens", 0]},
-                {"$ifNull": ["$outputTokens", 0]},
-                {"$ifNull": ["$tokensInput", 0]},
-                {"$ifNull": ["$tokensOutput", 0]},
-                {"$ifNull": ["$metadata.usage.input_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.output_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.cache_creation_input_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.cache_read_input_tokens", 0]},
-            ]
-        }
-
         pipeline = [
             {"$match": base_filter},
             {
                 "$group": {
                     "_id": date_key,
-                    "tokens": {"$push": total_tokens_expr},
+                    "tokens": {"$push": "$tokens.total"},
                     "count": {"$sum": 1},
                 }
             },
@@ -2526,20 +2716,13 @@ class AnalyticsService:
 
         time_series = []
         for result in results:
-            tokens = sorted(result["tokens"])
+            tokens = result["tokens"]
             count = len(tokens)
 
             if count == 0:
                 continue
 
-            avg_tokens = sum(tokens) / count
-            p50_idx = int(0.5 * count)
-            p90_idx = int(0.9 * count)
-
-            if p50_idx >= count:
-                p50_idx = count - 1
-            if p90_idx >= count:
-                p90_idx = count - 1
+            avg_tokens, (p50, p90) = nearest_rank(tokens, (0.5, 0.9))
 
             # Parse timestamp for time-based grouping
             if group_by in ["hour", "day"]:
@@ -2551,8 +2734,8 @@ class AnalyticsService:
                 TokenAnalyticsDataPoint(
                     timestamp=timestamp,
                     avg_tokens=round(avg_tokens, 2),
-                    p50=float(tokens[p50_idx]),
-                    p90=float(tokens[p90_idx]),
+                    p50=p50,
+                    p90=p90,
                     message_count=count,
                 )
             )
@@ -2563,26 +2746,11 @@ class AnalyticsService:
         self, base_filter: dict
     ) -> list[TokenDistributionBucket]:
         """Get token usage distribution buckets."""
-        # Expression to calculate total tokens
-        total_tokens_expr = {
-            "$add": [
-                {"$ifNull": ["$inputTokens", 0]},
-                {"$ifNull": ["$outputTokens", 0]},
-                {"$ifNull": ["$tokensInput", 0]},
-                {"$ifNull": ["$tokensOutput", 0]},
-                {"$ifNull": ["$metadata.usage.input_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.output_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.cache_creation_input_tokens", 0]},
-                {"$ifNull": ["$metadata.usage.cache_read_input_tokens", 0]},
-            ]
-        }
-
         pipeline: list[dict[str, Any]] = [
             {"$match": base_filter},
-            {"$addFields": {"totalTokens": total_tokens_expr}},
             {
                 "$bucket": {
-                    "groupBy": "$totalTokens",
+                    "groupBy": "$tokens.total",
                     "boundaries": [0, 100, 500, 1000, 5000, 10000, 50000, float("inf")],
                     "default": "50000+",
                     "output": {"count": {"$sum": 1}},
@@ -2626,6 +2794,7 @@ class AnalyticsService:
 
         return distribution
 
+    @coalesced
     async def get_git_branch_analytics(
         self,
         time_range: TimeRange,
@@ -2655,7 +2824,7 @@ class AnalyticsService:
             {
                 "$group": {
                     "_id": "$gitBranch",
-                    "cost": {"$sum": {"$ifNull": ["$costUsd", 0]}},
+                    "cost": {"$sum": "$cost"},
                     "messages": {"$sum": 1},
                     "sessions": {"$addToSet": "$sessionId"},
                     "first_activity": {"$min": "$timestamp"},
@@ -2892,17 +3061,15 @@ class AnalyticsService:
             )
 
         # Calculate costs by branch type
-        type_costs: dict[BranchType, float] = {}
-        feature_lifetimes: list[int] = []
-
-        for branch in branches:
-            branch_type = branch.type
-            cost = branch.metrics.cost
-
-            type_costs[branch_type] = type_costs.get(branch_type, 0) + cost
-
-            if branch_type == BranchType.FEATURE:
-                feature_lifetimes.append(branch.metrics.active_days)
+        type_costs = group_sums(
+            [branch.type for branch in branches],
+            [branch.metrics.cost for branch in branches],
+        )
+        feature_lifetimes = [
+            branch.metrics.active_days
+            for branch in branches
+            if branch.type == BranchType.FEATURE
+        ]
 
         # Main vs feature cost ratio
         main_cost = type_costs.get(BranchType.MAIN, 0)
@@ -2929,6 +3096,7 @@ class AnalyticsService:
             most_expensive_branch_type=most_expensive_type,
         )
 
+    @coalesced
     async def get_token_efficiency_summary(
         self,
         session_id: str | None = None,
@@ -2948,35 +3116,15 @@ class AnalyticsService:
             {
                 "$group": {
                     "_id": None,
-                    "total_input": {"$sum": {"$ifNull": ["$usage.input_tokens", 0]}},
-                    "total_output": {"$sum": {"$ifNull": ["$usage.output_tokens", 0]}},
-                    "total_cost": {
-                        "$sum": {"$ifNull": [{"$ifNull": ["$cost_usd", "$costUsd"]}, 0]}
-                    },
+                    "total_input": {"$sum": "$tokens.input"},
+                    "total_output": {"$sum": "$tokens.output"},
+                    "total_cost": {"$sum": "$cost"},
                     "message_count": {"$sum": 1},
-                    # Extract cache tokens from usage field
-                    "cache_creation": {
-                        "$sum": {"$ifNull": ["$usage.cache_creation_input_tokens", 0]}
-                    },
-                    "cache_read": {
-                        "$sum": {"$ifNull": ["$usage.cache_read_input_tokens", 0]}
-                    },
+                    "cache_creation": {"$sum": "$tokens.cache_creation"},
+                    "cache_read": {"$sum": "$tokens.cache_read"},
                     "cache_tokens": {
                         "$sum": {
-                            "$add": [
-                                {
-                                    "$ifNull": [
-                                        "$usage.cache_creation_input_tokens",
-                                        0,
-                                    ]
-                                },
-                                {
-                                    "$ifNull": [
-                                        "$usage.cache_read_input_tokens",
-                                        0,
-                                    ]
-                                },
-                            ]
+                            "$add": ["$tokens.cache_creation", "$tokens.cache_read"]
                         }
                     },
                 }
@@ -3009,6 +3157,7 @@ class AnalyticsService:
             trend=trend,
         )
 
+    @coalesced
     async def get_token_efficiency_detailed(
         self,
         session_id: str | None = None,
@@ -3055,44 +3204,18 @@ class AnalyticsService:
             {
                 "$match": {
                     **match_filter,
-                    "usage": {"$exists": True},
+                    "tokens.total": {"$gt": 0},
                 }
             },
             {
                 "$group": {
                     "_id": None,
-                    "total_input": {
-                        "$sum": {
-                            "$ifNull": [
-                                "$usage.input_tokens",
-                                0,
-                            ]
-                        }
-                    },
-                    "total_output": {
-                        "$sum": {
-                            "$ifNull": [
-                                "$usage.output_tokens",
-                                0,
-                            ]
-                        }
-                    },
-                    "total_cost": {
-                        "$sum": {"$ifNull": [{"$ifNull": ["$cost_usd", "$costUsd"]}, 0]}
-                    },
+                    "total_input": {"$sum": "$tokens.input"},
+                    "total_output": {"$sum": "$tokens.output"},
+                    "total_cost": {"$sum": "$cost"},
                     "message_count": {"$sum": 1},
-                    # Extract cache metrics from usage field
-                    "cache_creation": {
-                        "$sum": {
-                            "$ifNull": [
-                                "$usage.cache_creation_input_tokens",
-                                0,
-                            ]
-                        }
-                    },
-                    "cache_read": {
-                        "$sum": {"$ifNull": ["$usage.cache_read_input_tokens", 0]}
-                    },
+                    "cache_creation": {"$sum": "$tokens.cache_creation"},
+                    "cache_read": {"$sum": "$tokens.cache_read"},
                 }
             },
         ]
@@ -3197,6 +3320,7 @@ class AnalyticsService:
         else:
             return str(count)
 
+    @coalesced
     async def get_session_depth_analytics(
         self,
         time_range: TimeRange,
@@ -3232,7 +3356,118 @@ class AnalyticsService:
                 )
             time_filter["sessionId"] = {"$in": session_ids}
 
-        # Get all messages with their conversation tree structure
+        if include_sidechains:
+            depth_stats = await self._session_depth_stats(
+                time_filter, project_id, min_depth
+            )
+        else:
+            depth_stats = await self._rebuild_depth_stats(time_filter, min_depth)
+
+        if not depth_stats:
+            return SessionDepthAnalytics(
+                depth_distribution=[],
+                depth_correlations=DepthCorrelations(
+                    depth_vs_cost=0.0, depth_vs_duration=0.0, depth_vs_success=0.0
+                ),
+                patterns=[],
+                recommendations=DepthRecommendations(
+                    optimal_depth_range=(0, 0),
+                    warning_threshold=0,
+                    tips=["No conversations found matching the specified criteria"],
+                ),
+                time_range=time_range,
+            )
+
+        # Calculate depth distribution
+        depth_distribution = self._calculate_depth_distribution(depth_stats)
+
+        # Calculate correlations
+        depth_correlations = self._calculate_depth_correlations(depth_stats)
+
+        # Identify conversation patterns
+        patterns = self._identify_conversation_patterns(depth_stats)
+
+        # Generate recommendations
+        recommendations = self._generate_depth_recommendations(
+            depth_stats, depth_distribution
+        )
+
+        return SessionDepthAnalytics(
+            depth_distribution=depth_distribution,
+            depth_correlations=depth_correlations,
+            patterns=patterns,
+            recommendations=recommendations,
+            time_range=time_range,
+        )
+
+    async def _session_depth_stats(
+        self, time_filter: dict, project_id: str | None, min_depth: int
+    ) -> list[dict[str, Any]]:
+        """Per-session depth statistics from the fields ingest maintains.
+
+        A session counts toward a time range when it was active during it,
+        starting before the range ends and ending after it starts, as when
+        sessions were found through their messages in the range. Its depth
+        and totals still cover the whole session.
+        """
+        match: dict[str, Any] = {"maxDepth": {"$gte": max(min_depth, 1)}}
+        window = time_filter.get("timestamp") or {}
+        start = window.get("$gte") or window.get("$gt")
+        end = window.get("$lte") or window.get("$lt")
+        if start:
+            match["endedAt"] = {"$gte": start}
+        if end:
+            match["startedAt"] = {"$lte": end}
+        if project_id:
+            match["projectId"] = ObjectId(project_id)
+
+        sessions = await self.db.sessions.aggregate(
+            [
+                {"$match": self._add_user_filter(match)},
+                {
+                    "$project": {
+                        "_id": 0,
+                        "sessionId": 1,
+                        "maxDepth": 1,
+                        "branchCount": 1,
+                        "totalCost": 1,
+                        "totalDurationMs": 1,
+                        "messageCount": 1,
+                        "userMessageCount": 1,
+                        "respondedCount": 1,
+                    }
+                },
+            ]
+        ).to_list(None)
+
+        depth_stats = []
+        for session in sessions:
+            user_messages = session.get("userMessageCount") or 0
+            depth_stats.append(
+                {
+                    "session_id": session["sessionId"],
+                    "max_depth": session["maxDepth"],
+                    "cost": self._safe_float(session.get("totalCost")),
+                    "duration": session.get("totalDurationMs") or 0,
+                    "message_count": session.get("messageCount") or 0,
+                    "success_rate": (
+                        (session.get("respondedCount") or 0) / user_messages * 100
+                        if user_messages > 0
+                        else 0
+                    ),
+                    "branch_count": session.get("branchCount") or 0,
+                }
+            )
+        return depth_stats
+
+    async def _rebuild_depth_stats(
+        self, time_filter: dict, min_depth: int
+    ) -> list[dict[str, Any]]:
+        """Per-session depth statistics with sidechains excluded.
+
+        Stored depths count sidechain messages, so this rebuilds each
+        conversation tree from the messages in the time range instead.
+        """
         messages_pipeline = [
             {"$match": time_filter},
             {
@@ -3252,37 +3487,22 @@ class AnalyticsService:
 
         messages = await self._aggregate_messages(messages_pipeline)
 
-        # Build conversation trees per session and calculate depths
         session_data: dict[str, list[dict[str, Any]]] = {}
-        session_depths: dict[str, dict[str, int]] = {}
-
         for message in messages:
-            session_id = message["sessionId"]
+            session_data.setdefault(message["sessionId"], []).append(message)
 
-            if session_id not in session_data:
-                session_data[session_id] = []
-                session_depths[session_id] = {}
-
-            session_data[session_id].append(message)
-
-        # Calculate depth for each session
         depth_stats = []
-
         for session_id, session_messages in session_data.items():
-            depths = self._calculate_conversation_depths(
-                session_messages, include_sidechains
-            )
+            tree = ConversationTree(session_messages)
+            depths = tree.depths(include_sidechains=False)
             if not depths:
                 continue
 
             max_depth = max(depths.values())
-            avg_depth = sum(depths.values()) / len(depths)
-
             # Skip sessions below minimum depth
             if max_depth < min_depth:
                 continue
 
-            # Calculate session metrics
             session_cost = sum(
                 self._safe_float(msg.get("costUsd", 0))
                 for msg in session_messages
@@ -3293,9 +3513,8 @@ class AnalyticsService:
                 for msg in session_messages
                 if msg.get("durationMs")
             )
-            message_count = len(session_messages)
 
-            # Calculate success rate (simplified - based on non-null costs as proxy for successful assistant responses)
+            # Success rate: assistant responses with a cost per user message
             successful_responses = sum(
                 1
                 for msg in session_messages
@@ -3314,88 +3533,20 @@ class AnalyticsService:
                 {
                     "session_id": session_id,
                     "max_depth": max_depth,
-                    "avg_depth": avg_depth,
                     "cost": session_cost,
                     "duration": session_duration,
-                    "message_count": message_count,
+                    "message_count": len(session_messages),
                     "success_rate": success_rate,
-                    "branch_count": len(
-                        [d for d in depths.values() if d > 1]
-                    ),  # Messages with depth > 1 indicate branching
+                    "branch_count": tree.branch_count(),
                 }
             )
-
-        if not depth_stats:
-            return SessionDepthAnalytics(
-                depth_distribution=[],
-                depth_correlations=DepthCorrelations(
-                    depth_vs_cost=0.0, depth_vs_duration=0.0, depth_vs_success=0.0
-                ),
-                patterns=[],
-                recommendations=DepthRecommendations(
-                    optimal_depth_range=(0, 0),
-                    warning_threshold=0,
-                    tips=["No conversations found matching the specified criteria"],
-                ),
-                time_range=time_range,
-            )
-
-        # Calculate depth distribution
-        depth_distribution = self._calculate_depth_distribution(depth_stats)
-
-        # Calculate correlations
-        depth_correlations = self._calculate_depth_correlations(depth_stats)
-
-        # Identify conversation patterns
-        patterns = self._identify_conversation_patterns(depth_stats)
-
-        # Generate recommendations
-        recommendations = self._generate_depth_recommendations(
-            depth_stats, depth_distribution
-        )
-
-        return SessionDepthAnalytics(
-            depth_distribution=depth_distribution,
-            depth_correlations=depth_correlations,
-            patterns=patterns,
-            recommendations=recommendations,
-            time_range=time_range,
-        )
+        return depth_stats
 
     def _calculate_conversation_depths(
         self, messages: list[dict], include_sidechains: bool
     ) -> dict[str, int]:
         """Calculate depth for each message in a conversation."""
-        depths: dict[str, int] = {}
-        message_map = {msg["uuid"]: msg for msg in messages}
-
-        def get_depth(uuid: str) -> int:
-            if uuid in depths:
-                return depths[uuid]
-
-            message = message_map.get(uuid)
-            if not message:
-                return 0
-
-            # Skip sidechains if not included
-            if not include_sidechains and message.get("isSidechain", False):
-                depths[uuid] = 0
-                return 0
-
-            parent_uuid = message.get("parentUuid")
-            if not parent_uuid:
-                depths[uuid] = 1
-                return 1
-
-            parent_depth = get_depth(parent_uuid)
-            depths[uuid] = parent_depth + 1
-            return int(depths[uuid])
-
-        # Calculate depths for all messages
-        for message in messages:
-            get_depth(message["uuid"])
-
-        return depths
+        return ConversationTree(messages).depths(include_sidechains)
 
     def _calculate_depth_distribution(
         self, depth_stats: list[dict]
@@ -3446,27 +3597,7 @@ class AnalyticsService:
         durations = [s["duration"] for s in depth_stats if s["duration"] > 0]
         success_rates = [s["success_rate"] for s in depth_stats]
 
-        def calculate_correlation(x: list[float], y: list[float]) -> float:
-            """Calculate Pearson correlation coefficient."""
-            if len(x) != len(y) or len(x) < 2:
-                return 0.0
-
-            n = len(x)
-            sum_x = sum(x)
-            sum_y = sum(y)
-            sum_xy = sum(xi * yi for xi, yi in zip(x, y))
-            sum_x2 = sum(xi * xi for xi in x)
-            sum_y2 = sum(yi * yi for yi in y)
-
-            denominator = (
-                (n * sum_x2 - sum_x * sum_x) * (n * sum_y2 - sum_y * sum_y)
-            ) ** 0.5
-            if denominator == 0:
-                return 0.0
-
-            return float((n * sum_xy - sum_x * sum_y) / denominator)
-
-        depth_vs_cost = calculate_correlation(depths, costs)
+        depth_vs_cost = pearson(depths, costs)
 
         # For duration correlation, only use sessions with duration data
         duration_depths = [
@@ -3475,12 +3606,10 @@ class AnalyticsService:
             if depth_stats[i]["duration"] > 0
         ]
         depth_vs_duration = (
-            calculate_correlation(duration_depths, durations)
-            if len(durations) >= 2
-            else 0.0
+            pearson(duration_depths, durations) if len(durations) >= 2 else 0.0
         )
 
-        depth_vs_success = calculate_correlation(depths, success_rates)
+        depth_vs_success = pearson(depths, success_rates)
 
         return DepthCorrelations(
             depth_vs_cost=round(depth_vs_cost, 3),
@@ -3634,6 +3763,7 @@ class AnalyticsService:
             return f"${cost:.2f}"
         return f"${cost:.0f}"
 
+    @coalesced
     async def get_cost_summary(
         self, session_id: str | None, project_id: str | None, time_range: TimeRange
     ) -> CostSummary:
@@ -3663,7 +3793,7 @@ class AnalyticsService:
         current_cost = await self._aggregate_messages(
             [
                 {"$match": base_filter},
-                {"$group": {"_id": None, "total_cost": {"$sum": "$costUsd"}}},
+                {"$group": {"_id": None, "total_cost": {"$sum": "$cost"}}},
             ]
         )
 
@@ -3684,7 +3814,7 @@ class AnalyticsService:
             prev_cost = await self._aggregate_messages(
                 [
                     {"$match": prev_filter},
-                    {"$group": {"_id": None, "total_cost": {"$sum": "$costUsd"}}},
+                    {"$group": {"_id": None, "total_cost": {"$sum": "$cost"}}},
                 ]
             )
 
@@ -3718,6 +3848,7 @@ class AnalyticsService:
             period=period,
         )
 
+    @coalesced
     async def get_cost_breakdown(
         self, session_id: str | None, project_id: str | None, time_range: TimeRange
     ) -> CostBreakdownResponse:
@@ -3764,7 +3895,7 @@ class AnalyticsService:
                 {
                     "$group": {
                         "_id": {"$ifNull": ["$model", "unknown"]},
-                        "cost": {"$sum": "$costUsd"},
+                        "cost": {"$sum": "$cost"},
                         "message_count": {"$sum": 1},
                     }
                 },
@@ -3802,7 +3933,7 @@ class AnalyticsService:
                                 "date": "$timestamp",
                             }
                         },
-                        "cost": {"$sum": "$costUsd"},
+                        "cost": {"$sum": "$cost"},
                     }
                 },
                 {"$sort": {"_id": 1}},
@@ -3863,6 +3994,7 @@ class AnalyticsService:
             project_id=project_id,
         )
 
+    @coalesced
     async def get_cost_prediction(
         self, session_id: str | None, project_id: str | None, prediction_days: int
     ) -> CostPrediction:
@@ -3900,7 +4032,7 @@ class AnalyticsService:
                                 "date": "$timestamp",
                             }
                         },
-                        "cost": {"$sum": "$costUsd"},
+                        "cost": {"$sum": "$cost"},
                     }
                 },
                 {"$sort": {"_id": 1}},
@@ -3933,24 +4065,10 @@ class AnalyticsService:
                 project_id=project_id,
             )
 
-        # Calculate simple moving average for prediction
+        # Simple moving average of recent days, decaying every week, with a
+        # 95% confidence interval (±1.96 standard deviations)
         costs = [self._safe_float(item["cost"]) for item in daily_costs]
-
-        # Simple prediction: use the average of recent days
-        recent_days = min(7, len(costs))  # Use last 7 days or all available
-        avg_daily_cost = (
-            sum(costs[-recent_days:]) / recent_days if recent_days > 0 else 0
-        )
-
-        # Calculate standard deviation for confidence intervals
-        if len(costs) > 1:
-            variance = (
-                sum((cost - avg_daily_cost) ** 2 for cost in costs[-recent_days:])
-                / recent_days
-            )
-            std_dev = variance**0.5
-        else:
-            std_dev = avg_daily_cost * 0.2  # 20% uncertainty if only one data point
+        forecast = moving_average_forecast(costs, prediction_days)
 
         # Generate predictions
         predictions = []
@@ -3959,18 +4077,11 @@ class AnalyticsService:
         )
         total_predicted = 0.0
 
-        for i in range(prediction_days):
+        for i, (predicted_cost, confidence_lower, confidence_upper) in enumerate(
+            forecast
+        ):
             prediction_date = start_date + timedelta(days=i + 1)
 
-            # Simple linear prediction with slight decay for longer periods
-            decay_factor = 0.95 ** (i // 7)  # Decay every 7 days
-            predicted_cost = avg_daily_cost * decay_factor
-
-            # 95% confidence interval (±1.96 standard deviations)
-            margin = 1.96 * std_dev * decay_factor
-            confidence_lower = max(0, predicted_cost - margin)
-            confidence_upper = predicted_cost + margin
-
             predictions.append(
                 CostPredictionPoint(
                     date=prediction_date,
@@ -4160,107 +4271,103 @@ class AnalyticsService:
             },
         }
 
-    def _extract_keywords_from_content(self, content: str) -> list[str]:
-        """Extract relevant keywords from message content."""
-        # Convert to lowercase for matching
-        content_lower = content.lower()
-
-        # Extract file paths and extensions
-        file_patterns = re.findall(r"\b\w+\.\w+\b", content_lower)
-
-        # Also extract file paths with slashes
-        path_patterns = re.findall(r"[\w/\-_]+\.\w+", content_lower)
-        file_patterns.extend(path_patterns)
-
-        # Extract framework/library mentions - expanded list
-        tech_patterns = re.findall(
-            r"\b(?:react|vue|angular|python|javascript|typescript|node|express|django|flask|mongodb|postgresql|mysql|docker|kubernetes|aws|azure|gcp|github|gitlab|ci/cd|api|rest|graphql|jwt|oauth|npm|yarn|pip|conda|webpack|vite|babel|eslint|prettier|jest|vitest|pytest|jupyter|pandas|numpy|tensorflow|pytorch|sklearn|matplotlib|seaborn|plotly|d3|bootstrap|tailwind|sass|scss|css|html|json|yaml|xml|sql|nosql|redis|elasticsearch|nginx|apache|terraform|ansible|jenkins|gradle|maven|spring|django|rails|laravel|nextjs|nuxt|svelte|solid|fastapi|sqlalchemy|alembic|pydantic|uvicorn|poetry|pytest|mypy|ruff|black|flake8|pre-commit|git|bash|linux|macos|windows|vscode|intellij|vim|emacs|chrome|firefox|safari|edge|postman|insomnia|swagger|openapi|grpc|websocket|mqtt|kafka|rabbitmq|celery|cron|systemd|prometheus|grafana|elasticsearch|kibana|logstash|sentry|datadog|newrelic|jenkins|circleci|travisci|githubactions|gitlab-ci|bitbucket|jira|confluence|slack|discord|teams|zoom|figma|sketch|adobe|photoshop|illustrator|premiere|aftereffects|blender|unity|unreal|godot|flutter|dart|kotlin|swift|objective-c|rust|go|golang|ruby|php|perl|scala|clojure|haskell|elixir|erlang|julia|r|matlab|fortran|c\+\+|cpp|java|csharp|dotnet|aspnet|blazor|xamarin|electron|ionic|capacitor|quasar|vuetify|material-ui|ant-design|chakra-ui|semantic-ui|bulma|foundation|materialize|jquery|backbone|ember|polymer|lit|stencil|alpine|htmx|turbo|stimulus|hotwire|phoenix|rails|sinatra|bottle|pyramid|tornado|sanic|starlette|gin|echo|fiber|iris|beego|revel|buffalo|chi|gorilla|mux|httprouter|fasthttp|actix|rocket|warp|tide|async-std|tokio|hyper|reqwest|surf|isahc|ureq|curl|wget|httpie|fetch|axios|superagent|got|node-fetch|request|bent|phin|needle|undici|ky|redaxios|cross-fetch|isomorphic-fetch|whatwg-fetch|unfetch|swr|react-query|apollo|relay|urql|graphql-request|mercurius|graphql-yoga|graphql-tools|graphql-codegen|graphql-inspector|graphql-voyager|graphiql|altair|playground|postwoman|hoppscotch|paw|bruno|thunderclient|restclient|soapui|katalon|selenium|cypress|playwright|puppeteer|webdriver|nightwatch|testcafe|codecept|detox|appium|espresso|xctest|robolectric|junit|testng|nunit|xunit|mstest|jasmine|karma|protractor|enzyme|react-testing-library|vue-test-utils|angular-testing|svelte-testing|solid-testing|vitest|uvu|ava|tap|qunit|intern|nightwatch|webdriverio|selenium-webdriver|chromedriver|geckodriver|safaridriver|edgedriver|iedriver)\b",
-            content_lower,
-        )
-
-        # Extract tool usage patterns - both old and new formats
-        tool_patterns = re.findall(r"\[tool\s+(?:use|result):\s*(\w+)\]", content_lower)
-
-        # Also look for tool usage in different formats
-        tool_patterns2 = re.findall(
-            r"(?:using|calling|executing)\s+(?:the\s+)?(\w+)\s+tool", content_lower
-        )
-        tool_patterns.extend(tool_patterns2)
-
-        # Look for file operation indicators
-        file_op_patterns = re.findall(
-            r"(?:reading|writing|editing|creating|updating|deleting)\s+(?:file\s+)?([/\w\-_.]+\.\w+)",
-            content_lower,
-        )
-        file_patterns.extend(file_op_patterns)
-
-        # Combine all extracted keywords
-        keywords = []
-        keywords.extend([pattern.lower() for pattern in file_patterns])
-        keywords.extend([pattern.lower() for pattern in tech_patterns])
-        keywords.extend([pattern.lower() for pattern in tool_patterns])
-
-        return list(set(keywords))  # Remove duplicates
+    def _get_topic_matcher(self) -> TopicMatcher:
+        """Get or compile the matcher for the topic rules."""
+        global _topic_matcher
+        if _topic_matcher is None:
+            _topic_matcher = TopicMatcher(self._get_topic_rules())
+        return _topic_matcher
 
     def _calculate_topic_relevance(
-        self,
-        keywords: list[str],
-        topic_rule: dict[str, Any],
-        session_context: dict[str, Any],
+        self, topic_name: str, topic_rule: dict[str, Any], topics: SessionTopics
     ) -> float:
-        """Calculate relevance score for a topic based on keywords and context."""
-        base_score = 0.0
-        matched_keywords = []
-
-        # Check keyword matches
-        rule_keywords = [kw.lower() for kw in topic_rule["keywords"]]
-        for keyword in keywords:
-            if keyword in rule_keywords:
-                base_score += topic_rule["weight"]
-                matched_keywords.append(keyword)
-
-        # Check file extension matches
-        rule_extensions = topic_rule.get("file_extensions", [])
-        for keyword in keywords:
-            if any(keyword.endswith(ext) for ext in rule_extensions):
-                base_score += topic_rule["weight"] * 0.8
-                matched_keywords.append(keyword)
+        """Calculate relevance score for a topic from a session's matches."""
+        # Keyword and file extension matches
+        base_score: float = topic_rule["weight"] * (
+            len(topics.terms.get(topic_name, ()))
+            + 0.8 * len(topics.files.get(topic_name, ()))
+        )
 
         # Apply context boosts
-        if session_context.get("tool_usage"):
-            relevant_tools = {
-                "Web Development": ["Read", "Edit", "Write", "Grep"],
-                "API Integration": ["WebFetch", "Bash"],
-                "Database Operations": ["Bash", "Read", "Edit"],
-                "DevOps/Deployment": ["Bash", "Read", "Write"],
-                "Testing/QA": ["Bash", "Read", "Edit"],
-                "Documentation": ["Read", "Write", "Edit"],
-            }
-
-            topic_name = None
-            for name, rule in self._get_topic_rules().items():
-                if rule == topic_rule:
-                    topic_name = name
-                    break
-
-            if topic_name and topic_name in relevant_tools:
-                used_tools = set(session_context["tool_usage"].keys())
-                relevant_topic_tools = set(relevant_tools[topic_name])
-                if used_tools & relevant_topic_tools:
-                    base_score *= 1.2
+        if set(topics.tool_usage) & set(TOPIC_TOOLS.get(topic_name, [])):
+            base_score *= 1.2
 
         # Normalize score to 0-1 range
-        relevance_score = min(base_score / 5.0, 1.0)
-
-        return relevance_score
+        return min(base_score / 5.0, 1.0)
+
+    async def _get_session_topics(
+        self, sessions: list[dict[str, Any]]
+    ) -> dict[str, SessionTopics]:
+        """Topic matches of sessions, scanning only messages not yet cached.
+
+        ``sessions`` are session documents with ``sessionId``, ``partitions``
+        and ``updatedAt``. Cached state is reused while the session has not
+        been updated since; otherwise messages ingested since ``WATERMARK_LAG``
+        before its watermark are streamed, and those not yet folded in go
+        through the matcher.
+        """
+        if not sessions:
+            return {}
+        matcher = self._get_topic_matcher()
+        store = SessionTopicStore(self.db)
+        cached = await store.load([s["sessionId"] for s in sessions], matcher.version)
+
+        stale = [
+            s
+            for s in sessions
+            if s["sessionId"] not in cached
+            or cached[s["sessionId"]].refreshed_at is None
+            or not s.get("updatedAt")
+            or s["updatedAt"] > cached[s["sessionId"]].refreshed_at
+        ]
+        if not stale:
+            return cached
+
+        refreshed_at = datetime.now(UTC)
+        refreshing = {
+            s["sessionId"]: cached.get(s["sessionId"])
+            or SessionTopics(s["sessionId"], matcher.version)
+            for s in stale
+        }
+        query: dict[str, Any] = {"sessionId": {"$in": list(refreshing)}}
+        watermarks = [t.watermark for t in refreshing.values()]
+        if all(watermarks):
+            query["createdAt"] = {
+                "$gte": min(w for w in watermarks if w) - WATERMARK_LAG
+            }
 
+        collections = await self.rolling_service.get_sessions_collections(stale)
+        async for message in self.rolling_service.stream_messages(
+            collections, query, TOPIC_PROJECTION
+        ):
+            topics = refreshing.get(message.get("sessionId"))
+            if topics is not None and topics.is_new(message):
+                topics.add_message(message, matcher)
+
+        for topics in refreshing.values():
+            topics.refreshed_at = refreshed_at
+        # Partitions that ran out of time would leave gaps behind the watermark
+        budget = current_budget()
+        if budget is None or not budget.partial:
+            await store.save(refreshing.values())
+        return {**cached, **refreshing}
+
+    @coalesced
     async def extract_session_topics(
         self, session_id: str, confidence_threshold: float = 0.3
     ) -> TopicExtractionResponse:
         """Extract topics from a session's messages and tool usage."""
         # Resolve session ID
         resolved_id = await self._resolve_session_id(session_id)
-        if not resolved_id:
+        session = (
+            await self.db.sessions.find_one(
+                {"sessionId": resolved_id},
+                {"sessionId": 1, "partitions": 1, "updatedAt": 1},
+            )
+            if resolved_id
+            else None
+        )
+        if not resolved_id or not session:
             return TopicExtractionResponse(
                 session_id=session_id,
                 topics=[],
@@ -4269,12 +4376,8 @@ class AnalyticsService:
                 confidence_threshold=confidence_threshold,
             )
 
-        # Get session messages
-        messages, _ = await self.rolling_service.find_messages(
-            {"sessionId": resolved_id}, skip=0, limit=10000  # Reasonable limit
-        )
-
-        if not messages:
+        topics = (await self._get_session_topics([session]))[resolved_id]
+        if not topics.message_count:
             return TopicExtractionResponse(
                 session_id=resolved_id,
                 topics=[],
@@ -4283,101 +4386,32 @@ class AnalyticsService:
                 confidence_threshold=confidence_threshold,
             )
 
-        # Extract all content and build session context
-        all_content = ""
-        all_keywords = []
-        tool_usage: dict[str, int] = {}
-
-        for message in messages:
-            # Extract content from message
-            content = message.get("content", "")
-            if content:
-                if isinstance(content, list):
-                    # Handle Claude API format with content blocks
-                    text_content = " ".join(
-                        [
-                            block.get("text", "")
-                            for block in content
-                            if isinstance(block, dict) and block.get("type") == "text"
-                        ]
-                    )
-                    all_content += " " + text_content
-                else:
-                    all_content += " " + str(content)
-
-            # Track tool usage from tool_use messages
-            if message.get("type") == "tool_use" and message.get("messageData"):
-                tool_name = message["messageData"].get("name")
-                if tool_name:
-                    tool_usage[tool_name] = tool_usage.get(tool_name, 0) + 1
-
-            # Extract keywords from working directory
-            if message.get("cwd"):
-                cwd_keywords = self._extract_keywords_from_content(message["cwd"])
-                all_keywords.extend(cwd_keywords)
-
-        # Extract keywords from all content
-        content_keywords = self._extract_keywords_from_content(all_content)
-        all_keywords.extend(content_keywords)
-
-        # Remove duplicates
-        all_keywords = list(set(all_keywords))
-
-        # Build session context
-        session_context = {
-            "tool_usage": tool_usage,
-            "message_count": len(messages),
-            "has_errors": any(
-                msg.get("toolUseResult", {}).get("error") for msg in messages
-            ),
-        }
-
         # Apply topic rules
-        topic_rules = self._get_topic_rules()
         extracted_topics = []
-
-        for topic_name, rule in topic_rules.items():
-            relevance_score = self._calculate_topic_relevance(
-                all_keywords, rule, session_context
-            )
+        suggested_topics = []
+        for topic_name, rule in self._get_topic_rules().items():
+            relevance_score = self._calculate_topic_relevance(topic_name, rule, topics)
 
             if relevance_score >= confidence_threshold:
-                # Find matched keywords for this topic
-                matched_keywords = []
-                rule_keywords = [kw.lower() for kw in rule["keywords"]]
-                rule_extensions = rule.get("file_extensions", [])
-
-                for keyword in all_keywords:
-                    if keyword in rule_keywords or any(
-                        keyword.endswith(ext) for ext in rule_extensions
-                    ):
-                        matched_keywords.append(keyword)
-
-                confidence = min(relevance_score, 1.0)
-
+                matched_keywords = sorted(topics.terms.get(topic_name, ())) + sorted(
+                    topics.files.get(topic_name, ())
+                )
                 extracted_topics.append(
                     ExtractedTopic(
                         name=topic_name,
-                        confidence=confidence,
+                        confidence=relevance_score,
                         category=rule["category"],
                         relevance_score=relevance_score,
                         keywords=matched_keywords[:5],  # Limit to top 5 keywords
                     )
                 )
+            elif relevance_score >= 0.1:
+                # Topics with lower confidence are suggested
+                suggested_topics.append(topic_name)
 
         # Sort by relevance score
         extracted_topics.sort(key=lambda t: t.relevance_score, reverse=True)
 
-        # Generate suggested topics (topics with lower confidence)
-        suggested_topics = []
-        for topic_name, rule in topic_rules.items():
-            if topic_name not in [t.name for t in extracted_topics]:
-                relevance_score = self._calculate_topic_relevance(
-                    all_keywords, rule, session_context
-                )
-                if 0.1 <= relevance_score < confidence_threshold:
-                    suggested_topics.append(topic_name)
-
         return TopicExtractionResponse(
             session_id=session_id,
             topics=extracted_topics,
@@ -4386,66 +4420,102 @@ class AnalyticsService:
             confidence_threshold=confidence_threshold,
         )
 
+    async def _count_session_topics(
+        self, sessions: list[dict[str, Any]]
+    ) -> list[set[str]]:
+        """Confident topics of each session."""
+        rules = self._get_topic_rules()
+        session_topics = await self._get_session_topics(sessions)
+        return [
+            {
+                name
+                for name, rule in rules.items()
+                if self._calculate_topic_relevance(name, rule, topics)
+                >= TOPIC_CONFIDENCE_THRESHOLD
+            }
+            for topics in (session_topics[s["sessionId"]] for s in sessions)
+        ]
+
+    @coalesced
     async def get_topic_suggestions(
         self, time_range: TimeRange = TimeRange.LAST_30_DAYS
     ) -> TopicSuggestionResponse:
         """Get popular topics and combinations across sessions."""
+        projection = {"sessionId": 1, "partitions": 1, "updatedAt": 1}
         time_filter = self._get_time_filter(time_range)
 
-        # Get all sessions in time range
-        sessions = await self.db.sessions.find(time_filter).to_list(None)
-        session_ids = [session["sessionId"] for session in sessions]
-
-        if not session_ids:
+        # Get all sessions started in time range
+        session_filter = self._add_user_filter(
+            {"startedAt": time_filter["timestamp"]} if time_filter else {}
+        )
+        sessions = await self.db.sessions.find(session_filter, projection).to_list(None)
+        if not sessions:
             return TopicSuggestionResponse(
                 popular_topics=[], topic_combinations=[], time_range=time_range
             )
 
-        # For demo purposes, return some mock popular topics
-        # In a real implementation, this would analyze all sessions
-        popular_topics = [
-            PopularTopic(
-                name="Web Development",
-                session_count=min(len(session_ids), 25),
-                trend="trending",
-                percentage_change=15.2,
-            ),
-            PopularTopic(
-                name="API Integration",
-                session_count=min(len(session_ids), 18),
-                trend="stable",
-                percentage_change=2.1,
-            ),
-            PopularTopic(
-                name="Database Operations",
-                session_count=min(len(session_ids), 12),
-                trend="declining",
-                percentage_change=-8.3,
-            ),
-            PopularTopic(
-                name="Testing/QA",
-                session_count=min(len(session_ids), 10),
-                trend="trending",
-                percentage_change=22.5,
-            ),
-        ]
+        previous_sessions: list[dict[str, Any]] = []
+        if time_range != TimeRange.ALL_TIME:
+            previous_filter = self._get_previous_period_filter(time_range)
+            previous_sessions = await self.db.sessions.find(
+                self._add_user_filter({"startedAt": previous_filter["timestamp"]}),
+                projection,
+            ).to_list(None)
+
+        current = await self._count_session_topics(sessions)
+        previous = await self._count_session_topics(previous_sessions)
+
+        topic_counts: dict[str, int] = {}
+        pair_counts: dict[tuple[str, str], int] = {}
+        for names in current:
+            for name in names:
+                topic_counts[name] = topic_counts.get(name, 0) + 1
+            ordered = sorted(names)
+            for i, first in enumerate(ordered):
+                for second in ordered[i + 1 :]:
+                    pair = (first, second)
+                    pair_counts[pair] = pair_counts.get(pair, 0) + 1
+        previous_counts: dict[str, int] = {}
+        for names in previous:
+            for name in names:
+                previous_counts[name] = previous_counts.get(name, 0) + 1
+
+        popular_topics = []
+        for name, count in sorted(topic_counts.items(), key=lambda t: (-t[1], t[0]))[
+            :10
+        ]:
+            percentage_change = (
+                self._calculate_trend(count, previous_counts.get(name, 0))
+                if time_range != TimeRange.ALL_TIME
+                else 0.0
+            )
+            if percentage_change > 10:
+                trend = "trending"
+            elif percentage_change < -10:
+                trend = "declining"
+            else:
+                trend = "stable"
+            popular_topics.append(
+                PopularTopic(
+                    name=name,
+                    session_count=count,
+                    trend=trend,
+                    percentage_change=percentage_change,
+                )
+            )
 
         topic_combinations = [
             TopicCombination(
-                topics=["Web Development", "API Integration"],
-                frequency=min(len(session_ids), 8),
-                confidence=0.85,
-            ),
-            TopicCombination(
-                topics=["Database Operations", "API Integration"],
-                frequency=min(len(session_ids), 6),
-                confidence=0.72,
-            ),
-            TopicCombination(
-                topics=["Web Development", "Testing/QA"],
-                frequency=min(len(session_ids), 5),
-                confidence=0.68,
-            ),
+                topics=list(pair),
+                frequency=frequency,
+                # Share of sessions with the rarer topic that have both
+                confidence=round(
+                    frequency / min(topic_counts[pair[0]], topic_counts[pair[1]]), 2
+                ),
+            )
+            for pair, frequency in sorted(
+                pair_counts.items(), key=lambda p: (-p[1], p[0])
+            )[:5]
         ]
 
         return TopicSuggestionResponse(
@@ -4456,6 +4526,7 @@ class AnalyticsService:
 
     # Performance Benchmarking Methods
 
+    @coalesced
     async def get_benchmarks(
         self,
         entity_type: BenchmarkEntityType,
@@ -4465,13 +4536,14 @@ class AnalyticsService:
         include_percentile_ranks: bool = True,
     ) -> BenchmarkResponse:
         """Get performance benchmarks for specified entities."""
-        # Get raw metrics for each entity
-        raw_metrics = []
-        for entity_id in entity_ids:
-            entity_metrics = await self._get_entity_raw_metrics(
-                entity_type, entity_id, time_range
-            )
-            raw_metrics.append({"entity_id": entity_id, **entity_metrics})
+        # Get raw metrics for all entities in a single pass
+        entities_metrics = await self._get_entities_raw_metrics(
+            entity_type, entity_ids, time_range
+        )
+        raw_metrics = [
+            {"entity_id": entity_id, **entity_metrics}
+            for entity_id, entity_metrics in zip(entity_ids, entities_metrics)
+        ]
 
         # Calculate normalized scores
         normalized_metrics = self._normalize_metrics(raw_metrics, normalization_method)
@@ -4484,10 +4556,9 @@ class AnalyticsService:
         )
 
         # Create benchmark entities
+        entity_names = await self._get_entity_names(entity_type, entity_ids)
         benchmarks = []
-        for i, entity_id in enumerate(entity_ids):
-            entity_name = await self._get_entity_name(entity_type, entity_id)
-
+        for i, entity_name in enumerate(entity_names):
             benchmark_metrics: BenchmarkMetrics = BenchmarkMetrics(
                 **normalized_metrics[i]
             )
@@ -4529,6 +4600,7 @@ class AnalyticsService:
             time_range=time_range,
         )
 
+    @coalesced
     async def get_benchmark_comparison(
         self,
         primary_entity_id: str,
@@ -4555,284 +4627,62 @@ class AnalyticsService:
 
         return result
 
-    async def _get_entity_raw_metrics(
-        self, entity_type: BenchmarkEntityType, entity_id: str, time_range: TimeRange
-    ) -> dict[str, float]:
-        """Get raw performance metrics for an entity."""
+    async def _get_entities_raw_metrics(
+        self,
+        entity_type: BenchmarkEntityType,
+        entity_ids: list[str],
+        time_range: TimeRange,
+    ) -> list[dict[str, float]]:
+        """Get raw performance metrics for all entities in one pass."""
         time_filter = self._get_time_filter(time_range)
 
-        if entity_type == BenchmarkEntityType.PROJECT:
-            # Get session IDs for this project
-            session_ids = await self.db.sessions.distinct(
-                "sessionId", {"projectId": ObjectId(entity_id)}
-            )
-            message_filter = {**time_filter, "sessionId": {"$in": session_ids}}
-
-        elif entity_type == BenchmarkEntityType.TIME_PERIOD:
+        if entity_type == BenchmarkEntityType.TIME_PERIOD:
             # For time periods, entity_id is a date range identifier
-            period_filter = self._get_time_period_filter(entity_id)
-            message_filter = {**period_filter}
-
-        else:  # TEAM - would need team mapping logic
-            # For now, treat as project
-            session_ids = await self.db.sessions.distinct(
-                "sessionId", {"projectId": ObjectId(entity_id)}
-            )
-            message_filter = {**time_filter, "sessionId": {"$in": session_ids}}
-
-        # Calculate KPIs
-        cost_efficiency = await self._calculate_cost_efficiency(message_filter)
-        speed_score = await self._calculate_speed_score(message_filter)
-        quality_score = await self._calculate_quality_score(message_filter)
-        productivity_score = await self._calculate_productivity_score(message_filter)
-        complexity_handling = await self._calculate_complexity_handling(message_filter)
-
-        return {
-            "cost_efficiency_raw": cost_efficiency,
-            "speed_score_raw": speed_score,
-            "quality_score_raw": quality_score,
-            "productivity_score_raw": productivity_score,
-            "complexity_handling_raw": complexity_handling,
-        }
-
-    async def _calculate_cost_efficiency(self, message_filter: dict[str, Any]) -> float:
-        """Calculate cost efficiency metric (lower cost per outcome is better)."""
-        pipeline = [
-            {"$match": {**message_filter, "costUsd": {"$exists": True, "$gt": 0}}},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_cost": {"$sum": "$costUsd"},
-                    "total_messages": {"$sum": 1},
-                    "successful_operations": {
-                        "$sum": {"$cond": [{"$ne": ["$errors", []]}, 0, 1]}
-                    },
-                }
-            },
-        ]
-
-        result = await self._aggregate_messages(pipeline)
-        if not result:
-            return 0.0
-
-        data = result[0]
-        total_cost = self._safe_float(data.get("total_cost", 0))
-        if total_cost == 0:
-            return 0.0
-
-        # Cost efficiency = successful operations per dollar (higher is better)
-        efficiency = data["successful_operations"] / total_cost
-        return float(efficiency * 100)  # Scale to 0-100 range
-
-    async def _calculate_speed_score(self, message_filter: dict[str, Any]) -> float:
-        """Calculate speed performance score based on response times."""
-        pipeline = [
-            {"$match": {**message_filter, "durationMs": {"$exists": True, "$gt": 0}}},
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_duration": {"$avg": "$durationMs"},
-                    "count": {"$sum": 1},
-                }
-            },
-        ]
-
-        result = await self._aggregate_messages(pipeline)
-        if not result or result[0]["count"] == 0:
-            return 50.0  # Neutral score
-
-        avg_duration = result[0]["avg_duration"]
-        # Convert to speed score (lower duration = higher score)
-        # Using inverse log scale: score = 100 - log10(duration_seconds) * 20
-        duration_seconds = avg_duration / 1000
-        if duration_seconds <= 0:
-            return 100.0
-
-        speed_score = max(0.0, 100.0 - (math.log10(duration_seconds) * 20.0))
-        return float(min(100.0, speed_score))
-
-    async def _calculate_quality_score(self, message_filter: dict[str, Any]) -> float:
-        """Calculate quality score based on error rates."""
-        pipeline = [
-            {"$match": message_filter},
-            {
-                "$group": {
-                    "_id": None,
-                    "total_messages": {"$sum": 1},
-                    "error_messages": {
-                        "$sum": {
-                            "$cond": [
-                                {
-                                    "$and": [
-                                        {"$exists": ["$errors", True]},
-                                        {"$ne": ["$errors", []]},
-                                        {"$ne": ["$errors", None]},
-                                    ]
-                                },
-                                1,
-                                0,
-                            ]
-                        }
-                    },
-                }
-            },
-        ]
-
-        result = await self._aggregate_messages(pipeline)
-        if not result or result[0]["total_messages"] == 0:
-            return 100.0  # Perfect score if no data
-
-        data = result[0]
-        error_rate = data["error_messages"] / data["total_messages"]
-        quality_score = (1 - error_rate) * 100
-        return float(max(0.0, quality_score))
-
-    async def _calculate_productivity_score(
-        self, message_filter: dict[str, Any]
-    ) -> float:
-        """Calculate productivity score based on tasks per session."""
-        # Get session-level productivity
-        session_pipeline = [
-            {"$match": message_filter},
-            {
-                "$group": {
-                    "_id": "$sessionId",
-                    "message_count": {"$sum": 1},
-                    "tool_calls": {
-                        "$sum": {
-                            "$cond": [
-                                {
-                                    "$and": [
-                                        {"$exists": ["$tools", True]},
-                                        {"$ne": ["$tools", []]},
-                                        {"$ne": ["$tools", None]},
-                                    ]
-                                },
-                                {"$size": "$tools"},
-                                0,
-                            ]
-                        }
-                    },
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_messages_per_session": {"$avg": "$message_count"},
-                    "avg_tools_per_session": {"$avg": "$tool_calls"},
-                    "session_count": {"$sum": 1},
-                }
-            },
-        ]
-
-        result = await self._aggregate_messages(session_pipeline)
-        if not result or result[0]["session_count"] == 0:
-            return 50.0  # Neutral score
-
-        data = result[0]
-        # Productivity = weighted combination of messages and tool usage
-        messages_score = min(
-            100.0, data["avg_messages_per_session"] * 2.0
-        )  # Scale by 2
-        tools_score = min(100.0, data["avg_tools_per_session"] * 5.0)  # Scale by 5
-
-        productivity_score = messages_score * 0.6 + tools_score * 0.4
-        return float(min(100.0, productivity_score))
+            entity_filters = [self._get_time_period_filter(e) for e in entity_ids]
+            match: dict[str, Any] = {"$or": entity_filters}
+            # Periods carry their own bounds; pick partitions by their filters
+            time_range = TimeRange.ALL_TIME
+        else:
+            # TEAM would need team mapping logic; for now, treat as project
+            session_ids: dict[ObjectId, list[str]] = {
+                ObjectId(entity_id): [] for entity_id in entity_ids
+            }
+            sessions = await self.db.sessions.find(
+                {"projectId": {"$in": list(session_ids)}},
+                {"sessionId": 1, "projectId": 1},
+            ).to_list(None)
+            for session in sessions:
+                session_ids[session["projectId"]].append(session["sessionId"])
+            entity_filters = [
+                {"sessionId": {"$in": session_ids[ObjectId(entity_id)]}}
+                for entity_id in entity_ids
+            ]
+            all_sessions = [s for ids in session_ids.values() for s in ids]
+            match = {**time_filter, "sessionId": {"$in": all_sessions}}
 
-    async def _calculate_complexity_handling(
-        self, message_filter: dict[str, Any]
-    ) -> float:
-        """Calculate complexity handling score based on conversation depth and branching."""
-        pipeline = [
-            {"$match": message_filter},
-            {
-                "$group": {
-                    "_id": "$sessionId",
-                    "message_count": {"$sum": 1},
-                    "avg_depth": {"$avg": {"$ifNull": ["$conversationDepth", 1]}},
-                    "has_sidechains": {
-                        "$max": {"$cond": [{"$eq": ["$isSidechain", True]}, 1, 0]}
-                    },
-                }
-            },
-            {
-                "$group": {
-                    "_id": None,
-                    "avg_session_depth": {"$avg": "$avg_depth"},
-                    "sidechain_percentage": {"$avg": "$has_sidechains"},
-                    "avg_session_length": {"$avg": "$message_count"},
-                }
-            },
+        results = await self._aggregate_messages(
+            kpi_pipeline(match, entity_filters), time_range
+        )
+        return [
+            entity_kpis(sessions)
+            for sessions in merge_partials(results, len(entity_ids))
         ]
 
-        result = await self._aggregate_messages(pipeline)
-        if not result:
-            return 50.0  # Neutral score
-
-        data = result[0]
-        depth_score = min(100.0, data["avg_session_depth"] * 10.0)  # Scale depth
-        branch_score = data["sidechain_percentage"] * 100.0  # Percentage to score
-        length_score = min(100.0, data["avg_session_length"] * 3.0)  # Scale length
-
-        complexity_score = depth_score * 0.4 + branch_score * 0.3 + length_score * 0.3
-        return float(min(100.0, complexity_score))
-
     def _normalize_metrics(
         self, raw_metrics: list[dict[str, Any]], method: NormalizationMethod
     ) -> list[dict[str, float]]:
         """Normalize raw metrics using specified method."""
-        metric_keys = [
-            "cost_efficiency_raw",
-            "speed_score_raw",
-            "quality_score_raw",
-            "productivity_score_raw",
-            "complexity_handling_raw",
-        ]
-
-        # Extract values for each metric
-        metric_values = {key: [m[key] for m in raw_metrics] for key in metric_keys}
+        # Normalize each metric column at once, then map to final names
+        columns = {
+            key.replace("_raw", ""): normalize_column(
+                [m[key] for m in raw_metrics], method
+            )
+            for key in RAW_METRIC_KEYS
+        }
 
         normalized_results = []
-
         for i in range(len(raw_metrics)):
-            normalized = {}
-
-            for key in metric_keys:
-                values = metric_values[key]
-                current_value = values[i]
-
-                if method == NormalizationMethod.Z_SCORE:
-                    if len(values) > 1 and statistics.stdev(values) > 0:
-                        mean_val = statistics.mean(values)
-                        std_val = statistics.stdev(values)
-                        z_score = (current_value - mean_val) / std_val
-                        # Convert z-score to 0-100 scale (z-scores typically range -3 to +3)
-                        normalized_score = max(0, min(100, 50 + (z_score * 15)))
-                    else:
-                        normalized_score = 50.0  # Neutral if no variation
-
-                elif method == NormalizationMethod.MIN_MAX:
-                    min_val = min(values)
-                    max_val = max(values)
-                    if max_val > min_val:
-                        normalized_score = (
-                            (current_value - min_val) / (max_val - min_val)
-                        ) * 100
-                        # Ensure normalized score is within 0-100 range
-                        normalized_score = min(max(normalized_score, 0.0), 100.0)
-                    else:
-                        normalized_score = 50.0  # Neutral if no variation
-
-                elif method == NormalizationMethod.PERCENTILE_RANK:
-                    sorted_values = sorted(values)
-                    rank = sorted_values.index(current_value) + 1
-                    normalized_score = (rank / len(values)) * 100
-                    # Ensure percentile rank is within 0-100 range
-                    normalized_score = min(max(normalized_score, 0.0), 100.0)
-
-                # Map to final metric names
-                final_key = key.replace("_raw", "").replace("score_raw", "score")
-                normalized[final_key] = round(normalized_score, 2)
+            normalized = {key: round(column[i], 2) for key, column in columns.items()}
 
             # Calculate overall score as weighted average
             normalized["overall_score"] = round(
@@ -4854,45 +4704,36 @@ class AnalyticsService:
         self, raw_metrics: list[dict[str, Any]]
     ) -> list[dict[str, float]]:
         """Calculate percentile ranks for metrics."""
-        metric_keys = [
-            "cost_efficiency_raw",
-            "speed_score_raw",
-            "quality_score_raw",
-            "productivity_score_raw",
-        ]
-
-        percentile_results = []
-
-        for i in range(len(raw_metrics)):
-            percentiles = {}
-
-            for key in metric_keys:
-                values = [m[key] for m in raw_metrics]
-                current_value = values[i]
-
-                # Calculate percentile rank
-                rank = sum(1 for v in values if v <= current_value)
-                percentile = (rank / len(values)) * 100
-
-                # Map to final names
-                final_key = key.replace("_raw", "").replace("score_raw", "")
-                percentiles[final_key] = round(percentile, 1)
-
-            percentile_results.append(percentiles)
+        columns = {
+            key.replace("_raw", "").replace("_score", ""): percentile_ranks(
+                [m[key] for m in raw_metrics]
+            )
+            for key in RAW_METRIC_KEYS[:4]
+        }
 
-        return percentile_results
+        return [
+            {key: round(column[i], 1) for key, column in columns.items()}
+            for i in range(len(raw_metrics))
+        ]
 
-    async def _get_entity_name(
-        self, entity_type: BenchmarkEntityType, entity_id: str
-    ) -> str:
-        """Get display name for entity."""
+    async def _get_entity_names(
+        self, entity_type: BenchmarkEntityType, entity_ids: list[str]
+    ) -> list[str]:
+        """Get display names for entities."""
         if entity_type == BenchmarkEntityType.PROJECT:
-            project = await self.db.projects.find_one({"_id": ObjectId(entity_id)})
-            return project["name"] if project else f"Project {entity_id[:8]}"
+            projects = await self.db.projects.find(
+                {"_id": {"$in": [ObjectId(entity_id) for entity_id in entity_ids]}},
+                {"name": 1},
+            ).to_list(None)
+            names = {str(project["_id"]): project["name"] for project in projects}
+            return [
+                names.get(entity_id, f"Project {entity_id[:8]}")
+                for entity_id in entity_ids
+            ]
         elif entity_type == BenchmarkEntityType.TIME_PERIOD:
-            return entity_id  # Time periods are passed as readable names
+            return list(entity_ids)  # Time periods are passed as readable names
         else:  # TEAM
-            return f"Team {entity_id}"
+            return [f"Team {entity_id}" for entity_id in entity_ids]
 
     def _analyze_entity_performance(
         self, metrics: dict[str, float]
@@ -0,0 +1,171 @@
+"""Numeric kernels for in-process analytics post-processing.
+
+Analytics endpoints fetch compact numeric columns from MongoDB and finish the
+math here: correlations, normalization, rank percentiles, nearest-rank
+percentiles, cost forecasts and heatmap binning, vectorized with NumPy.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Seven days by twenty-four hours
+HEATMAP_SHAPE = (7, 24)
+
+
+def _floats(column: Any) -> List[float]:
+    """A NumPy column as a list of Python floats."""
+    return [float(v) for v in column]
+
+
+def pearson(x: Sequence[float], y: Sequence[float]) -> float:
+    """Pearson correlation coefficient, 0 when undefined."""
+    if len(x) != len(y) or len(x) < 2:
+        return 0.0
+
+    n = len(x)
+    xs = np.asarray(x, dtype=float)
+    ys = np.asarray(y, dtype=float)
+    sum_x, sum_y = float(xs.sum()), float(ys.sum())
+    sum_xy = float(np.dot(xs, ys))
+    sum_x2, sum_y2 = float(np.dot(xs, xs)), float(np.dot(ys, ys))
+
+    denominator = ((n * sum_x2 - sum_x * sum_x) * (n * sum_y2 - sum_y * sum_y)) ** 0.5
+    if denominator == 0:
+        return 0.0
+    return float((n * sum_xy - sum_x * sum_y) / denominator)
+
+
+def z_scores(values: Sequence[float]) -> Optional[List[float]]:
+    """Standard scores using the sample deviation, ``None`` without spread."""
+    if len(values) < 2:
+        return None
+    column = np.asarray(values, dtype=float)
+    std_val = float(column.std(ddof=1))
+    if std_val == 0:
+        return None
+    return _floats((column - column.mean()) / std_val)
+
+
+def min_max(values: Sequence[float]) -> Optional[List[float]]:
+    """Values scaled to 0-1 between their extremes, ``None`` without spread."""
+    if not values:
+        return None
+    column = np.asarray(values, dtype=float)
+    span = float(column.max() - column.min())
+    if span == 0:
+        return None
+    return _floats((column - column.min()) / span)
+
+
+def rank_fractions(values: Sequence[float], ties: str = "max") -> List[float]:
+    """Rank of each value divided by the number of values.
+
+    With ``ties="max"`` equal values share the rank of the last of them
+    (the share of values at or below), with ``"min"`` of the first of them.
+    """
+    if not values:
+        return []
+    column = np.asarray(values, dtype=float)
+    if ties == "max":
+        ranks = np.searchsorted(np.sort(column), column, side="right")
+    else:
+        ranks = np.searchsorted(np.sort(column), column, side="left") + 1
+    return _floats(ranks / len(values))
+
+
+def nearest_rank(
+    values: Sequence[float], quantiles: Sequence[float]
+) -> Tuple[float, List[float]]:
+    """Mean and nearest-rank quantiles (index ``int(q * n)``) of values."""
+    count = len(values)
+    indexes = [min(int(q * count), count - 1) for q in quantiles]
+    column = np.asarray(values)
+    picked = np.partition(column, indexes)[indexes]
+    return float(column.sum()) / count, _floats(picked)
+
+
+def moving_average_forecast(
+    daily: Sequence[float],
+    days: int,
+    window: int = 7,
+    decay: float = 0.95,
+    z: float = 1.96,
+) -> List[Tuple[float, float, float]]:
+    """Forecast the next ``days`` from the average of the last ``window``.
+
+    The prediction decays by ``decay`` every week; the interval is ``z``
+    population deviations of the window, shrinking with the same decay.
+    With a single data point the deviation is taken as 20% of the average.
+    Returns ``(predicted, lower, upper)`` per day.
+    """
+    column = np.asarray(daily[-window:], dtype=float)
+    average = float(column.sum()) / len(column)
+    if len(daily) > 1:
+        std_dev = (float(((column - average) ** 2).sum()) / len(column)) ** 0.5
+    else:
+        std_dev = average * 0.2
+    factors = decay ** (np.arange(days) // 7)
+    predicted = average * factors
+    margin = z * std_dev * factors
+    lower = np.maximum(0, predicted - margin)
+    return list(zip(_floats(predicted), _floats(lower), _floats(predicted + margin)))
+
+
+def group_sums(keys: Sequence[Any], values: Sequence[float]) -> Dict[Any, float]:
+    """Sum values per key, keyed in order of first appearance."""
+    codes: Dict[Any, int] = {}
+    for key in keys:
+        codes.setdefault(key, len(codes))
+    sums = np.bincount(
+        np.fromiter((codes[k] for k in keys), dtype=int, count=len(keys)),
+        weights=np.asarray(values, dtype=float),
+        minlength=len(codes),
+    )
+    return dict(zip(codes, _floats(sums)))
+
+
+def heatmap_bins(rows: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Bin partial heatmap rows into a day-by-hour grid.
+
+    Rows carry ``day``, ``hour``, ``count`` and the sums and counts of cost
+    and response time. Rows for the same cell, such as one per monthly
+    partition, are merged. Returns the occupied ``cells`` (day, hour, count,
+    average cost, average response time) in day/hour order, and the busiest
+    ``peak_hour`` and ``peak_day`` (lowest on ties, ``None`` without rows).
+    """
+    fields = ("count", "costSum", "costCount", "durationSum", "durationCount")
+    grid = np.zeros((len(fields), *HEATMAP_SHAPE))
+    if rows:
+        days = np.fromiter((r["day"] for r in rows), dtype=int)
+        hours = np.fromiter((r["hour"] for r in rows), dtype=int)
+        for i, field in enumerate(fields):
+            values = np.fromiter((r.get(field) or 0 for r in rows), dtype=float)
+            np.add.at(grid[i], (days, hours), values)
+    counts = grid[0]
+    occupied = np.argwhere(counts > 0)
+    cells = [
+        (int(d), int(h), *(float(grid[i, d, h]) for i in range(len(fields))))
+        for d, h in occupied
+    ]
+    by_hour, by_day = counts.sum(axis=0), counts.sum(axis=1)
+    has_rows = bool(occupied.size)
+    peak_hour = int(by_hour.argmax()) if has_rows else None
+    peak_day = int(by_day.argmax()) if has_rows else None
+
+    return {
+        "cells": [
+            {
+                "day": d,
+                "hour": h,
+                "count": int(count),
+                "avg_cost": cost_sum / cost_count if cost_count else None,
+                "avg_response_time": (
+                    duration_sum / duration_count if duration_count else None
+                ),
+            }
+            for d, h, count, cost_sum, cost_count, duration_sum, duration_count in cells
+        ],
+        "peak_hour": peak_hour,
+        "peak_day": peak_day,
+    }
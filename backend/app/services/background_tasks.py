@@ -1,13 +1,18 @@
 """Background tasks for periodic operations."""
 
 import asyncio
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.core.logging import get_logger
+from app.services.ingest_queue import get_ingest_queue, stop_ingest_queue
+from app.services.partition_snapshot import PartitionSnapshotStore
 from app.services.rate_limit_usage_service import RateLimitUsageService
+from app.services.stats_snapshot import StatsSnapshotService
+from app.services.storage_metrics import STORAGE_JOB_ID, StorageMetricsService
+from app.services.summary_queue import stop_summary_queue
 
 logger = get_logger(__name__)
 
@@ -33,6 +38,9 @@ class BackgroundTaskManager:
         # Start individual tasks
         self.tasks.append(asyncio.create_task(self._rate_limit_cleanup_task()))
         self.tasks.append(asyncio.create_task(self._metrics_flush_task()))
+        self.tasks.append(asyncio.create_task(self._stats_reconcile_task()))
+        self.tasks.append(asyncio.create_task(self._storage_recalculation_task()))
+        self.tasks.append(asyncio.create_task(self._partition_snapshot_task()))
 
         logger.info(f"Started {len(self.tasks)} background tasks")
 
@@ -119,6 +127,84 @@ class BackgroundTaskManager:
                 # Continue running even if flush fails
                 await asyncio.sleep(flush_interval)
 
+    async def _stats_reconcile_task(self) -> None:
+        """Periodically reconcile the admin statistics snapshots."""
+        reconcile_interval = 900  # Reconcile every 15 minutes
+
+        while self._running:
+            try:
+                # Reconcile on startup too, so the first admin request after a
+                # deploy reads a fresh snapshot
+                service = StatsSnapshotService(self.db)
+                result = await service.reconcile()
+                logger.info(
+                    "Statistics snapshot reconciled "
+                    f"({result['users_reconciled']} users recomputed)"
+                )
+
+                await asyncio.sleep(reconcile_interval)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in stats reconcile task: {e}", exc_info=True)
+                await asyncio.sleep(reconcile_interval)
+
+    async def _storage_recalculation_task(self) -> None:
+        """Recompute every user's storage daily, resuming interrupted runs."""
+        while self._running:
+            try:
+                service = StorageMetricsService(self.db)
+
+                # A checkpoint left by a restart mid-run is resumed immediately
+                unfinished = await self.db.storage_jobs.find_one(
+                    {"_id": STORAGE_JOB_ID, "status": "running"}
+                )
+                if unfinished is None:
+                    # Run once per day at 4 AM, after rate limit cleanup
+                    now = datetime.now(timezone.utc)
+                    next_run = now.replace(hour=4, minute=0, second=0, microsecond=0)
+                    if now >= next_run:
+                        next_run += timedelta(days=1)
+
+                    await asyncio.sleep((next_run - now).total_seconds())
+
+                    if not self._running:
+                        break
+
+                logger.info("Starting storage recalculation for all users")
+                result = await service.batch_update_all_users(resume=True)
+                logger.info(
+                    "Storage recalculation completed. "
+                    f"Updated {result['users_updated']} users"
+                )
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in storage recalculation task: {e}", exc_info=True)
+                # Wait 1 hour before retrying; progress is checkpointed
+                await asyncio.sleep(3600)
+
+    async def _partition_snapshot_task(self) -> None:
+        """Periodically snapshot closed monthly message collections."""
+        snapshot_interval = 3600  # Check every hour
+
+        while self._running:
+            try:
+                # Rebuilds snapshots outdated by late writes as well as new months
+                built = await PartitionSnapshotStore(self.db).refresh()
+                if built:
+                    logger.info(f"Built partition snapshots: {', '.join(built)}")
+
+                await asyncio.sleep(snapshot_interval)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in partition snapshot task: {e}", exc_info=True)
+                await asyncio.sleep(snapshot_interval)
+
 
 # Global task manager instance
 _task_manager: Optional[BackgroundTaskManager] = None
@@ -132,6 +218,9 @@ async def start_background_tasks(db: AsyncIOMotorDatabase) -> None:
         _task_manager = BackgroundTaskManager(db)
         await _task_manager.start()
 
+    # Drain ingest batches accepted before the last shutdown
+    get_ingest_queue(db).start()
+
 
 async def stop_background_tasks() -> None:
     """Stop background tasks."""
@@ -140,3 +229,6 @@ async def stop_background_tasks() -> None:
     if _task_manager is not None:
         await _task_manager.stop()
         _task_manager = None
+
+    await stop_ingest_queue()
+    await stop_summary_queue()
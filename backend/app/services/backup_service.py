@@ -415,21 +415,16 @@ class BackupService:
 
         # ALWAYS filter by user_id if provided
         if user_id:
-            # For collections that have user_id directly
-            if collection_name in ["projects", "sessions", "prompts", "ai_settings"]:
+            # Every backed-up collection carries user_id directly; sessions and
+            # messages have it denormalized at ingest
+            if collection_name in [
+                "projects",
+                "sessions",
+                "messages",
+                "prompts",
+                "ai_settings",
+            ]:
                 query["user_id"] = ObjectId(user_id)
-            # For messages, need to filter by sessions belonging to user
-            elif collection_name == "messages":
-                # Get user's session IDs
-                user_sessions = await self.db.sessions.find(
-                    {"user_id": ObjectId(user_id)}, {"sessionId": 1}
-                ).to_list(None)
-                session_ids = [s["sessionId"] for s in user_sessions]
-                if session_ids:
-                    query["sessionId"] = {"$in": session_ids}
-                else:
-                    # No sessions for this user, return impossible query
-                    query["_id"] = {"$exists": False}
 
         if not filters:
             return query
@@ -449,17 +444,8 @@ class BackupService:
         # Project filters
         if filters.projects and collection_name in ["sessions", "messages"]:
             project_ids = [ObjectId(pid) for pid in filters.projects]
-            if collection_name == "sessions":
-                query["projectId"] = {"$in": project_ids}
-            elif collection_name == "messages":
-                # Find sessions in projects first
-                session_ids = []
-                async for session in self.db.sessions.find(
-                    {"projectId": {"$in": project_ids}}, {"sessionId": 1}
-                ):
-                    session_ids.append(session["sessionId"])
-                if session_ids:
-                    query["sessionId"] = {"$in": session_ids}
+            # Both sessions and messages carry a denormalized projectId
+            query["projectId"] = {"$in": project_ids}
 
         # Session filters
         if filters.sessions and collection_name == "messages":
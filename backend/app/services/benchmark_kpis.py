@@ -0,0 +1,198 @@
+"""Single-pass KPI engine for performance benchmarks.
+
+Each benchmarked entity gets one ``$facet`` branch that groups its messages
+by session, so a single aggregation per monthly partition yields the counts
+behind all five KPIs for every entity. A session can span partitions, so the
+partials are merged per session before any session average is taken; the
+KPIs are then scored from the merged totals.
+"""
+
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping
+
+from app.schemas.analytics import NormalizationMethod
+from app.services.analytics_kernels import min_max, rank_fractions, z_scores
+
+
+def _array_size(field: str) -> Dict[str, Any]:
+    """Length of an array field, 0 when it is missing or not an array."""
+    return {"$cond": [{"$isArray": field}, {"$size": field}, 0]}
+
+
+# Per-session counts behind every KPI; all of them merge by summing except
+# ``sidechain``, which merges by max
+SESSION_PARTIALS: Dict[str, Any] = {
+    "messages": {"$sum": 1},
+    "cost": {"$sum": {"$cond": [{"$gt": ["$cost", 0]}, "$cost", 0]}},
+    # Costed messages with an explicitly empty error list
+    "successful": {
+        "$sum": {
+            "$cond": [
+                {"$and": [{"$gt": ["$cost", 0]}, {"$eq": ["$errors", []]}]},
+                1,
+                0,
+            ]
+        }
+    },
+    "duration": {"$sum": {"$cond": [{"$gt": ["$durationMs", 0]}, "$durationMs", 0]}},
+    "timed": {"$sum": {"$cond": [{"$gt": ["$durationMs", 0]}, 1, 0]}},
+    "errored": {"$sum": {"$cond": [{"$gt": [_array_size("$errors"), 0]}, 1, 0]}},
+    "tools": {"$sum": _array_size("$tools")},
+    "depth": {"$sum": {"$ifNull": ["$conversationDepth", 1]}},
+    "sidechain": {"$max": {"$cond": [{"$eq": ["$isSidechain", True]}, 1, 0]}},
+}
+
+RAW_METRIC_KEYS = [
+    "cost_efficiency_raw",
+    "speed_score_raw",
+    "quality_score_raw",
+    "productivity_score_raw",
+    "complexity_handling_raw",
+]
+
+
+def facet_key(index: int) -> str:
+    """Name of the ``$facet`` branch of the entity at ``index``."""
+    return f"entity_{index}"
+
+
+def kpi_pipeline(
+    match: Dict[str, Any], entity_filters: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Pipeline computing session partials for every entity in one pass."""
+    return [
+        {"$match": match},
+        {
+            "$facet": {
+                facet_key(i): [
+                    {"$match": entity_filter},
+                    {"$group": {"_id": "$sessionId", **SESSION_PARTIALS}},
+                ]
+                for i, entity_filter in enumerate(entity_filters)
+            }
+        },
+    ]
+
+
+def merge_partials(
+    results: Iterable[Mapping[str, List[Dict[str, Any]]]], entity_count: int
+) -> List[Dict[str, Dict[str, float]]]:
+    """Merge per-partition facet results into per-entity session totals."""
+    merged: List[Dict[str, Dict[str, float]]] = [
+        defaultdict(lambda: dict.fromkeys(SESSION_PARTIALS, 0))
+        for _ in range(entity_count)
+    ]
+    for result in results:
+        for i in range(entity_count):
+            for row in result.get(facet_key(i), []):
+                totals = merged[i][row["_id"]]
+                for key in SESSION_PARTIALS:
+                    value = row.get(key) or 0
+                    if key == "sidechain":
+                        totals[key] = max(totals[key], value)
+                    else:
+                        totals[key] += value
+    return [dict(sessions) for sessions in merged]
+
+
+def cost_efficiency(total_cost: float, successful: float) -> float:
+    """Successful operations per dollar, scaled by 100 (higher is better)."""
+    if total_cost == 0:
+        return 0.0
+    return float(successful / total_cost * 100)
+
+
+def speed_score(avg_duration_ms: float) -> float:
+    """Inverse log scale of the average response time: 1s scores 100."""
+    duration_seconds = avg_duration_ms / 1000
+    if duration_seconds <= 0:
+        return 100.0
+    score = max(0.0, 100.0 - (math.log10(duration_seconds) * 20.0))
+    return float(min(100.0, score))
+
+
+def quality_score(total_messages: float, error_messages: float) -> float:
+    """Share of messages without errors, as 0-100."""
+    if total_messages == 0:
+        return 100.0  # Perfect score if no data
+    error_rate = error_messages / total_messages
+    return float(max(0.0, (1 - error_rate) * 100))
+
+
+def productivity_score(
+    avg_messages_per_session: float, avg_tools_per_session: float
+) -> float:
+    """Weighted combination of messages and tool calls per session."""
+    messages_score = min(100.0, avg_messages_per_session * 2.0)
+    tools_score = min(100.0, avg_tools_per_session * 5.0)
+    return float(min(100.0, messages_score * 0.6 + tools_score * 0.4))
+
+
+def complexity_handling(
+    avg_session_depth: float, sidechain_share: float, avg_session_length: float
+) -> float:
+    """Weighted combination of depth, sidechain use and session length."""
+    depth_score = min(100.0, avg_session_depth * 10.0)
+    branch_score = sidechain_share * 100.0
+    length_score = min(100.0, avg_session_length * 3.0)
+    score = depth_score * 0.4 + branch_score * 0.3 + length_score * 0.3
+    return float(min(100.0, score))
+
+
+def entity_kpis(sessions: Mapping[str, Mapping[str, float]]) -> Dict[str, float]:
+    """Score the five raw KPIs of one entity from its merged session totals."""
+    totals = dict.fromkeys(SESSION_PARTIALS, 0.0)
+    for partial in sessions.values():
+        for key in SESSION_PARTIALS:
+            totals[key] += partial[key]
+    count = len(sessions)
+
+    if count == 0:
+        # Neutral scores without sessions
+        productivity = complexity = 50.0
+    else:
+        productivity = productivity_score(
+            totals["messages"] / count, totals["tools"] / count
+        )
+        complexity = complexity_handling(
+            sum(p["depth"] / p["messages"] for p in sessions.values()) / count,
+            totals["sidechain"] / count,
+            totals["messages"] / count,
+        )
+
+    return {
+        "cost_efficiency_raw": cost_efficiency(totals["cost"], totals["successful"]),
+        "speed_score_raw": (
+            speed_score(totals["duration"] / totals["timed"])
+            if totals["timed"]
+            else 50.0  # Neutral score
+        ),
+        "quality_score_raw": quality_score(totals["messages"], totals["errored"]),
+        "productivity_score_raw": productivity,
+        "complexity_handling_raw": complexity,
+    }
+
+
+def normalize_column(values: List[float], method: NormalizationMethod) -> List[float]:
+    """Normalize one metric across all entities to a 0-100 scale."""
+    if method == NormalizationMethod.Z_SCORE:
+        scores = z_scores(values)
+        if scores is None:
+            return [50.0] * len(values)  # Neutral if no variation
+        # Convert z-scores to 0-100 (z-scores typically range -3 to +3)
+        return [max(0, min(100, 50 + (z * 15))) for z in scores]
+
+    if method == NormalizationMethod.MIN_MAX:
+        scaled = min_max(values)
+        if scaled is None:
+            return [50.0] * len(values)  # Neutral if no variation
+        return [min(max(s * 100, 0.0), 100.0) for s in scaled]
+
+    # PERCENTILE_RANK: ties take the rank of the first equal value
+    return [min(max(r * 100, 0.0), 100.0) for r in rank_fractions(values, "min")]
+
+
+def percentile_ranks(values: List[float]) -> List[float]:
+    """Share of entities scoring at or below each value, as 0-100."""
+    return [r * 100 for r in rank_fractions(values, "max")]
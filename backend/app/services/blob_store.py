@@ -0,0 +1,262 @@
+"""Content-addressed storage for large message fields."""
+
+import hashlib
+import zlib
+from collections import Counter
+from datetime import UTC, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import bson
+from bson import Binary
+from motor.motor_asyncio import (
+    AsyncIOMotorClientSession,
+    AsyncIOMotorCollection,
+    AsyncIOMotorDatabase,
+)
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+zstd: Optional[Any] = None
+try:
+    import zstandard as zstd
+except ImportError:
+    pass
+
+logger = get_logger(__name__)
+
+# Message fields that may be moved out of the document
+BLOB_FIELDS = ("toolUseResult", "messageData", "thinking")
+
+# Holds the plain text of externalized fields, keyed by field, for search
+SEARCH_TEXT_FIELD = "searchText"
+
+# Bounds of the inline preview left in place of an externalized field
+PREVIEW_CHARS = 256
+PREVIEW_ITEMS = 8
+PREVIEW_KEYS = 32
+PREVIEW_DEPTH = 2
+
+_DROP = object()
+
+
+def _preview(value: Any, depth: int = 0) -> Any:
+    """Bounded copy of a value that keeps its shape and small scalars.
+
+    Strings are truncated and containers are cut to a few entries, so
+    queries on fields such as ``messageData.name`` or ``toolUseResult.exitCode``
+    still match the inline document.
+    """
+    if isinstance(value, str):
+        return value[:PREVIEW_CHARS]
+    if isinstance(value, dict):
+        if depth >= PREVIEW_DEPTH:
+            return _DROP
+        preview = {}
+        for key in list(value)[:PREVIEW_KEYS]:
+            item = _preview(value[key], depth + 1)
+            if item is not _DROP:
+                preview[key] = item
+        return preview
+    if isinstance(value, list):
+        if depth >= PREVIEW_DEPTH:
+            return _DROP
+        items = (_preview(v, depth + 1) for v in value[:PREVIEW_ITEMS])
+        return [item for item in items if item is not _DROP]
+    return value
+
+
+def _text_of(value: Any) -> str:
+    """The string leaves of a value, one per line."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        parts = (_text_of(v) for v in value.values())
+    elif isinstance(value, list):
+        parts = (_text_of(v) for v in value)
+    else:
+        return ""
+    return "\n".join(part for part in parts if part)
+
+
+class BlobStore:
+    """Store large message fields once in the ``blobs`` collection.
+
+    Fields above the size threshold are encoded as BSON, keyed by the SHA-256
+    of that encoding and compressed with zstd, so identical file reads or
+    command outputs repeated across sessions are stored once. The message
+    keeps a short preview of the field and ``blobRefs.<field>`` pointing at
+    the blob; readers that need the full value call ``hydrate``. Queries on
+    the field see the preview; its full text is kept uncompressed in
+    ``searchText.<field>`` so text and regex searches still match it.
+
+    Blobs carry a reference count. Writers acquire a reference for every
+    message that points at a blob and release it when the message is
+    deleted or replaced; blobs are removed when their count reaches zero.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        threshold: Optional[int] = None,
+        fields: Sequence[str] = BLOB_FIELDS,
+    ):
+        self.db = db
+        self.threshold = (
+            settings.BLOB_THRESHOLD_BYTES if threshold is None else threshold
+        )
+        self.fields = fields
+
+    @property
+    def collection(self) -> AsyncIOMotorCollection:
+        return self.db.blobs
+
+    async def externalize(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """Move large fields of message documents into the blob store.
+
+        Documents are modified in place and hold a reference to their blobs
+        from here on; callers ``release`` the references of documents they
+        then fail to write. Returns the number of fields moved.
+        """
+        payloads: Dict[str, bytes] = {}
+        refs: Counter[str] = Counter()
+
+        for doc in docs:
+            for field in self.fields:
+                value = doc.get(field)
+                if value is None or isinstance(value, (bool, int, float)):
+                    continue
+                # Skip encoding strings that cannot reach the threshold even
+                # at four UTF-8 bytes per character
+                if isinstance(value, str) and len(value) < self.threshold // 4:
+                    continue
+
+                raw = bson.encode({"v": value})
+                if len(raw) < self.threshold:
+                    continue
+
+                digest = hashlib.sha256(raw).hexdigest()
+                payloads[digest] = raw
+                refs[digest] += 1
+                doc[field] = _preview(value)
+                doc.setdefault("blobRefs", {})[field] = digest
+                doc.setdefault(SEARCH_TEXT_FIELD, {})[field] = _text_of(value)
+
+        if not refs:
+            return 0
+
+        now = datetime.now(UTC)
+        operations = []
+        for digest, count in refs.items():
+            raw = payloads[digest]
+            codec, data = self._compress(raw)
+            operations.append(
+                UpdateOne(
+                    {"_id": digest},
+                    {
+                        "$setOnInsert": {
+                            "data": Binary(data),
+                            "codec": codec,
+                            "size": len(raw),
+                            "storedSize": len(data),
+                            "createdAt": now,
+                        },
+                        "$inc": {"refCount": count},
+                    },
+                    upsert=True,
+                )
+            )
+        await self.collection.bulk_write(operations, ordered=False)
+        return sum(refs.values())
+
+    async def hydrate(
+        self,
+        docs: List[Dict[str, Any]],
+        fields: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Replace previews with their full values, in place.
+
+        Only ``fields`` are loaded (all externalized fields by default), with
+        one query for the whole batch.
+        """
+        wanted = set(fields or self.fields)
+        digests = {
+            digest
+            for doc in docs
+            for field, digest in (doc.get("blobRefs") or {}).items()
+            if field in wanted
+        }
+        if not digests:
+            return docs
+
+        values: Dict[str, Any] = {}
+        async for blob in self.collection.find(
+            {"_id": {"$in": list(digests)}}, {"data": 1, "codec": 1}
+        ):
+            raw = self._decompress(blob["codec"], bytes(blob["data"]))
+            values[blob["_id"]] = bson.decode(raw)["v"]
+
+        for doc in docs:
+            refs = doc.get("blobRefs")
+            if not refs:
+                continue
+            search_text = doc.get(SEARCH_TEXT_FIELD) or {}
+            for field in [f for f in refs if f in wanted]:
+                digest = refs[field]
+                if digest in values:
+                    doc[field] = values[digest]
+                    del refs[field]
+                    search_text.pop(field, None)
+                else:
+                    logger.warning(f"Missing blob {digest} for {field}")
+            if not refs:
+                del doc["blobRefs"]
+            if SEARCH_TEXT_FIELD in doc and not search_text:
+                del doc[SEARCH_TEXT_FIELD]
+        return docs
+
+    async def release(
+        self,
+        refs: Counter[str],
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> None:
+        """Drop references and delete blobs nobody points at any more."""
+        if not refs:
+            return
+        await self.collection.bulk_write(
+            [
+                UpdateOne({"_id": digest}, {"$inc": {"refCount": -count}})
+                for digest, count in refs.items()
+            ],
+            ordered=False,
+            session=session,
+        )
+        await self.collection.delete_many(
+            {"_id": {"$in": list(refs)}, "refCount": {"$lte": 0}},
+            session=session,
+        )
+
+    @staticmethod
+    def refs_of(docs: Iterable[Dict[str, Any]]) -> Counter[str]:
+        """Count the blob references held by message documents."""
+        refs: Counter[str] = Counter()
+        for doc in docs:
+            refs.update((doc.get("blobRefs") or {}).values())
+        return refs
+
+    @staticmethod
+    def _compress(raw: bytes) -> tuple[str, bytes]:
+        if zstd is not None:
+            return "zstd", zstd.ZstdCompressor(level=3).compress(raw)
+        return "zlib", zlib.compress(raw)
+
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> bytes:
+        if codec == "zstd":
+            if zstd is None:
+                raise ImportError(
+                    "zstandard library is not installed. Run: pip install zstandard"
+                )
+            return bytes(zstd.ZstdDecompressor().decompress(data))
+        return zlib.decompress(data)
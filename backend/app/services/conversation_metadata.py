@@ -0,0 +1,239 @@
+"""Conversation tree metadata maintained on message documents at ingest.
+
+Every message carries its ``depth`` (roots are 1), the ``rootUuid`` of its
+tree, its ``childCount`` and ``isBranchPoint``. Sessions carry the deepest
+message and the number of branch points, so depth analytics aggregate over
+sessions instead of rebuilding every conversation tree in memory.
+
+Messages can arrive before their parent, for instance when a sync uploads a
+later file first. Such a message is annotated as the root of its own subtree
+and marked ``treePending``; when the parent arrives, ``settle`` attaches the
+subtree by shifting every message that has the pending message as its root.
+"""
+
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from app.core.logging import get_logger
+from app.services.conversation_tree import TREE_PROJECTION, ConversationTree
+from app.services.rolling_message_service import RollingMessageService
+
+logger = get_logger(__name__)
+
+# Session fields derived from the annotated messages, merged by
+# merge_depth_stats; also feeds the success rate of depth analytics
+SESSION_DEPTH_STATS: Dict[str, Any] = {
+    "maxDepth": {"$max": "$depth"},
+    "branchCount": {"$sum": {"$cond": [{"$eq": ["$isBranchPoint", True]}, 1, 0]}},
+    "totalDurationMs": {"$sum": "$durationMs"},
+    "userMessageCount": {"$sum": {"$cond": [{"$eq": ["$type", "user"]}, 1, 0]}},
+    "respondedCount": {
+        "$sum": {
+            "$cond": [
+                {"$and": [{"$eq": ["$type", "assistant"]}, {"$gt": ["$cost", 0]}]},
+                1,
+                0,
+            ]
+        }
+    },
+}
+
+_POSITION = {"_id": 0, "uuid": 1, "depth": 1, "rootUuid": 1}
+
+
+def merge_depth_stats(partials: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Combine per-collection ``SESSION_DEPTH_STATS`` results."""
+    merged = {key: 0 for key in SESSION_DEPTH_STATS}
+    for partial in partials:
+        for key in SESSION_DEPTH_STATS:
+            value = partial.get(key) or 0
+            if key == "maxDepth":
+                merged[key] = max(merged[key], value)
+            else:
+                merged[key] += value
+    return merged
+
+
+def _branch_update(increment: int) -> List[Dict[str, Any]]:
+    """Pipeline update adding children to a message."""
+    return [
+        {
+            "$set": {
+                "childCount": {"$add": [{"$ifNull": ["$childCount", 0]}, increment]}
+            }
+        },
+        {"$set": {"isBranchPoint": {"$gt": ["$childCount", 1]}}},
+    ]
+
+
+class ConversationMetadata:
+    """Annotate and repair tree metadata for the messages of a session."""
+
+    def __init__(self, rolling_service: RollingMessageService):
+        self.rolling_service = rolling_service
+
+    async def annotate(
+        self, session_id: str, docs: List[Dict[str, Any]]
+    ) -> Counter[str]:
+        """Stamp tree metadata onto new message documents, in place.
+
+        Parents are looked up in the batch first and then with one query.
+        Returns how many children each already stored parent gained; pass it
+        to ``settle`` once the documents are written.
+        """
+        by_uuid = {doc["uuid"]: doc for doc in docs}
+        external = {
+            doc["parentUuid"]
+            for doc in docs
+            if doc.get("parentUuid") and doc["parentUuid"] not in by_uuid
+        }
+        known: Dict[str, Dict[str, Any]] = {}
+        if external:
+            rows = await self.rolling_service.find_session_messages(
+                session_id,
+                extra_filter={"uuid": {"$in": list(external)}},
+                projection=_POSITION,
+            )
+            known = {row["uuid"]: row for row in rows if "depth" in row}
+
+        for doc in docs:
+            # Walk up through unannotated batch messages to a known position
+            path: List[Dict[str, Any]] = []
+            on_path: set[str] = set()
+            current = doc
+            depth, root = 0, None
+            while True:
+                if "depth" in current:
+                    depth, root = current["depth"], current["rootUuid"]
+                    break
+                path.append(current)
+                on_path.add(current["uuid"])
+                parent_uuid = current.get("parentUuid")
+                if parent_uuid in by_uuid and parent_uuid not in on_path:
+                    current = by_uuid[parent_uuid]
+                    continue
+                if parent_uuid in known:
+                    depth = known[parent_uuid]["depth"]
+                    root = known[parent_uuid]["rootUuid"]
+                elif parent_uuid is not None and parent_uuid not in by_uuid:
+                    # Parent not stored yet; attached later by settle
+                    current["treePending"] = True
+                break
+
+            for node in reversed(path):
+                depth += 1
+                node["depth"] = depth
+                node["rootUuid"] = root = root or node["uuid"]
+
+        children = Counter(d["parentUuid"] for d in docs if d.get("parentUuid"))
+        for doc in docs:
+            doc["childCount"] = children.get(doc["uuid"], 0)
+            doc["isBranchPoint"] = doc["childCount"] > 1
+
+        return Counter({uuid: children[uuid] for uuid in known})
+
+    async def settle(
+        self, session_id: str, gained: Counter[str], docs: List[Dict[str, Any]]
+    ) -> int:
+        """Finish an ingest batch once its documents are written.
+
+        Adds the children stored parents gained, then attaches pending
+        subtrees whose parent arrived in this batch. Returns the number of
+        subtrees attached.
+        """
+        by_increment: Dict[int, List[str]] = defaultdict(list)
+        for uuid, increment in gained.items():
+            by_increment[increment].append(uuid)
+        for increment, uuids in by_increment.items():
+            await self.rolling_service.update_session_messages(
+                session_id, {"uuid": {"$in": uuids}}, _branch_update(increment)
+            )
+
+        pending = await self.rolling_service.find_session_messages(
+            session_id,
+            extra_filter={
+                "treePending": True,
+                "parentUuid": {"$in": [doc["uuid"] for doc in docs]},
+            },
+            projection={"_id": 0, "uuid": 1, "parentUuid": 1},
+        )
+        for orphan in pending:
+            # Read the parent each time: attaching one subtree can move
+            # the parent of the next
+            parents = await self.rolling_service.find_session_messages(
+                session_id,
+                extra_filter={"uuid": orphan["parentUuid"]},
+                projection=_POSITION,
+            )
+            if not parents or "depth" not in parents[0]:
+                continue
+            parent = parents[0]
+            await self.rolling_service.update_session_messages(
+                session_id,
+                {"rootUuid": orphan["uuid"]},
+                [
+                    {
+                        "$set": {
+                            "depth": {"$add": ["$depth", parent["depth"]]},
+                            "rootUuid": parent["rootUuid"],
+                        }
+                    }
+                ],
+            )
+            await self.rolling_service.update_session_messages(
+                session_id, {"uuid": orphan["uuid"]}, {"$unset": {"treePending": ""}}
+            )
+            await self.rolling_service.update_session_messages(
+                session_id, {"uuid": parent["uuid"]}, _branch_update(1)
+            )
+
+        return len(pending)
+
+    async def rebuild(self, session_id: str) -> Optional[Dict[str, int]]:
+        """Recompute the metadata of a whole session from its parent links.
+
+        Used after overwriting messages and by the backfill migration.
+        Returns the session's ``maxDepth`` and ``branchCount``, or ``None``
+        for a session without messages.
+        """
+        messages = await self.rolling_service.find_session_messages(
+            session_id, projection=TREE_PROJECTION
+        )
+        if not messages:
+            return None
+
+        tree = ConversationTree(messages)
+        depths = tree.depths()
+        roots: Dict[str, str] = {}
+        branch_count = 0
+        operations: Dict[str, List[UpdateOne]] = defaultdict(list)
+        for uuid in sorted(tree.nodes, key=lambda u: depths.get(u, 1)):
+            message = tree.nodes[uuid]
+            parent_uuid = message.get("parentUuid")
+            roots[uuid] = (parent_uuid and roots.get(parent_uuid)) or uuid
+            child_count = len(tree.children.get(uuid, []))
+            branch_count += child_count > 1
+            update: Dict[str, Any] = {
+                "$set": {
+                    "depth": depths.get(uuid, 1),
+                    "rootUuid": roots[uuid],
+                    "childCount": child_count,
+                    "isBranchPoint": child_count > 1,
+                }
+            }
+            if parent_uuid is not None and parent_uuid not in tree:
+                update["$set"]["treePending"] = True
+            else:
+                update["$unset"] = {"treePending": ""}
+            coll_name = self.rolling_service.get_message_collection_name(message)
+            operations[coll_name].append(UpdateOne({"uuid": uuid}, update))
+
+        for coll_name, ops in operations.items():
+            await self.rolling_service.db[coll_name].bulk_write(ops, ordered=False)
+
+        return {
+            "maxDepth": max(depths.values(), default=0),
+            "branchCount": branch_count,
+        }
@@ -0,0 +1,162 @@
+"""In-memory conversation tree built from a session's parent links."""
+
+from typing import Any, Iterable
+
+# Fields needed to build a tree; fetch only these before hydrating content
+TREE_PROJECTION: dict[str, Any] = {
+    "_id": 0,
+    "uuid": 1,
+    "parentUuid": 1,
+    "isSidechain": 1,
+    "timestamp": 1,
+}
+
+
+class ConversationTree:
+    """Parent/child index over the messages of a single session.
+
+    Built from one fetch of the session's messages so that ancestor and
+    descendant walks, depths and branch metrics need no further database
+    round trips. All traversals are iterative, so deep agentic threads cannot
+    hit Python's recursion limit.
+    """
+
+    def __init__(self, messages: Iterable[dict[str, Any]]):
+        self.nodes: dict[str, dict[str, Any]] = {}
+        self.children: dict[str, list[str]] = {}
+        self.roots: list[str] = []
+
+        for msg in messages:
+            uuid = msg.get("uuid")
+            if uuid:
+                self.nodes[uuid] = msg
+
+        # Children keep input order, so callers that pass messages sorted by
+        # timestamp get chronologically ordered siblings
+        for uuid, msg in self.nodes.items():
+            parent_uuid = msg.get("parentUuid")
+            if parent_uuid is None:
+                self.roots.append(uuid)
+            else:
+                self.children.setdefault(parent_uuid, []).append(uuid)
+
+    def __contains__(self, uuid: object) -> bool:
+        return uuid in self.nodes
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def ancestors(self, uuid: str, max_depth: int) -> list[str]:
+        """Return up to ``max_depth`` ancestors of a message, oldest first."""
+        ancestors: list[str] = []
+        seen = {uuid}
+        current = self.nodes.get(uuid, {}).get("parentUuid")
+        while current and len(ancestors) < max_depth:
+            if current not in self.nodes or current in seen:
+                break
+            seen.add(current)
+            ancestors.append(current)
+            current = self.nodes[current].get("parentUuid")
+
+        ancestors.reverse()
+        return ancestors
+
+    def descendants(self, uuid: str, max_depth: int) -> list[str]:
+        """Return descendants up to ``max_depth`` levels below a message.
+
+        Results are in depth-first pre-order: each child is followed by its
+        own descendants before its next sibling.
+        """
+        descendants: list[str] = []
+        seen = {uuid}
+        stack = [(child, 1) for child in reversed(self.children.get(uuid, []))]
+        while stack:
+            node, depth = stack.pop()
+            if depth > max_depth or node in seen:
+                continue
+            seen.add(node)
+            descendants.append(node)
+            stack.extend(
+                (child, depth + 1) for child in reversed(self.children.get(node, []))
+            )
+
+        return descendants
+
+    def depths(self, include_sidechains: bool = True) -> dict[str, int]:
+        """Calculate the depth of every message (roots are depth 1).
+
+        Messages whose parent is missing from the session count as roots.
+        Sidechain messages get depth 0 when ``include_sidechains`` is False,
+        and their descendants continue counting from there.
+        """
+        depths: dict[str, int] = {}
+
+        for start in self.nodes:
+            if start in depths:
+                continue
+
+            # Walk up until a known depth, a root or a missing parent
+            path: list[str] = []
+            on_path: set[str] = set()
+            current: str | None = start
+            base = 0
+            while current is not None:
+                if current in depths:
+                    base = depths[current]
+                    break
+                message = self.nodes.get(current)
+                if message is None or current in on_path:
+                    break
+                if not include_sidechains and message.get("isSidechain", False):
+                    depths[current] = 0
+                    break
+                path.append(current)
+                on_path.add(current)
+                current = message.get("parentUuid")
+
+            # Unwind from the topmost unresolved message down to the start
+            for node in reversed(path):
+                base += 1
+                depths[node] = base
+
+        return depths
+
+    def subtree_depth(self, uuid: str) -> int:
+        """Return the number of levels below a message (0 for a leaf)."""
+        max_depth = 0
+        seen = {uuid}
+        stack = [(uuid, 0)]
+        while stack:
+            node, depth = stack.pop()
+            max_depth = max(max_depth, depth)
+            for child in self.children.get(node, []):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append((child, depth + 1))
+
+        return max_depth
+
+    def max_depth(self) -> int:
+        """Return the deepest root-to-leaf distance across all roots."""
+        return max((self.subtree_depth(root) for root in self.roots), default=0)
+
+    def branch_count(self) -> int:
+        """Count messages with more than one child."""
+        return sum(1 for kids in self.children.values() if len(kids) > 1)
+
+    def branch_lengths(self) -> list[int]:
+        """Return the root-to-leaf length of every branch."""
+        lengths: list[int] = []
+        for root in self.roots:
+            seen = {root}
+            stack = [(root, 0)]
+            while stack:
+                node, length = stack.pop()
+                kids = [c for c in self.children.get(node, []) if c not in seen]
+                if not kids:
+                    lengths.append(length)
+                    continue
+                seen.update(kids)
+                stack.extend((child, length + 1) for child in kids)
+
+        return lengths
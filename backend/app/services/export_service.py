@@ -12,6 +12,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from app.core.logging import get_logger
 from app.models.export_job import ExportJob
 from app.services.file_service import FileService
+from app.services.message_repository import MessageRepository
 
 logger = get_logger(__name__)
 
@@ -94,6 +95,7 @@ class ExportService:
         """Initialize the export service."""
         self.db = db
         self.file_service = FileService()
+        self.messages = MessageRepository(db)
 
     async def create_export_job(
         self,
@@ -332,9 +334,9 @@ class ExportService:
                 first = False
 
                 # Include messages for each session
-                messages = await self.db.messages.find(
-                    {"sessionId": session.get("sessionId")}
-                ).to_list(length=None)
+                messages = await self.messages.find(
+                    {"sessionId": session.get("sessionId")}, "list"
+                )
 
                 # Convert totalCost from Decimal128 to float if needed
                 total_cost = session.get("totalCost", 0.0)
@@ -427,8 +429,8 @@ class ExportService:
 
             for session in sessions:
                 # Get first message for model info
-                first_message = await self.db.messages.find_one(
-                    {"sessionId": session.get("sessionId")}
+                first_message = await self.messages.find_first(
+                    {"sessionId": session.get("sessionId")}, {"model": 1}
                 )
 
                 # Convert totalCost from Decimal128 to float if needed
@@ -520,13 +522,11 @@ class ExportService:
             # Messages
             yield b"### Conversation\n\n"
 
-            messages = (
-                await self.db.messages.find({"sessionId": session.get("sessionId")})
-                .sort("timestamp", 1)
-                .to_list(None)
+            messages = self.messages.stream(
+                {"sessionId": session.get("sessionId")}, "list"
             )
 
-            for msg in messages:
+            async for msg in messages:
                 role = msg.get("userType", "unknown")
                 timestamp = msg.get("timestamp")
 
@@ -617,12 +617,9 @@ class ExportService:
                     continue
 
                 # Get messages for this session
-                messages = (
-                    await self.db.messages.find(
-                        {"sessionId": session.get("sessionId", str(session["_id"]))}
-                    )
-                    .sort("timestamp", 1)
-                    .to_list(None)
+                messages = await self.messages.find(
+                    {"sessionId": session.get("sessionId", str(session["_id"]))},
+                    "list",
                 )
 
                 html_parts.append(
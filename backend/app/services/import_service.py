@@ -10,6 +10,9 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.core.logging import get_logger
 from app.services.file_service import FileService
+from app.services.message_caches import invalidate_deleted_messages
+from app.services.message_repository import MessageRepository
+from app.services.token_fields import stamp_canonical_fields
 
 logger = get_logger(__name__)
 
@@ -53,6 +56,7 @@ class ImportService:
         """Initialize the import service."""
         self.db = db
         self.file_service = FileService()
+        self.messages = MessageRepository(db)
 
     async def validate_import_file(
         self,
@@ -650,8 +654,13 @@ class ImportService:
 
                 # Replace messages
                 if session_id:
-                    await self.db.messages.delete_many({"sessionId": session_id})
-                    await self._import_messages(conversation, session_id, field_mapping)
+                    if await self.messages.delete_many({"sessionId": session_id}):
+                        await invalidate_deleted_messages(
+                            self.db, {"sessionId": session_id}
+                        )
+                    await self._import_messages(
+                        conversation, session_id, field_mapping, existing
+                    )
 
                 return "replaced"
             elif strategy == "merge":
@@ -669,7 +678,9 @@ class ImportService:
 
             # Import messages
             new_session_id = session_id if session_id else str(result.inserted_id)
-            await self._import_messages(conversation, new_session_id, field_mapping)
+            await self._import_messages(
+                conversation, new_session_id, field_mapping, session_data
+            )
 
             return "imported"
 
@@ -707,6 +718,8 @@ class ImportService:
             ),
             "messageCount": len(conv.get("messages", [])),
             "totalCost": total_cost,
+            # Filled in as messages are written to the monthly collections
+            "partitions": [],
             "createdAt": datetime.now(UTC),
             "updatedAt": datetime.now(UTC),
         }
@@ -718,34 +731,51 @@ class ImportService:
         return session_data
 
     async def _import_messages(
-        self, conv: Dict, session_id: str, field_mapping: Dict
+        self,
+        conv: Dict,
+        session_id: str,
+        field_mapping: Dict,
+        session: Optional[Dict] = None,
     ) -> None:
-        """Import messages for a conversation."""
+        """Import messages for a conversation.
+
+        Tenant fields of ``session`` are stamped onto each message, matching
+        what ingest writes.
+        """
         messages = conv.get(field_mapping.get("messages", "messages"), [])
 
         if not messages:
             return
 
+        tenant = {
+            field: session[field]
+            for field in ("user_id", "projectId")
+            if session and session.get(field)
+        }
+
         # Prepare bulk operations
         operations = []
         for msg in messages:
-            operations.append(
-                {
-                    "sessionId": session_id,
-                    "uuid": msg.get("id", str(ObjectId())),
-                    "type": msg.get("type", "unknown"),
-                    "userType": msg.get("type"),
-                    "timestamp": datetime.fromisoformat(
-                        msg.get("timestamp", datetime.now(UTC).isoformat()).replace(
-                            "Z", "+00:00"
-                        )
-                    ),
-                    "message": {"text": msg.get("content", "")},
-                    "model": msg.get("model"),
-                    "costUsd": msg.get("costUsd", msg.get("cost_usd")),
-                    "createdAt": datetime.now(UTC),
-                }
-            )
+            doc: Dict[str, Any] = {
+                "sessionId": session_id,
+                "uuid": msg.get("id", str(ObjectId())),
+                "type": msg.get("type", "unknown"),
+                "userType": msg.get("type"),
+                "timestamp": datetime.fromisoformat(
+                    msg.get("timestamp", datetime.now(UTC).isoformat()).replace(
+                        "Z", "+00:00"
+                    )
+                ),
+                "message": {"text": msg.get("content", "")},
+                "model": msg.get("model"),
+                "costUsd": msg.get("costUsd", msg.get("cost_usd")),
+                "createdAt": datetime.now(UTC),
+                **tenant,
+            }
+            if isinstance(msg.get("usage"), dict):
+                doc["usage"] = msg["usage"]
+            stamp_canonical_fields(doc)
+            operations.append(doc)
 
         if operations:
-            await self.db.messages.insert_many(operations)
+            await self.messages.insert_many(operations)
@@ -4,17 +4,34 @@ import asyncio
 import hashlib
 import json
 import logging
+from collections import Counter
 from datetime import UTC, datetime
+from decimal import Decimal
 from typing import Any
 
+import bson
 from bson import Decimal128, ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from pymongo import ReplaceOne
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from app.schemas.ingest import IngestStats, MessageIngest
+from app.services.blob_store import BlobStore
+from app.services.conversation_metadata import (
+    SESSION_DEPTH_STATS,
+    ConversationMetadata,
+    merge_depth_stats,
+)
 from app.services.cost_calculation import CostCalculationService
+from app.services.ingest_cache import get_resolution_cache
 from app.services.realtime_integration import get_integration_service
+from app.services.request_coalescer import get_request_coalescer
 from app.services.rolling_message_service import RollingMessageService
+from app.services.stats_snapshot import StatsSnapshotService, empty_storage_delta
+from app.services.summary_queue import get_summary_queue
+from app.services.token_fields import stamp_canonical_fields
+from app.services.tool_errors import error_fields
+from app.services.topic_extraction import SessionTopicStore
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +42,18 @@ class IngestService:
     def __init__(self, db: AsyncIOMotorDatabase, user_id: str):
         self.db = db
         self.user_id = user_id
-        self._project_cache: dict[str, ObjectId] = {}
-        self._session_cache: dict[str, ObjectId] = {}
+        # Session and project ids are resolved through a process-wide cache
+        # because a new service is created for every request
+        self._resolutions = get_resolution_cache()
+        # Maps "<user_id>:<sessionId>" to the owning project's _id so every
+        # message document can be stamped with its tenant at write time
+        self._session_projects: dict[str, ObjectId] = {}
+        # Counts and BSON sizes of documents written by the current batch,
+        # applied to the admin storage snapshots once the batch completes
+        self._storage_delta = empty_storage_delta()
         self.rolling_service = RollingMessageService(db)
+        self.tree_metadata = ConversationMetadata(self.rolling_service)
+        self.blob_store = BlobStore(db)
 
     async def ingest_messages(
         self, messages: list[MessageIngest], overwrite_mode: bool = False
@@ -86,6 +112,13 @@ class IngestService:
             f"({stats.duration_ms}ms)"
         )
 
+        # Apply storage deltas to the admin snapshots
+        delta, self._storage_delta = self._storage_delta, empty_storage_delta()
+        await StatsSnapshotService(self.db).record_ingest(self.user_id, delta)
+
+        # Dashboards reloaded after a sync should not see memoized results
+        get_request_coalescer().discard_user(str(self.user_id))
+
         # Log ingestion
         await self._log_ingestion(stats)
 
@@ -136,6 +169,7 @@ class IngestService:
                 # Convert to database model(s)
                 try:
                     message_docs = self._message_to_doc(message, session_id)
+                    self._stamp_ownership(message_docs, session_id)
                     new_messages.extend(message_docs)  # Extend instead of append
                     if not overwrite_mode:
                         existing_hashes.add(self._hash_message(message))
@@ -145,6 +179,47 @@ class IngestService:
 
             # Bulk insert/update messages
             if new_messages:
+                # Record target collections first so session-scoped reads
+                # never miss a partition that is being written
+                await self.rolling_service.record_session_partitions(
+                    session_id,
+                    {
+                        self.rolling_service.get_message_collection_name(m)
+                        for m in new_messages
+                    },
+                )
+
+                # Messages being replaced may hold blob references that the
+                # new documents no longer need
+                replaced: list[dict] = []
+                if overwrite_mode:
+                    replaced, _ = await self.rolling_service.find_messages(
+                        {
+                            "sessionId": session_id,
+                            "uuid": {"$in": [m["uuid"] for m in new_messages]},
+                            "blobRefs": {"$exists": True},
+                        },
+                        limit=len(new_messages),
+                        projection={"uuid": 1, "blobRefs": 1, "timestamp": 1},
+                    )
+                    replaced_uuids = {m["uuid"] for m in replaced}
+                    for msg in new_messages:
+                        if msg["uuid"] in replaced_uuids:
+                            # Clear stale references the $set would keep
+                            msg.setdefault("blobRefs", {})
+
+                await self._stamp_tool_names(new_messages, session_id)
+
+                # Overwrites may move messages within the tree, so those
+                # sessions are rebuilt once written
+                gained: Counter[str] = Counter()
+                if not overwrite_mode:
+                    gained = await self.tree_metadata.annotate(session_id, new_messages)
+
+                # Large tool results, payloads and thinking go to the blob
+                # store before the documents are written
+                await self.blob_store.externalize(new_messages)
+
                 if overwrite_mode:
                     # Use bulk write with upserts
                     operations = []
@@ -159,9 +234,13 @@ class IngestService:
                             )
                         )
 
+                    # Documents not written give back the blob references
+                    # externalize took for them
+                    unwritten: list[dict] = []
+                    done = 0
                     try:
                         # Process operations one by one for rolling collections
-                        for op in operations:
+                        for msg, op in zip(new_messages, operations):
                             if hasattr(op, "_doc"):
                                 doc = op._doc
                                 if hasattr(op, "_filter"):  # ReplaceOne
@@ -170,9 +249,16 @@ class IngestService:
                                     )
                                     if success:
                                         stats.messages_updated += 1
+                                    else:
+                                        unwritten.append(msg)
                                 else:  # InsertOne
                                     await self.rolling_service.insert_message(dict(doc))
                                     stats.messages_processed += 1
+                            done += 1
+
+                        await self.blob_store.release(
+                            BlobStore.refs_of(replaced) + BlobStore.refs_of(unwritten)
+                        )
 
                         # Trigger real-time updates for new/updated messages
                         if stats.messages_processed > 0 or stats.messages_updated > 0:
@@ -188,6 +274,7 @@ class IngestService:
                                     )
                     except Exception as e:
                         logger.error(f"MongoDB bulk write failed: {e}")
+                        await self._release_blobs(unwritten + new_messages[done:])
                         stats.messages_failed += len(new_messages)
                         # Add error detail for the response
                         error_msg = (
@@ -203,6 +290,7 @@ class IngestService:
                         inserted_count = 0
                         for msg in new_messages:
                             await self.rolling_service.insert_message(msg)
+                            self._track_storage("messages", msg)
                             stats.messages_processed += 1
                             inserted_count += 1
 
@@ -220,6 +308,7 @@ class IngestService:
                                     )
                     except Exception as e:
                         logger.error(f"MongoDB insert failed: {e}")
+                        await self._release_blobs(new_messages[inserted_count:])
                         stats.messages_failed += len(new_messages)
                         # Add error detail for the response
                         error_msg = f"Insert failed for session {session_id}: {str(e)}"
@@ -227,6 +316,14 @@ class IngestService:
                             stats.error_details.append(error_msg)
                         return
 
+                if overwrite_mode:
+                    await self.tree_metadata.rebuild(session_id)
+                    # Replaced messages keep their createdAt, so the topic
+                    # watermark would never pick up their new content
+                    await SessionTopicStore(self.db).invalidate(session_id)
+                else:
+                    await self.tree_metadata.settle(session_id, gained, new_messages)
+
                 # Update session statistics and summary if found
                 await self._update_session_stats(session_id, session_summary)
 
@@ -237,22 +334,38 @@ class IngestService:
     async def _ensure_session(
         self, session_id: str, first_message: MessageIngest
     ) -> ObjectId | None:
-        """Ensure session exists, create if needed."""
-        # Check cache first - include user_id in cache key
+        """Ensure session exists, create if needed.
+
+        Returns the new session's ``_id`` if this call created it, otherwise
+        None.
+        """
         cache_key = f"{self.user_id}:{session_id}"
-        if cache_key in self._session_cache:
+        cached = self._resolutions.sessions.get((self.user_id, session_id))
+        if cached is not None:
+            self._session_projects[cache_key] = cached[1]
             return None
 
+        user_oid = ObjectId(self.user_id)
+
         # Check database - find session by ID and verify project ownership
-        existing = await self.db.sessions.find_one({"sessionId": session_id})
+        existing = await self.db.sessions.find_one(
+            {"sessionId": session_id}, {"projectId": 1, "user_id": 1}
+        )
         if existing:
-            # Verify the project belongs to this user
+            if existing.get("user_id") == user_oid:
+                self._remember_session(session_id, existing)
+                return None
+
+            # Sessions created before tenant fields were written at ingest
+            # have no user_id; ownership is defined by the project
             project = await self.db.projects.find_one(
-                {"_id": existing["projectId"], "user_id": ObjectId(self.user_id)}
+                {"_id": existing["projectId"], "user_id": user_oid}, {"_id": 1}
             )
             if project:
-                # Session exists and belongs to this user's project
-                self._session_cache[cache_key] = existing["_id"]
+                await self.db.sessions.update_one(
+                    {"_id": existing["_id"]}, {"$set": {"user_id": user_oid}}
+                )
+                self._remember_session(session_id, existing)
                 return None
             # Session exists but belongs to another user's project
             # Continue to create a new session for this user
@@ -289,48 +402,44 @@ class IngestService:
         effective_path = project_path or first_message.cwd or "unknown"
         project_id = await self._ensure_project(effective_path, project_name)
 
-        # Create session (without user_id - ownership through project)
+        # Create session. Ownership is defined by the project; user_id is a
+        # denormalized copy so reads can filter by tenant directly.
         session_doc = {
             "_id": ObjectId(),
-            # No user_id - ownership inherited from project
+            "user_id": user_oid,
             "sessionId": session_id,
             "projectId": project_id,
             "startedAt": first_message.timestamp,
             "endedAt": first_message.timestamp,
             "messageCount": 0,
             "totalCost": Decimal128("0.0"),  # MongoDB expects Decimal128, not float
+            # Monthly message collections this session spans
+            "partitions": [],
             "createdAt": datetime.now(UTC),
             "updatedAt": datetime.now(UTC),
         }
 
-        await self.db.sessions.insert_one(session_doc)
+        # Upsert so concurrent batches for the same session agree on one
+        # document instead of racing a find with an insert
+        session = await self._upsert(self.db.sessions, session_doc, "sessionId")
+        self._remember_session(session_id, session)
+        if session["_id"] != session_doc["_id"]:
+            return None
+
+        self._track_storage("sessions", session_doc)
         session_id_obj = session_doc["_id"]
         assert isinstance(session_id_obj, ObjectId)
-        self._session_cache[cache_key] = session_id_obj
-
         return session_id_obj
 
     async def _ensure_project(self, project_path: str, project_name: str) -> ObjectId:
         """Ensure project exists, create if needed."""
-        # Check cache first - include user_id in cache key
-        cache_key = f"{self.user_id}:{project_path}"
-        if cache_key in self._project_cache:
-            return self._project_cache[cache_key]
-
-        # Check database - filter by user_id
-        existing = await self.db.projects.find_one(
-            {"path": project_path, "user_id": ObjectId(self.user_id)}
-        )
-        if existing:
-            self._project_cache[cache_key] = existing["_id"]
-            project_id = existing["_id"]
-            assert isinstance(project_id, ObjectId)
-            return project_id
+        cached = self._resolutions.projects.get((self.user_id, project_path))
+        if cached is not None:
+            return cached
 
-        # Create project with user_id
         project_doc = {
             "_id": ObjectId(),
-            "user_id": ObjectId(self.user_id),  # Add user_id
+            "user_id": ObjectId(self.user_id),
             "name": project_name,
             "path": project_path,
             "createdAt": datetime.now(UTC),
@@ -338,13 +447,56 @@ class IngestService:
             "stats": {"message_count": 0, "session_count": 0},
         }
 
-        await self.db.projects.insert_one(project_doc)
-        project_id = project_doc["_id"]
+        project = await self._upsert(self.db.projects, project_doc, "path")
+        project_id = project["_id"]
         assert isinstance(project_id, ObjectId)
-        self._project_cache[cache_key] = project_id
+        if project_id == project_doc["_id"]:
+            self._track_storage("projects", project_doc)
+        self._resolutions.projects.set((self.user_id, project_path), project_id)
 
         return project_id
 
+    async def _upsert(self, collection: Any, doc: dict, key: str) -> dict:
+        """Atomically return the user's document matching ``doc[key]``.
+
+        ``doc`` is inserted if no such document exists; callers compare the
+        returned ``_id`` with ``doc["_id"]`` to tell whether it was created.
+
+        The unique index is on ``key`` alone, so MongoDB does not retry an
+        upsert that lost the insert race on it; the winner is re-read
+        instead. A key held by another user still raises.
+        """
+        query = {key: doc[key], "user_id": doc["user_id"]}
+        projection = {"_id": 1, "projectId": 1}
+        try:
+            result: dict = await collection.find_one_and_update(
+                query,
+                {"$setOnInsert": {k: v for k, v in doc.items() if k not in query}},
+                projection=projection,
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            existing = await collection.find_one(query, projection)
+            if existing is None:
+                raise
+            return dict(existing)
+        return result
+
+    async def _release_blobs(self, docs: list[dict]) -> None:
+        """Give back the blob references of documents that were not written."""
+        try:
+            await self.blob_store.release(BlobStore.refs_of(docs))
+        except Exception as e:
+            logger.warning(f"Failed to release blob references: {e}")
+
+    def _remember_session(self, session_id: str, session: dict) -> None:
+        """Cache a resolved session and its project for this user."""
+        self._resolutions.sessions.set(
+            (self.user_id, session_id), (session["_id"], session["projectId"])
+        )
+        self._session_projects[f"{self.user_id}:{session_id}"] = session["projectId"]
+
     async def _get_existing_hashes(self, session_id: str) -> set[str]:
         """Get existing message hashes for a session."""
         # Get existing message hashes from rolling collections
@@ -352,6 +504,7 @@ class IngestService:
             {"sessionId": session_id},
             skip=0,
             limit=10000,  # Reasonable limit for hash checking
+            projection={"_id": 0, "contentHash": 1, "timestamp": 1},
         )
         hashes = set()
         for doc in docs:
@@ -359,6 +512,54 @@ class IngestService:
                 hashes.add(doc["contentHash"])
         return hashes
 
+    def _track_storage(self, kind: str, doc: dict) -> None:
+        """Count a newly written document towards the storage snapshots."""
+        self._storage_delta[kind]["count"] += 1
+        self._storage_delta[kind]["bytes"] += len(bson.encode(doc))
+
+    def _stamp_ownership(self, docs: list[dict], session_id: str) -> None:
+        """Stamp denormalized tenant fields onto message documents.
+
+        Ownership is still defined by the session -> project -> user chain;
+        these copies let readers filter by ``user_id``/``projectId`` directly
+        instead of expanding a user's sessions into a ``$in`` list.
+        """
+        user_oid = ObjectId(self.user_id)
+        project_id = self._session_projects.get(f"{self.user_id}:{session_id}")
+        for doc in docs:
+            doc["user_id"] = user_oid
+            if project_id is not None:
+                doc["projectId"] = project_id
+
+    async def _stamp_tool_names(self, docs: list[dict], session_id: str) -> None:
+        """Copy the tool name from each tool_use onto its tool_result.
+
+        Tool uses in the same batch are matched directly; the rest are
+        looked up in one query, as the result usually arrives in the batch
+        after its tool use.
+        """
+        results = [d for d in docs if d.get("type") == "tool_result"]
+        if not results:
+            return
+
+        names = {
+            d["uuid"]: d["messageData"].get("name")
+            for d in docs
+            if d.get("type") == "tool_use" and isinstance(d.get("messageData"), dict)
+        }
+        missing = list({d["parentUuid"] for d in results} - names.keys())
+        if missing:
+            parents = await self.rolling_service.find_session_messages(
+                session_id,
+                extra_filter={"uuid": {"$in": missing}},
+                projection={"_id": 0, "uuid": 1, "messageData.name": 1},
+            )
+            for parent in parents:
+                names[parent["uuid"]] = (parent.get("messageData") or {}).get("name")
+
+        for doc in results:
+            doc["toolName"] = names.get(doc["parentUuid"]) or "unknown"
+
     def _hash_message(self, message: MessageIngest) -> str:
         """Generate hash for message deduplication."""
         # Create deterministic string representation
@@ -410,7 +611,7 @@ class IngestService:
                 # Always create the main assistant message, even if it's empty
                 main_doc = {
                     "_id": ObjectId(),
-                    # No user_id - ownership inherited from session's project
+                    # user_id/projectId are stamped in _stamp_ownership
                     "uuid": message.uuid,
                     "sessionId": session_id,
                     "type": "assistant",
@@ -516,7 +717,7 @@ class IngestService:
                     tool_uuid = f"{message.uuid}_tool_{i}"
                     tool_doc = {
                         "_id": ObjectId(),
-                        # No user_id - ownership inherited from session's project
+                        # user_id/projectId are stamped in _stamp_ownership
                         "uuid": tool_uuid,
                         "sessionId": session_id,
                         "type": "tool_use",
@@ -558,7 +759,7 @@ class IngestService:
                 # Always create main user message
                 main_doc = {
                     "_id": ObjectId(),
-                    # No user_id - ownership inherited from session's project
+                    # user_id/projectId are stamped in _stamp_ownership
                     "uuid": message.uuid,
                     "sessionId": session_id,
                     "type": "user",
@@ -596,7 +797,7 @@ class IngestService:
                     parent_tool_uuid = f"{message.parentUuid}_tool_{i}"
                     result_doc = {
                         "_id": ObjectId(),
-                        # No user_id - ownership inherited from session's project
+                        # user_id/projectId are stamped in _stamp_ownership
                         "uuid": result_uuid,
                         "sessionId": session_id,
                         "type": "tool_result",
@@ -621,6 +822,7 @@ class IngestService:
 
                     # Add optional fields (but exclude costUsd for tool result messages)
                     self._add_optional_fields(result_doc, message, exclude_cost=True)
+                    result_doc.update(error_fields(result_doc))
                     docs.append(result_doc)
 
                 return docs
@@ -632,7 +834,7 @@ class IngestService:
         """Create a default document using the original logic."""
         doc = {
             "_id": ObjectId(),
-            # No user_id - ownership inherited from session's project
+            # user_id/projectId are stamped in _stamp_ownership
             "uuid": message.uuid,
             "sessionId": session_id,
             "type": message.type,
@@ -810,6 +1012,11 @@ class IngestService:
         if message.extra_fields:
             doc["metadata"] = message.extra_fields
 
+        # Canonical token counts and numeric cost; tool messages are counted
+        # on the assistant message they were split from
+        if not exclude_cost:
+            stamp_canonical_fields(doc)
+
     async def _update_session_stats(
         self, session_id: str, summary: str | None = None
     ) -> None:
@@ -821,39 +1028,12 @@ class IngestService:
                 "$group": {
                     "_id": None,
                     "messageCount": {"$sum": 1},
-                    "totalCost": {"$sum": {"$ifNull": ["$costUsd", 0]}},
-                    # Aggregate input tokens from all possible fields
+                    "totalCost": {"$sum": "$cost"},
+                    # Input includes cache writes and reads
                     "inputTokens": {
-                        "$sum": {
-                            "$add": [
-                                {"$ifNull": ["$tokensInput", 0]},
-                                {"$ifNull": ["$inputTokens", 0]},
-                                {"$ifNull": ["$metadata.usage.input_tokens", 0]},
-                                {
-                                    "$ifNull": [
-                                        "$metadata.usage.cache_creation_input_tokens",
-                                        0,
-                                    ]
-                                },
-                                {
-                                    "$ifNull": [
-                                        "$metadata.usage.cache_read_input_tokens",
-                                        0,
-                                    ]
-                                },
-                            ]
-                        }
-                    },
-                    # Aggregate output tokens from all possible fields
-                    "outputTokens": {
-                        "$sum": {
-                            "$add": [
-                                {"$ifNull": ["$tokensOutput", 0]},
-                                {"$ifNull": ["$outputTokens", 0]},
-                                {"$ifNull": ["$metadata.usage.output_tokens", 0]},
-                            ]
-                        }
+                        "$sum": {"$subtract": ["$tokens.total", "$tokens.output"]}
                     },
+                    "outputTokens": {"$sum": "$tokens.output"},
                     # Count tool usage from both tool_use messages and tool_calls array
                     "toolUseCount": {
                         "$sum": {
@@ -873,21 +1053,16 @@ class IngestService:
                     },
                     "startTime": {"$min": "$timestamp"},
                     "endTime": {"$max": "$timestamp"},
+                    **SESSION_DEPTH_STATS,
                 }
             },
         ]
 
-        # Use rolling service for aggregation
-        from datetime import timedelta
-
-        end_date = datetime.now(UTC)
-        start_date = end_date - timedelta(days=365)  # Look back 1 year
-        result = await self.rolling_service.aggregate_across_collections(
-            pipeline, start_date, end_date
-        )
+        # Each collection the session spans returns a partial group
+        partials = await self.rolling_service.aggregate_session(session_id, pipeline)
 
-        if result:
-            stats = result[0]
+        if partials:
+            stats = self._merge_session_stats(partials)
             # Build update data
             update_data = {
                 "messageCount": stats["messageCount"],
@@ -901,6 +1076,7 @@ class IngestService:
                 "toolsUsed": stats.get("toolUseCount", 0),
                 "startedAt": stats["startTime"],
                 "endedAt": stats["endTime"],
+                **merge_depth_stats(partials),
                 "updatedAt": datetime.now(UTC),
             }
 
@@ -933,15 +1109,37 @@ class IngestService:
                             {"$set": {"summary": message_with_summary["summary"]}},
                         )
                     else:
-                        # Fallback to generating summary
-                        from .session import SessionService
-
-                        session_service = SessionService(self.db)
-                        # Use the user_id from self instead of from session
-                        await session_service.generate_summary(
+                        # Fallback to generating a summary in the background so
+                        # long sessions don't stall the ingest request
+                        get_summary_queue(self.db).enqueue(
                             self.user_id, str(session["_id"])
                         )
 
+    @staticmethod
+    def _merge_session_stats(partials: list[dict]) -> dict[str, Any]:
+        """Combine per-collection session stats into one result."""
+        merged: dict[str, Any] = {
+            "messageCount": 0,
+            "totalCost": Decimal("0"),
+            "inputTokens": 0,
+            "outputTokens": 0,
+            "toolUseCount": 0,
+            "startTime": None,
+            "endTime": None,
+        }
+        for partial in partials:
+            merged["messageCount"] += partial.get("messageCount", 0)
+            merged["totalCost"] += Decimal(str(partial.get("totalCost") or 0))
+            merged["inputTokens"] += partial.get("inputTokens", 0)
+            merged["outputTokens"] += partial.get("outputTokens", 0)
+            merged["toolUseCount"] += partial.get("toolUseCount", 0)
+            start, end = partial.get("startTime"), partial.get("endTime")
+            if start and (merged["startTime"] is None or start < merged["startTime"]):
+                merged["startTime"] = start
+            if end and (merged["endTime"] is None or end > merged["endTime"]):
+                merged["endTime"] = end
+        return merged
+
     async def _log_ingestion(self, stats: IngestStats) -> None:
         """Log ingestion statistics."""
         log_entry = {
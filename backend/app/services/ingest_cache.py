@@ -0,0 +1,95 @@
+"""Process-wide cache of session and project ids resolved during ingestion."""
+
+import time
+from collections import OrderedDict
+from typing import Generic, Optional, TypeVar
+
+from bson import ObjectId
+
+V = TypeVar("V")
+
+# Entries are dropped after this long so deletions or ownership changes made
+# by another process are eventually picked up
+DEFAULT_TTL_SECONDS = 600.0
+
+
+class LRUCache(Generic[V]):
+    """Bounded least-recently-used mapping keyed by ``(user_id, name)``."""
+
+    def __init__(self, maxsize: int, ttl: float = DEFAULT_TTL_SECONDS):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[tuple[str, str], tuple[float, V]] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: tuple[str, str], value: V) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard_user(self, user_id: str) -> None:
+        """Drop every entry whose key belongs to ``user_id``."""
+        for key in [k for k in self._data if k[0] == user_id]:
+            del self._data[key]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class IngestResolutionCache:
+    """Resolve ``(user, sessionId)`` and ``(user, path)`` without a query.
+
+    ``IngestService`` is created per request, so an instance-level cache never
+    survives to the next batch. This cache is shared by every ingest in the
+    process. Callers that delete or reassign sessions or projects must call
+    ``invalidate_user`` for the affected owners.
+    """
+
+    def __init__(self, maxsize: int = 50_000, ttl: float = DEFAULT_TTL_SECONDS):
+        # (user_id, sessionId) -> (session _id, project _id)
+        self.sessions: LRUCache[tuple[ObjectId, ObjectId]] = LRUCache(maxsize, ttl)
+        # (user_id, project path) -> project _id
+        self.projects: LRUCache[ObjectId] = LRUCache(maxsize, ttl)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Forget everything resolved for one user."""
+        self.sessions.discard_user(str(user_id))
+        self.projects.discard_user(str(user_id))
+
+    def clear(self) -> None:
+        self.sessions.clear()
+        self.projects.clear()
+
+
+# Global resolution cache instance
+_resolution_cache: Optional[IngestResolutionCache] = None
+
+
+def get_resolution_cache() -> IngestResolutionCache:
+    """Get or create the global ingest resolution cache."""
+    global _resolution_cache
+    if _resolution_cache is None:
+        _resolution_cache = IngestResolutionCache()
+    return _resolution_cache
+
+
+def invalidate_user_resolutions(*user_ids: str | ObjectId | None) -> None:
+    """Drop cached session/project ids for the given owners."""
+    cache = get_resolution_cache()
+    for user_id in user_ids:
+        if user_id is not None:
+            cache.invalidate_user(str(user_id))
@@ -0,0 +1,358 @@
+"""Durable write-behind queue for asynchronous ingestion."""
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from typing import Any, Optional
+
+import bson
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from app.core.logging import get_logger
+from app.schemas.ingest import IngestStats, MessageIngest
+from app.services.ingest_stream import merge_ingest_stats
+
+logger = get_logger(__name__)
+
+# Split a batch across queue documents so each stays well below 16MB
+QUEUE_DOC_MAX_BYTES = 8 * 1024 * 1024
+
+# A processing document whose lease is older than this is assumed abandoned
+# by a crashed worker and becomes claimable again. Workers renew the lease
+# of each claimed entry right before writing it.
+LEASE_SECONDS = 300
+
+# Completed and failed entries stay queryable for this long
+RETENTION_SECONDS = 24 * 3600
+
+
+def _message_to_queue_doc(message: MessageIngest) -> dict[str, Any]:
+    """Flatten a validated message back into its wire form."""
+    data = message.model_dump(mode="json", exclude={"extra_fields"}, exclude_none=True)
+    data.update(message.extra_fields)
+    return data
+
+
+class IngestQueue:
+    """Accept ingest batches immediately and write them in the background.
+
+    Batches are persisted in the ``ingest_queue`` collection before the
+    request returns, so accepted work survives a restart. Workers claim
+    entries with a lease, write entries of the same user together, and retry
+    failures with exponential backoff.
+
+    Progress is tracked per ticket; a ticket may span several queue documents
+    when a batch is too large for one.
+    """
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        workers: int = 2,
+        max_batch_messages: int = 1000,
+        max_attempts: int = 5,
+        poll_interval: float = 1.0,
+    ):
+        self.db = db
+        self.collection = db.ingest_queue
+        self._worker_count = workers
+        self.max_batch_messages = max_batch_messages
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    async def enqueue(
+        self,
+        user_id: str,
+        messages: list[MessageIngest],
+        overwrite_mode: bool = False,
+    ) -> str:
+        """Persist a batch and return its ticket."""
+        ticket = str(ObjectId())
+        now = datetime.now(UTC)
+
+        docs: list[dict[str, Any]] = []
+        chunk: list[dict[str, Any]] = []
+        chunk_bytes = 0
+        for message in messages:
+            data = _message_to_queue_doc(message)
+            size = len(bson.encode(data))
+            if chunk and chunk_bytes + size > QUEUE_DOC_MAX_BYTES:
+                docs.append(self._queue_doc(ticket, user_id, chunk, overwrite_mode))
+                chunk, chunk_bytes = [], 0
+            chunk.append(data)
+            chunk_bytes += size
+        if chunk:
+            docs.append(self._queue_doc(ticket, user_id, chunk, overwrite_mode))
+
+        for part, doc in enumerate(docs):
+            doc.update(part=part, parts=len(docs), created_at=now, available_at=now)
+
+        await self.collection.insert_many(docs)
+        self._wakeup.set()
+        self._ensure_workers()
+        return ticket
+
+    @staticmethod
+    def _queue_doc(
+        ticket: str,
+        user_id: str,
+        messages: list[dict[str, Any]],
+        overwrite_mode: bool,
+    ) -> dict[str, Any]:
+        return {
+            "ticket": ticket,
+            "user_id": user_id,
+            "overwrite_mode": overwrite_mode,
+            "messages": messages,
+            "message_count": len(messages),
+            "status": "queued",
+            "attempts": 0,
+        }
+
+    async def get_status(self, user_id: str, ticket: str) -> dict[str, Any] | None:
+        """Summarize the progress of a ticket for its owner."""
+        parts = await self.collection.find(
+            {"ticket": ticket, "user_id": user_id}, {"messages": 0}
+        ).to_list(None)
+        if not parts:
+            return None
+
+        statuses = {p["status"] for p in parts}
+        if "failed" in statuses:
+            status = "failed"
+        elif statuses == {"completed"}:
+            status = "completed"
+        elif statuses == {"queued"}:
+            status = "queued"
+        else:
+            status = "processing"
+
+        stats: dict[str, Any] = {}
+        for part in parts:
+            if part.get("stats"):
+                merge_ingest_stats(stats, part["stats"])
+
+        completed_at = [p["completed_at"] for p in parts if p.get("completed_at")]
+        return {
+            "ticket": ticket,
+            "status": status,
+            "messages_total": sum(p["message_count"] for p in parts),
+            "parts": len(parts),
+            "parts_completed": sum(1 for p in parts if p["status"] == "completed"),
+            "attempts": max(p.get("attempts", 0) for p in parts),
+            "stats": IngestStats(**stats) if stats else None,
+            "error": next(
+                (p["last_error"] for p in parts if p.get("last_error")), None
+            ),
+            "created_at": min(p["created_at"] for p in parts),
+            "completed_at": max(completed_at) if status == "completed" else None,
+        }
+
+    async def queue_depth(self) -> int:
+        """Number of queue documents waiting to be written."""
+        return await self.collection.count_documents(
+            {"status": {"$in": ["queued", "processing"]}}
+        )
+
+    def start(self) -> None:
+        """Start consumers, e.g. to drain entries left by a previous run."""
+        self._ensure_workers()
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks; claimed entries are retried after restart."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def _ensure_workers(self) -> None:
+        """Start worker tasks if none are running."""
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self._worker_count:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        """Drain the queue until cancelled."""
+        while True:
+            try:
+                processed = await self.process_next()
+            except Exception as e:
+                logger.error(f"Ingest queue worker error: {e}", exc_info=True)
+                processed = False
+
+            if not processed:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self, query: dict[str, Any]) -> dict[str, Any] | None:
+        """Atomically lease the oldest entry matching ``query``."""
+        now = datetime.now(UTC)
+        claimable = {
+            "$or": [
+                {"status": "queued", "available_at": {"$lte": now}},
+                {
+                    "status": "processing",
+                    "locked_at": {"$lt": now - timedelta(seconds=LEASE_SECONDS)},
+                },
+            ]
+        }
+        doc: dict[str, Any] | None = await self.collection.find_one_and_update(
+            {**query, **claimable},
+            {
+                "$set": {"status": "processing", "locked_at": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc
+
+    async def process_next(self) -> bool:
+        """Claim and write one batch of queued entries.
+
+        Entries of the same user are claimed together, up to
+        ``max_batch_messages``, and written through one ``IngestService`` so
+        project and session lookups are shared. Each entry keeps its own
+        stats and retry state. Returns False if nothing was claimable.
+        """
+        from app.services.ingest import IngestService
+
+        first = await self._claim({})
+        if first is None:
+            return False
+
+        claimed = [first]
+        total = first["message_count"]
+        while total < self.max_batch_messages:
+            more = await self._claim(
+                {
+                    "user_id": first["user_id"],
+                    "message_count": {"$lte": self.max_batch_messages - total},
+                }
+            )
+            if more is None:
+                break
+            claimed.append(more)
+            total += more["message_count"]
+
+        service = IngestService(self.db, first["user_id"])
+        for entry in claimed:
+            # Entries are written one at a time; the lease taken at claim
+            # time may have run out while earlier entries were written
+            if not await self._renew_lease(entry):
+                logger.warning(
+                    f"Lease on queued ingest {entry['ticket']} expired, skipping"
+                )
+                continue
+
+            try:
+                messages = [MessageIngest(**data) for data in entry["messages"]]
+                stats = await service.ingest_messages(
+                    messages, overwrite_mode=entry["overwrite_mode"]
+                )
+            except Exception as e:
+                logger.error(f"Queued ingest {entry['ticket']} failed: {e}")
+                await self._fail(entry, str(e))
+                continue
+
+            if stats.messages_failed:
+                # Written messages are skipped as duplicates on retry
+                error = "; ".join(stats.error_details) or (
+                    f"{stats.messages_failed} messages failed"
+                )
+                logger.error(f"Queued ingest {entry['ticket']} failed: {error}")
+                await self._fail(entry, error, stats)
+                continue
+
+            await self._complete(entry, stats)
+
+        return True
+
+    async def _renew_lease(self, entry: dict[str, Any]) -> bool:
+        """Extend the lease of a claimed entry before writing it.
+
+        Returns False if the lease already ran out and another worker has
+        claimed the entry since.
+        """
+        result = await self.collection.update_one(
+            {
+                "_id": entry["_id"],
+                "status": "processing",
+                "locked_at": entry.get("locked_at"),
+            },
+            {"$set": {"locked_at": datetime.now(UTC)}},
+        )
+        return bool(result.modified_count)
+
+    async def _complete(self, entry: dict[str, Any], stats: IngestStats) -> None:
+        """Record results and drop the payload of a written entry."""
+        now = datetime.now(UTC)
+        await self.collection.update_one(
+            {"_id": entry["_id"]},
+            {
+                "$set": {
+                    "status": "completed",
+                    "stats": stats.model_dump(),
+                    "completed_at": now,
+                    "expires_at": now + timedelta(seconds=RETENTION_SECONDS),
+                },
+                "$unset": {"messages": "", "locked_at": ""},
+            },
+        )
+
+    async def _fail(
+        self,
+        entry: dict[str, Any],
+        error: str,
+        stats: Optional[IngestStats] = None,
+    ) -> None:
+        """Schedule a retry with backoff, or give up after max attempts."""
+        now = datetime.now(UTC)
+        if entry["attempts"] >= self.max_attempts:
+            update: dict[str, Any] = {
+                "$set": {
+                    "status": "failed",
+                    "last_error": error,
+                    "completed_at": now,
+                    "expires_at": now + timedelta(seconds=RETENTION_SECONDS),
+                },
+                "$unset": {"locked_at": ""},
+            }
+            if stats is not None:
+                update["$set"]["stats"] = stats.model_dump()
+        else:
+            update = {
+                "$set": {
+                    "status": "queued",
+                    "last_error": error,
+                    "available_at": now + timedelta(seconds=2 ** entry["attempts"]),
+                },
+                "$unset": {"locked_at": ""},
+            }
+        await self.collection.update_one({"_id": entry["_id"]}, update)
+
+
+# Global ingest queue instance
+_ingest_queue: Optional[IngestQueue] = None
+
+
+def get_ingest_queue(db: AsyncIOMotorDatabase) -> IngestQueue:
+    """Get or create the global ingest queue."""
+    global _ingest_queue
+    if _ingest_queue is None:
+        _ingest_queue = IngestQueue(db)
+    return _ingest_queue
+
+
+async def stop_ingest_queue() -> None:
+    """Stop the global ingest queue workers."""
+    global _ingest_queue
+    if _ingest_queue is not None:
+        await _ingest_queue.stop()
+        _ingest_queue = None
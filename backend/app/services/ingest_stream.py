@@ -0,0 +1,181 @@
+"""Incremental decoding of streamed NDJSON ingest bodies."""
+
+import zlib
+from collections.abc import AsyncIterator
+from typing import TYPE_CHECKING, Any, Protocol
+
+from pydantic import ValidationError as PydanticValidationError
+
+from app.core.logging import get_logger
+from app.schemas.ingest import MessageIngest
+
+if TYPE_CHECKING:
+    from app.services.ingest import IngestService
+
+logger = get_logger(__name__)
+
+# Refuse a single line larger than this; MongoDB documents cap at 16MB
+MAX_LINE_BYTES = 32 * 1024 * 1024
+
+SUPPORTED_ENCODINGS = ("identity", "gzip", "zstd")
+
+
+class _Decompressor(Protocol):
+    def decompress(self, data: bytes) -> bytes:
+        ...
+
+
+class NDJSONDecoder:
+    """Decompress and split an NDJSON body as chunks arrive.
+
+    Only the current partial line is buffered, so memory stays bounded by the
+    largest message rather than the whole upload.
+    """
+
+    def __init__(self, content_encoding: str | None = None):
+        encoding = (content_encoding or "identity").strip().lower()
+        self.encoding = encoding
+        self._decompressor: _Decompressor | None = None
+
+        if encoding == "gzip":
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == "zstd":
+            try:
+                import zstandard as zstd
+            except ImportError:
+                raise ValueError("zstd content encoding is not available")
+            self._decompressor = zstd.ZstdDecompressor().decompressobj()
+        elif encoding != "identity":
+            raise ValueError(
+                f"Unsupported content encoding '{encoding}'. "
+                f"Supported: {', '.join(SUPPORTED_ENCODINGS)}"
+            )
+
+        # Pieces of the current partial line, joined once its newline arrives
+        self._pending: list[bytes] = []
+        self._pending_size = 0
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Add a raw body chunk and return the lines it completed."""
+        if self._decompressor is not None:
+            try:
+                chunk = self._decompressor.decompress(chunk)
+            except Exception as e:
+                raise ValueError(f"Invalid {self.encoding} data: {e}") from e
+
+        self._pending.append(chunk)
+        self._pending_size += len(chunk)
+
+        if b"\n" in chunk:
+            *lines, tail = b"".join(self._pending).split(b"\n")
+            self._pending = [tail]
+            self._pending_size = len(tail)
+        else:
+            lines = []
+
+        # The unterminated tail is the only thing kept between calls
+        if self._pending_size > MAX_LINE_BYTES:
+            raise ValueError(f"Line exceeds maximum size of {MAX_LINE_BYTES} bytes")
+
+        return [line for line in lines if line.strip()]
+
+    def close(self) -> list[bytes]:
+        """Return the final line if the body did not end with a newline."""
+        line = b"".join(self._pending)
+        self._pending = []
+        self._pending_size = 0
+        return [line] if line.strip() else []
+
+
+def merge_ingest_stats(total: dict[str, Any], batch: dict[str, Any]) -> None:
+    """Accumulate one micro-batch's ``IngestStats`` dump into ``total``."""
+    for key, value in batch.items():
+        if isinstance(value, bool):
+            total[key] = total.get(key, False) or value
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+        elif isinstance(value, list):
+            total.setdefault(key, []).extend(value)
+
+
+async def ingest_ndjson(
+    ingest_service: "IngestService",
+    chunks: AsyncIterator[bytes],
+    decoder: NDJSONDecoder,
+    batch_size: int = 100,
+    overwrite_mode: bool = False,
+) -> AsyncIterator[dict[str, Any]]:
+    """Validate and ingest an NDJSON stream in micro-batches.
+
+    Yields status records as the stream is consumed: an ``invalid`` record for
+    each line that fails to parse or validate, a ``batch`` record with the line
+    range and stats of each written micro-batch, an ``error`` record if the
+    body itself is corrupt, and a final ``summary`` record. Line numbers are
+    1-based and count non-empty lines.
+    """
+    totals: dict[str, Any] = {}
+    batch: list[MessageIngest] = []
+    batch_lines: list[int] = []
+    line_number = 0
+
+    async def write_batch() -> dict[str, Any]:
+        record: dict[str, Any] = {
+            "type": "batch",
+            "first_line": batch_lines[0],
+            "last_line": batch_lines[-1],
+            "messages": len(batch),
+        }
+        try:
+            stats = await ingest_service.ingest_messages(
+                list(batch), overwrite_mode=overwrite_mode
+            )
+            batch_stats = stats.model_dump()
+            merge_ingest_stats(totals, batch_stats)
+            record["stats"] = batch_stats
+        except Exception as e:
+            logger.error(f"Stream micro-batch failed: {e}", exc_info=True)
+            merge_ingest_stats(
+                totals, {"messages_received": len(batch), "messages_failed": len(batch)}
+            )
+            record["error"] = str(e)
+        batch.clear()
+        batch_lines.clear()
+        return record
+
+    def parse(line: bytes) -> dict[str, Any] | None:
+        nonlocal line_number
+        line_number += 1
+        try:
+            batch.append(MessageIngest.model_validate_json(line))
+            batch_lines.append(line_number)
+            return None
+        except PydanticValidationError as e:
+            merge_ingest_stats(totals, {"messages_received": 1, "messages_failed": 1})
+            return {
+                "type": "invalid",
+                "line": line_number,
+                "error": e.errors(
+                    include_url=False, include_context=False, include_input=False
+                ),
+            }
+
+    try:
+        async for chunk in chunks:
+            for line in decoder.feed(chunk):
+                invalid = parse(line)
+                if invalid:
+                    yield invalid
+                if len(batch) >= batch_size:
+                    yield await write_batch()
+        for line in decoder.close():
+            invalid = parse(line)
+            if invalid:
+                yield invalid
+    except ValueError as e:
+        # Corrupt or oversized body; keep what was already written
+        yield {"type": "error", "line": line_number + 1, "error": str(e)}
+
+    if batch:
+        yield await write_batch()
+
+    yield {"type": "summary", "lines": line_number, "stats": totals}
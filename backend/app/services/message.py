@@ -6,7 +6,7 @@ from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.schemas.message import Message, MessageDetail
-from app.services.rolling_message_service import RollingMessageService
+from app.services.message_repository import MessageRepository
 
 
 class MessageService:
@@ -14,7 +14,7 @@ class MessageService:
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
-        self.rolling_service = RollingMessageService(db)
+        self.messages = MessageRepository(db)
 
     async def list_messages(
         self,
@@ -25,27 +25,13 @@ class MessageService:
         sort_order: str,
     ) -> tuple[list[Message], int]:
         """List messages with pagination."""
-        # Get user's project IDs first
-        user_projects = await self.db.projects.find(
-            {"user_id": ObjectId(user_id)}, {"_id": 1}
-        ).to_list(None)
-        project_ids = [p["_id"] for p in user_projects]
-
-        # Get sessions belonging to user's projects
-        user_sessions = await self.db.sessions.find(
-            {"projectId": {"$in": project_ids}}, {"sessionId": 1}
-        ).to_list(None)
-        session_ids = [s["sessionId"] for s in user_sessions]
-
-        # Filter messages by user's sessions
-        filter_dict["sessionId"] = {"$in": session_ids}
-
-        # Remove any user_id filter that might have been passed
-        filter_dict.pop("user_id", None)
+        # Messages carry a denormalized user_id stamped at ingest, so tenant
+        # scoping is a direct indexed match instead of a sessionId $in list
+        filter_dict["user_id"] = ObjectId(user_id)
 
         # Use rolling service for queries
-        docs, total = await self.rolling_service.find_messages(
-            filter_dict, skip, limit, sort_order
+        docs, total = await self.messages.find_messages(
+            filter_dict, skip, limit, sort_order, projection="list"
         )
 
         messages = []
@@ -70,7 +56,7 @@ class MessageService:
         if not ObjectId.is_valid(message_id):
             return None
 
-        doc = await self.rolling_service.find_one({"_id": ObjectId(message_id)})
+        doc = await self.messages.find_one({"_id": ObjectId(message_id)})
         if not doc:
             return None
 
@@ -91,7 +77,7 @@ class MessageService:
         self, user_id: str, uuid: str
     ) -> MessageDetail | None:
         """Get a message by its Claude UUID."""
-        doc = await self.rolling_service.find_one({"uuid": uuid})
+        doc = await self.messages.find_one({"uuid": uuid})
         if not doc:
             return None
 
@@ -116,7 +102,7 @@ class MessageService:
             return None
 
         # Get the target message
-        target = await self.rolling_service.find_one({"_id": ObjectId(message_id)})
+        target = await self.messages.find_one({"_id": ObjectId(message_id)})
         if not target:
             return None
 
@@ -124,7 +110,7 @@ class MessageService:
         timestamp = target["timestamp"]
 
         # Get messages before
-        before_messages_docs, _ = await self.rolling_service.find_messages(
+        before_messages_docs, _ = await self.messages.find_messages(
             {
                 "sessionId": session_id,
                 "timestamp": {"$lt": timestamp},
@@ -132,6 +118,7 @@ class MessageService:
             skip=0,
             limit=before,
             sort_order="desc",
+            projection="list",
         )
 
         before_messages = []
@@ -154,7 +141,7 @@ class MessageService:
         before_messages.reverse()
 
         # Get messages after
-        after_messages_docs, _ = await self.rolling_service.find_messages(
+        after_messages_docs, _ = await self.messages.find_messages(
             {
                 "sessionId": session_id,
                 "timestamp": {"$gt": timestamp},
@@ -162,6 +149,7 @@ class MessageService:
             skip=0,
             limit=after,
             sort_order="asc",
+            projection="list",
         )
 
         after_messages = []
@@ -231,11 +219,11 @@ class MessageService:
                 return False
 
             # Now update without user_id filter
-            result = await self.rolling_service.update_one(
+            result = await self.messages.update_one(
                 {"_id": ObjectId(message_id)},
                 {"$set": {"costUsd": Decimal128(str(cost_usd))}},
             )
-            return result  # rolling_service.update_one returns bool
+            return result  # messages.update_one returns bool
         except Exception:
             return False
 
@@ -252,16 +240,16 @@ class MessageService:
             if not msg:
                 continue
 
-            result = await self.rolling_service.update_one(
+            result = await self.messages.update_one(
                 {"uuid": uuid}, {"$set": {"costUsd": Decimal128(str(cost))}}
             )
-            if result:  # rolling_service.update_one returns bool
+            if result:  # messages.update_one returns bool
                 updated_count += 1
 
         # Update session total costs
         session_ids = set()
         for uuid in cost_updates.keys():
-            doc = await self.rolling_service.find_one({"uuid": uuid})
+            doc = await self.messages.find_one({"uuid": uuid})
             if doc:
                 session_ids.add(doc["sessionId"])
 
@@ -284,34 +272,29 @@ class MessageService:
         if not project:
             return
 
-        from datetime import UTC, datetime, timedelta
-
         pipeline: list[dict[str, Any]] = [
             {"$match": {"sessionId": session_id}},
             {
                 "$group": {
                     "_id": None,
-                    "totalCost": {"$sum": {"$ifNull": ["$costUsd", 0]}},
+                    "totalCost": {"$sum": "$cost"},
                 }
             },
         ]
 
-        # Use a reasonable date range for aggregation
-        end_date = datetime.now(UTC)
-        start_date = end_date - timedelta(days=365)  # Look back 1 year
-
-        result = await self.rolling_service.aggregate_across_collections(
-            pipeline, start_date, end_date
-        )
+        # One partial total per collection the session spans
+        result = await self.messages.aggregate_session(session_id, pipeline)
         if result:
             # Handle Decimal128 from MongoDB aggregation
-            total_cost_value = result[0]["totalCost"]
-            if hasattr(total_cost_value, "to_decimal"):
-                # It's a Decimal128 object
-                total_cost = float(str(total_cost_value))
-            else:
-                # It's already a numeric type
-                total_cost = float(total_cost_value)
+            total_cost = 0.0
+            for partial in result:
+                total_cost_value = partial["totalCost"]
+                if hasattr(total_cost_value, "to_decimal"):
+                    # It's a Decimal128 object
+                    total_cost += float(str(total_cost_value))
+                else:
+                    # It's already a numeric type
+                    total_cost += float(total_cost_value)
 
             # Convert to Decimal128 for MongoDB storage
             from bson import Decimal128
@@ -0,0 +1,22 @@
+"""Invalidation of state derived from stored messages."""
+
+from typing import Any, Dict
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.services.message_repository import MessageRepository
+from app.services.partition_snapshot import PartitionSnapshotStore
+from app.services.topic_extraction import SessionTopicStore
+
+
+async def invalidate_deleted_messages(
+    db: AsyncIOMotorDatabase, filter_dict: Dict[str, Any]
+) -> None:
+    """Outdate snapshots and topic state after deleting messages by a filter.
+
+    Call after ``MessageRepository.delete_many`` removed documents. Neither
+    store fails the caller; both log and move on.
+    """
+    collection_names = await MessageRepository(db).collections_for(filter_dict)
+    await PartitionSnapshotStore(db).invalidate(collection_names)
+    await SessionTopicStore(db).invalidate(filter_dict.get("sessionId"))
@@ -0,0 +1,322 @@
+"""Unified access to message documents in the monthly rolling collections."""
+
+import asyncio
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+
+from app.core.logging import get_logger
+from app.services.blob_store import BlobStore
+from app.services.conversation_tree import TREE_PROJECTION
+from app.services.rolling_message_service import RollingMessageService
+
+logger = get_logger(__name__)
+
+# Named field sets for message reads. Only "full" returns the heavy
+# messageData/toolUseResult/thinking payloads.
+PROJECTIONS: Dict[str, Optional[Dict[str, Any]]] = {
+    # Rows of message lists, threads and exports
+    "list": {
+        "uuid": 1,
+        "type": 1,
+        "sessionId": 1,
+        "content": 1,
+        "timestamp": 1,
+        "createdAt": 1,
+        "model": 1,
+        "parentUuid": 1,
+        "userType": 1,
+        "costUsd": 1,
+        "usage": 1,
+        "cwd": 1,
+        "gitBranch": 1,
+        "version": 1,
+        "isSidechain": 1,
+        # Legacy documents kept their text under the raw message
+        "message": 1,
+    },
+    # Parent links; covered by the session tree index
+    "tree": TREE_PROJECTION,
+    "full": None,
+}
+
+Projection = Union[str, Dict[str, Any], None]
+
+
+def resolve_projection(projection: Projection) -> Optional[Dict[str, Any]]:
+    """Turn a profile name into its field set; dicts pass through."""
+    if isinstance(projection, str):
+        try:
+            return PROJECTIONS[projection]
+        except KeyError:
+            raise ValueError(f"Unknown projection profile: {projection}") from None
+    return projection
+
+
+def sum_partials(partials: List[Dict], key: str, default: float = 0) -> Any:
+    """Sum one field of per-collection aggregation results.
+
+    Decimal128 values are converted to float.
+    """
+    total = default
+    for partial in partials:
+        value = partial.get(key) or 0
+        if hasattr(value, "to_decimal"):
+            value = float(value.to_decimal())
+        total += value
+    return total
+
+
+class MessageRepository(RollingMessageService):
+    """Read and write messages without knowing how they are partitioned.
+
+    Collections are chosen from the filter: a single ``sessionId`` uses the
+    session's partition map, a ``timestamp`` range uses the months it covers,
+    and anything else searches every monthly collection. Because collections
+    are monthly, reading them in order yields documents in timestamp order
+    without a global sort.
+
+    Large fields may live in the blob store; reads return their previews
+    unless the caller loads them through ``BlobStore.hydrate``.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        super().__init__(db)
+        self.blobs = BlobStore(db)
+
+    async def stream(
+        self,
+        filter_dict: Dict[str, Any],
+        projection: Projection = None,
+        sort_order: str = "asc",
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield matching messages in timestamp order.
+
+        Collections are read one at a time through a cursor, so memory stays
+        flat regardless of how many messages match. ``skip`` passes over whole
+        collections by count before opening a cursor.
+        """
+        projection = resolve_projection(projection)
+        collection_names = await self.collections_for(filter_dict)
+        descending = sort_order == "desc"
+        if descending:
+            collection_names = list(reversed(collection_names))
+
+        remaining = limit
+        for coll_name in collection_names:
+            if remaining is not None and remaining <= 0:
+                return
+            collection = self.db[coll_name]
+            if skip:
+                count = await collection.count_documents(filter_dict)
+                if count <= skip:
+                    skip -= count
+                    continue
+
+            cursor = collection.find(filter_dict, projection).sort(
+                "timestamp", DESCENDING if descending else ASCENDING
+            )
+            if skip:
+                cursor = cursor.skip(skip)
+                skip = 0
+            if remaining is not None:
+                cursor = cursor.limit(remaining)
+
+            async for doc in cursor:
+                yield doc
+                if remaining is not None:
+                    remaining -= 1
+
+    async def find(
+        self,
+        filter_dict: Dict[str, Any],
+        projection: Projection = None,
+        sort_order: str = "asc",
+        skip: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return matching messages in timestamp order."""
+        return [
+            doc
+            async for doc in self.stream(
+                filter_dict, projection, sort_order, skip=skip, limit=limit
+            )
+        ]
+
+    async def find_first(
+        self,
+        filter_dict: Dict[str, Any],
+        projection: Projection = None,
+        sort_order: str = "asc",
+    ) -> Optional[Dict[str, Any]]:
+        """Return the earliest (or latest, with ``desc``) matching message.
+
+        Collections are probed in order, so the search usually stops at the
+        first (or last) month the filter routes to.
+        """
+        projection = resolve_projection(projection)
+        collection_names = await self.collections_for(filter_dict)
+        direction = ASCENDING
+        if sort_order == "desc":
+            collection_names = list(reversed(collection_names))
+            direction = DESCENDING
+
+        for coll_name in collection_names:
+            doc: Optional[Dict[str, Any]] = await self.db[coll_name].find_one(
+                filter_dict, projection, sort=[("timestamp", direction)]
+            )
+            if doc is not None:
+                return doc
+        return None
+
+    async def find_messages(
+        self,
+        filter_dict: Dict[str, Any],
+        skip: int = 0,
+        limit: int = 100,
+        sort_order: str = "desc",
+        projection: Projection = None,
+    ) -> tuple[List[Dict], int]:
+        """Paginated find that also accepts a projection profile name."""
+        return await super().find_messages(
+            filter_dict, skip, limit, sort_order, resolve_projection(projection)
+        )
+
+    async def find_session_messages(
+        self,
+        session_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        extra_filter: Optional[Dict[str, Any]] = None,
+        projection: Projection = None,
+        limit: Optional[int] = None,
+        sort_order: str = "asc",
+    ) -> List[Dict]:
+        """Session find that also accepts a projection profile name."""
+        return await super().find_session_messages(
+            session_id,
+            start_date,
+            end_date,
+            extra_filter,
+            resolve_projection(projection),
+            limit,
+            sort_order,
+        )
+
+    async def count(self, filter_dict: Dict[str, Any]) -> int:
+        """Count matching messages in every collection that can hold them."""
+        collection_names = await self.collections_for(filter_dict)
+        counts = await asyncio.gather(
+            *(self.db[c].count_documents(filter_dict) for c in collection_names)
+        )
+        return sum(counts)
+
+    async def distinct(self, field: str, filter_dict: Dict[str, Any]) -> List[Any]:
+        """Distinct values of a field across collections, in first-seen order."""
+        collection_names = await self.collections_for(filter_dict)
+        results = await asyncio.gather(
+            *(self.db[c].distinct(field, filter_dict) for c in collection_names)
+        )
+        values: List[Any] = []
+        for result in results:
+            values.extend(v for v in result if v not in values)
+        return values
+
+    async def aggregate_partitions(
+        self, pipeline: List[Dict], filter_dict: Dict[str, Any]
+    ) -> List[Dict]:
+        """Run a pipeline on each collection ``filter_dict`` routes to.
+
+        Results are per-collection partials; callers merge them. The pipeline
+        should start with a ``$match`` equivalent to ``filter_dict``.
+        """
+        collection_names = await self.collections_for(filter_dict)
+        return await self.aggregate_collections(collection_names, pipeline)
+
+    async def insert_many(self, docs: List[Dict[str, Any]]) -> int:
+        """Insert messages into their monthly collections.
+
+        Session partition maps are updated and large fields moved to the blob
+        store before writing.
+        """
+        await self.blobs.externalize(docs)
+        by_collection: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        session_partitions: Dict[str, set[str]] = defaultdict(set)
+        for doc in docs:
+            coll_name = self.get_message_collection_name(doc)
+            by_collection[coll_name].append(doc)
+            if doc.get("sessionId"):
+                session_partitions[doc["sessionId"]].add(coll_name)
+
+        for session_id, names in session_partitions.items():
+            await self.record_session_partitions(session_id, names)
+
+        inserted = 0
+        pending = list(by_collection.items())
+        for i, (coll_name, coll_docs) in enumerate(pending):
+            collection = await self.ensure_collection_with_indexes(coll_name)
+            try:
+                result = await collection.insert_many(coll_docs, ordered=False)
+            except BulkWriteError as e:
+                # Rejected documents, such as duplicates, and those of the
+                # collections not reached give back their blob references
+                unwritten = [coll_docs[err["index"]] for err in e.details["writeErrors"]]
+                unwritten += [doc for _, later in pending[i + 1 :] for doc in later]
+                await self.blobs.release(BlobStore.refs_of(unwritten))
+                raise
+            inserted += len(result.inserted_ids)
+        return inserted
+
+    async def delete_many(
+        self,
+        filter_dict: Dict[str, Any],
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> int:
+        """Delete matching messages from every collection that can hold them.
+
+        Blob references held by the deleted messages are released; callers
+        invalidate derived state with ``invalidate_deleted_messages``. Pass
+        ``session`` to delete inside a transaction; collections are then
+        processed one at a time as a session cannot be used concurrently.
+        """
+        collection_names = await self.collections_for(filter_dict)
+        refs = await self._blob_refs(collection_names, filter_dict, session)
+
+        if session is not None:
+            deleted = 0
+            for coll_name in collection_names:
+                result = await self.db[coll_name].delete_many(
+                    filter_dict, session=session
+                )
+                deleted += result.deleted_count
+        else:
+            results = await asyncio.gather(
+                *(self.db[c].delete_many(filter_dict) for c in collection_names)
+            )
+            deleted = sum(r.deleted_count or 0 for r in results)
+
+        await self.blobs.release(refs, session=session)
+        return deleted
+
+    async def _blob_refs(
+        self,
+        collection_names: List[str],
+        filter_dict: Dict[str, Any],
+        session: Optional[AsyncIOMotorClientSession] = None,
+    ) -> Counter[str]:
+        """Blob references held by the messages matching a filter."""
+        refs: Counter[str] = Counter()
+        query = {**filter_dict, "blobRefs": {"$exists": True}}
+        for coll_name in collection_names:
+            cursor = self.db[coll_name].find(
+                query, {"blobRefs": 1, "_id": 0}, session=session
+            )
+            async for doc in cursor:
+                refs.update(BlobStore.refs_of([doc]))
+        return refs
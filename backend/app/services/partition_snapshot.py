@@ -0,0 +1,394 @@
+"""Columnar snapshots of closed monthly message collections.
+
+A ``messages_YYYY_MM`` collection stops receiving regular writes once its
+month is over. The snapshot job exports each closed collection to a
+directory of raw column files, one fixed-width array per field, with string
+fields dictionary-encoded. Analytics memory-map those files and scan them
+locally instead of re-reading the month's BSON from MongoDB.
+
+The ``partition_snapshots`` collection records where each snapshot lives and
+when it was built. A late write into a closed month stamps
+``invalidated_at``, and snapshots built before that time are ignored until
+the job rebuilds them. Snapshots are only built and read when
+``settings.SNAPSHOT_STORAGE_PATH`` names storage shared by every replica.
+"""
+
+import asyncio
+import json
+import math
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import UTC, datetime
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the column layout changes; older snapshots are rebuilt
+SNAPSHOT_VERSION = 1
+
+# Fixed-width columns: field -> array typecode. Floats are NaN where the
+# document has no number; integers are 0.
+NUMERIC_COLUMNS = {
+    "timestamp": "q",  # Milliseconds since the epoch, ascending
+    "cost": "d",
+    "durationMs": "d",
+    "tokens.total": "q",
+    "tokens.input": "q",
+    "tokens.output": "q",
+}
+
+# Memoryview formats of the integer column typecodes
+INTEGER_FORMATS: Dict[str, Literal["b", "i", "q"]] = {"b": "b", "i": "i", "q": "q"}
+
+# Documents handed to a worker thread at a time while building a snapshot
+BUILD_BATCH_SIZE = 5000
+
+# 1 where the document has a ``costUsd`` field at all
+FLAG_COLUMNS = {"hasCostUsd": "costUsd"}
+
+# Dictionary-encoded string columns; code -1 is a missing value
+DICTIONARY_COLUMNS = (
+    "type",
+    "model",
+    "gitBranch",
+    "cwd",
+    "sessionId",
+    "user_id",
+    "projectId",
+)
+
+EXPORT_PROJECTION = {
+    "_id": 0,
+    "costUsd": 1,
+    **{field: 1 for field in NUMERIC_COLUMNS},
+    **{field: 1 for field in DICTIONARY_COLUMNS},
+}
+
+
+def _field(doc: Dict[str, Any], path: str) -> Any:
+    """Value of a dotted field path, ``None`` when absent."""
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)  # type: ignore[assignment]
+    return doc
+
+
+def _number(value: Any) -> Optional[float]:
+    """Numeric value of a field, converting Decimal128."""
+    if hasattr(value, "to_decimal"):
+        return float(str(value))
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _epoch_ms(value: datetime) -> int:
+    """Milliseconds since the epoch, naive datetimes taken as UTC."""
+    return int(value.replace(tzinfo=value.tzinfo or UTC).timestamp() * 1000)
+
+
+def is_closed(collection_name: str, now: Optional[datetime] = None) -> bool:
+    """Whether a monthly collection's month is over."""
+    current = f"messages_{(now or datetime.now(UTC)).strftime('%Y_%m')}"
+    return collection_name.startswith("messages_") and collection_name < current
+
+
+class ColumnarPartition:
+    """Read-only view of one memory-mapped partition snapshot."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json")) as f:
+            manifest = json.load(f)
+        if manifest["byteorder"] != sys.byteorder:
+            raise ValueError(f"Snapshot {path} was written on another byte order")
+
+        self.path = path
+        self.collection = manifest["collection"]
+        self.rows: int = manifest["rows"]
+        self.dictionaries: Dict[str, List[str]] = manifest["dictionaries"]
+        self._typecodes: Dict[str, str] = manifest["columns"]
+        self._columns: Dict[str, Sequence[Any]] = {}
+        self._maps: List[mmap.mmap] = []
+        for name, typecode in self._typecodes.items():
+            self._columns[name] = self._map(name, typecode)
+
+    def _map(self, name: str, typecode: str) -> Sequence[Any]:
+        """Memory-map one column file as a typed view."""
+        if self.rows == 0:
+            return array(typecode)
+        with open(os.path.join(self.path, f"{name}.col"), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        view = memoryview(mapped)
+        if typecode == "d":
+            return view.cast("d")
+        return view.cast(INTEGER_FORMATS[typecode])
+
+    def column(self, name: str) -> Sequence[Any]:
+        """Raw column values; dictionary columns return codes."""
+        return self._columns[name]
+
+    def row_range(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> range:
+        """Rows with ``start <= timestamp <= end``, by binary search."""
+        timestamps = self._columns["timestamp"]
+        first = bisect_left(timestamps, _epoch_ms(start)) if start else 0
+        last = bisect_right(timestamps, _epoch_ms(end)) if end else self.rows
+        return range(first, max(first, last))
+
+    def scan(
+        self,
+        columns: Sequence[str],
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> Iterator[Tuple[Any, ...]]:
+        """Yield the given columns row by row within a time range.
+
+        Dictionary columns are decoded to strings and missing values (NaN,
+        code -1) are returned as ``None``.
+        """
+        rows = self.row_range(start, end)
+        return zip(*(self._decode(name, rows) for name in columns))
+
+    def _decode(self, name: str, rows: range) -> Iterable[Any]:
+        """Values of one column over a row range, with ``None`` for missing."""
+        values = self._columns[name][rows.start : rows.stop]
+        if name in self.dictionaries:
+            lookup = self.dictionaries[name]
+            return (lookup[code] if code >= 0 else None for code in values)
+        if self._typecodes[name] == "d":
+            return (None if math.isnan(v) else v for v in values)
+        return values
+
+
+class ColumnWriter:
+    """Accumulate documents, in timestamp order, into snapshot columns."""
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        self.rows = 0
+        self.columns: Dict[str, array[Any]] = {
+            name: array(code) for name, code in NUMERIC_COLUMNS.items()
+        }
+        self.columns.update({name: array("b") for name in FLAG_COLUMNS})
+        self.columns.update({name: array("i") for name in DICTIONARY_COLUMNS})
+        self.codes: Dict[str, Dict[str, int]] = {n: {} for n in DICTIONARY_COLUMNS}
+
+    def append(self, doc: Dict[str, Any]) -> None:
+        """Add one projected message document."""
+        self.rows += 1
+        for name, typecode in NUMERIC_COLUMNS.items():
+            value = _field(doc, name)
+            if name == "timestamp":
+                self.columns[name].append(_epoch_ms(value))
+                continue
+            number = _number(value)
+            if typecode == "d":
+                self.columns[name].append(math.nan if number is None else number)
+            else:
+                self.columns[name].append(int(number or 0))
+        for name, source in FLAG_COLUMNS.items():
+            self.columns[name].append(1 if source in doc else 0)
+        for name in DICTIONARY_COLUMNS:
+            value = doc.get(name)
+            if value is None:
+                self.columns[name].append(-1)
+                continue
+            dictionary = self.codes[name]
+            code = dictionary.setdefault(str(value), len(dictionary))
+            self.columns[name].append(code)
+
+    def extend(self, docs: Iterable[Dict[str, Any]]) -> None:
+        """Add projected message documents in order."""
+        for doc in docs:
+            self.append(doc)
+
+    def write(self, path: str) -> None:
+        """Write the snapshot directory at ``path``.
+
+        Files go to a temporary directory that is renamed into place.
+        """
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, values in self.columns.items():
+            with open(os.path.join(tmp_path, f"{name}.col"), "wb") as f:
+                values.tofile(f)
+        manifest = {
+            "version": SNAPSHOT_VERSION,
+            "collection": self.collection,
+            "rows": self.rows,
+            "byteorder": sys.byteorder,
+            "columns": {name: v.typecode for name, v in self.columns.items()},
+            "dictionaries": {name: list(self.codes[name]) for name in self.codes},
+        }
+        with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+
+
+class PartitionSnapshotStore:
+    """Build, invalidate and open columnar snapshots of message collections."""
+
+    # Open snapshots by path, shared by every store in the process
+    _open: Dict[str, ColumnarPartition] = {}
+
+    def __init__(self, db: AsyncIOMotorDatabase, root: Optional[str] = None):
+        self.db = db
+        self.root = root or settings.SNAPSHOT_STORAGE_PATH
+
+    @property
+    def enabled(self) -> bool:
+        """Whether shared snapshot storage is configured."""
+        return bool(self.root)
+
+    @property
+    def registry(self) -> Any:
+        """The ``partition_snapshots`` registry collection."""
+        return self.db.partition_snapshots
+
+    async def invalidate(self, collection_names: Iterable[str]) -> None:
+        """Mark the snapshots of closed collections written to as outdated.
+
+        Never fails the write that triggered it.
+        """
+        closed = sorted({c for c in collection_names if is_closed(c)})
+        if not closed:
+            return
+        try:
+            await self.registry.update_many(
+                {"_id": {"$in": closed}},
+                {"$set": {"invalidated_at": datetime.now(UTC)}},
+            )
+        except Exception as e:
+            logger.warning(f"Failed to invalidate partition snapshots: {e}")
+
+    async def load(
+        self, collection_names: Iterable[str]
+    ) -> Dict[str, ColumnarPartition]:
+        """Open the current snapshots of the given collections.
+
+        Collections without a usable snapshot are left out; callers query
+        MongoDB for them. That includes snapshots whose files are missing
+        here, until the job rebuilds them.
+        """
+        closed = [c for c in collection_names if is_closed(c)]
+        if not closed or not self.enabled:
+            return {}
+
+        partitions: Dict[str, ColumnarPartition] = {}
+        async for entry in self.registry.find({"_id": {"$in": closed}}):
+            if not self._is_current(entry):
+                continue
+            partition = self._open.get(entry["path"])
+            if partition is None:
+                try:
+                    partition = ColumnarPartition(entry["path"])
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Cannot open snapshot {entry['path']}: {e}")
+                    continue
+                self._open[entry["path"]] = partition
+            partitions[entry["_id"]] = partition
+        return partitions
+
+    @staticmethod
+    def _is_current(entry: Dict[str, Any]) -> bool:
+        """Whether a registry entry is usable."""
+        if entry.get("version") != SNAPSHOT_VERSION:
+            return False
+        invalidated_at = entry.get("invalidated_at")
+        return invalidated_at is None or invalidated_at < entry["built_at"]
+
+    async def build(self, collection_name: str) -> int:
+        """Export one collection and register its snapshot.
+
+        ``built_at`` is taken before reading, so a write that lands while
+        the export runs still invalidates the new snapshot.
+        """
+        if not self.root:
+            raise RuntimeError("SNAPSHOT_STORAGE_PATH is not configured")
+        built_at = datetime.now(UTC)
+        writer = ColumnWriter(collection_name)
+        cursor = (
+            self.db[collection_name].find({}, EXPORT_PROJECTION).sort("timestamp", 1)
+        )
+        # Columns are built off the event loop, a batch at a time
+        batch: List[Dict[str, Any]] = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= BUILD_BATCH_SIZE:
+                await asyncio.to_thread(writer.extend, batch)
+                batch = []
+        await asyncio.to_thread(writer.extend, batch)
+
+        path = os.path.join(self.root, f"{collection_name}-{_epoch_ms(built_at)}")
+        os.makedirs(self.root, exist_ok=True)
+        await asyncio.to_thread(writer.write, path)
+        rows = writer.rows
+
+        previous = await self.registry.find_one_and_update(
+            {"_id": collection_name},
+            {
+                "$set": {
+                    "path": path,
+                    "rows": rows,
+                    "built_at": built_at,
+                    "version": SNAPSHOT_VERSION,
+                }
+            },
+            upsert=True,
+        )
+        if previous and previous.get("path") and previous["path"] != path:
+            # Scans in flight keep their mappings; the files are unlinked
+            self._open.pop(previous["path"], None)
+            shutil.rmtree(previous["path"], ignore_errors=True)
+
+        logger.info(f"Snapshot of {collection_name}: {rows} rows")
+        return rows
+
+    async def refresh(self) -> List[str]:
+        """Build snapshots for closed collections that lack a current one.
+
+        Returns the names of the collections snapshotted.
+        """
+        if not self.enabled:
+            return []
+        names = await self.db.list_collection_names()
+        closed = sorted(c for c in names if is_closed(c))
+        current = {
+            entry["_id"]
+            async for entry in self.registry.find({"_id": {"$in": closed}})
+            if self._is_current(entry) and os.path.isdir(entry.get("path", ""))
+        }
+
+        built = []
+        for name in closed:
+            if name in current:
+                continue
+            try:
+                await self.build(name)
+                built.append(name)
+            except Exception as e:
+                logger.error(f"Failed to snapshot {name}: {e}")
+        return built
@@ -3,12 +3,15 @@
 from datetime import UTC, datetime
 from typing import Any, cast
 
+import bson
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.models.project import ProjectInDB, ProjectStats, PyObjectId
 from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectWithStats
+from app.services.ingest_cache import invalidate_user_resolutions
 from app.services.rolling_message_service import RollingMessageService
+from app.services.stats_snapshot import StatsSnapshotService, empty_storage_delta
 
 
 class ProjectService:
@@ -99,6 +102,11 @@ class ProjectService:
         }
 
         await self.db.projects.insert_one(doc)
+
+        delta = empty_storage_delta()
+        delta["projects"] = {"count": 1, "bytes": len(bson.encode(doc))}
+        await StatsSnapshotService(self.db).record_ingest(user_id, delta)
+
         return ProjectInDB(
             _id=PyObjectId(cast(ObjectId, doc["_id"])),
             name=cast(str, doc["name"]),
@@ -160,7 +168,15 @@ class ProjectService:
             ObjectId(project_id), retry_delay=retry_delay
         )
 
-        if not result["success"]:
+        if result["success"]:
+            invalidate_user_resolutions(user_id)
+            await StatsSnapshotService(self.db).record_deletion(
+                user_id,
+                projects=1,
+                sessions=result.get("sessions_deleted", 0),
+                messages=result.get("messages_deleted", 0),
+            )
+        else:
             # Log the error but still try to clean up
             error_msg = result.get("error", "Unknown error")
             print(f"Project deletion failed: {error_msg}")
@@ -233,6 +249,13 @@ class ProjectService:
             )
 
             if result["success"]:
+                invalidate_user_resolutions(user_id)
+                await StatsSnapshotService(self.db).record_deletion(
+                    user_id,
+                    projects=1,
+                    sessions=result.get("sessions_deleted", 0),
+                    messages=result.get("messages_deleted", 0),
+                )
                 await connection_manager.broadcast_deletion_progress(
                     project_id=project_id_str,
                     stage="completed",
@@ -308,7 +331,7 @@ class ProjectService:
                     "assistant_messages": {
                         "$sum": {"$cond": [{"$eq": ["$type", "assistant"]}, 1, 0]}
                     },
-                    "total_cost": {"$sum": {"$ifNull": ["$costUsd", 0]}},
+                    "total_cost": {"$sum": "$cost"},
                     "models_used": {"$addToSet": "$model"},
                     "first_message": {"$min": "$timestamp"},
                     "last_message": {"$max": "$timestamp"},
@@ -9,6 +9,8 @@ from motor.motor_asyncio import AsyncIOMotorClientSession, AsyncIOMotorDatabase
 from pymongo.errors import PyMongoError
 
 from app.core.logging import get_logger
+from app.services.message_caches import invalidate_deleted_messages
+from app.services.message_repository import MessageRepository
 
 logger = get_logger(__name__)
 
@@ -18,8 +20,20 @@ class ProjectDeletionService:
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
+        self.messages = MessageRepository(db)
         self._deletion_tasks: dict[str, asyncio.Task] = {}
 
+    async def _delete_messages(
+        self,
+        filter_dict: dict[str, Any],
+        session: AsyncIOMotorClientSession | None = None,
+    ) -> int:
+        """Delete matching messages and outdate state derived from them."""
+        deleted = await self.messages.delete_many(filter_dict, session=session)
+        if deleted:
+            await invalidate_deleted_messages(self.db, filter_dict)
+        return deleted
+
     async def delete_project_transactional(
         self, project_id: ObjectId, force: bool = False
     ) -> dict[str, Any]:
@@ -105,11 +119,11 @@ class ProjectDeletionService:
 
             # Delete all messages first
             if session_ids:
-                messages_result = await self.db.messages.delete_many(
+                messages_deleted = await self._delete_messages(
                     {"sessionId": {"$in": session_ids}}, session=session
                 )
-                stats["messages_deleted"] = messages_result.deleted_count
-                logger.info(f"Deleted {messages_result.deleted_count} messages")
+                stats["messages_deleted"] = messages_deleted
+                logger.info(f"Deleted {messages_deleted} messages")
 
             # Delete all sessions
             sessions_result = await self.db.sessions.delete_many(
@@ -232,12 +246,9 @@ class ProjectDeletionService:
                 batch_size = 1000
                 for i in range(0, len(session_ids), batch_size):
                     batch = session_ids[i : i + batch_size]
-                    result = await self.db.messages.delete_many(
+                    deleted_count = await self._delete_messages(
                         {"sessionId": {"$in": batch}}
                     )
-                    deleted_count = (
-                        result.deleted_count if result.deleted_count is not None else 0
-                    )
                     current_count = stats.get("messages_deleted", 0)
                     if isinstance(current_count, int):
                         stats["messages_deleted"] = current_count + deleted_count
@@ -296,12 +307,10 @@ class ProjectDeletionService:
 
                     # Delete orphaned messages
                     if session_ids:
-                        result = await self.db.messages.delete_many(
+                        deleted = await self._delete_messages(
                             {"sessionId": {"$in": session_ids}}
                         )
-                        logger.info(
-                            f"Cleaned up {result.deleted_count} orphaned messages"
-                        )
+                        logger.info(f"Cleaned up {deleted} orphaned messages")
 
                     # Delete orphaned sessions
                     result = await self.db.sessions.delete_many(
@@ -361,10 +370,9 @@ class ProjectDeletionService:
 
                 # Delete messages for orphaned sessions
                 if session_ids:
-                    result = await self.db.messages.delete_many(
+                    stats["orphaned_messages"] += await self._delete_messages(
                         {"sessionId": {"$in": session_ids}}
                     )
-                    stats["orphaned_messages"] += result.deleted_count
 
                 # Delete orphaned sessions
                 result = await self.db.sessions.delete_many(
@@ -376,10 +384,9 @@ class ProjectDeletionService:
             valid_session_ids = await self.db.sessions.distinct("sessionId")
 
             # 5. Delete orphaned messages (messages without valid sessions)
-            result = await self.db.messages.delete_many(
+            stats["orphaned_messages"] += await self._delete_messages(
                 {"sessionId": {"$nin": valid_session_ids}}
             )
-            stats["orphaned_messages"] += result.deleted_count
 
             logger.info(f"Cleanup complete: {stats}")
             return stats
@@ -0,0 +1,196 @@
+"""Per-request time budgets for MongoDB queries.
+
+``QueryDeadlineMiddleware`` opens a ``QueryBudget`` for requests under the
+path prefixes in ``settings.QUERY_BUDGETS``. Services read it through
+``current_budget`` and pass the remaining time to MongoDB as ``maxTimeMS``,
+so the server stops work that would outlive the request. Queries are tagged
+with the budget's ``comment`` so that operations still running when the
+client disconnects can be found and killed.
+
+Partitions that run out of time are recorded on the budget. Callers that
+can, return the results of the other partitions and flag them as partial.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Never send a maxTimeMS of 0, which MongoDB reads as "no limit"
+MIN_MAX_TIME_MS = 1
+
+
+class QueryBudget:
+    """Time left for the queries of one request."""
+
+    def __init__(self, endpoint: str, seconds: float):
+        self.endpoint = endpoint
+        self.seconds = seconds
+        self.deadline = time.monotonic() + seconds
+        self.comment = f"claudelens:{uuid.uuid4().hex}"
+        # Partitions whose queries ran out of time
+        self.timed_out: set[str] = set()
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def max_time_ms(self) -> int:
+        return max(MIN_MAX_TIME_MS, int(self.remaining() * 1000))
+
+    @property
+    def partial(self) -> bool:
+        """Whether any query of the request returned incomplete results."""
+        return bool(self.timed_out)
+
+    def record_timeout(self, partition: str) -> None:
+        """Note a partition that ran out of time."""
+        self.timed_out.add(partition)
+        get_query_metrics().record_timeout(self.endpoint)
+        logger.warning(f"Query budget of {self.endpoint} exhausted on {partition}")
+
+
+_current_budget: ContextVar[Optional[QueryBudget]] = ContextVar(
+    "query_budget", default=None
+)
+
+
+def current_budget() -> Optional[QueryBudget]:
+    """Budget of the request being served, if it has one."""
+    return _current_budget.get()
+
+
+@contextmanager
+def query_budget(endpoint: str, seconds: float) -> Iterator[QueryBudget]:
+    """Run the enclosed queries, and tasks created by them, under a budget."""
+    budget = QueryBudget(endpoint, seconds)
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def aggregate_options() -> Dict[str, Any]:
+    """``aggregate``/``count_documents`` keyword arguments for the budget."""
+    budget = current_budget()
+    if budget is None:
+        return {}
+    return {"maxTimeMS": budget.max_time_ms(), "comment": budget.comment}
+
+
+def find_options() -> Dict[str, Any]:
+    """``find`` keyword arguments for the budget."""
+    budget = current_budget()
+    if budget is None:
+        return {}
+    return {"max_time_ms": budget.max_time_ms(), "comment": budget.comment}
+
+
+def budget_for_path(path: str) -> Optional[tuple[str, float]]:
+    """Configured ``(prefix, seconds)`` for a request path, longest prefix first."""
+    matches = [p for p in settings.QUERY_BUDGETS if path.startswith(p)]
+    if not matches:
+        return None
+    prefix = max(matches, key=len)
+    return prefix, settings.QUERY_BUDGETS[prefix]
+
+
+async def kill_operations(db: AsyncIOMotorDatabase, comment: str) -> int:
+    """Kill this client's operations still running under a budget comment.
+
+    Users may always list and kill their own operations, so no extra
+    privileges are needed. Returns the number of operations killed.
+    """
+    admin = db.client.admin
+    killed = 0
+    try:
+        operations = await admin.aggregate(
+            [
+                {"$currentOp": {"ownOps": True}},
+                {"$match": {"command.comment": comment}},
+                {"$project": {"opid": 1}},
+            ]
+        ).to_list(None)
+        for operation in operations:
+            await admin.command("killOp", op=operation["opid"])
+            killed += 1
+    except Exception as e:
+        logger.warning(f"Failed to kill abandoned queries: {e}")
+    return killed
+
+
+# Cleanup tasks of abandoned queries, referenced until they finish
+_abandoned: Set["asyncio.Task[None]"] = set()
+
+
+def abandon(db: AsyncIOMotorDatabase, cursors: Iterable[Any] = ()) -> None:
+    """Release the server-side work of a cancelled request in the background.
+
+    Closes the given cursors and kills operations tagged with the current
+    budget's comment. Runs detached so cancellation is not delayed.
+    """
+    budget = current_budget()
+    cursors = list(cursors)
+
+    async def cleanup() -> None:
+        for cursor in cursors:
+            try:
+                await cursor.close()
+            except Exception as e:
+                logger.debug(f"Failed to close abandoned cursor: {e}")
+        if budget is not None:
+            await kill_operations(db, budget.comment)
+
+    task = asyncio.create_task(cleanup())
+    _abandoned.add(task)
+    task.add_done_callback(_abandoned.discard)
+
+
+class QueryMetrics:
+    """Process-wide counters of budget outcomes per endpoint."""
+
+    def __init__(self) -> None:
+        self._counters: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"timeouts": 0, "partial_responses": 0, "cancelled": 0}
+        )
+
+    def record_timeout(self, endpoint: str) -> None:
+        self._counters[endpoint]["timeouts"] += 1
+
+    def record_partial(self, endpoint: str) -> None:
+        self._counters[endpoint]["partial_responses"] += 1
+
+    def record_cancelled(self, endpoint: str) -> None:
+        self._counters[endpoint]["cancelled"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        return {endpoint: dict(c) for endpoint, c in self._counters.items()}
+
+    def clear(self) -> None:
+        self._counters.clear()
+
+
+# Global query metrics instance
+_query_metrics: Optional[QueryMetrics] = None
+
+
+def get_query_metrics() -> QueryMetrics:
+    """Get or create the global query metrics."""
+    global _query_metrics
+    if _query_metrics is None:
+        _query_metrics = QueryMetrics()
+    return _query_metrics
@@ -0,0 +1,189 @@
+"""Single-flight coalescing and short-lived memoization of read requests.
+
+Dashboards open in several tabs, or by several users after a deploy, issue the
+same analytics and search requests at once. Each service call decorated with
+``coalesced`` is keyed on ``(user, endpoint, normalized params)``: concurrent
+identical calls share one in-flight computation, and its result is served
+from memory for a few seconds afterwards.
+
+Results are shared between callers and must be treated as read-only. Results
+cut short by a query budget are shared but not memoized. Calls made without a
+user cover every user's data and are dropped on any user's writes.
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.services.query_budget import current_budget, query_budget
+
+T = TypeVar("T")
+
+# (user, endpoint, normalized params)
+RequestKey = tuple[str, str, str]
+
+# User part of the key of calls not scoped to a user
+ALL_USERS = "*"
+
+
+def _param_default(value: Any) -> Any:
+    """JSON form of parameter types ``json`` does not know."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return repr(value)
+
+
+def normalize_params(params: dict[str, Any]) -> str:
+    """Stable text form of call parameters, independent of key order."""
+    return json.dumps(params, sort_keys=True, default=_param_default)
+
+
+class _Flight:
+    """One shared computation and the number of callers awaiting it."""
+
+    # Set as soon as the flight is registered, before anyone awaits it
+    task: "asyncio.Task[Any]"
+
+    def __init__(self) -> None:
+        self.waiters = 0
+        # Partitions that ran out of query budget during the computation
+        self.timed_out: set[str] = set()
+
+
+class RequestCoalescer:
+    """Share in-flight computations and memoize their results briefly.
+
+    Failures are not memoized; every caller awaiting a failed computation
+    receives its exception. A computation is cancelled once every caller
+    awaiting it has been cancelled.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 512):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._inflight: dict[RequestKey, _Flight] = {}
+        self._results: OrderedDict[RequestKey, tuple[float, Any]] = OrderedDict()
+
+    async def run(self, key: RequestKey, compute: Callable[[], Awaitable[T]]) -> T:
+        """Result of ``compute``, shared with identical concurrent calls."""
+        entry = self._results.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires >= time.monotonic():
+                return value  # type: ignore[no-any-return]
+            del self._results[key]
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = _Flight()
+            flight.task = asyncio.ensure_future(self._compute(key, compute, flight))
+            # Retrieve failures nobody is left to await
+            flight.task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        task = flight.task
+
+        flight.waiters += 1
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not task.done():
+                task.cancel()
+
+        # Callers sharing a partial result are told so too
+        budget = current_budget()
+        if budget is not None:
+            budget.timed_out.update(flight.timed_out)
+        return value  # type: ignore[no-any-return]
+
+    async def _compute(
+        self, key: RequestKey, compute: Callable[[], Awaitable[T]], flight: _Flight
+    ) -> T:
+        # Every caller awaiting the computation depends on it, so it runs
+        # under a budget of its own rather than that of the first caller
+        caller_budget = current_budget()
+        try:
+            if caller_budget is None:
+                value = await compute()
+            else:
+                with query_budget(
+                    caller_budget.endpoint, caller_budget.seconds
+                ) as budget:
+                    value = await compute()
+                flight.timed_out = budget.timed_out
+        finally:
+            self._inflight.pop(key, None)
+
+        # Partial results are shared with concurrent callers but not reused
+        if self.ttl > 0 and not flight.timed_out:
+            self._results[key] = (time.monotonic() + self.ttl, value)
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return value
+
+    def discard_user(self, user_id: str) -> None:
+        """Drop memoized results covering one user's data."""
+        for key in [k for k in self._results if k[0] in (user_id, ALL_USERS)]:
+            del self._results[key]
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+
+# Global request coalescer instance
+_coalescer: Optional[RequestCoalescer] = None
+
+
+def get_request_coalescer() -> RequestCoalescer:
+    """Get or create the global request coalescer."""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = RequestCoalescer(settings.REQUEST_MEMO_TTL_SECONDS)
+    return _coalescer
+
+
+def coalesced(
+    method: Callable[..., Awaitable[T]],
+) -> Callable[..., Awaitable[T]]:
+    """Coalesce calls of a service method per user and parameters.
+
+    The service must expose ``user_id``; services without one share
+    ``ALL_USERS``. Positional and keyword forms of the same arguments, and
+    omitted defaults, map to the same key.
+    """
+    signature = inspect.signature(method)
+    endpoint = method.__qualname__
+
+    @functools.wraps(method)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(list(bound.arguments.items())[1:])
+        owner = str(self.user_id) if self.user_id else ALL_USERS
+        key = (owner, endpoint, normalize_params(params))
+        return await get_request_coalescer().run(
+            key, lambda: method(self, *args, **kwargs)
+        )
+
+    return wrapper
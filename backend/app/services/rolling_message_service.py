@@ -2,12 +2,32 @@
 
 import asyncio
 from datetime import UTC, datetime, timedelta
-from typing import Any, Dict, List, Optional, Set
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Union,
+)
 
 from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
 from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import ExecutionTimeout
+from pymongo.results import UpdateResult
 
 from app.core.logging import get_logger
+from app.services.partition_snapshot import PartitionSnapshotStore
+from app.services.query_budget import (
+    abandon,
+    aggregate_options,
+    current_budget,
+    find_options,
+)
 
 logger = get_logger(__name__)
 
@@ -28,6 +48,17 @@ class RollingMessageService:
         """
         return f"messages_{timestamp.strftime('%Y_%m')}"
 
+    def get_message_collection_name(self, message_data: Dict[str, Any]) -> str:
+        """
+        Get the collection a message document is stored in.
+        String timestamps are parsed in place.
+        """
+        timestamp = message_data.get("timestamp", datetime.now(UTC))
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+            message_data["timestamp"] = timestamp
+        return self.get_collection_name(timestamp)
+
     async def ensure_collection_with_indexes(
         self, collection_name: str
     ) -> AsyncIOMotorCollection:
@@ -52,17 +83,64 @@ class RollingMessageService:
         indexes = [
             # Unique identifier
             IndexModel([("uuid", ASCENDING)], unique=True),
-            # Core query patterns
-            IndexModel([("sessionId", ASCENDING), ("timestamp", ASCENDING)]),
+            # Core query patterns; also covers the "tree" projection profile
+            IndexModel(
+                [
+                    ("sessionId", ASCENDING),
+                    ("timestamp", ASCENDING),
+                    ("uuid", ASCENDING),
+                    ("parentUuid", ASCENDING),
+                    ("isSidechain", ASCENDING),
+                ]
+            ),
             IndexModel([("timestamp", DESCENDING)]),
+            # Tenant-scoped query patterns (user_id/projectId stamped at ingest)
             IndexModel([("user_id", ASCENDING), ("timestamp", DESCENDING)]),
-            IndexModel([("type", ASCENDING), ("timestamp", DESCENDING)]),
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("sessionId", ASCENDING),
+                    ("timestamp", ASCENDING),
+                ]
+            ),
+            IndexModel(
+                [
+                    ("user_id", ASCENDING),
+                    ("projectId", ASCENDING),
+                    ("timestamp", DESCENDING),
+                ]
+            ),
+            # Token analytics scan assistant messages by time and token total
+            IndexModel(
+                [
+                    ("type", ASCENDING),
+                    ("timestamp", DESCENDING),
+                    ("tokens.total", ASCENDING),
+                ]
+            ),
             # Message relationships
             IndexModel([("parentUuid", ASCENDING)]),
             # Analytics queries
             IndexModel([("model", ASCENDING), ("timestamp", DESCENDING)]),
-            IndexModel([("costUsd", DESCENDING)]),
+            IndexModel([("cost", DESCENDING)]),
             IndexModel([("gitBranch", ASCENDING), ("timestamp", DESCENDING)]),
+            # Subtree shifts when a late parent arrives
+            IndexModel([("sessionId", ASCENDING), ("rootUuid", ASCENDING)]),
+            IndexModel(
+                [("sessionId", ASCENDING), ("parentUuid", ASCENDING)],
+                name="tree_pending",
+                partialFilterExpression={"treePending": True},
+            ),
+            # Tool errors classified at ingest; only error results are indexed
+            IndexModel(
+                [
+                    ("timestamp", DESCENDING),
+                    ("errorSeverity", ASCENDING),
+                    ("toolName", ASCENDING),
+                ],
+                name="tool_errors",
+                partialFilterExpression={"isError": True},
+            ),
             # Text search
             IndexModel([("$**", TEXT)]),
         ]
@@ -76,14 +154,8 @@ class RollingMessageService:
         """
         Insert a message into the appropriate monthly collection.
         """
-        # Parse timestamp
-        timestamp = message_data.get("timestamp", datetime.now(UTC))
-        if isinstance(timestamp, str):
-            timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-            message_data["timestamp"] = timestamp
-
         # Get target collection
-        collection_name = self.get_collection_name(timestamp)
+        collection_name = self.get_message_collection_name(message_data)
         collection = await self.ensure_collection_with_indexes(collection_name)
 
         # Insert message
@@ -97,15 +169,15 @@ class RollingMessageService:
         skip: int = 0,
         limit: int = 100,
         sort_order: str = "desc",
+        projection: Optional[Dict[str, Any]] = None,
     ) -> tuple[List[Dict], int]:
         """
         Find messages across relevant monthly collections.
+        Queries scoped to one session only touch the collections it spans.
+        Inclusion projections should keep ``timestamp``, which orders the
+        merged results.
         """
-        # Extract date range from filter
-        start_date, end_date = self._extract_date_range(filter_dict)
-
-        # Get collections for date range
-        collection_names = await self.get_collections_for_range(start_date, end_date)
+        collection_names = await self.collections_for(filter_dict)
         if not collection_names:
             return [], 0
 
@@ -113,19 +185,23 @@ class RollingMessageService:
         count_tasks = []
         fetch_tasks = []
 
+        cursors = []
         for coll_name in collection_names:
             collection = self.db[coll_name]
-            count_tasks.append(collection.count_documents(filter_dict))
+            count_tasks.append(
+                collection.count_documents(filter_dict, **aggregate_options())
+            )
 
             # Fetch extra to handle pagination across collections
-            cursor = collection.find(filter_dict).sort(
+            cursor = collection.find(filter_dict, projection, **find_options()).sort(
                 "timestamp", DESCENDING if sort_order == "desc" else ASCENDING
             )
+            cursors.append(cursor)
             fetch_tasks.append(cursor.to_list(limit + skip))
 
         # Execute parallel queries
-        counts = await asyncio.gather(*count_tasks, return_exceptions=True)
-        results = await asyncio.gather(*fetch_tasks, return_exceptions=True)
+        counts = await self._gather_partitions(collection_names, count_tasks)
+        results = await self._gather_partitions(collection_names, fetch_tasks, cursors)
 
         # Process results
         all_messages: list[dict[str, Any]] = []
@@ -146,18 +222,233 @@ class RollingMessageService:
         # Apply pagination
         return all_messages[skip : skip + limit], total_count
 
-    def _extract_date_range(self, filter_dict: Dict) -> tuple[datetime, datetime]:
-        """Extract date range from filter, defaulting to last 90 days."""
-        if "timestamp" in filter_dict and isinstance(filter_dict["timestamp"], dict):
-            ts_filter = filter_dict["timestamp"]
-            start = ts_filter.get("$gte", datetime(2020, 1, 1, tzinfo=UTC))
-            end = ts_filter.get("$lte", datetime.now(UTC))
-            return start, end
+    async def get_session_partitions(self, session_id: str) -> Optional[List[str]]:
+        """
+        Monthly collections holding a session's messages, oldest first.
+        Returns None for sessions whose partitions were never recorded.
+        """
+        session = await self.db.sessions.find_one(
+            {"sessionId": session_id}, {"partitions": 1}
+        )
+        if not session or session.get("partitions") is None:
+            return None
+        return sorted(session["partitions"])
+
+    async def record_session_partitions(
+        self, session_id: str, collection_names: Iterable[str]
+    ) -> None:
+        """
+        Add monthly collections to a session's partition map.
+        Call before inserting so readers never miss a collection, once per
+        session for a batch of messages. Sessions created before the map
+        existed are backfilled by probing every monthly collection once.
+        Messages of sessions without a document are not mapped or probed;
+        readers search every collection for them. Snapshots of closed months
+        among the collections are outdated by the coming write.
+        """
+        names = sorted(set(collection_names))
+        if not names:
+            return
+        await PartitionSnapshotStore(self.db).invalidate(names)
+
+        result = await self.db.sessions.update_one(
+            {"sessionId": session_id, "partitions": {"$exists": True}},
+            {"$addToSet": {"partitions": {"$each": names}}},
+        )
+        if result.matched_count:
+            return
+        if not await self.db.sessions.find_one({"sessionId": session_id}, {"_id": 1}):
+            return
+
+        existing = await self.db.list_collection_names()
+        candidates = [
+            c for c in existing if c.startswith("messages_") and c not in names
+        ]
+        found = await asyncio.gather(
+            *(
+                self.db[c].find_one({"sessionId": session_id}, {"_id": 1})
+                for c in candidates
+            )
+        )
+        discovered = [c for c, doc in zip(candidates, found) if doc]
+        await self.db.sessions.update_one(
+            {"sessionId": session_id},
+            {"$addToSet": {"partitions": {"$each": sorted(names + discovered)}}},
+        )
+
+    async def get_all_collections(self) -> List[str]:
+        """All monthly message collections, oldest first."""
+        existing = await self.db.list_collection_names()
+        return sorted(c for c in existing if c.startswith("messages_"))
+
+    async def collections_for(self, filter_dict: Dict[str, Any]) -> List[str]:
+        """Monthly collections that can hold documents matching a filter.
+
+        A single ``sessionId`` uses the session's partition map, narrowed to
+        the months of a ``timestamp`` range when both are given. A range alone
+        uses the months it covers, and anything else reads every monthly
+        collection.
+        """
+        partitions = None
+        session_id = filter_dict.get("sessionId")
+        if isinstance(session_id, str):
+            partitions = await self.get_session_partitions(session_id)
+
+        timestamp = filter_dict.get("timestamp")
+        if isinstance(timestamp, dict) and timestamp.keys() & {
+            "$gte",
+            "$gt",
+            "$lte",
+            "$lt",
+        }:
+            start = timestamp.get("$gte") or timestamp.get("$gt")
+            end = timestamp.get("$lte") or timestamp.get("$lt")
+            in_range = await self.get_collections_for_range(
+                start or datetime(2020, 1, 1, tzinfo=UTC), end or datetime.now(UTC)
+            )
+            if partitions is None:
+                return in_range
+            return [c for c in partitions if c in in_range]
+
+        if partitions is not None:
+            return partitions
+        return await self.get_all_collections()
+
+    async def _get_session_collections(
+        self,
+        session_id: str,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+    ) -> List[str]:
+        """Collections that may hold a session's messages, oldest first."""
+        if start_date and end_date:
+            return await self.get_collections_for_range(start_date, end_date)
+        partitions = await self.get_session_partitions(session_id)
+        if partitions is not None:
+            return partitions
+        return await self.get_all_collections()
+
+    async def find_session_messages(
+        self,
+        session_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        extra_filter: Optional[Dict[str, Any]] = None,
+        projection: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        sort_order: str = "asc",
+    ) -> List[Dict]:
+        """
+        Fetch messages of a session in timestamp order.
+        Each covering monthly collection is queried once, in parallel.
+        With a full date range, the collections for that range are read.
+        Otherwise the session's ``partitions`` map picks the collections;
+        sessions without one fall back to every monthly collection.
+        """
+        collection_names = await self._get_session_collections(
+            session_id, start_date, end_date
+        )
+        if not collection_names:
+            return []
+
+        descending = sort_order == "desc"
+        if descending:
+            collection_names = list(reversed(collection_names))
+
+        filter_dict: Dict[str, Any] = {"sessionId": session_id, **(extra_filter or {})}
+        tasks = []
+        cursors = []
+        for coll_name in collection_names:
+            cursor = (
+                self.db[coll_name]
+                .find(filter_dict, projection, **find_options())
+                .sort("timestamp", DESCENDING if descending else ASCENDING)
+            )
+            if limit:
+                cursor = cursor.limit(limit)
+            cursors.append(cursor)
+            tasks.append(cursor.to_list(None))
+        results = await self._gather_partitions(collection_names, tasks, cursors)
+
+        # Collections are in requested order and each result is sorted,
+        # so concatenation preserves timestamp order
+        messages: list[dict[str, Any]] = []
+        for result in results:
+            if not isinstance(result, Exception) and isinstance(result, list):
+                messages.extend(result)
 
-        # Default: last 90 days
-        end = datetime.now(UTC)
-        start = end - timedelta(days=90)
-        return start, end
+        return messages[:limit] if limit else messages
+
+    async def get_sessions_collections(self, sessions: Iterable[Dict]) -> List[str]:
+        """
+        Monthly collections holding the messages of session documents.
+        Sessions without a partition map widen the search to every
+        monthly collection.
+        """
+        names: Set[str] = set()
+        for session in sessions:
+            partitions = session.get("partitions")
+            if partitions is None:
+                existing = await self.db.list_collection_names()
+                return sorted(c for c in existing if c.startswith("messages_"))
+            names.update(partitions)
+        return sorted(names)
+
+    async def stream_messages(
+        self,
+        collection_names: Sequence[str],
+        filter_dict: Dict[str, Any],
+        projection: Optional[Dict[str, Any]] = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield matching messages collection by collection, unordered.
+        Documents arrive in cursor batches instead of being collected into
+        one list. Collections that exceed the request's query budget are
+        recorded on it and skipped.
+        """
+        for coll_name in collection_names:
+            cursor = (
+                self.db[coll_name]
+                .find(filter_dict, projection, **find_options())
+                .batch_size(batch_size)
+            )
+            try:
+                async for doc in cursor:
+                    yield doc
+            except ExecutionTimeout:
+                budget = current_budget()
+                if budget is not None:
+                    budget.record_timeout(coll_name)
+            except asyncio.CancelledError:
+                abandon(self.db, [cursor])
+                raise
+
+    async def count_session_messages(
+        self,
+        session_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        extra_filter: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """
+        Count messages of a session across its covering monthly collections.
+        """
+        collection_names = await self._get_session_collections(
+            session_id, start_date, end_date
+        )
+        if not collection_names:
+            return 0
+
+        filter_dict: Dict[str, Any] = {"sessionId": session_id, **(extra_filter or {})}
+        tasks = [
+            self.db[coll_name].count_documents(filter_dict, **aggregate_options())
+            for coll_name in collection_names
+        ]
+        counts = await self._gather_partitions(collection_names, tasks)
+        return sum(
+            c for c in counts if not isinstance(c, Exception) and isinstance(c, int)
+        )
 
     async def get_collections_for_range(
         self, start_date: datetime, end_date: datetime
@@ -190,16 +481,39 @@ class RollingMessageService:
         Run aggregation pipeline across multiple collections.
         """
         collections = await self.get_collections_for_range(start_date, end_date)
+        return await self.aggregate_collections(collections, pipeline)
+
+    async def aggregate_session(
+        self, session_id: str, pipeline: List[Dict], lookback_days: int = 365
+    ) -> List[Dict]:
+        """
+        Run aggregation pipeline over the collections a session spans.
+        Each collection returns its own partial result; callers merge them.
+        Sessions without a partition map fall back to the lookback window.
+        """
+        collections = await self.get_session_partitions(session_id)
+        if collections is None:
+            end_date = datetime.now(UTC)
+            start_date = end_date - timedelta(days=lookback_days)
+            collections = await self.get_collections_for_range(start_date, end_date)
+        return await self.aggregate_collections(collections, pipeline)
+
+    async def aggregate_collections(
+        self, collections: List[str], pipeline: List[Dict]
+    ) -> List[Dict]:
+        """Run a pipeline on each collection in parallel and combine results."""
         if not collections:
             return []
 
         # Run aggregations in parallel
         tasks = []
+        cursors = []
         for coll_name in collections:
-            collection = self.db[coll_name]
-            tasks.append(collection.aggregate(pipeline).to_list(None))
+            cursor = self.db[coll_name].aggregate(pipeline, **aggregate_options())
+            cursors.append(cursor)
+            tasks.append(cursor.to_list(None))
 
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        results = await self._gather_partitions(collections, tasks, cursors)
 
         # Combine results
         combined: list[dict[str, Any]] = []
@@ -209,6 +523,31 @@ class RollingMessageService:
 
         return combined
 
+    async def _gather_partitions(
+        self,
+        collection_names: Sequence[str],
+        reads: Sequence[Awaitable[Any]],
+        cursors: Sequence[Any] = (),
+    ) -> List[Any]:
+        """
+        Await per-collection reads in parallel, returning failures in place.
+        Collections that exceed the request's query budget are recorded on
+        it, so callers can flag the combined result as partial. If the
+        request is cancelled, the reads are cancelled and their server-side
+        cursors and operations released.
+        """
+        try:
+            results = await asyncio.gather(*reads, return_exceptions=True)
+        except asyncio.CancelledError:
+            abandon(self.db, cursors)
+            raise
+
+        budget = current_budget()
+        for name, result in zip(collection_names, results):
+            if isinstance(result, ExecutionTimeout) and budget is not None:
+                budget.record_timeout(name)
+        return results
+
     async def find_one(self, filter_dict: Dict[str, Any]) -> Optional[Dict]:
         """
         Find a single document across collections.
@@ -221,10 +560,8 @@ class RollingMessageService:
                 if collection_name in await self.db.list_collection_names():
                     return await self.db[collection_name].find_one(filter_dict)
 
-        # Otherwise search recent collections
-        end_date = datetime.now(UTC)
-        start_date = end_date - timedelta(days=90)
-        collections = await self.get_collections_for_range(start_date, end_date)
+        # Otherwise search the collections the filter routes to
+        collections = await self.collections_for(filter_dict)
 
         for coll_name in reversed(collections):  # Start with most recent
             doc = await self.db[coll_name].find_one(filter_dict)
@@ -249,12 +586,51 @@ class RollingMessageService:
         result = await self.db[collection_name].update_one(filter_dict, update_dict)
         return result.modified_count > 0
 
+    async def update_many(
+        self, filter_dict: Dict[str, Any], update_dict: Dict[str, Any]
+    ) -> int:
+        """
+        Update matching documents in every monthly collection.
+        Returns the total number of modified documents.
+        """
+        collections = await self.db.list_collection_names()
+        message_collections = [c for c in collections if c.startswith("messages_")]
+        if not message_collections:
+            return 0
+
+        tasks = [
+            self.db[coll_name].update_many(filter_dict, update_dict)
+            for coll_name in message_collections
+        ]
+        results: List[Union[UpdateResult, BaseException]] = await asyncio.gather(
+            *tasks, return_exceptions=True
+        )
+        return sum(
+            r.modified_count for r in results if not isinstance(r, BaseException)
+        )
+
+    async def update_session_messages(
+        self,
+        session_id: str,
+        filter_dict: Dict[str, Any],
+        update: Union[Dict[str, Any], List[Dict[str, Any]]],
+    ) -> int:
+        """
+        Update matching messages of a session in the collections it spans.
+        Returns the number of modified documents.
+        """
+        collection_names = await self._get_session_collections(session_id, None, None)
+        query = {"sessionId": session_id, **filter_dict}
+        results = await asyncio.gather(
+            *(self.db[c].update_many(query, update) for c in collection_names)
+        )
+        return sum(r.modified_count for r in results)
+
     async def count_documents(self, filter_dict: Dict[str, Any]) -> int:
         """
         Count documents across collections matching filter.
         """
-        start_date, end_date = self._extract_date_range(filter_dict)
-        collections = await self.get_collections_for_range(start_date, end_date)
+        collections = await self.collections_for(filter_dict)
 
         if not collections:
             return 0
@@ -263,9 +639,9 @@ class RollingMessageService:
         tasks = []
         for coll_name in collections:
             collection = self.db[coll_name]
-            tasks.append(collection.count_documents(filter_dict))
+            tasks.append(collection.count_documents(filter_dict, **aggregate_options()))
 
-        counts = await asyncio.gather(*tasks, return_exceptions=True)
+        counts = await self._gather_partitions(collections, tasks)
         total = sum(
             c for c in counts if not isinstance(c, Exception) and isinstance(c, int)
         )
@@ -1,5 +1,6 @@
 """Search service implementation."""
 
+import asyncio
 import json
 import logging
 import re
@@ -8,6 +9,7 @@ from typing import Any
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import ExecutionTimeout
 
 from app.schemas.search import (
     SearchFilters,
@@ -16,11 +18,27 @@ from app.schemas.search import (
     SearchResult,
     SearchSuggestion,
 )
+from app.services.blob_store import BLOB_FIELDS, SEARCH_TEXT_FIELD
+from app.services.message_repository import MessageRepository
+from app.services.query_budget import abandon, aggregate_options, current_budget
+from app.services.request_coalescer import coalesced
 from app.services.rolling_message_service import RollingMessageService
 
 logger = logging.getLogger(__name__)
 
 
+def _text_conditions(pattern: str) -> list[dict[str, Any]]:
+    """Case-insensitive regex matches on every searchable message field.
+
+    Fields moved to the blob store keep only a preview inline, so their
+    full text is matched through ``searchText``.
+    """
+    regex = {"$regex": pattern, "$options": "i"}
+    fields = ["content", "message.content", "toolUseResult"]
+    fields += [f"{SEARCH_TEXT_FIELD}.{field}" for field in BLOB_FIELDS]
+    return [{field: regex} for field in fields]
+
+
 class SearchService:
     """Service for search operations."""
 
@@ -40,8 +58,6 @@ class SearchService:
         continue_token: str | None = None,
     ) -> SearchResponse:
         """Search messages progressively across monthly collections."""
-        start_time = datetime.now(UTC)
-
         # Validate regex pattern if regex mode
         if is_regex:
             try:
@@ -65,6 +81,28 @@ class SearchService:
                     continue_token=None,
                 )
 
+        response = await self._search_messages(
+            query, filters, skip, limit, highlight, is_regex, continue_token
+        )
+
+        # Log every search, including those served from a shared result
+        await self._log_search(query, filters, response.total, response.took_ms)
+        return response
+
+    @coalesced
+    async def _search_messages(
+        self,
+        query: str,
+        filters: SearchFilters | None,
+        skip: int,
+        limit: int,
+        highlight: bool,
+        is_regex: bool,
+        continue_token: str | None,
+    ) -> SearchResponse:
+        """Search the monthly collections, shared by identical searches."""
+        start_time = datetime.now(UTC)
+
         # Parse continuation token
         search_state = self._parse_continue_token(continue_token)
 
@@ -103,19 +141,35 @@ class SearchService:
         searched_collections = []
 
         # Search collections one by one until we have enough results
+        budget = current_budget()
+        out_of_time = False
         for collection_name in collections_to_search:
+            # Months left unsearched are reachable through the continue token
+            if budget is not None and budget.expired():
+                out_of_time = True
+                break
+
             # Update search status
             logger.info(f"Searching collection: {collection_name} for query: {query}")
 
             # Build and execute search pipeline for this collection
-            if is_regex:
-                results, count = await self._search_collection_regex(
-                    collection_name, query, filters, is_regex
-                )
-            else:
-                results, count = await self._search_collection_text(
-                    collection_name, query, filters
-                )
+            try:
+                if is_regex:
+                    results, count = await self._search_collection_regex(
+                        collection_name, query, filters, is_regex
+                    )
+                else:
+                    results, count = await self._search_collection_text(
+                        collection_name, query, filters
+                    )
+            except ExecutionTimeout:
+                if budget is not None:
+                    budget.record_timeout(collection_name)
+                out_of_time = True
+                break
+            except asyncio.CancelledError:
+                abandon(self.db)
+                raise
 
             searched_collections.append(collection_name)
             total_count += count
@@ -151,9 +205,6 @@ class SearchService:
         # Calculate duration
         duration_ms = int((datetime.now(UTC) - start_time).total_seconds() * 1000)
 
-        # Log search
-        await self._log_search(query, filters, total_count, duration_ms)
-
         # Format months searched for display
         months_display = [
             c.replace("messages_", "").replace("_", "-")
@@ -168,7 +219,10 @@ class SearchService:
             results=paginated_results,
             took_ms=duration_ms,
             filters_applied=filters.model_dump(exclude_none=True) if filters else {},
-            search_status=f"Searched {len(searched_collections)} month(s)",
+            search_status=(
+                f"Searched {len(searched_collections)} month(s)"
+                + (", time budget reached" if out_of_time else "")
+            ),
             months_searched=months_display,
             has_more_months=has_more,
             continue_token=new_continue_token,
@@ -340,11 +394,7 @@ class SearchService:
         pipeline.append(
             {
                 "$match": {
-                    "$or": [
-                        {"content": {"$regex": query, "$options": "i"}},
-                        {"message.content": {"$regex": query, "$options": "i"}},
-                        {"toolUseResult": {"$regex": query, "$options": "i"}},
-                    ]
+                    "$or": _text_conditions(query)
                 }
             }
         )
@@ -388,7 +438,11 @@ class SearchService:
                                     {
                                         "$regexMatch": {
                                             "input": {
-                                                "$ifNull": ["$toolUseResult", ""]
+                                                "$ifNull": [
+                                                    "$searchText.toolUseResult",
+                                                    "$toolUseResult",
+                                                    "",
+                                                ]
                                             },
                                             "regex": query,
                                             "options": "i",
@@ -468,11 +522,7 @@ class SearchService:
         pipeline.append(
             {
                 "$match": {
-                    "$or": [
-                        {"content": {"$regex": query, "$options": "i"}},
-                        {"message.content": {"$regex": query, "$options": "i"}},
-                        {"toolUseResult": {"$regex": query, "$options": "i"}},
-                    ]
+                    "$or": _text_conditions(query)
                 }
             }
         )
@@ -577,13 +627,7 @@ class SearchService:
         if filters.has_code:
             # Improved regex to catch various code patterns
             code_pattern = r"(```|`[^`]+`|\b(function|def|class|import|from|require|var|let|const)\b|=>|\.\w+\()"
-            conditions["$or"] = [
-                {"message.content": {"$regex": code_pattern, "$options": "i"}},
-                {"toolUseResult": {"$regex": code_pattern, "$options": "i"}},
-                {
-                    "content": {"$regex": code_pattern, "$options": "i"}
-                },  # For direct content field
-            ]
+            conditions["$or"] = _text_conditions(code_pattern)
 
         if filters.min_cost is not None:
             conditions["costUsd"] = {"$gte": filters.min_cost}
@@ -717,7 +761,10 @@ class SearchService:
 
         # Check tool results
         if doc.get("toolUseResult"):
-            tool_result = str(doc["toolUseResult"])
+            # Large results are previews inline; match on their full text
+            tool_result = (doc.get(SEARCH_TEXT_FIELD) or {}).get(
+                "toolUseResult"
+            ) or str(doc["toolUseResult"])
             if self._matches_query(tool_result, query, is_regex):
                 snippet = self._create_highlighted_snippet(
                     tool_result, query, max_length=150, is_regex=is_regex
@@ -830,6 +877,7 @@ class SearchService:
 
         return query
 
+    @coalesced
     async def get_suggestions(
         self, partial_query: str, limit: int
     ) -> list[SearchSuggestion]:
@@ -885,13 +933,13 @@ class SearchService:
 
             # Get distinct models from user's messages
             if session_ids:
-                models = await self.db.messages.distinct(
+                models = await MessageRepository(self.db).distinct(
                     "model", {"sessionId": {"$in": session_ids}}
                 )
             else:
                 models = []
         else:
-            models = await self.db.messages.distinct("model")
+            models = await MessageRepository(self.db).distinct("model", {})
 
         for model in models:
             if model and partial_query.lower() in model.lower():
@@ -901,6 +949,8 @@ class SearchService:
 
         return suggestions[:limit]
 
+    # Not coalesced: the search log changes on every search, and a user
+    # expects their own just-run query to show up here immediately
     async def get_recent_searches(self, limit: int) -> list[dict[str, Any]]:
         """Get recent search queries."""
         recent = (
@@ -1105,7 +1155,9 @@ class SearchService:
         pipeline.append({"$sort": {"score": -1, "timestamp": -1}})
 
         # Execute search
-        results = await collection.aggregate(pipeline).to_list(100)
+        results = await collection.aggregate(pipeline, **aggregate_options()).to_list(
+            100
+        )
 
         # Get count
         count_pipeline: list[dict[str, Any]] = [
@@ -1133,7 +1185,9 @@ class SearchService:
             )
         count_pipeline.append({"$count": "total"})
 
-        count_result = await collection.aggregate(count_pipeline).to_list(1)
+        count_result = await collection.aggregate(
+            count_pipeline, **aggregate_options()
+        ).to_list(1)
         count = count_result[0]["total"] if count_result else 0
 
         return results, count
@@ -1150,11 +1204,7 @@ class SearchService:
 
         # Build regex match
         match_stage: dict[str, Any] = {
-            "$or": [
-                {"content": {"$regex": query, "$options": "i"}},
-                {"message.content": {"$regex": query, "$options": "i"}},
-                {"toolUseResult": {"$regex": query, "$options": "i"}},
-            ]
+            "$or": _text_conditions(query)
         }
 
         # Add filters
@@ -1286,7 +1336,9 @@ class SearchService:
         pipeline.append({"$sort": {"score": -1, "timestamp": -1}})
 
         # Execute search
-        results = await collection.aggregate(pipeline).to_list(100)
+        results = await collection.aggregate(pipeline, **aggregate_options()).to_list(
+            100
+        )
 
         # Get count
         count = len(results)  # Simple count for regex search
@@ -1,5 +1,7 @@
 """Session service layer."""
 
+import asyncio
+import hashlib
 from datetime import UTC, datetime
 from typing import Any
 
@@ -8,6 +10,14 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.schemas.message import Message
 from app.schemas.session import Session, SessionDetail
+from app.services.conversation_tree import TREE_PROJECTION, ConversationTree
+from app.services.message_repository import MessageRepository
+
+# Number of leading user/assistant messages inspected for a summary
+SUMMARY_HEAD_WINDOW = 3
+
+# Fields read when generating a summary; avoids transferring tool payloads
+SUMMARY_PROJECTION = {"type": 1, "content": 1}
 
 
 class SessionService:
@@ -15,6 +25,7 @@ class SessionService:
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
+        self.messages = MessageRepository(db)
 
     async def list_sessions(
         self,
@@ -26,26 +37,9 @@ class SessionService:
         sort_order: str,
     ) -> tuple[list[Session], int]:
         """List sessions with pagination."""
-        # Get user's project IDs first
-        user_projects = await self.db.projects.find(
-            {"user_id": ObjectId(user_id)}, {"_id": 1}
-        ).to_list(None)
-        project_ids = [p["_id"] for p in user_projects]
-
-        # If no specific project filter is provided, filter by all user's projects
-        # If a specific project is provided, ensure it belongs to the user
-        if "projectId" in filter_dict:
-            # Verify the specified project belongs to the user
-            specified_project = filter_dict["projectId"]
-            if specified_project not in project_ids:
-                # Project doesn't belong to user, return empty result
-                return [], 0
-        else:
-            # No specific project filter, show all user's projects
-            filter_dict["projectId"] = {"$in": project_ids}
-
-        # Remove any user_id filter that might have been passed
-        filter_dict.pop("user_id", None)
+        # Sessions carry a denormalized user_id stamped at ingest, so tenant
+        # scoping (including any projectId filter) is a direct indexed match
+        filter_dict["user_id"] = ObjectId(user_id)
 
         # Count total
         total = await self.db.sessions.count_documents(filter_dict)
@@ -126,22 +120,18 @@ class SessionService:
         actual_session_id = doc["sessionId"]
 
         # Get additional details
-        models_used = await self.db.messages.distinct(
-            "model",
-            {
-                "sessionId": actual_session_id,
-                "model": {"$ne": None},
-            },
-        )
-
-        # Get first and last messages
-        first_msg = await self.db.messages.find_one(
-            {"sessionId": actual_session_id},
-            sort=[("timestamp", 1)],
-        )
-        last_msg = await self.db.messages.find_one(
-            {"sessionId": actual_session_id},
-            sort=[("timestamp", -1)],
+        session_filter = {"sessionId": actual_session_id}
+        models_used, first_msg, last_msg = await asyncio.gather(
+            self.messages.distinct(
+                "model", {**session_filter, "model": {"$ne": None}}
+            ),
+            # First and last messages
+            self.messages.find_first(
+                session_filter, {"content": 1, "cwd": 1}, sort_order="asc"
+            ),
+            self.messages.find_first(
+                session_filter, {"content": 1}, sort_order="desc"
+            ),
         )
 
         # Get working directory from first message
@@ -214,11 +204,8 @@ class SessionService:
         # Get the actual sessionId from the document
         actual_session_id = doc["sessionId"]
 
-        cursor = (
-            self.db.messages.find({"sessionId": actual_session_id})
-            .sort("timestamp", 1)
-            .skip(skip)
-            .limit(limit)
+        cursor = self.messages.stream(
+            {"sessionId": actual_session_id}, "list", skip=skip, limit=limit
         )
 
         messages = []
@@ -279,7 +266,13 @@ class SessionService:
     async def get_message_thread(
         self, user_id: str, session_id: str, message_uuid: str, depth: int
     ) -> dict[str, Any] | None:
-        """Get conversation thread for a message."""
+        """Get conversation thread for a message.
+
+        The session's parent links are fetched once (tree fields only) and
+        traversed in memory with the depth limit applied before any message
+        content is loaded, so deep threads cost two queries per partition
+        instead of one round trip per ancestor and descendant.
+        """
         # First get the session to find the actual sessionId
         try:
             if not ObjectId.is_valid(session_id):
@@ -287,122 +280,84 @@ class SessionService:
             session_doc = await self.db.sessions.find_one({"_id": ObjectId(session_id)})
             if not session_doc:
                 return None
-            actual_session_id = session_doc["sessionId"]
-        except Exception:
-            return None
 
-        # Find the target message
-        target = await self.db.messages.find_one(
-            {
-                "sessionId": actual_session_id,
-                "uuid": message_uuid,
-            }
-        )
+            # Verify the session belongs to a project owned by the user
+            project = await self.db.projects.find_one(
+                {"_id": session_doc["projectId"], "user_id": ObjectId(user_id)}
+            )
+            if not project:
+                return None
 
-        if not target:
+            actual_session_id = session_doc["sessionId"]
+        except Exception:
             return None
 
-        thread: dict[str, Any] = {
-            "target": Message(
-                _id=str(target["_id"]),
-                uuid=target["uuid"],
-                type=target["type"],
-                session_id=target["sessionId"],
-                content=target.get("content"),
-                timestamp=target["timestamp"],
-                model=target.get("model"),
-                parent_uuid=target.get("parentUuid"),
-                created_at=target["createdAt"],
-            ),
-            "ancestors": [],
-            "descendants": [],
-        }
+        start_date = session_doc.get("startedAt")
+        end_date = session_doc.get("endedAt")
 
-        # Get ancestors
-        current_uuid = target.get("parentUuid")
-        ancestor_depth = 0
-        while current_uuid and ancestor_depth < depth:
-            parent = await self.db.messages.find_one(
-                {
-                    "sessionId": actual_session_id,
-                    "uuid": current_uuid,
-                }
+        tree = ConversationTree(
+            await self.messages.find_session_messages(
+                actual_session_id,
+                start_date,
+                end_date,
+                projection=TREE_PROJECTION,
             )
-            if not parent:
-                break
-
-            ancestors_list: list[Any] = thread["ancestors"]
-            ancestors_list.insert(
-                0,
-                Message(
-                    _id=str(parent["_id"]),
-                    uuid=parent["uuid"],
-                    type=parent["type"],
-                    session_id=parent["sessionId"],
-                    content=parent.get("content"),
-                    timestamp=parent["timestamp"],
-                    model=parent.get("model"),
-                    parent_uuid=parent.get("parentUuid"),
-                    created_at=parent["createdAt"],
-                ),
-            )
-
-            current_uuid = parent.get("parentUuid")
-            ancestor_depth += 1
-
-        # Get descendants
-        descendants = await self._get_descendants(
-            user_id, actual_session_id, message_uuid, depth
         )
-        thread["descendants"] = descendants
+        if message_uuid not in tree:
+            return None
 
-        return thread
+        ancestor_uuids = tree.ancestors(message_uuid, depth)
+        descendant_uuids = tree.descendants(message_uuid, depth)
 
-    async def _get_descendants(
-        self,
-        user_id: str,
-        session_id: str,
-        parent_uuid: str,
-        depth: int,
-        current_depth: int = 0,
-    ) -> list[Message]:
-        """Recursively get descendants of a message."""
-        if current_depth >= depth:
-            return []
-
-        cursor = self.db.messages.find(
-            {
-                "sessionId": session_id,
-                "parentUuid": parent_uuid,
-                "user_id": ObjectId(user_id),
-            }
-        ).sort("timestamp", 1)
-
-        descendants = []
-        async for doc in cursor:
-            message = Message(
-                _id=str(doc["_id"]),
-                uuid=doc["uuid"],
-                type=doc["type"],
-                session_id=doc["sessionId"],
-                content=doc.get("content"),
-                timestamp=doc["timestamp"],
-                model=doc.get("model"),
-                parent_uuid=doc.get("parentUuid"),
-                created_at=doc["createdAt"],
-            )
-            descendants.append(message)
+        # Hydrate only the messages that made it into the thread
+        docs = await self.messages.find_session_messages(
+            actual_session_id,
+            start_date,
+            end_date,
+            extra_filter={
+                "uuid": {"$in": [message_uuid, *ancestor_uuids, *descendant_uuids]}
+            },
+            projection="list",
+        )
+        docs_by_uuid = {doc["uuid"]: doc for doc in docs}
+        if message_uuid not in docs_by_uuid:
+            return None
 
-            # Get descendants of this message
-            sub_descendants = await self._get_descendants(
-                user_id, session_id, doc["uuid"], depth, current_depth + 1
-            )
-            descendants.extend(sub_descendants)
+        return {
+            "target": self._doc_to_thread_message(docs_by_uuid[message_uuid]),
+            "ancestors": [
+                self._doc_to_thread_message(docs_by_uuid[uuid])
+                for uuid in ancestor_uuids
+                if uuid in docs_by_uuid
+            ],
+            "descendants": [
+                self._doc_to_thread_message(docs_by_uuid[uuid])
+                for uuid in descendant_uuids
+                if uuid in docs_by_uuid
+            ],
+        }
 
-        return descendants
+    def _doc_to_thread_message(self, doc: dict[str, Any]) -> Message:
+        """Convert a message document to a thread entry."""
+        return Message(
+            _id=str(doc["_id"]),
+            uuid=doc["uuid"],
+            type=doc["type"],
+            session_id=doc["sessionId"],
+            content=doc.get("content"),
+            timestamp=doc["timestamp"],
+            model=doc.get("model"),
+            parent_uuid=doc.get("parentUuid"),
+            created_at=doc.get("createdAt", doc["timestamp"]),
+        )
 
     async def generate_summary(self, user_id: str, session_id: str) -> str | None:
-        """Generate a summary for a session."""
+        """Generate a summary for a session.
+
+        Reads only the first few user/assistant messages (type and content)
+        and skips regeneration when the conversation's fingerprint matches
+        the one stored with the existing summary.
+        """
         # Get session by _id
         try:
             if not ObjectId.is_valid(session_id):
@@ -422,25 +377,59 @@ class SessionService:
         except Exception:
             return None
 
-        # Get first and last few messages
-        messages = (
-            await self.db.messages.find(
-                {
-                    "sessionId": actual_session_id,
-                    "type": {"$in": ["user", "assistant"]},
-                    "user_id": ObjectId(user_id),
-                }
-            )
-            .sort("timestamp", 1)
-            .to_list(None)
+        start_date = session.get("startedAt")
+        end_date = session.get("endedAt")
+        conversation_filter = {"type": {"$in": ["user", "assistant"]}}
+
+        # Fingerprint the conversation from its size and tail so unchanged
+        # sessions skip regeneration
+        message_count, tail = await asyncio.gather(
+            self.messages.count_session_messages(
+                actual_session_id, start_date, end_date, conversation_filter
+            ),
+            self.messages.find_session_messages(
+                actual_session_id,
+                start_date,
+                end_date,
+                extra_filter=conversation_filter,
+                projection={"uuid": 1, "timestamp": 1},
+                limit=1,
+                sort_order="desc",
+            ),
         )
 
-        if not messages:
+        if not message_count:
             return "Empty conversation"
 
-        # Enhanced summary generation
+        content_hash = self._summary_content_hash(
+            message_count, tail[0] if tail else None
+        )
+        stored_hash = session.get("summaryContentHash")
+        if session.get("summary") and stored_hash == content_hash:
+            return str(session["summary"])
+
+        # Only the head of the conversation feeds the summary
+        messages = await self.messages.find_session_messages(
+            actual_session_id,
+            start_date,
+            end_date,
+            extra_filter=conversation_filter,
+            projection=SUMMARY_PROJECTION,
+            limit=SUMMARY_HEAD_WINDOW,
+        )
         first_user_msg = next((msg for msg in messages if msg["type"] == "user"), None)
+        if first_user_msg is None:
+            user_msgs = await self.messages.find_session_messages(
+                actual_session_id,
+                start_date,
+                end_date,
+                extra_filter={"type": "user"},
+                projection=SUMMARY_PROJECTION,
+                limit=1,
+            )
+            first_user_msg = user_msgs[0] if user_msgs else None
 
+        # Enhanced summary generation
         if first_user_msg and first_user_msg.get("content"):
             content: str = first_user_msg["content"]
 
@@ -501,14 +490,29 @@ class SessionService:
                         summary = "Bug fixing session"
                         break
                 else:
-                    summary = f"Conversation with {len(messages)} messages"
+                    summary = f"Conversation with {message_count} messages"
             else:
-                summary = f"Conversation with {len(messages)} messages"
+                summary = f"Conversation with {message_count} messages"
 
         # Update session with summary
         await self.db.sessions.update_one(
             {"_id": ObjectId(session_id), "user_id": ObjectId(user_id)},
-            {"$set": {"summary": summary, "updatedAt": datetime.now(UTC)}},
+            {
+                "$set": {
+                    "summary": summary,
+                    "summaryContentHash": content_hash,
+                    "updatedAt": datetime.now(UTC),
+                }
+            },
         )
 
         return summary
+
+    def _summary_content_hash(
+        self, message_count: int, last_message: dict[str, Any] | None
+    ) -> str:
+        """Fingerprint a session's conversation for summary caching."""
+        last_uuid = last_message.get("uuid") if last_message else None
+        last_timestamp = last_message.get("timestamp") if last_message else None
+        fingerprint = f"{message_count}:{last_uuid}:{last_timestamp}"
+        return hashlib.sha256(fingerprint.encode()).hexdigest()
@@ -0,0 +1,242 @@
+"""Materialized storage statistics for the admin dashboard."""
+
+import asyncio
+from datetime import UTC, datetime
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Document _id of the single system-wide snapshot in ``system_stats``
+SYSTEM_STATS_ID = "global"
+
+# Snapshot kinds and the user document field holding each kind's count
+SNAPSHOT_KINDS = {
+    "projects": "project_count",
+    "sessions": "session_count",
+    "messages": "message_count",
+}
+
+
+def empty_storage_delta() -> Dict[str, Dict[str, int]]:
+    """Return a zeroed ``{kind: {"count", "bytes"}}`` delta."""
+    return {kind: {"count": 0, "bytes": 0} for kind in SNAPSHOT_KINDS}
+
+
+class StatsSnapshotService:
+    """Maintain storage snapshots instead of scanning collections on read.
+
+    Per-user figures live on the user document, in the fields already cached
+    by ``StorageMetricsService.update_user_storage_cache``. System totals live
+    in a single ``system_stats`` document shaped like
+    ``StorageMetricsService.calculate_system_metrics``.
+
+    Ingest applies exact deltas as documents are written. Deletions only know
+    how many documents went away, so they decrement counts and flag the
+    affected user as dirty. The reconciler replaces system totals with
+    ``collStats`` figures and recomputes dirty users, correcting any drift.
+    Snapshot updates never fail the write that triggered them.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def record_ingest(
+        self, user_id: str, delta: Dict[str, Dict[str, int]]
+    ) -> None:
+        """Apply counts and BSON sizes of newly written documents."""
+        if not any(d["count"] or d["bytes"] for d in delta.values()):
+            return
+
+        try:
+            await self._apply_delta(user_id, delta, mark_dirty=False)
+        except Exception as e:
+            logger.warning(f"Failed to record ingest in stats snapshot: {e}")
+
+    async def record_deletion(
+        self,
+        user_id: str,
+        projects: int = 0,
+        sessions: int = 0,
+        messages: int = 0,
+    ) -> None:
+        """Apply deleted document counts and flag the owner for recompute."""
+        delta = empty_storage_delta()
+        delta["projects"]["count"] = -projects
+        delta["sessions"]["count"] = -sessions
+        delta["messages"]["count"] = -messages
+
+        try:
+            await self._apply_delta(user_id, delta, mark_dirty=True)
+        except Exception as e:
+            logger.warning(f"Failed to record deletion in stats snapshot: {e}")
+
+    async def record_user_removed(
+        self, projects: int = 0, sessions: int = 0, messages: int = 0
+    ) -> None:
+        """Apply a cascade user deletion to the system snapshot."""
+        update = {
+            "$inc": {
+                "breakdown.projects_count": -projects,
+                "breakdown.sessions_count": -sessions,
+                "breakdown.messages_count": -messages,
+                "total_document_count": -(projects + sessions + messages),
+            },
+            "$set": {"updated_at": datetime.now(UTC), "dirty": True},
+        }
+        try:
+            await self.db.system_stats.update_one(
+                {"_id": SYSTEM_STATS_ID}, update, upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to record user removal in stats snapshot: {e}")
+
+    async def _apply_delta(
+        self, user_id: str, delta: Dict[str, Dict[str, int]], mark_dirty: bool
+    ) -> None:
+        """Increment the user and system snapshots by ``delta``."""
+        now = datetime.now(UTC)
+        total_count = sum(d["count"] for d in delta.values())
+        total_bytes = sum(d["bytes"] for d in delta.values())
+
+        user_inc: Dict[str, int] = {"total_disk_usage": total_bytes}
+        system_inc: Dict[str, int] = {
+            "total_disk_usage": total_bytes,
+            "total_document_count": total_count,
+        }
+        for kind, field in SNAPSHOT_KINDS.items():
+            user_inc[field] = delta[kind]["count"]
+            system_inc[f"breakdown.{kind}_count"] = delta[kind]["count"]
+            system_inc[f"breakdown.{kind}_bytes"] = delta[kind]["bytes"]
+
+        user_set: Dict[str, Any] = {"storage_updated_at": now}
+        system_set: Dict[str, Any] = {"updated_at": now}
+        if mark_dirty:
+            # Sizes of deleted documents are unknown until reconciled
+            user_set["storage_dirty"] = True
+            system_set["dirty"] = True
+
+        await asyncio.gather(
+            self.db.users.update_one(
+                {"_id": ObjectId(user_id)}, {"$inc": user_inc, "$set": user_set}
+            ),
+            self.db.system_stats.update_one(
+                {"_id": SYSTEM_STATS_ID},
+                {"$inc": system_inc, "$set": system_set},
+                upsert=True,
+            ),
+        )
+
+    async def get_system_metrics(self) -> Dict[str, Any]:
+        """Return the system snapshot, reconciling first if none exists."""
+        snapshot: Optional[Dict[str, Any]] = await self.db.system_stats.find_one(
+            {"_id": SYSTEM_STATS_ID}
+        )
+        if snapshot is None or "reconciled_at" not in snapshot:
+            return await self.reconcile_system()
+
+        breakdown = snapshot.get("breakdown", {})
+        return {
+            "total_disk_usage": snapshot.get("total_disk_usage", 0),
+            "total_document_count": snapshot.get("total_document_count", 0),
+            "breakdown": {
+                f"{kind}_{metric}": max(breakdown.get(f"{kind}_{metric}", 0), 0)
+                for kind in SNAPSHOT_KINDS
+                for metric in ("bytes", "count")
+            },
+            "calculated_at": snapshot.get("updated_at")
+            or snapshot.get("reconciled_at"),
+        }
+
+    async def reconcile_system(self) -> Dict[str, Any]:
+        """Rebuild the system snapshot from collection statistics.
+
+        Uses ``collStats`` (falling back to ``estimatedDocumentCount``), which
+        reads collection metadata rather than documents.
+        """
+        all_collections = await self.db.list_collection_names()
+        message_collections = [c for c in all_collections if c.startswith("messages_")]
+        if not message_collections and "messages" in all_collections:
+            message_collections = ["messages"]
+
+        groups = {
+            "projects": ["projects"],
+            "sessions": ["sessions"],
+            "messages": message_collections,
+        }
+
+        breakdown: Dict[str, int] = {}
+        for kind, names in groups.items():
+            results = await asyncio.gather(
+                *(self._collection_stats(name) for name in names)
+            )
+            breakdown[f"{kind}_count"] = sum(r["count"] for r in results)
+            breakdown[f"{kind}_bytes"] = sum(r["size"] for r in results)
+
+        now = datetime.now(UTC)
+        snapshot = {
+            "_id": SYSTEM_STATS_ID,
+            "total_disk_usage": sum(breakdown[f"{k}_bytes"] for k in SNAPSHOT_KINDS),
+            "total_document_count": sum(
+                breakdown[f"{k}_count"] for k in SNAPSHOT_KINDS
+            ),
+            "breakdown": breakdown,
+            "dirty": False,
+            "reconciled_at": now,
+            "updated_at": now,
+        }
+        await self.db.system_stats.replace_one(
+            {"_id": SYSTEM_STATS_ID}, snapshot, upsert=True
+        )
+
+        return {
+            "total_disk_usage": snapshot["total_disk_usage"],
+            "total_document_count": snapshot["total_document_count"],
+            "breakdown": breakdown,
+            "calculated_at": now,
+        }
+
+    async def _collection_stats(self, collection_name: str) -> Dict[str, int]:
+        """Return document count and data size from collection metadata."""
+        try:
+            stats = await self.db.command("collStats", collection_name)
+            return {
+                "count": int(stats.get("count", 0)),
+                "size": int(stats.get("size", 0)),
+            }
+        except Exception:
+            count = await self.db[collection_name].estimated_document_count()
+            return {"count": count, "size": 0}
+
+    async def reconcile_dirty_users(self, limit: int = 100) -> int:
+        """Recompute storage for users flagged by deletions.
+
+        Returns the number of users recomputed.
+        """
+        from app.services.storage_metrics import StorageMetricsService
+
+        storage_service = StorageMetricsService(self.db)
+        cursor = self.db.users.find({"storage_dirty": True}, {"_id": 1}).limit(limit)
+
+        reconciled = 0
+        async for user in cursor:
+            try:
+                await storage_service.update_user_storage_cache(str(user["_id"]))
+                reconciled += 1
+            except Exception as e:
+                logger.error(f"Failed to reconcile storage for {user['_id']}: {e}")
+
+        return reconciled
+
+    async def reconcile(self) -> Dict[str, Any]:
+        """Run a full reconciliation pass."""
+        system_metrics = await self.reconcile_system()
+        users_reconciled = await self.reconcile_dirty_users()
+        return {
+            "system_metrics": system_metrics,
+            "users_reconciled": users_reconciled,
+        }
@@ -6,11 +6,24 @@ from typing import Any, Dict, Mapping, Sequence
 
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+
+from app.core.logging import get_logger
+from app.services.stats_snapshot import SNAPSHOT_KINDS
+from app.services.websocket_manager import connection_manager
+
+logger = get_logger(__name__)
+
+# _id of the checkpoint document for the all-users recalculation job
+STORAGE_JOB_ID = "storage_recalculation"
 
 
 class StorageMetricsService:
     """Calculate and cache storage metrics per tenant."""
 
+    # Serializes all-users recalculation between the scheduler and admin API
+    _batch_lock = asyncio.Lock()
+
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
 
@@ -78,7 +91,14 @@ class StorageMetricsService:
     async def _calculate_rolling_messages_metrics(
         self, user_id: ObjectId
     ) -> Dict[str, Any]:
-        """Calculate metrics for messages across rolling collections."""
+        """Estimate metrics for messages across rolling collections.
+
+        Summing ``$bsonSize`` would read every message a user owns. Instead the
+        count comes from the ``user_id`` index and sizes are estimated from
+        each collection's average document size in ``collStats``. The largest
+        single message is unknown without that scan, so ``max_avg_size``
+        reports the largest per-collection average instead of ``max_size``.
+        """
         # Get all message collections (messages_YYYY_MM format)
         all_collections = await self.db.list_collection_names()
         message_collections = [c for c in all_collections if c.startswith("messages_")]
@@ -92,74 +112,42 @@ class StorageMetricsService:
                 "total_size": 0,
                 "document_count": 0,
                 "avg_size": 0,
-                "max_size": 0,
-            }
-
-        # Get user's session IDs through projects
-        # First get user's projects
-        user_projects = await self.db.projects.find(
-            {"user_id": user_id}, {"_id": 1}
-        ).to_list(None)
-        project_ids = [p["_id"] for p in user_projects]
-
-        if not project_ids:
-            return {
-                "total_size": 0,
-                "document_count": 0,
-                "avg_size": 0,
-                "max_size": 0,
+                "max_avg_size": 0,
             }
 
-        # Get session IDs for user's projects
-        session_ids = await self.db.sessions.distinct(
-            "sessionId", {"projectId": {"$in": project_ids}}
+        results = await asyncio.gather(
+            *(
+                self._estimate_collection_metrics(name, user_id)
+                for name in message_collections
+            )
         )
 
-        if not session_ids:
-            return {
-                "total_size": 0,
-                "document_count": 0,
-                "avg_size": 0,
-                "max_size": 0,
-            }
-
-        # Aggregate metrics across all message collections for these sessions
-        total_size = 0
-        total_count = 0
-        max_size = 0
-        all_sizes = []
-
-        for collection_name in message_collections:
-            pipeline = [
-                {"$match": {"sessionId": {"$in": session_ids}}},
-                {
-                    "$group": {
-                        "_id": None,
-                        "total_size": {"$sum": {"$bsonSize": "$$ROOT"}},
-                        "document_count": {"$sum": 1},
-                        "avg_size": {"$avg": {"$bsonSize": "$$ROOT"}},
-                        "max_size": {"$max": {"$bsonSize": "$$ROOT"}},
-                    }
-                },
-            ]
-
-            pipeline_typed: Sequence[Mapping[str, Any]] = pipeline  # type: ignore
-            result = await self.db[collection_name].aggregate(pipeline_typed).to_list(1)
-
-            if result and result[0]:
-                total_size += result[0].get("total_size", 0)
-                total_count += result[0].get("document_count", 0)
-                max_size = max(max_size, result[0].get("max_size", 0))
-                if result[0].get("document_count", 0) > 0:
-                    all_sizes.append(result[0].get("avg_size", 0))
-
-        avg_size = sum(all_sizes) / len(all_sizes) if all_sizes else 0
+        total_size = sum(r["total_size"] for r in results)
+        total_count = sum(r["document_count"] for r in results)
+        max_avg_size = max(
+            (r["avg_size"] for r in results if r["document_count"]), default=0
+        )
 
         return {
             "total_size": total_size,
             "document_count": total_count,
+            "avg_size": total_size / total_count if total_count else 0,
+            "max_avg_size": max_avg_size,
+        }
+
+    async def _estimate_collection_metrics(
+        self, collection_name: str, user_id: ObjectId
+    ) -> Dict[str, Any]:
+        """Estimate a user's share of a collection without reading documents."""
+        count_task = self.db[collection_name].count_documents({"user_id": user_id})
+        stats_task = self.db.command("collStats", collection_name)
+        document_count, stats = await asyncio.gather(count_task, stats_task)
+
+        avg_size = stats.get("avgObjSize", 0) if document_count else 0
+        return {
+            "total_size": int(document_count * avg_size),
+            "document_count": document_count,
             "avg_size": avg_size,
-            "max_size": max_size,
         }
 
     async def update_user_storage_cache(self, user_id: str) -> Dict[str, Any]:
@@ -176,7 +164,8 @@ class StorageMetricsService:
                     "message_count": metrics["messages"]["document_count"],
                     "total_disk_usage": metrics["total_disk_usage"],
                     "storage_updated_at": datetime.now(UTC),
-                }
+                },
+                "$unset": {"storage_dirty": ""},
             },
         )
 
@@ -298,25 +287,190 @@ class StorageMetricsService:
         result = await self.db.users.aggregate(pipeline_typed).to_list(None)
         return result
 
-    async def batch_update_all_users(self) -> Dict[str, Any]:
-        """Batch update storage metrics for all users."""
-        # Get all user IDs
-        user_ids = await self.db.users.distinct("_id")
+    async def batch_update_all_users(
+        self, resume: bool = True, concurrency: int = 4
+    ) -> Dict[str, Any]:
+        """Recompute storage metrics for all users.
+
+        Each collection is scanned once, grouped by owner, instead of once per
+        user. Collection results are checkpointed in ``storage_jobs`` so an
+        interrupted run resumes with the collections it has not finished.
+        Progress is broadcast as ``storage_progress`` websocket events.
+
+        Args:
+            resume: Continue an unfinished run instead of starting over
+            concurrency: Maximum number of collections scanned at once
+        """
+        async with self._batch_lock:
+            job = await self._load_or_start_job(resume)
+            job_id = job["job_id"]
+            collections: list[str] = job["collections"]
+            completed = set(job.get("completed", []))
+            total = len(collections)
+
+            await connection_manager.broadcast_storage_progress(
+                job_id, len(completed), total, "Recalculating storage..."
+            )
+
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def scan(collection_name: str) -> None:
+                async with semaphore:
+                    await self._scan_collection_by_owner(job_id, collection_name)
+                completed.add(collection_name)
+                await connection_manager.broadcast_storage_progress(
+                    job_id, len(completed), total, f"Scanned {collection_name}"
+                )
+
+            try:
+                await asyncio.gather(
+                    *(scan(c) for c in collections if c not in completed)
+                )
+                users_updated = await self._apply_job_results(job_id)
+            except Exception as e:
+                logger.error(f"Storage recalculation {job_id} failed: {e}")
+                await connection_manager.broadcast_storage_progress(
+                    job_id,
+                    len(completed),
+                    total,
+                    "Storage recalculation failed",
+                    completed=True,
+                    error=str(e),
+                )
+                raise
+
+            await connection_manager.broadcast_storage_progress(
+                job_id,
+                total,
+                total,
+                f"Updated storage for {users_updated} users",
+                completed=True,
+            )
 
-        # Update metrics for each user
-        update_tasks = []
-        for user_id in user_ids:
-            update_tasks.append(self.update_user_storage_cache(str(user_id)))
+            return {
+                "job_id": job_id,
+                "users_updated": users_updated,
+                "collections_scanned": total,
+                "timestamp": datetime.now(UTC),
+            }
 
-        # Process in batches to avoid overwhelming the database
-        batch_size = 10
-        results = []
-        for i in range(0, len(update_tasks), batch_size):
-            batch = update_tasks[i : i + batch_size]
-            batch_results = await asyncio.gather(*batch)
-            results.extend(batch_results)
+    async def _load_or_start_job(self, resume: bool) -> Dict[str, Any]:
+        """Return the unfinished checkpoint, or start a new job."""
+        if resume:
+            job = await self.db.storage_jobs.find_one(
+                {"_id": STORAGE_JOB_ID, "status": "running"}
+            )
+            if job:
+                logger.info(
+                    f"Resuming storage recalculation {job['job_id']} "
+                    f"({len(job.get('completed', []))}/{len(job['collections'])})"
+                )
+                return dict(job)
 
-        return {
-            "users_updated": len(results),
-            "timestamp": datetime.now(UTC),
+        all_collections = await self.db.list_collection_names()
+        message_collections = sorted(
+            c for c in all_collections if c.startswith("messages_")
+        )
+        if not message_collections and "messages" in all_collections:
+            message_collections = ["messages"]
+
+        now = datetime.now(UTC)
+        job = {
+            "_id": STORAGE_JOB_ID,
+            "job_id": str(ObjectId()),
+            "status": "running",
+            "collections": ["projects", "sessions", *message_collections],
+            "completed": [],
+            "started_at": now,
+            "updated_at": now,
         }
+        await self.db.storage_job_partials.delete_many({})
+        await self.db.storage_jobs.replace_one(
+            {"_id": STORAGE_JOB_ID}, job, upsert=True
+        )
+        return job
+
+    async def _scan_collection_by_owner(
+        self, job_id: str, collection_name: str
+    ) -> None:
+        """Sum document counts and sizes per owner and checkpoint them."""
+        pipeline = [
+            {"$match": {"user_id": {"$exists": True}}},
+            {
+                "$group": {
+                    "_id": "$user_id",
+                    "count": {"$sum": 1},
+                    "bytes": {"$sum": {"$bsonSize": "$$ROOT"}},
+                }
+            },
+        ]
+
+        pipeline_typed: Sequence[Mapping[str, Any]] = pipeline  # type: ignore
+        owners = await self.db[collection_name].aggregate(pipeline_typed).to_list(None)
+
+        await self.db.storage_job_partials.replace_one(
+            {"_id": f"{job_id}:{collection_name}"},
+            {
+                "job_id": job_id,
+                "collection": collection_name,
+                "kind": _collection_kind(collection_name),
+                "owners": [
+                    {"user_id": o["_id"], "count": o["count"], "bytes": o["bytes"]}
+                    for o in owners
+                ],
+            },
+            upsert=True,
+        )
+        await self.db.storage_jobs.update_one(
+            {"_id": STORAGE_JOB_ID, "job_id": job_id},
+            {
+                "$addToSet": {"completed": collection_name},
+                "$set": {"updated_at": datetime.now(UTC)},
+            },
+        )
+
+    async def _apply_job_results(self, job_id: str) -> int:
+        """Merge checkpointed partials and write every user's cached metrics."""
+        totals: Dict[Any, Dict[str, int]] = {}
+        async for partial in self.db.storage_job_partials.find({"job_id": job_id}):
+            field = SNAPSHOT_KINDS[partial["kind"]]
+            for owner in partial["owners"]:
+                user_totals = totals.setdefault(
+                    owner["user_id"],
+                    {f: 0 for f in (*SNAPSHOT_KINDS.values(), "total_disk_usage")},
+                )
+                user_totals[field] += owner["count"]
+                user_totals["total_disk_usage"] += owner["bytes"]
+
+        now = datetime.now(UTC)
+        empty = {f: 0 for f in (*SNAPSHOT_KINDS.values(), "total_disk_usage")}
+        operations = [
+            UpdateOne(
+                {"_id": user_id},
+                {
+                    "$set": {
+                        **totals.get(user_id, empty),
+                        "storage_updated_at": now,
+                    },
+                    "$unset": {"storage_dirty": ""},
+                },
+            )
+            for user_id in await self.db.users.distinct("_id")
+        ]
+        if operations:
+            await self.db.users.bulk_write(operations, ordered=False)
+
+        await self.db.storage_jobs.update_one(
+            {"_id": STORAGE_JOB_ID, "job_id": job_id},
+            {"$set": {"status": "completed", "completed_at": now}},
+        )
+        await self.db.storage_job_partials.delete_many({"job_id": job_id})
+
+        return len(operations)
+
+
+def _collection_kind(collection_name: str) -> str:
+    """Map a collection name to its storage kind."""
+    if collection_name in ("projects", "sessions"):
+        return collection_name
+    return "messages"
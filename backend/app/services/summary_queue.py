@@ -0,0 +1,104 @@
+"""Background work queue for session summary generation."""
+
+import asyncio
+from typing import Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class SummaryQueue:
+    """Generates session summaries off the ingest request path.
+
+    Requests are de-duplicated per session while queued, so a burst of
+    batches for the same session results in a single generation. Workers are
+    started lazily on the first enqueue.
+    """
+
+    def __init__(
+        self, db: AsyncIOMotorDatabase, workers: int = 2, max_size: int = 1000
+    ):
+        self.db = db
+        self._worker_count = workers
+        self._queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(maxsize=max_size)
+        self._pending: set[tuple[str, str]] = set()
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def pending_count(self) -> int:
+        """Number of sessions waiting for a summary."""
+        return len(self._pending)
+
+    def enqueue(self, user_id: str, session_id: str) -> bool:
+        """Queue summary generation for a session (by MongoDB _id).
+
+        Returns False if the session is already queued or the queue is full.
+        """
+        key = (user_id, session_id)
+        if key in self._pending:
+            return False
+
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            logger.warning(f"Summary queue full, dropping session {session_id}")
+            return False
+
+        self._pending.add(key)
+        self._ensure_workers()
+        return True
+
+    async def join(self) -> None:
+        """Wait until every queued summary has been processed."""
+        await self._queue.join()
+
+    async def stop(self) -> None:
+        """Cancel the worker tasks."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def _ensure_workers(self) -> None:
+        """Start worker tasks if none are running."""
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self._worker_count:
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def _worker(self) -> None:
+        """Process queued sessions until cancelled."""
+        from app.services.session import SessionService
+
+        while True:
+            user_id, session_id = await self._queue.get()
+            # Allow re-queueing while this one runs so later content is covered
+            self._pending.discard((user_id, session_id))
+            try:
+                await SessionService(self.db).generate_summary(user_id, session_id)
+            except Exception as e:
+                logger.error(f"Summary generation failed for session {session_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+# Global summary queue instance
+_summary_queue: Optional[SummaryQueue] = None
+
+
+def get_summary_queue(db: AsyncIOMotorDatabase) -> SummaryQueue:
+    """Get or create the global summary queue."""
+    global _summary_queue
+    if _summary_queue is None:
+        _summary_queue = SummaryQueue(db)
+    return _summary_queue
+
+
+async def stop_summary_queue() -> None:
+    """Stop the global summary queue workers."""
+    global _summary_queue
+    if _summary_queue is not None:
+        await _summary_queue.stop()
+        _summary_queue = None
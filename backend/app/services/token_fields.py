@@ -0,0 +1,137 @@
+"""Canonical token and cost fields stored on message documents.
+
+Token counts reach the backend in several shapes: ``usage`` lifted from the
+assistant message, ``metadata.usage`` from clients that send usage at the top
+level, the original ``messageData.usage`` and the legacy ``tokensInput`` /
+``inputTokens`` counters. Ingest resolves them once into a ``tokens``
+subdocument and stores ``costUsd`` as a plain double in ``cost``, so analytics
+pipelines sum and index fields directly instead of re-deriving them per scan.
+
+``TOKENS_EXPRESSION`` computes the same subdocument in an aggregation pipeline
+for backfilling existing messages.
+"""
+
+from typing import Any, Dict, Optional
+
+# Where usage may live on a message document, in order of preference
+USAGE_SOURCES = ("usage", "metadata.usage", "messageData.usage")
+
+# Message types whose tokens and cost belong to the message they came from
+UNCOUNTED_TYPES = ("tool_use", "tool_result")
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _first(*values: Any) -> int:
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return int(value)
+    return 0
+
+
+def canonical_tokens(doc: Dict[str, Any]) -> Dict[str, int]:
+    """Resolve a message document's token counts.
+
+    Returns ``{"input", "output", "cache_creation", "cache_read", "total"}``
+    where ``total`` is the sum of the other four.
+    """
+    usage = next(
+        (u for u in (_get_path(doc, s) for s in USAGE_SOURCES) if u is not None),
+        None,
+    )
+    if not isinstance(usage, dict):
+        usage = {}
+
+    tokens = {
+        "input": _first(
+            usage.get("input_tokens"), doc.get("tokensInput"), doc.get("inputTokens")
+        ),
+        "output": _first(
+            usage.get("output_tokens"),
+            doc.get("tokensOutput"),
+            doc.get("outputTokens"),
+        ),
+        "cache_creation": _first(usage.get("cache_creation_input_tokens")),
+        "cache_read": _first(usage.get("cache_read_input_tokens")),
+    }
+    tokens["total"] = sum(tokens.values())
+    return tokens
+
+
+def canonical_cost(value: Any) -> Optional[float]:
+    """Convert a stored cost (Decimal128, Decimal or number) to a float."""
+    if value is None:
+        return None
+    if hasattr(value, "to_decimal"):
+        value = value.to_decimal()
+    return float(value)
+
+
+def stamp_canonical_fields(doc: Dict[str, Any]) -> None:
+    """Set ``tokens`` and, when the document has a cost, ``cost`` in place.
+
+    Every writer of message documents goes through this so analytics that
+    sum ``$tokens.*`` and ``$cost`` see the same fields regardless of the
+    write path.
+    """
+    doc["tokens"] = canonical_tokens(doc)
+    if doc.get("costUsd") is not None:
+        doc["cost"] = canonical_cost(doc["costUsd"])
+
+
+TOKENS_EXPRESSION: Dict[str, Any] = {
+    "$let": {
+        "vars": {
+            "u": {"$ifNull": [f"${source}" for source in USAGE_SOURCES]},
+        },
+        "in": {
+            "$let": {
+                "vars": {
+                    "input": {
+                        "$ifNull": [
+                            "$$u.input_tokens",
+                            "$tokensInput",
+                            "$inputTokens",
+                            0,
+                        ]
+                    },
+                    "output": {
+                        "$ifNull": [
+                            "$$u.output_tokens",
+                            "$tokensOutput",
+                            "$outputTokens",
+                            0,
+                        ]
+                    },
+                    "cache_creation": {
+                        "$ifNull": ["$$u.cache_creation_input_tokens", 0]
+                    },
+                    "cache_read": {"$ifNull": ["$$u.cache_read_input_tokens", 0]},
+                },
+                "in": {
+                    "input": "$$input",
+                    "output": "$$output",
+                    "cache_creation": "$$cache_creation",
+                    "cache_read": "$$cache_read",
+                    "total": {
+                        "$add": [
+                            "$$input",
+                            "$$output",
+                            "$$cache_creation",
+                            "$$cache_read",
+                        ]
+                    },
+                },
+            }
+        },
+    }
+}
+
+COST_EXPRESSION: Dict[str, Any] = {"$toDouble": "$costUsd"}
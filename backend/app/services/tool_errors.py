@@ -0,0 +1,76 @@
+"""Classification of tool results as errors.
+
+Ingest stamps the outcome onto ``tool_result`` documents (``isError``,
+``errorType``, ``errorSeverity``) so error analytics query an index instead
+of inspecting every result; analytics reuse the same rules to describe the
+errors they return.
+"""
+
+from typing import Any, Dict, NamedTuple, Optional
+
+# Substrings that make stderr output an error rather than a warning or log
+STDERR_ERROR_INDICATORS = (
+    "error:",
+    "fatal:",
+    "exception",
+    "traceback",
+    "permission denied",
+    "not found",
+    "no such file",
+    "cannot",
+    "failed to",
+    "unable to",
+)
+
+
+class ToolError(NamedTuple):
+    """How a failed tool result is reported."""
+
+    error_type: str
+    severity: str
+    message: str
+
+
+def classify_tool_result(doc: Dict[str, Any]) -> Optional[ToolError]:
+    """Classify a ``tool_result`` message document.
+
+    Checks, in order: an explicit ``error`` in the tool output, stderr that
+    contains an error indicator, a non-zero exit code, and finally the
+    ``is_error`` flag Claude sets on the tool result itself. Returns ``None``
+    for successful results.
+    """
+    tool_result = doc.get("toolUseResult")
+    if isinstance(tool_result, dict):
+        if tool_result.get("error"):
+            return ToolError(
+                "execution_error", "critical", str(tool_result["error"])[:500]
+            )
+
+        stderr = str(tool_result.get("stderr") or "")
+        if stderr:
+            if any(i in stderr.lower() for i in STDERR_ERROR_INDICATORS):
+                return ToolError("stderr_error", "warning", stderr[:500])
+        elif tool_result.get("exitCode", 0) != 0:
+            stdout = tool_result.get("stdout", "")
+            message = f"Exit code {tool_result['exitCode']}"
+            if stdout:
+                message += f": {stdout[:200]}"
+            return ToolError("exit_code_error", "warning", message)
+
+    message_data = doc.get("messageData")
+    if isinstance(message_data, dict) and message_data.get("is_error"):
+        return ToolError("tool_error", "warning", str(doc.get("content") or "")[:500])
+
+    return None
+
+
+def error_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Fields stamped onto a ``tool_result`` document at ingest."""
+    error = classify_tool_result(doc)
+    if error is None:
+        return {"isError": False}
+    return {
+        "isError": True,
+        "errorType": error.error_type,
+        "errorSeverity": error.severity,
+    }
@@ -0,0 +1,302 @@
+"""Topic matching over session messages.
+
+``TopicMatcher`` compiles the keywords and file extensions of every topic
+rule into one Aho-Corasick automaton, so each message is scanned once no
+matter how many rules there are. ``SessionTopics`` accumulates the matches
+of a session message by message. ``SessionTopicStore`` keeps that state in
+the ``session_topics`` collection, so later extractions only scan messages
+ingested since.
+"""
+
+import hashlib
+import json
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Characters that may precede a file extension within a path
+PATH_PUNCTUATION = frozenset("_/-.")
+
+# Distinct files kept per topic; relevance saturates long before
+MAX_FILES_PER_TOPIC = 25
+
+# ``createdAt`` is stamped before insert, so a slow write can commit after
+# messages stamped later. Rescans reach this far behind the watermark.
+WATERMARK_LAG = timedelta(minutes=5)
+
+
+def _is_word(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _is_path(char: str) -> bool:
+    return char.isalnum() or char in PATH_PUNCTUATION
+
+
+class TopicMatcher:
+    """Aho-Corasick automaton over the keywords and extensions of topic rules.
+
+    Keywords match as whole words. Extensions match at the end of a file
+    name and report the whole path they end.
+    """
+
+    def __init__(self, rules: Dict[str, Dict[str, Any]]):
+        # Identifies the rules, so state built from other rules is discarded
+        self.version = hashlib.sha1(
+            json.dumps(
+                {
+                    name: [
+                        sorted(rule["keywords"]),
+                        sorted(rule.get("file_extensions", [])),
+                    ]
+                    for name, rule in rules.items()
+                },
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()[:12]
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (topic, pattern length, is extension) of patterns ending there
+        self._out: List[List[Tuple[str, int, bool]]] = [[]]
+        for topic, rule in rules.items():
+            for keyword in rule["keywords"]:
+                self._add(keyword.lower(), topic, False)
+            for extension in rule.get("file_extensions", []):
+                self._add(extension.lower(), topic, True)
+        self._link()
+
+    def _add(self, pattern: str, topic: str, extension: bool) -> None:
+        state = 0
+        for char in pattern:
+            following = self._goto[state].get(char)
+            if following is None:
+                following = len(self._goto)
+                self._goto[state][char] = following
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = following
+        self._out[state].append((topic, len(pattern), extension))
+
+    def _link(self) -> None:
+        """Add failure links breadth first and merge their outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self._goto[state].items():
+                queue.append(following)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[following] = self._goto[fallback].get(char, 0)
+                self._out[following] = (
+                    self._out[following] + self._out[self._fail[following]]
+                )
+
+    def scan(self, text: str) -> Iterator[Tuple[str, str, bool]]:
+        """Yield ``(topic, term, is_extension)`` for each match in ``text``."""
+        text = text.lower()
+        goto, fail, out = self._goto, self._fail, self._out
+        root = goto[0]
+        length = len(text)
+        state = 0
+        for end, char in enumerate(text, 1):
+            if state == 0 and char not in root:
+                continue
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if not out[state]:
+                continue
+            for topic, size, extension in out[state]:
+                start = end - size
+                ends_word = end == length or not _is_word(text[end])
+                if extension:
+                    # Needs a file name before it and nothing after it
+                    if start == 0 or not _is_word(text[start - 1]) or not ends_word:
+                        continue
+                    while start > 0 and _is_path(text[start - 1]):
+                        start -= 1
+                elif (start > 0 and _is_word(text[start - 1])) or not ends_word:
+                    continue
+                yield topic, text[start:end], extension
+
+
+def message_texts(message: Dict[str, Any]) -> Iterator[str]:
+    """Text of a message's content, block by block."""
+    content = message.get("content")
+    if not content:
+        return
+    if isinstance(content, list):
+        # Handle Claude API format with content blocks
+        for block in content:
+            if isinstance(block, dict) and block.get("type") == "text":
+                yield block.get("text", "")
+    else:
+        yield str(content)
+
+
+class SessionTopics:
+    """Topic matches of one session, folded in message by message."""
+
+    def __init__(self, session_id: str, version: str):
+        self.session_id = session_id
+        self.version = version
+        self.terms: Dict[str, Set[str]] = {}
+        self.files: Dict[str, Set[str]] = {}
+        self.tool_usage: Dict[str, int] = {}
+        self.message_count = 0
+        # Latest ``createdAt`` folded in; newer messages are still to scan
+        self.watermark: Optional[datetime] = None
+        # ``createdAt`` by ``_id`` of the messages folded in within
+        # ``WATERMARK_LAG`` of the watermark, where late commits may land
+        self.recent_ids: Dict[Any, datetime] = {}
+        self.refreshed_at: Optional[datetime] = None
+        # Watermark when loaded; messages older than the lag behind it, and
+        # those within it listed in the loaded recent ids, are folded in
+        self._loaded_watermark: Optional[datetime] = None
+        self._loaded_recent_ids: Set[Any] = set()
+        self._scanned_cwds: Set[str] = set()
+
+    def add_message(self, message: Dict[str, Any], matcher: TopicMatcher) -> None:
+        """Fold one message into the session's matches."""
+        self.message_count += 1
+        texts = list(message_texts(message))
+        cwd = message.get("cwd")
+        # Every message of a session repeats its working directory
+        if cwd and cwd not in self._scanned_cwds:
+            self._scanned_cwds.add(cwd)
+            texts.append(cwd)
+        for text in texts:
+            for topic, term, extension in matcher.scan(text):
+                if not extension:
+                    self.terms.setdefault(topic, set()).add(term)
+                    continue
+                files = self.files.setdefault(topic, set())
+                if len(files) < MAX_FILES_PER_TOPIC:
+                    files.add(term)
+
+        # Track tool usage from tool_use messages
+        if message.get("type") == "tool_use" and message.get("messageData"):
+            tool_name = message["messageData"].get("name")
+            if tool_name:
+                self.tool_usage[tool_name] = self.tool_usage.get(tool_name, 0) + 1
+
+        created_at = message.get("createdAt")
+        if created_at:
+            if self.watermark is None or created_at > self.watermark:
+                self.watermark = created_at
+            if "_id" in message:
+                self.recent_ids[message["_id"]] = created_at
+
+    def is_new(self, message: Dict[str, Any]) -> bool:
+        """Whether a message was ingested after the stored state was built.
+
+        Messages within ``WATERMARK_LAG`` of the watermark are new unless they
+        were folded in when the state was built.
+        """
+        if self._loaded_watermark is None:
+            return True
+        created_at = message.get("createdAt")
+        if created_at is None or created_at < self._loaded_watermark - WATERMARK_LAG:
+            return False
+        return message.get("_id") not in self._loaded_recent_ids
+
+    def to_document(self) -> Dict[str, Any]:
+        horizon = self.watermark - WATERMARK_LAG if self.watermark else None
+        return {
+            "_id": self.session_id,
+            "version": self.version,
+            "terms": {topic: sorted(terms) for topic, terms in self.terms.items()},
+            "files": {topic: sorted(files) for topic, files in self.files.items()},
+            # Pairs, as tool names are not safe field names
+            "tools": sorted(self.tool_usage.items()),
+            "messageCount": self.message_count,
+            "watermark": self.watermark,
+            # Pairs, as ids are not safe field names
+            "recentIds": [
+                [message_id, created_at]
+                for message_id, created_at in self.recent_ids.items()
+                if horizon is None or created_at >= horizon
+            ],
+            "refreshedAt": self.refreshed_at,
+        }
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "SessionTopics":
+        topics = cls(doc["_id"], doc["version"])
+        topics.terms = {t: set(terms) for t, terms in doc.get("terms", {}).items()}
+        topics.files = {t: set(files) for t, files in doc.get("files", {}).items()}
+        topics.tool_usage = {name: count for name, count in doc.get("tools", [])}
+        topics.message_count = doc.get("messageCount", 0)
+        topics.watermark = topics._loaded_watermark = doc.get("watermark")
+        topics.recent_ids = {
+            message_id: created_at for message_id, created_at in doc["recentIds"]
+        }
+        topics._loaded_recent_ids = set(topics.recent_ids)
+        topics.refreshed_at = doc.get("refreshedAt")
+        return topics
+
+
+class SessionTopicStore:
+    """Load, save and drop cached ``SessionTopics``."""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    @property
+    def collection(self) -> Any:
+        """The ``session_topics`` collection, keyed by session id."""
+        return self.db.session_topics
+
+    async def load(
+        self, session_ids: Iterable[str], version: str
+    ) -> Dict[str, SessionTopics]:
+        """Cached state of sessions, built by matchers of ``version``.
+
+        State stored before ``recentIds`` cannot tell which messages behind
+        the watermark were folded in, so it is rebuilt.
+        """
+        cached: Dict[str, SessionTopics] = {}
+        async for doc in self.collection.find(
+            {
+                "_id": {"$in": list(session_ids)},
+                "version": version,
+                "recentIds": {"$exists": True},
+            }
+        ):
+            cached[doc["_id"]] = SessionTopics.from_document(doc)
+        return cached
+
+    async def save(self, topics: Iterable[SessionTopics]) -> None:
+        """Store session state. Never fails the request that built it."""
+        operations = [
+            ReplaceOne({"_id": t.session_id}, t.to_document(), upsert=True)
+            for t in topics
+        ]
+        if not operations:
+            return
+        try:
+            await self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            logger.warning(f"Failed to cache session topics: {e}")
+
+    async def invalidate(self, session_filter: Any = None) -> None:
+        """Drop the state of sessions whose messages were removed or replaced.
+
+        ``session_filter`` is matched against session ids, as in a
+        ``sessionId`` message filter; without one every session is dropped.
+        """
+        query = {} if session_filter is None else {"_id": session_filter}
+        try:
+            await self.collection.delete_many(query)
+        except Exception as e:
+            logger.warning(f"Failed to invalidate session topics: {e}")
@@ -12,6 +12,9 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from app.models.user import APIKey, UserCreate, UserInDB, UserRole, UserUpdate
 from app.services.auth import AuthService
+from app.services.ingest_cache import invalidate_user_resolutions
+from app.services.message_caches import invalidate_deleted_messages
+from app.services.message_repository import MessageRepository
 
 
 class UserService:
@@ -189,15 +192,16 @@ class UserService:
         user_oid = ObjectId(user_id)
 
         # Delete all user data in parallel
-        delete_tasks = [
-            self.db.messages.delete_many({"user_id": user_oid}),
+        messages_deleted, *_, user_result = await asyncio.gather(
+            MessageRepository(self.db).delete_many({"user_id": user_oid}),
             self.db.sessions.delete_many({"user_id": user_oid}),
             self.db.projects.delete_many({"user_id": user_oid}),
             self.db.users.delete_one({"_id": user_oid}),
-        ]
-
-        results = await asyncio.gather(*delete_tasks)
-        return results[3].deleted_count > 0
+        )
+        invalidate_user_resolutions(user_id)
+        if messages_deleted:
+            await invalidate_deleted_messages(self.db, {"user_id": user_oid})
+        return bool(user_result.deleted_count > 0)
 
     async def list_users(
         self,
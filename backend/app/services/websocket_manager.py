@@ -22,8 +22,10 @@ from app.schemas.websocket import (
     StatType,
     StatUpdate,
     StatUpdateEvent,
+    StorageProgressEvent,
     WebSocketEvent,
 )
+from app.services.message_repository import MessageRepository, sum_partials
 
 logger = logging.getLogger(__name__)
 
@@ -38,12 +40,20 @@ class ConnectionManager:
         self.session_connections: Dict[str, Set[WebSocket]] = {}
         # Stats connections for global updates
         self.stats_connections: Set[WebSocket] = set()
+        # Global connections opened by admins, for admin-only job progress
+        self.admin_connections: Set[WebSocket] = set()
         self._lock = asyncio.Lock()
 
     async def connect(
-        self, websocket: WebSocket, session_id: str | None = None
+        self,
+        websocket: WebSocket,
+        session_id: str | None = None,
+        is_admin: bool = False,
     ) -> None:
-        """Accept a WebSocket connection and add it to the appropriate groups."""
+        """Accept a WebSocket connection and add it to the appropriate groups.
+
+        Global connections with ``is_admin`` also receive admin-only events.
+        """
         await websocket.accept()
 
         async with self._lock:
@@ -58,6 +68,8 @@ class ConnectionManager:
             else:
                 # Stats connection (global)
                 self.stats_connections.add(websocket)
+                if is_admin:
+                    self.admin_connections.add(websocket)
                 logger.info("WebSocket connected for global stats")
 
         # Send connection confirmation
@@ -82,6 +94,7 @@ class ConnectionManager:
 
             # Remove from stats connections
             self.stats_connections.discard(websocket)
+            self.admin_connections.discard(websocket)
 
             # active_connections is a WeakSet, so it will clean up automatically
 
@@ -201,6 +214,31 @@ class ConnectionManager:
         # Send to all active connections
         await self._broadcast_to_connections(self.stats_connections, event)
 
+    async def broadcast_storage_progress(
+        self,
+        job_id: str,
+        current: int,
+        total: int,
+        message: str = "",
+        completed: bool = False,
+        error: str | None = None,
+    ) -> None:
+        """Broadcast storage recalculation progress to admin connections."""
+        event = StorageProgressEvent(
+            job_id=job_id,
+            progress={
+                "current": current,
+                "total": total,
+                "percentage": round((current / total * 100) if total > 0 else 0, 2),
+            },
+            message=message,
+            completed=completed,
+            error=error,
+        )
+
+        # Same audience as the admin storage endpoints
+        await self._broadcast_to_connections(self.admin_connections, event)
+
     async def handle_websocket_messages(
         self, websocket: WebSocket, session_id: str | None = None
     ) -> None:
@@ -267,6 +305,7 @@ class ConnectionManager:
             # Remove the connection from all groups
             async with self._lock:
                 self.stats_connections.discard(websocket)
+                self.admin_connections.discard(websocket)
                 for session_id, session_conns in self.session_connections.items():
                     session_conns.discard(websocket)
 
@@ -275,6 +314,7 @@ class ConnectionManager:
         return {
             "total_connections": len(self.active_connections),
             "stats_connections": len(self.stats_connections),
+            "admin_connections": len(self.admin_connections),
             "session_connections": {
                 session_id: len(connections)
                 for session_id, connections in self.session_connections.items()
@@ -291,13 +331,13 @@ class RealtimeStatsService:
 
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
+        self.messages = MessageRepository(db)
 
     async def update_message_count(self, session_id: str) -> None:
         """Update message count and broadcast the change."""
         try:
             # Get current message count from database
-            messages_collection = self.db.messages
-            count = await messages_collection.count_documents({"sessionId": session_id})
+            count = await self.messages.count({"sessionId": session_id})
 
             # Format the count appropriately
             if count >= 1000:
@@ -327,16 +367,16 @@ class RealtimeStatsService:
         """Update tool usage count and broadcast the change."""
         try:
             # Get current tool usage count from database
-            messages_collection = self.db.messages
+            session_filter = {"sessionId": session_id}
             pipeline: list[dict[str, Any]] = [
-                {"$match": {"sessionId": session_id}},
+                {"$match": session_filter},
                 {"$unwind": {"path": "$toolsUsed", "preserveNullAndEmptyArrays": True}},
                 {"$match": {"toolsUsed": {"$ne": None}}},
                 {"$count": "total_tools"},
             ]
 
-            result = await messages_collection.aggregate(pipeline).to_list(1)
-            count = result[0]["total_tools"] if result else 0
+            result = await self.messages.aggregate_partitions(pipeline, session_filter)
+            count = sum_partials(result, "total_tools")
 
             # Format the count appropriately
             if count >= 1000:
@@ -364,26 +404,19 @@ class RealtimeStatsService:
         """Update token count and broadcast the change."""
         try:
             # Get current token count from database
-            messages_collection = self.db.messages
+            session_filter = {"sessionId": session_id}
             pipeline: list[dict[str, Any]] = [
-                {"$match": {"sessionId": session_id}},
+                {"$match": session_filter},
                 {
                     "$group": {
                         "_id": None,
-                        "total_tokens": {
-                            "$sum": {
-                                "$add": [
-                                    {"$ifNull": ["$inputTokens", 0]},
-                                    {"$ifNull": ["$outputTokens", 0]},
-                                ]
-                            }
-                        },
+                        "total_tokens": {"$sum": "$tokens.total"},
                     }
                 },
             ]
 
-            result = await messages_collection.aggregate(pipeline).to_list(1)
-            count = result[0]["total_tokens"] if result else 0
+            result = await self.messages.aggregate_partitions(pipeline, session_filter)
+            count = sum_partials(result, "total_tokens")
 
             # Format the count appropriately
             if count >= 1000000:
@@ -415,25 +448,20 @@ class RealtimeStatsService:
         """Update cost and broadcast the change."""
         try:
             # Get current cost from database
-            messages_collection = self.db.messages
+            session_filter = {"sessionId": session_id}
             pipeline: list[dict[str, Any]] = [
-                {"$match": {"sessionId": session_id}},
+                {"$match": session_filter},
                 {
                     "$group": {
                         "_id": None,
-                        "total_cost": {"$sum": {"$ifNull": ["$costUsd", 0]}},
+                        "total_cost": {"$sum": "$cost"},
                     }
                 },
             ]
 
-            result = await messages_collection.aggregate(pipeline).to_list(1)
-            raw_cost = result[0]["total_cost"] if result else 0.0
-
-            # Convert Decimal128 to float if necessary
-            if hasattr(raw_cost, "to_decimal"):
-                cost = float(raw_cost.to_decimal())
-            else:
-                cost = float(raw_cost)
+            result = await self.messages.aggregate_partitions(pipeline, session_filter)
+            # Decimal128 partials are converted to float
+            cost = float(sum_partials(result, "total_cost", 0.0))
 
             # Format the cost appropriately
             formatted_value = f"${cost:.2f}"
@@ -0,0 +1,127 @@
+"""
+Migration script to backfill canonical token and cost fields on messages.
+
+Ingest now resolves a message's token counts once into a ``tokens``
+subdocument (input, output, cache_creation, cache_read, total) and stores
+``costUsd`` as a plain double in ``cost``. Analytics pipelines read those
+fields directly, so messages written before the change need them too.
+
+This migration:
+1. Sets ``tokens`` on every message except tool_use/tool_result messages,
+   whose usage belongs to the assistant message they were split from
+2. Sets ``cost`` on every message that has a ``costUsd``
+
+Both updates run server-side as pipeline updates and only touch documents
+still missing the field, so the migration can be re-run safely.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.services.partition_snapshot import PartitionSnapshotStore
+from app.services.token_fields import (
+    COST_EXPRESSION,
+    TOKENS_EXPRESSION,
+    UNCOUNTED_TYPES,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MISSING_TOKENS = {"type": {"$nin": list(UNCOUNTED_TYPES)}, "tokens": {"$exists": False}}
+MISSING_COST = {"costUsd": {"$ne": None}, "cost": {"$exists": False}}
+
+
+class CanonicalTokensMigration:
+    def __init__(self, mongodb_url: str, database_name: str):
+        self.client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.client[database_name]
+
+    async def _message_collections(self) -> List[str]:
+        """List the rolling message collections that need backfilling."""
+        collections = await self.db.list_collection_names()
+        return sorted(c for c in collections if c.startswith("messages_"))
+
+    async def analyze_current_state(self) -> Dict:
+        """Count messages that are still missing canonical fields."""
+        stats = {"messages_without_tokens": 0, "messages_without_cost": 0}
+
+        for coll_name in await self._message_collections():
+            collection = self.db[coll_name]
+            stats["messages_without_tokens"] += await collection.count_documents(
+                MISSING_TOKENS
+            )
+            stats["messages_without_cost"] += await collection.count_documents(
+                MISSING_COST
+            )
+
+        return stats
+
+    async def backfill_collection(self, coll_name: str) -> Dict:
+        """Backfill canonical fields in a single message collection."""
+        collection = self.db[coll_name]
+
+        result = await collection.update_many(
+            MISSING_TOKENS, [{"$set": {"tokens": TOKENS_EXPRESSION}}]
+        )
+        tokens_updated = result.modified_count
+
+        result = await collection.update_many(
+            MISSING_COST, [{"$set": {"cost": COST_EXPRESSION}}]
+        )
+
+        return {"tokens_updated": tokens_updated, "cost_updated": result.modified_count}
+
+    async def execute_migration(self, dry_run: bool = True) -> None:
+        """Execute the full migration."""
+        logger.info(f"Starting canonical token backfill (dry_run={dry_run})")
+
+        initial_stats = await self.analyze_current_state()
+        logger.info(f"Initial state: {initial_stats}")
+
+        if dry_run:
+            logger.info(
+                f"DRY RUN: Would backfill tokens on "
+                f"{initial_stats['messages_without_tokens']} messages and cost on "
+                f"{initial_stats['messages_without_cost']} messages"
+            )
+            logger.info("DRY RUN complete. Run with dry_run=False to apply changes.")
+            return
+
+        totals = {"tokens_updated": 0, "cost_updated": 0}
+        collections = await self._message_collections()
+        for coll_name in collections:
+            coll_stats = await self.backfill_collection(coll_name)
+            logger.info(f"{coll_name}: {coll_stats}")
+            totals["tokens_updated"] += coll_stats["tokens_updated"]
+            totals["cost_updated"] += coll_stats["cost_updated"]
+
+        # Snapshots of closed months hold the old token and cost columns
+        await PartitionSnapshotStore(self.db).invalidate(collections)
+
+        logger.info(
+            f"Backfilled tokens on {totals['tokens_updated']} messages and "
+            f"cost on {totals['cost_updated']} messages"
+        )
+
+        final_stats = await self.analyze_current_state()
+        logger.info(f"Migration complete. Final state: {final_stats}")
+        if any(final_stats.values()):
+            logger.warning("Some messages still lack canonical token or cost fields")
+        else:
+            logger.info("✅ Migration successful! All messages carry canonical fields.")
+
+
+async def main():
+    DRY_RUN = False  # Execute the migration
+
+    migration = CanonicalTokensMigration(settings.MONGODB_URL, settings.DATABASE_NAME)
+    await migration.execute_migration(dry_run=DRY_RUN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
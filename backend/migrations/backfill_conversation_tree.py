@@ -0,0 +1,117 @@
+"""
+Migration script to backfill conversation tree metadata.
+
+Ingest now keeps ``depth``, ``rootUuid``, ``childCount`` and
+``isBranchPoint`` on every message, and the deepest message, branch count,
+total duration and response counts on every session. Depth analytics read
+those session fields instead of rebuilding each conversation tree.
+
+This migration:
+1. Recomputes the tree metadata of every session's messages from their
+   parent links
+2. Recomputes the session fields from the annotated messages
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.services.conversation_metadata import (
+    SESSION_DEPTH_STATS,
+    ConversationMetadata,
+    merge_depth_stats,
+)
+from app.services.rolling_message_service import RollingMessageService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ConversationTreeMigration:
+    def __init__(self, mongodb_url: str, database_name: str):
+        self.client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.client[database_name]
+        self.rolling_service = RollingMessageService(self.db)
+        self.metadata = ConversationMetadata(self.rolling_service)
+
+    async def analyze_current_state(self) -> Dict:
+        """Count sessions and messages that still lack tree metadata."""
+        stats = {
+            "sessions_without_depth": await self.db.sessions.count_documents(
+                {"maxDepth": {"$exists": False}}
+            ),
+            "messages_without_depth": 0,
+        }
+
+        collections = await self.db.list_collection_names()
+        for coll_name in sorted(c for c in collections if c.startswith("messages_")):
+            stats["messages_without_depth"] += await self.db[coll_name].count_documents(
+                {"depth": {"$exists": False}}
+            )
+
+        return stats
+
+    async def backfill_session(self, session_id: str) -> bool:
+        """Annotate one session's messages and refresh its stats."""
+        if await self.metadata.rebuild(session_id) is None:
+            return False
+
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"sessionId": session_id}},
+            {"$group": {"_id": None, **SESSION_DEPTH_STATS}},
+        ]
+        partials = await self.rolling_service.aggregate_session(session_id, pipeline)
+        await self.db.sessions.update_one(
+            {"sessionId": session_id}, {"$set": merge_depth_stats(partials)}
+        )
+        return True
+
+    async def execute_migration(self, dry_run: bool = True) -> None:
+        """Execute the full migration."""
+        logger.info(f"Starting conversation tree backfill (dry_run={dry_run})")
+
+        initial_stats = await self.analyze_current_state()
+        logger.info(f"Initial state: {initial_stats}")
+
+        if dry_run:
+            logger.info(
+                f"DRY RUN: Would backfill "
+                f"{initial_stats['sessions_without_depth']} sessions"
+            )
+            logger.info("DRY RUN complete. Run with dry_run=False to apply changes.")
+            return
+
+        updated = 0
+        async for session in self.db.sessions.find(
+            {"maxDepth": {"$exists": False}}, {"sessionId": 1}
+        ):
+            if await self.backfill_session(session["sessionId"]):
+                updated += 1
+                if updated % 100 == 0:
+                    logger.info(f"Backfilled {updated} sessions")
+
+        logger.info(f"Backfilled {updated} sessions")
+
+        final_stats = await self.analyze_current_state()
+        logger.info(f"Migration complete. Final state: {final_stats}")
+        if final_stats["messages_without_depth"] > 0:
+            logger.warning(
+                "Some messages still lack tree metadata "
+                "(likely messages without a session - see fix_orphaned_data.py)"
+            )
+        else:
+            logger.info("✅ Migration successful! All messages carry tree metadata.")
+
+
+async def main():
+    DRY_RUN = False  # Execute the migration
+
+    migration = ConversationTreeMigration(settings.MONGODB_URL, settings.DATABASE_NAME)
+    await migration.execute_migration(dry_run=DRY_RUN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
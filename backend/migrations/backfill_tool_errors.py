@@ -0,0 +1,161 @@
+"""
+Migration script to backfill tool error fields on tool_result messages.
+
+Ingest now stamps ``toolName``, ``isError``, ``errorType`` and
+``errorSeverity`` onto every ``tool_result`` message, and the error and
+success-rate analytics read those fields instead of classifying results and
+joining each one to its tool_use message at query time.
+
+This migration:
+1. Classifies every tool_result message that has no ``isError`` yet, using
+   the full tool output from the blob store where it was externalized
+2. Copies the tool name from the parent tool_use message
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from app.core.config import settings
+from app.services.blob_store import BlobStore
+from app.services.tool_errors import error_fields
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Messages classified per bulk write
+BATCH_SIZE = 1000
+
+UNCLASSIFIED = {"type": "tool_result", "isError": {"$exists": False}}
+
+
+class ToolErrorsMigration:
+    def __init__(self, mongodb_url: str, database_name: str):
+        self.client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.client[database_name]
+        self.blobs = BlobStore(self.db)
+
+    async def _message_collections(self) -> List[str]:
+        """List the rolling message collections that need backfilling."""
+        collections = await self.db.list_collection_names()
+        return sorted(c for c in collections if c.startswith("messages_"))
+
+    async def analyze_current_state(self) -> Dict:
+        """Count tool results that are still unclassified."""
+        stats = {"unclassified_tool_results": 0}
+
+        for coll_name in await self._message_collections():
+            stats["unclassified_tool_results"] += await self.db[
+                coll_name
+            ].count_documents(UNCLASSIFIED)
+
+        return stats
+
+    async def _tool_names(
+        self, parent_uuids: List[str], collections: List[str]
+    ) -> Dict[str, str]:
+        """Tool names of the given tool_use messages, by uuid."""
+        names: Dict[str, str] = {}
+        for coll_name in collections:
+            cursor = self.db[coll_name].find(
+                {"uuid": {"$in": parent_uuids}, "type": "tool_use"},
+                {"_id": 0, "uuid": 1, "messageData.name": 1},
+            )
+            async for doc in cursor:
+                name = (doc.get("messageData") or {}).get("name")
+                if name:
+                    names[doc["uuid"]] = name
+        return names
+
+    async def _classify_batch(
+        self, coll_name: str, docs: List[Dict], collections: List[str]
+    ) -> int:
+        """Stamp tool error fields onto one batch of tool results."""
+        await self.blobs.hydrate(docs, ["toolUseResult"])
+        names = await self._tool_names(
+            list({d.get("parentUuid") for d in docs if d.get("parentUuid")}),
+            collections,
+        )
+
+        operations = [
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {
+                    "$set": {
+                        **error_fields(doc),
+                        "toolName": names.get(doc.get("parentUuid"), "unknown"),
+                    }
+                },
+            )
+            for doc in docs
+        ]
+        result = await self.db[coll_name].bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    async def backfill_collection(self, coll_name: str, collections: List[str]) -> int:
+        """Classify the tool results of a single message collection."""
+        updated = 0
+        batch: List[Dict] = []
+        cursor = self.db[coll_name].find(
+            UNCLASSIFIED,
+            {
+                "parentUuid": 1,
+                "content": 1,
+                "toolUseResult": 1,
+                "messageData.is_error": 1,
+                "blobRefs": 1,
+            },
+        )
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= BATCH_SIZE:
+                updated += await self._classify_batch(coll_name, batch, collections)
+                batch = []
+        if batch:
+            updated += await self._classify_batch(coll_name, batch, collections)
+        return updated
+
+    async def execute_migration(self, dry_run: bool = True) -> None:
+        """Execute the full migration."""
+        logger.info(f"Starting tool error backfill (dry_run={dry_run})")
+
+        initial_stats = await self.analyze_current_state()
+        logger.info(f"Initial state: {initial_stats}")
+
+        if dry_run:
+            logger.info(
+                f"DRY RUN: Would classify "
+                f"{initial_stats['unclassified_tool_results']} tool results"
+            )
+            logger.info("DRY RUN complete. Run with dry_run=False to apply changes.")
+            return
+
+        collections = await self._message_collections()
+        total = 0
+        for coll_name in collections:
+            updated = await self.backfill_collection(coll_name, collections)
+            logger.info(f"{coll_name}: classified {updated} tool results")
+            total += updated
+
+        logger.info(f"Classified {total} tool results")
+
+        final_stats = await self.analyze_current_state()
+        logger.info(f"Migration complete. Final state: {final_stats}")
+        if final_stats["unclassified_tool_results"] > 0:
+            logger.warning("Some tool results are still unclassified")
+        else:
+            logger.info("✅ Migration successful! All tool results are classified.")
+
+
+async def main():
+    DRY_RUN = False  # Execute the migration
+
+    migration = ToolErrorsMigration(settings.MONGODB_URL, settings.DATABASE_NAME)
+    await migration.execute_migration(dry_run=DRY_RUN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Migration script to seed the materialized per-user storage statistics.
+
+Ingest and deletions now keep ``project_count``, ``session_count``,
+``message_count`` and ``total_disk_usage`` on each user document up to date
+with ``$inc`` deltas, and the admin dashboard reads those fields instead of
+scanning collections. Deltas only add to what is already there, so users
+created before the change carry no figures, or stale ones, until a
+deletion happens to mark them dirty.
+
+This migration:
+1. Recomputes the storage fields of every user in one owner-grouped pass
+   over the projects, sessions and message collections
+2. Reconciles the system-wide ``system_stats`` snapshot
+
+The recalculation checkpoints per collection, so an interrupted run resumes
+where it stopped and the migration can be re-run safely.
+"""
+
+import asyncio
+import logging
+from typing import Dict
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+from app.services.stats_snapshot import StatsSnapshotService
+from app.services.storage_metrics import StorageMetricsService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UNSEEDED = {"storage_updated_at": {"$exists": False}}
+
+
+class UserStorageStatsMigration:
+    def __init__(self, mongodb_url: str, database_name: str):
+        self.client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.client[database_name]
+
+    async def analyze_current_state(self) -> Dict:
+        """Count users whose storage fields were never computed or are stale."""
+        return {
+            "users": await self.db.users.count_documents({}),
+            "users_without_storage_stats": await self.db.users.count_documents(
+                UNSEEDED
+            ),
+            "users_marked_dirty": await self.db.users.count_documents(
+                {"storage_dirty": True}
+            ),
+        }
+
+    async def execute_migration(self, dry_run: bool = True) -> None:
+        """Execute the full migration."""
+        logger.info(f"Starting user storage stats backfill (dry_run={dry_run})")
+
+        initial_stats = await self.analyze_current_state()
+        logger.info(f"Initial state: {initial_stats}")
+
+        if dry_run:
+            logger.info(
+                f"DRY RUN: Would recompute storage stats for "
+                f"{initial_stats['users']} users"
+            )
+            logger.info("DRY RUN complete. Run with dry_run=False to apply changes.")
+            return
+
+        result = await StorageMetricsService(self.db).batch_update_all_users()
+        logger.info(f"Recomputed storage stats for {result['users_updated']} users")
+
+        system_metrics = await StatsSnapshotService(self.db).reconcile_system()
+        logger.info(f"System snapshot: {system_metrics}")
+
+        final_stats = await self.analyze_current_state()
+        logger.info(f"Migration complete. Final state: {final_stats}")
+        if final_stats["users_without_storage_stats"] > 0:
+            logger.warning("Some users still have no storage stats")
+        else:
+            logger.info("✅ Migration successful! All users carry storage stats.")
+
+
+async def main():
+    DRY_RUN = False  # Execute the migration
+
+    migration = UserStorageStatsMigration(settings.MONGODB_URL, settings.DATABASE_NAME)
+    await migration.execute_migration(dry_run=DRY_RUN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
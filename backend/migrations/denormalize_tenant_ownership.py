@@ -0,0 +1,146 @@
+"""
+Migration script to backfill denormalized tenant fields on sessions and messages.
+
+Ownership is still defined by the project -> user chain, but ingest now stamps
+``user_id`` on sessions and ``user_id``/``projectId`` on every message so that
+reads can filter by tenant directly instead of building ``$in`` lists of every
+session a user owns.
+
+This migration:
+1. Sets user_id on every session from its project's owner
+2. Sets user_id and projectId on every message in the rolling
+   ``messages_YYYY_MM`` collections (and the legacy ``messages`` collection)
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of sessionIds per update_many filter; keeps each command well below
+# the 16MB BSON limit even for very large tenants
+SESSION_BATCH_SIZE = 1000
+
+
+class TenantOwnershipMigration:
+    def __init__(self, mongodb_url: str, database_name: str):
+        self.client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.client[database_name]
+
+    async def _message_collections(self) -> List[str]:
+        """List the message collections that need backfilling."""
+        collections = await self.db.list_collection_names()
+        return sorted(
+            c for c in collections if c == "messages" or c.startswith("messages_")
+        )
+
+    async def analyze_current_state(self) -> Dict:
+        """Count documents that are still missing tenant fields."""
+        stats = {
+            "sessions_without_user_id": await self.db.sessions.count_documents(
+                {"user_id": {"$exists": False}}
+            ),
+            "messages_without_user_id": 0,
+        }
+
+        for coll_name in await self._message_collections():
+            stats["messages_without_user_id"] += await self.db[
+                coll_name
+            ].count_documents({"user_id": {"$exists": False}})
+
+        return stats
+
+    async def backfill_project(self, project: Dict, dry_run: bool = True) -> Dict:
+        """Backfill sessions and messages belonging to a single project."""
+        stats = {"sessions_updated": 0, "messages_updated": 0}
+        project_id = project["_id"]
+        user_id = project.get("user_id")
+        if user_id is None:
+            logger.warning(f"Project {project_id} has no owner, skipping")
+            return stats
+
+        session_ids = await self.db.sessions.distinct(
+            "sessionId", {"projectId": project_id}
+        )
+        if dry_run:
+            stats["sessions_updated"] = len(session_ids)
+            return stats
+
+        result = await self.db.sessions.update_many(
+            {"projectId": project_id, "user_id": {"$ne": user_id}},
+            {"$set": {"user_id": user_id}},
+        )
+        stats["sessions_updated"] = result.modified_count
+
+        message_collections = await self._message_collections()
+        for i in range(0, len(session_ids), SESSION_BATCH_SIZE):
+            batch = session_ids[i : i + SESSION_BATCH_SIZE]
+            for coll_name in message_collections:
+                result = await self.db[coll_name].update_many(
+                    {
+                        "sessionId": {"$in": batch},
+                        "$or": [
+                            {"user_id": {"$ne": user_id}},
+                            {"projectId": {"$ne": project_id}},
+                        ],
+                    },
+                    {"$set": {"user_id": user_id, "projectId": project_id}},
+                )
+                stats["messages_updated"] += result.modified_count
+
+        return stats
+
+    async def execute_migration(self, dry_run: bool = True) -> None:
+        """Execute the full migration."""
+        logger.info(f"Starting tenant ownership backfill (dry_run={dry_run})")
+
+        initial_stats = await self.analyze_current_state()
+        logger.info(f"Initial state: {initial_stats}")
+
+        totals = {"sessions_updated": 0, "messages_updated": 0}
+        async for project in self.db.projects.find({}, {"_id": 1, "user_id": 1}):
+            project_stats = await self.backfill_project(project, dry_run)
+            totals["sessions_updated"] += project_stats["sessions_updated"]
+            totals["messages_updated"] += project_stats["messages_updated"]
+
+        if dry_run:
+            logger.info(
+                f"DRY RUN: Would backfill {totals['sessions_updated']} sessions"
+            )
+            logger.info("DRY RUN complete. Run with dry_run=False to apply changes.")
+            return
+
+        logger.info(
+            f"Backfilled {totals['sessions_updated']} sessions and "
+            f"{totals['messages_updated']} messages"
+        )
+
+        final_stats = await self.analyze_current_state()
+        logger.info(f"Migration complete. Final state: {final_stats}")
+        if (
+            final_stats["sessions_without_user_id"] > 0
+            or final_stats["messages_without_user_id"] > 0
+        ):
+            logger.warning(
+                "Some sessions or messages still lack user_id "
+                "(likely orphaned data - see fix_orphaned_data.py)"
+            )
+        else:
+            logger.info("✅ Migration successful! All documents carry tenant fields.")
+
+
+async def main():
+    DRY_RUN = False  # Execute the migration
+
+    migration = TenantOwnershipMigration(settings.MONGODB_URL, settings.DATABASE_NAME)
+    await migration.execute_migration(dry_run=DRY_RUN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
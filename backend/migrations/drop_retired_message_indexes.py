@@ -0,0 +1,92 @@
+"""
+Migration script to drop retired indexes from message collections.
+
+``RollingMessageService.create_indexes`` no longer creates the session stats
+covering index (sessionId, type, timestamp, model, ...): nothing read
+messages through it, and it added write cost to every monthly collection.
+Collections created before that change still carry it.
+
+This migration drops the index from every rolling message collection. It
+only drops indexes that are still there, so it can be re-run safely.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Leading keys of the retired session stats covering index
+RETIRED_STATS_INDEX_PREFIX = ["sessionId", "type", "timestamp", "model"]
+
+
+class RetiredIndexesMigration:
+    def __init__(self, mongodb_url: str, database_name: str):
+        self.client = AsyncIOMotorClient(mongodb_url)
+        self.db = self.client[database_name]
+
+    async def _message_collections(self) -> List[str]:
+        """List the rolling message collections to clean up."""
+        collections = await self.db.list_collection_names()
+        return sorted(c for c in collections if c.startswith("messages_"))
+
+    async def _retired_indexes(self, coll_name: str) -> List[str]:
+        """Names of the retired indexes on a message collection."""
+        indexes = await self.db[coll_name].index_information()
+        return [
+            name
+            for name, info in indexes.items()
+            if [field for field, _ in info["key"]][: len(RETIRED_STATS_INDEX_PREFIX)]
+            == RETIRED_STATS_INDEX_PREFIX
+        ]
+
+    async def analyze_current_state(self) -> Dict:
+        """Count retired indexes that still exist."""
+        stats = {"retired_indexes": 0}
+
+        for coll_name in await self._message_collections():
+            stats["retired_indexes"] += len(await self._retired_indexes(coll_name))
+
+        return stats
+
+    async def execute_migration(self, dry_run: bool = True) -> None:
+        """Execute the full migration."""
+        logger.info(f"Starting retired index cleanup (dry_run={dry_run})")
+
+        initial_stats = await self.analyze_current_state()
+        logger.info(f"Initial state: {initial_stats}")
+
+        if dry_run:
+            logger.info(
+                f"DRY RUN: Would drop {initial_stats['retired_indexes']} indexes"
+            )
+            logger.info("DRY RUN complete. Run with dry_run=False to apply changes.")
+            return
+
+        for coll_name in await self._message_collections():
+            for name in await self._retired_indexes(coll_name):
+                await self.db[coll_name].drop_index(name)
+                logger.info(f"{coll_name}: dropped index {name}")
+
+        final_stats = await self.analyze_current_state()
+        logger.info(f"Migration complete. Final state: {final_stats}")
+        if final_stats["retired_indexes"] > 0:
+            logger.warning("Some retired indexes are still present")
+        else:
+            logger.info("✅ Migration successful! No retired indexes remain.")
+
+
+async def main():
+    DRY_RUN = False  # Execute the migration
+
+    migration = RetiredIndexesMigration(settings.MONGODB_URL, settings.DATABASE_NAME)
+    await migration.execute_migration(dry_run=DRY_RUN)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
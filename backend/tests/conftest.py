@@ -70,3 +70,23 @@ async def client(test_db) -> AsyncGenerator:
 
     # Clear dependency overrides after test
     app.dependency_overrides.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_ingest_resolution_cache():
+    """Keep the process-wide ingest cache from leaking between tests."""
+    from app.services.ingest_cache import get_resolution_cache
+
+    get_resolution_cache().clear()
+    yield
+    get_resolution_cache().clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_request_coalescer():
+    """Keep memoized analytics and search results from leaking between tests."""
+    from app.services.request_coalescer import get_request_coalescer
+
+    get_request_coalescer().clear()
+    yield
+    get_request_coalescer().clear()
@@ -255,8 +255,9 @@ class TestCreateIndexes:
 
             assert mock_db.projects in collections_called
             assert mock_db.sessions in collections_called
-            assert mock_db.messages in collections_called
             assert mock_db.sync_state in collections_called
+            # Message indexes are created on the monthly collections instead
+            assert mock_db.messages not in collections_called
 
 
 class TestCreateIndexIfNotExists:
@@ -444,28 +445,19 @@ class TestIndexCreationDetails:
             assert path_unique_found
 
     @pytest.mark.asyncio
-    async def test_messages_indexes_created(self, mock_db_with_collections):
-        """Test that all messages indexes are created."""
+    async def test_no_legacy_messages_indexes(self, mock_db_with_collections):
+        """Test that the legacy messages collection is not indexed."""
         with patch("app.core.db_init.create_index_if_not_exists") as mock_create:
             mock_create.return_value = None
 
             await create_indexes(mock_db_with_collections)
 
-            # Check messages-specific indexes
             messages_calls = [
                 call
                 for call in mock_create.call_args_list
                 if call[0][0] == mock_db_with_collections.messages
             ]
-
-            assert len(messages_calls) >= 10  # Many analytics indexes
-
-            # Check for uuid unique index
-            uuid_unique_found = any(
-                call[0][1] == [("uuid", 1)] and call[1].get("unique", False)
-                for call in messages_calls
-            )
-            assert uuid_unique_found
+            assert messages_calls == []
 
     @pytest.mark.asyncio
     async def test_sessions_indexes_created(self, mock_db_with_collections):
@@ -491,37 +483,6 @@ class TestIndexCreationDetails:
             )
             assert session_unique_found
 
-    @pytest.mark.asyncio
-    async def test_analytics_indexes_created(self, mock_db_with_collections):
-        """Test that analytics-specific indexes are created."""
-        with patch("app.core.db_init.create_index_if_not_exists") as mock_create:
-            mock_create.return_value = None
-
-            await create_indexes(mock_db_with_collections)
-
-            # Check for analytics-specific indexes
-            messages_calls = [
-                call
-                for call in mock_create.call_args_list
-                if call[0][0] == mock_db_with_collections.messages
-            ]
-
-            # Check for createdAt indexes for time-series analytics
-            created_at_indexes = [
-                call
-                for call in messages_calls
-                if any("createdAt" in key[0] for key in call[0][1])
-            ]
-            assert len(created_at_indexes) >= 3
-
-            # Check for git branch analytics indexes
-            git_branch_indexes = [
-                call
-                for call in messages_calls
-                if any("gitBranch" in key[0] for key in call[0][1])
-            ]
-            assert len(git_branch_indexes) >= 2
-
 
 class TestErrorHandling:
     """Test error handling in database initialization."""
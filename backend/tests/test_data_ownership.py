@@ -24,12 +24,14 @@ def mock_db():
 @pytest.fixture
 def ingest_service(mock_db):
     """Create ingest service with mock database."""
+    from app.services.conversation_metadata import ConversationMetadata
     from app.services.ingest import IngestService
     from app.services.rolling_message_service import RollingMessageService
 
     service = IngestService(mock_db, user_id="test_user_id")
     service.rolling_service = MagicMock(spec=RollingMessageService)
     service.rolling_service.insert_message = AsyncMock(return_value=None)
+    service.tree_metadata = ConversationMetadata(service.rolling_service)
     service.db = mock_db
     return service
 
@@ -141,6 +143,20 @@ def create_mock_db():
     mock_db.sessions.find_one = mock_find_one("sessions")
     mock_db.messages.find_one = mock_find_one("messages")
 
+    def mock_find_one_and_update(collection_name):
+        async def upsert(filter_dict, update, upsert=False, **kwargs):
+            existing = await mock_find_one(collection_name)(filter_dict)
+            if existing is not None or not upsert:
+                return existing
+            doc = {**filter_dict, **update.get("$setOnInsert", {})}
+            await mock_insert_one(collection_name)(doc)
+            return doc
+
+        return upsert
+
+    mock_db.projects.find_one_and_update = mock_find_one_and_update("projects")
+    mock_db.sessions.find_one_and_update = mock_find_one_and_update("sessions")
+
     # Mock find().to_list()
     def mock_find(collection_name):
         def find(filter_dict, *args, **kwargs):
@@ -273,7 +289,9 @@ async def test_ingestion_sets_user_id(ingest_service, rolling_service, mock_db):
         mock_db._messages.append(message_data)
         return str(message_data["_id"])
 
-    async def mock_find_messages(filter_dict, skip=0, limit=100, sort_order="desc"):
+    async def mock_find_messages(
+        filter_dict, skip=0, limit=100, sort_order="desc", projection=None
+    ):
         results = [
             msg
             for msg in mock_db._messages
@@ -309,16 +327,17 @@ async def test_ingestion_sets_user_id(ingest_service, rolling_service, mock_db):
     assert project is not None
     assert project["user_id"] == test_user_id
 
-    # Verify session does NOT have user_id (hierarchical model)
+    # Verify session carries the denormalized owner of its project
     session = await mock_db.sessions.find_one({"sessionId": "test-session"})
     assert session is not None
-    assert "user_id" not in session  # Hierarchical ownership
+    assert session["user_id"] == test_user_id
     assert session["projectId"] == project["_id"]
 
-    # Verify message does NOT have user_id (hierarchical model)
+    # Verify message is stamped with its tenant at ingest
     msg = await service.rolling_service.find_one({"uuid": "test-uuid"})
     assert msg is not None
-    assert "user_id" not in msg  # Hierarchical ownership
+    assert msg["user_id"] == test_user_id
+    assert msg["projectId"] == project["_id"]
     assert msg["sessionId"] == "test-session"
 
 
@@ -358,7 +377,9 @@ async def test_data_isolation_between_users(ingest_service, rolling_service, moc
         mock_db._messages.append(message_data)
         return str(message_data["_id"])
 
-    async def mock_find_messages1(filter_dict, skip=0, limit=100, sort_order="desc"):
+    async def mock_find_messages1(
+        filter_dict, skip=0, limit=100, sort_order="desc", projection=None
+    ):
         results = [
             msg
             for msg in mock_db._messages
@@ -491,7 +512,7 @@ async def test_same_session_different_users_isolated(
         return str(message_data["_id"])
 
     async def mock_find_messages_shared(
-        filter_dict, skip=0, limit=100, sort_order="desc"
+        filter_dict, skip=0, limit=100, sort_order="desc", projection=None
     ):
         results = [
             msg
@@ -1,5 +1,6 @@
 """Tests for ingestion API endpoints."""
 
+import json
 from datetime import UTC, datetime
 from unittest.mock import AsyncMock, Mock, patch
 
@@ -7,8 +8,11 @@ import pytest
 from fastapi import BackgroundTasks, HTTPException
 
 from app.api.api_v1.endpoints.ingest import (
+    get_ingest_ticket,
     ingest_batch,
+    ingest_batch_async,
     ingest_single,
+    ingest_stream,
     ingestion_status,
     update_project_metadata,
 )
@@ -271,6 +275,152 @@ class TestIngestBatch:
             # No background task should be scheduled
 
 
+class TestIngestBatchAsync:
+    """Test queued batch ingestion endpoints."""
+
+    @pytest.fixture
+    def sample_request(self):
+        """Create sample batch request."""
+        message = MessageIngest(
+            uuid="test-uuid-123",
+            type="user",
+            timestamp=datetime.now(UTC),
+            sessionId="test-session",
+            message={"content": "Test message"},
+        )
+        return BatchIngestRequest(messages=[message], overwrite_mode=True)
+
+    @pytest.mark.asyncio
+    async def test_ingest_batch_async_returns_ticket(self, sample_request):
+        """Test a batch is queued and a ticket returned."""
+        with patch(
+            "app.api.api_v1.endpoints.ingest.get_ingest_queue"
+        ) as mock_get_queue:
+            mock_queue = Mock()
+            mock_queue.enqueue = AsyncMock(return_value="ticket-1")
+            mock_get_queue.return_value = mock_queue
+
+            result = await ingest_batch_async(sample_request, Mock(), "user-id")
+
+        assert result.ticket == "ticket-1"
+        assert result.status == "queued"
+        assert result.messages_queued == 1
+        mock_queue.enqueue.assert_awaited_once_with(
+            "user-id", sample_request.messages, overwrite_mode=True
+        )
+
+    @pytest.mark.asyncio
+    async def test_ingest_batch_async_empty_messages(self):
+        """Test an empty batch is rejected before queueing."""
+        request = BatchIngestRequest(messages=[])
+
+        with patch("app.api.api_v1.endpoints.ingest.get_ingest_queue"):
+            with pytest.raises(HTTPException) as exc_info:
+                await ingest_batch_async(request, Mock(), "user-id")
+
+        assert exc_info.value.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_get_ingest_ticket_not_found(self):
+        """Test unknown tickets return 404."""
+        with patch(
+            "app.api.api_v1.endpoints.ingest.get_ingest_queue"
+        ) as mock_get_queue:
+            mock_get_queue.return_value.get_status = AsyncMock(return_value=None)
+
+            with pytest.raises(HTTPException) as exc_info:
+                await get_ingest_ticket("missing", Mock(), "user-id")
+
+        assert exc_info.value.status_code == 404
+
+
+class TestIngestStream:
+    """Test streaming NDJSON ingestion endpoint."""
+
+    @staticmethod
+    def _request(body: bytes, headers: dict | None = None):
+        request = Mock()
+        request.headers = headers or {}
+
+        async def stream():
+            yield body
+
+        request.stream = stream
+        return request
+
+    @staticmethod
+    def _line(uuid: str) -> bytes:
+        return (
+            json.dumps(
+                {
+                    "uuid": uuid,
+                    "sessionId": "session-1",
+                    "type": "user",
+                    "timestamp": "2024-01-01T00:00:00Z",
+                    "message": {"content": "Test message"},
+                }
+            ).encode()
+            + b"\n"
+        )
+
+    @pytest.mark.asyncio
+    async def test_ingest_stream_returns_ndjson_status(self):
+        """Test streamed messages are ingested and reported per batch."""
+        body = self._line("u1") + b"not json\n" + self._line("u2")
+
+        with patch(
+            "app.api.api_v1.endpoints.ingest.IngestService"
+        ) as mock_service_class:
+            mock_service = Mock()
+            mock_service.ingest_messages = AsyncMock(
+                return_value=IngestStats(
+                    messages_received=2,
+                    messages_processed=2,
+                    projects_created=["project-1"],
+                )
+            )
+            mock_service_class.return_value = mock_service
+            background_tasks = Mock(spec=BackgroundTasks)
+            db = Mock()
+
+            response = await ingest_stream(
+                self._request(body), background_tasks, db, "user-id", False, 100
+            )
+
+        assert response.media_type == "application/x-ndjson"
+        records = [json.loads(line) for line in response.body.splitlines()]
+        assert [r["type"] for r in records] == ["invalid", "batch", "summary"]
+        assert records[0]["line"] == 2
+        assert records[-1]["stats"]["messages_processed"] == 2
+        assert records[-1]["stats"]["messages_failed"] == 1
+        background_tasks.add_task.assert_called_once_with(
+            update_project_metadata, db, ["project-1"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_ingest_stream_unsupported_encoding(self):
+        """Test unknown content encodings are rejected with 415."""
+        request = self._request(b"", {"content-encoding": "br"})
+
+        with pytest.raises(HTTPException) as exc_info:
+            await ingest_stream(
+                request, BackgroundTasks(), Mock(), "user-id", False, 100
+            )
+
+        assert exc_info.value.status_code == 415
+
+    @pytest.mark.asyncio
+    async def test_ingest_stream_empty_body(self):
+        """Test an empty stream is rejected."""
+        with patch("app.api.api_v1.endpoints.ingest.IngestService"):
+            with pytest.raises(HTTPException) as exc_info:
+                await ingest_stream(
+                    self._request(b""), BackgroundTasks(), Mock(), "user-id", False, 100
+                )
+
+        assert exc_info.value.status_code == 400
+
+
 class TestIngestSingle:
     """Test single message ingestion endpoint."""
 
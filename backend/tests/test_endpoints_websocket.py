@@ -15,16 +15,26 @@ from app.api.api_v1.endpoints.websocket import (
 from app.schemas.websocket import LiveSessionStats, LiveStatsResponse
 
 
+def _mock_db():
+    """Mock database whose single monthly collection is ``db.messages``."""
+    db = Mock()
+    db.sessions = Mock()
+    db.messages = Mock()
+    db.messages.distinct = AsyncMock(return_value=[])
+    db.list_collection_names = AsyncMock(
+        return_value=[f"messages_{datetime.now(UTC):%Y_%m}"]
+    )
+    db.__getitem__ = Mock(return_value=db.messages)
+    return db
+
+
 class TestGetLiveSessionStats:
     """Test live session statistics endpoint."""
 
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
-        db = Mock()
-        db.sessions = Mock()
-        db.messages = Mock()
-        return db
+        return _mock_db()
 
     @pytest.fixture
     def sample_session(self):
@@ -78,6 +88,12 @@ class TestGetLiveSessionStats:
         assert result.cost == 0.25
         assert result.is_active is True  # Activity within 5 minutes
 
+        # Totals read the canonical token and cost fields
+        pipelines = [str(c.args[0]) for c in mock_db.messages.aggregate.call_args_list]
+        assert any("$tokens.total" in p for p in pipelines)
+        assert any("'$cost'" in p for p in pipelines)
+        assert not any("costUsd" in p or "inputTokens" in p for p in pipelines)
+
     @pytest.mark.asyncio
     async def test_get_live_session_stats_session_not_found(self, mock_db):
         """Test session stats when session doesn't exist."""
@@ -172,10 +188,7 @@ class TestGetLiveGlobalStats:
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
-        db = Mock()
-        db.messages = Mock()
-        db.sessions = Mock()
-        return db
+        return _mock_db()
 
     @pytest.mark.asyncio
     async def test_get_live_global_stats_success(self, mock_db):
@@ -193,9 +206,7 @@ class TestGetLiveGlobalStats:
         )
 
         # Mock active sessions
-        mock_db.sessions.aggregate.return_value.to_list = AsyncMock(
-            return_value=[{"active_sessions": 3}]
-        )
+        mock_db.messages.distinct = AsyncMock(return_value=["s1", "s2", "s3"])
 
         result = await get_live_global_stats(mock_db)
 
@@ -212,7 +223,6 @@ class TestGetLiveGlobalStats:
         # Mock empty results
         mock_db.messages.count_documents = AsyncMock(return_value=0)
         mock_db.messages.aggregate.return_value.to_list = AsyncMock(return_value=[])
-        mock_db.sessions.aggregate.return_value.to_list = AsyncMock(return_value=[])
 
         result = await get_live_global_stats(mock_db)
 
@@ -238,7 +248,6 @@ class TestGetLiveGlobalStats:
                 [{"total_cost": decimal_cost}],  # Cost with Decimal128
             ]
         )
-        mock_db.sessions.aggregate.return_value.to_list = AsyncMock(return_value=[])
 
         result = await get_live_global_stats(mock_db)
 
@@ -249,15 +258,15 @@ class TestGetLiveGlobalStats:
         """Test that aggregation pipelines are called correctly."""
         mock_db.messages.count_documents = AsyncMock(return_value=1)
         mock_db.messages.aggregate.return_value.to_list = AsyncMock(return_value=[])
-        mock_db.sessions.aggregate.return_value.to_list = AsyncMock(return_value=[])
 
         await get_live_global_stats(mock_db)
 
         # Should call aggregate 3 times for messages (tools, tokens, cost)
         assert mock_db.messages.aggregate.call_count == 3
 
-        # Should call aggregate once for sessions (active sessions)
-        assert mock_db.sessions.aggregate.call_count == 1
+        # Active sessions come from recent messages, not a sessions lookup
+        mock_db.messages.distinct.assert_awaited_once()
+        mock_db.sessions.aggregate.assert_not_called()
 
 
 class TestGetConnectionStats:
@@ -337,10 +346,7 @@ class TestStatsAggregationLogic:
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
-        db = Mock()
-        db.messages = Mock()
-        db.sessions = Mock()
-        return db
+        return _mock_db()
 
     @pytest.mark.asyncio
     async def test_tool_usage_aggregation_pipeline(self, mock_db):
@@ -415,20 +421,17 @@ class TestStatsAggregationLogic:
         mock_db.messages.count_documents = AsyncMock(return_value=1)
         mock_db.messages.aggregate.return_value.to_list = AsyncMock(return_value=[])
 
-        # Mock active sessions pipeline
-        active_result = [{"active_sessions": 2}]
-        mock_db.sessions.aggregate.return_value.to_list = AsyncMock(
-            return_value=active_result
-        )
+        # Mock sessions with recent messages
+        mock_db.messages.distinct = AsyncMock(return_value=["s1", "s2"])
 
         result = await get_live_global_stats(mock_db)
 
         assert result.active_sessions == 2
 
-        # Verify the lookup and match stages in pipeline
-        pipeline_call = mock_db.sessions.aggregate.call_args[0][0]
-        assert any("$lookup" in stage for stage in pipeline_call)
-        assert any("$match" in stage for stage in pipeline_call)
+        # Verify distinct sessionIds are read from recent messages only
+        field, query = mock_db.messages.distinct.call_args[0]
+        assert field == "sessionId"
+        assert "$gte" in query["timestamp"]
 
 
 class TestWebSocketErrorHandling:
@@ -437,10 +440,7 @@ class TestWebSocketErrorHandling:
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
-        db = Mock()
-        db.sessions = Mock()
-        db.messages = Mock()
-        return db
+        return _mock_db()
 
     @pytest.mark.asyncio
     async def test_database_error_in_session_stats(self, mock_db):
@@ -484,10 +484,7 @@ class TestDateTimeHandling:
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
-        db = Mock()
-        db.sessions = Mock()
-        db.messages = Mock()
-        return db
+        return _mock_db()
 
     @pytest.mark.asyncio
     async def test_activity_boundary_conditions(self, mock_db):
@@ -533,16 +530,14 @@ class TestDateTimeHandling:
         """Test cutoff time calculation in global stats."""
         mock_db.messages.count_documents = AsyncMock(return_value=1)
         mock_db.messages.aggregate.return_value.to_list = AsyncMock(return_value=[])
-        mock_db.sessions.aggregate.return_value.to_list = AsyncMock(return_value=[])
 
+        before = datetime.now(UTC)
         await get_live_global_stats(mock_db)
 
-        # Verify sessions aggregation pipeline includes time match
-        sessions_call = mock_db.sessions.aggregate.call_args[0][0]
-
-        # Should have a match stage with timestamp comparison
-        match_stages = [stage for stage in sessions_call if "$match" in stage]
-        assert len(match_stages) > 0
+        # Activity cutoff is five minutes before the request
+        cutoff = mock_db.messages.distinct.call_args[0][1]["timestamp"]["$gte"]
+        assert before - timedelta(minutes=5) <= cutoff
+        assert cutoff <= datetime.now(UTC) - timedelta(minutes=5)
 
 
 class TestAggregationPipelineStructure:
@@ -551,10 +546,7 @@ class TestAggregationPipelineStructure:
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
-        db = Mock()
-        db.messages = Mock()
-        db.sessions = Mock()
-        return db
+        return _mock_db()
 
     @pytest.mark.asyncio
     async def test_tool_usage_pipeline_structure(self, mock_db):
@@ -582,26 +574,22 @@ class TestAggregationPipelineStructure:
         assert "$count" in stage_types
 
     @pytest.mark.asyncio
-    async def test_active_sessions_pipeline_structure(self, mock_db):
-        """Test active sessions aggregation pipeline structure."""
+    async def test_active_sessions_routed_by_time(self, mock_db):
+        """Test active sessions only read collections covering the cutoff."""
         mock_db.messages.count_documents = AsyncMock(return_value=1)
         mock_db.messages.aggregate.return_value.to_list = AsyncMock(return_value=[])
 
-        # Capture the active sessions pipeline
-        mock_aggregate = Mock()
-        mock_aggregate.to_list = AsyncMock(return_value=[])
-        mock_db.sessions.aggregate.return_value = mock_aggregate
-
-        await get_live_global_stats(mock_db)
-
-        # Get the sessions aggregation pipeline
-        sessions_pipeline = mock_db.sessions.aggregate.call_args[0][0]
+        with patch(
+            "app.services.message_repository.MessageRepository."
+            "get_collections_for_range",
+            AsyncMock(return_value=[]),
+        ) as mock_range:
+            await get_live_global_stats(mock_db)
 
-        # Should have lookup, match, count stages
-        stage_types = [list(stage.keys())[0] for stage in sessions_pipeline]
-        assert "$lookup" in stage_types
-        assert "$match" in stage_types
-        assert "$count" in stage_types
+        # Only the distinct query has a time range to route on
+        mock_range.assert_awaited_once()
+        start, _ = mock_range.call_args[0]
+        assert start > datetime.now(UTC) - timedelta(minutes=6)
 
     @pytest.mark.asyncio
     async def test_token_aggregation_group_stage(self, mock_db):
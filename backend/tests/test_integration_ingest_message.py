@@ -34,6 +34,13 @@ def mock_db():
         collection.insert_many = AsyncMock(return_value=mock_insert_result)
 
         collection.find_one = AsyncMock(return_value=None)
+        # Upserts behave as if the document was inserted
+        collection.find_one_and_update = AsyncMock(
+            side_effect=lambda query, update, **kwargs: {
+                **query,
+                **update["$setOnInsert"],
+            }
+        )
         collection.find = MagicMock()
         collection.update_one = AsyncMock()
         collection.delete_many = AsyncMock()
@@ -65,7 +72,9 @@ def ingest_service(mock_db, message_service):
         message_service._mock_messages.append(message_data)
         return str(message_data["_id"])
 
-    async def mock_find_messages(filter_dict, skip=0, limit=100, sort_order="desc"):
+    async def mock_find_messages(
+        filter_dict, skip=0, limit=100, sort_order="desc", projection=None
+    ):
         results = message_service._mock_messages[:]
         if "sessionId" in filter_dict:
             session_filter = filter_dict["sessionId"]
@@ -103,17 +112,31 @@ def ingest_service(mock_db, message_service):
                     return True
         return False
 
-    async def mock_aggregate_across_collections(pipeline, start_date, end_date):
+    async def mock_aggregate_session(session_id, pipeline):
         # Simple mock for aggregation
         return []
 
+    async def mock_find_session_messages(session_id, **kwargs):
+        return [
+            msg
+            for msg in message_service._mock_messages
+            if msg.get("sessionId") == session_id
+            and all(
+                msg.get(k) in v["$in"] if isinstance(v, dict) else msg.get(k) == v
+                for k, v in (kwargs.get("extra_filter") or {}).items()
+            )
+        ]
+
+    async def mock_update_session_messages(session_id, filter_dict, update):
+        return 0
+
     service.rolling_service.insert_message = mock_insert_message
     service.rolling_service.find_messages = mock_find_messages
     service.rolling_service.find_one = mock_find_one
     service.rolling_service.update_one = mock_update_one
-    service.rolling_service.aggregate_across_collections = (
-        mock_aggregate_across_collections
-    )
+    service.rolling_service.aggregate_session = mock_aggregate_session
+    service.rolling_service.find_session_messages = mock_find_session_messages
+    service.rolling_service.update_session_messages = mock_update_session_messages
 
     return service
 
@@ -126,8 +149,10 @@ def message_service(mock_db):
     # Storage for messages
     service._mock_messages = []
 
-    # Mock rolling_service methods
-    async def mock_find_messages(filter_dict, skip=0, limit=100, sort_order="desc"):
+    # Mock message repository methods
+    async def mock_find_messages(
+        filter_dict, skip=0, limit=100, sort_order="desc", projection=None
+    ):
         # Filter messages based on filter_dict
         results = service._mock_messages[:]
         if "sessionId" in filter_dict:
@@ -167,9 +192,9 @@ def message_service(mock_db):
         service._mock_messages.append(message_data)
         return str(message_data["_id"])
 
-    service.rolling_service.find_messages = mock_find_messages
-    service.rolling_service.find_one = mock_find_one
-    service.rolling_service.insert_message = mock_insert_message
+    service.messages.find_messages = mock_find_messages
+    service.messages.find_one = mock_find_one
+    service.messages.insert_message = mock_insert_message
 
     return service
 
@@ -289,9 +314,8 @@ class TestIngestMessageIntegration:
             # Verify messages were added to storage
             # With the new rolling collections, we check messages were processed
             assert stats.messages_processed > 0 or stats.messages_updated > 0
-            assert (
-                mock_db.sessions.insert_one.called
-            )  # Sessions are created with insert_one
+            # Sessions are created with an atomic upsert
+            assert mock_db.sessions.find_one_and_update.called
 
             # Mock projects and sessions for hierarchical ownership queries
             mock_db.projects.find.return_value.to_list = AsyncMock(
@@ -0,0 +1,142 @@
+"""Tests for query deadline middleware."""
+
+import asyncio
+
+import pytest
+
+from app.middleware.query_deadline import QueryDeadlineMiddleware
+from app.services.query_budget import current_budget, get_query_metrics
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    """Start every test with empty counters."""
+    get_query_metrics().clear()
+    yield
+    get_query_metrics().clear()
+
+
+def _scope(path):
+    return {"type": "http", "path": path, "method": "GET", "headers": []}
+
+
+def _client(disconnect):
+    """ASGI receive/send pair; ``disconnect`` is set when the client leaves."""
+    sent = []
+
+    async def receive():
+        if not getattr(receive, "body_sent", False):
+            receive.body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            disconnect.set()
+
+    return receive, send, sent
+
+
+async def _respond(send, partial=False):
+    if partial:
+        current_budget().record_timeout("messages_2025_01")
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+class TestQueryDeadlineMiddleware:
+    """Test cases for QueryDeadlineMiddleware."""
+
+    @pytest.mark.asyncio
+    async def test_unbudgeted_path_passes_through(self):
+        """Test paths without a budget run without one."""
+        budgets = []
+
+        async def app(scope, receive, send):
+            budgets.append(current_budget())
+            await _respond(send)
+
+        receive, send, sent = _client(asyncio.Event())
+        await QueryDeadlineMiddleware(app)(_scope("/api/v1/sessions/"), receive, send)
+
+        assert budgets == [None]
+        assert len(sent) == 2
+
+    @pytest.mark.asyncio
+    async def test_budgeted_path_runs_under_budget(self):
+        """Test analytics requests see a budget for their prefix."""
+        budgets = []
+
+        async def app(scope, receive, send):
+            budgets.append(current_budget())
+            await _respond(send)
+
+        receive, send, sent = _client(asyncio.Event())
+        await QueryDeadlineMiddleware(app)(
+            _scope("/api/v1/analytics/summary"), receive, send
+        )
+
+        assert budgets[0].endpoint == "/api/v1/analytics"
+        assert 0 < budgets[0].remaining() <= 30
+        assert sent[0]["headers"] == []
+        assert current_budget() is None
+
+    @pytest.mark.asyncio
+    async def test_partial_results_header(self):
+        """Test responses built from timed-out partitions are flagged."""
+
+        async def app(scope, receive, send):
+            await _respond(send, partial=True)
+
+        receive, send, sent = _client(asyncio.Event())
+        await QueryDeadlineMiddleware(app)(_scope("/api/v1/search/"), receive, send)
+
+        assert (b"x-partial-results", b"true") in sent[0]["headers"]
+        assert get_query_metrics().snapshot() == {
+            "/api/v1/search": {"timeouts": 1, "partial_responses": 1, "cancelled": 0}
+        }
+
+    @pytest.mark.asyncio
+    async def test_disconnect_cancels_handler(self):
+        """Test a client leaving mid-request cancels the handler."""
+        started = asyncio.Event()
+        cancelled = []
+
+        async def app(scope, receive, send):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        disconnect = asyncio.Event()
+        receive, send, sent = _client(disconnect)
+        request = asyncio.create_task(
+            QueryDeadlineMiddleware(app)(
+                _scope("/api/v1/analytics/benchmarks"), receive, send
+            )
+        )
+        await started.wait()
+        disconnect.set()
+        await asyncio.wait_for(request, 1)
+
+        assert cancelled == [True]
+        assert sent == []
+        counters = get_query_metrics().snapshot()["/api/v1/analytics"]
+        assert counters["cancelled"] == 1
+
+    @pytest.mark.asyncio
+    async def test_handler_errors_propagate(self):
+        """Test exceptions from the handler are not swallowed."""
+
+        async def app(scope, receive, send):
+            raise ValueError("boom")
+
+        receive, send, _ = _client(asyncio.Event())
+        with pytest.raises(ValueError):
+            await QueryDeadlineMiddleware(app)(
+                _scope("/api/v1/analytics/summary"), receive, send
+            )
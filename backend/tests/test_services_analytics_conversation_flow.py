@@ -64,7 +64,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": base_timestamp,
                 "message": {"content": "Hello, can you help me with a task?"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-2",
@@ -78,7 +78,7 @@ class TestAnalyticsServiceConversationFlow:
                     "content": "I'd be happy to help!",
                     "tool_calls": [{"function": {"name": "search"}}],
                 },
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-3",
@@ -89,7 +89,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": base_timestamp + timedelta(seconds=10),
                 "message": {"content": "Can you search for information about Python?"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-4",
@@ -100,7 +100,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 2300,
                 "timestamp": base_timestamp + timedelta(seconds=15),
                 "message": {"content": "Here's what I found about Python..."},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-5",
@@ -111,7 +111,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 800,
                 "timestamp": base_timestamp + timedelta(seconds=8),
                 "message": {"content": "Let me also check something else"},
-                "toolUseResult": {"name": "bash", "result": "success"},
+                "hasToolUseResult": True,
             },
         ]
 
@@ -303,7 +303,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 0),
                 "message": {"content": "Run a command"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-2",
@@ -314,7 +314,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 500,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 5),
                 "message": {"name": "bash"},
-                "toolUseResult": {"name": "bash", "result": "success"},
+                "hasToolUseResult": True,
             },
         ]
 
@@ -359,7 +359,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 1000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 0),
                 "message": {"content": "First response"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-2",
@@ -370,7 +370,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 2000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 5),
                 "message": {"content": "Second response"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-3",
@@ -381,7 +381,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 3000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 10),
                 "message": {"content": "Third response"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
         ]
 
@@ -423,7 +423,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 0),
                 "message": {"content": "Start"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "branch1",
@@ -434,7 +434,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 1000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 1),
                 "message": {"content": "Branch 1"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "branch2",
@@ -445,7 +445,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 1000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 1),
                 "message": {"content": "Branch 2"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "branch1.1",
@@ -456,7 +456,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 2),
                 "message": {"content": "Branch 1.1"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "branch1.2",
@@ -467,7 +467,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 2),
                 "message": {"content": "Branch 1.2"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "branch2.1",
@@ -478,7 +478,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 2000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 3),
                 "message": {"content": "Branch 2.1"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
         ]
 
@@ -558,7 +558,7 @@ class TestAnalyticsServiceConversationFlow:
                 # Missing isSidechain, costUsd, durationMs
                 "timestamp": datetime(2024, 1, 1, 12, 0, 0),
                 "message": {},  # Empty message content
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-2",
@@ -568,7 +568,7 @@ class TestAnalyticsServiceConversationFlow:
                 # Missing costUsd, durationMs
                 "timestamp": datetime(2024, 1, 1, 12, 0, 5),
                 "message": None,  # Null message
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
         ]
 
@@ -625,7 +625,7 @@ class TestAnalyticsServiceConversationFlow:
                 "message": {
                     "content": "This is a very long user message that should be truncated because it exceeds the 100 character limit for summaries in the conversation flow visualization."
                 },
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "assistant-msg",
@@ -642,7 +642,7 @@ class TestAnalyticsServiceConversationFlow:
                         {"function": {"name": "read_file"}},
                     ],
                 },
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "tool-msg",
@@ -653,10 +653,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 500,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 8),
                 "message": {"name": "bash"},
-                "toolUseResult": {
-                    "name": "bash",
-                    "result": "Command executed successfully",
-                },
+                "hasToolUseResult": True,
             },
         ]
 
@@ -711,7 +708,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 1000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 0),
                 "message": {"content": "First"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-2",
@@ -722,7 +719,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 2000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 5),
                 "message": {"content": "Second"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
         ]
 
@@ -772,7 +769,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": None,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 0),
                 "message": {"content": "Root message"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
             {
                 "uuid": "msg-2",
@@ -783,7 +780,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 1000,
                 "timestamp": datetime(2024, 1, 1, 12, 0, 5),
                 "message": {"content": "Orphaned message"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             },
         ]
 
@@ -873,26 +870,32 @@ class TestAnalyticsServiceConversationFlow:
         assert single_metrics.total_cost == 5.0
         assert single_metrics.avg_response_time_ms == 1000.0
 
-    def test_calculate_tree_depth_recursive(self, analytics_service):
-        """Test _calculate_tree_depth method directly."""
-        # Build simple children dict
-        children = {
-            "root": ["child1", "child2"],
-            "child1": ["grandchild1"],
-            "child2": [],
-        }
-
-        # Test depth calculation
-        depth = analytics_service._calculate_tree_depth("root", children, 0)
-        assert depth == 2  # root -> child1 -> grandchild1
-
-        # Test leaf node
-        leaf_depth = analytics_service._calculate_tree_depth("grandchild1", children, 2)
-        assert leaf_depth == 2
+    def test_calculate_conversation_metrics_tree_depth(self, analytics_service):
+        """Test max depth and branch count come from the conversation tree."""
+        nodes = [
+            ConversationFlowNode(
+                id=node_id,
+                parent_id=parent_id,
+                type="user",
+                is_sidechain=False,
+                cost=0.0,
+                duration_ms=None,
+                tool_count=0,
+                summary="",
+                timestamp=datetime.now(UTC),
+            )
+            for node_id, parent_id in [
+                ("root", None),
+                ("child1", "root"),
+                ("child2", "root"),
+                ("grandchild1", "child1"),
+            ]
+        ]
 
-        # Test non-existent node
-        missing_depth = analytics_service._calculate_tree_depth("missing", children, 0)
-        assert missing_depth == 0
+        metrics = analytics_service._calculate_conversation_metrics(nodes, [])
+        assert metrics.max_depth == 2  # root -> child1 -> grandchild1
+        assert metrics.branch_count == 1
+        assert metrics.avg_branch_length == 1.5
 
     @pytest.mark.asyncio
     async def test_get_conversation_flow_database_error_handling(
@@ -958,7 +961,7 @@ class TestAnalyticsServiceConversationFlow:
                 "durationMs": 1000 if i % 2 == 1 else None,
                 "timestamp": base_time + timedelta(seconds=i),
                 "message": {"content": f"Message {i}"},
-                "toolUseResult": None,
+                "hasToolUseResult": False,
             }
             large_messages.append(message)
 
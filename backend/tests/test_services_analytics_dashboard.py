@@ -0,0 +1,256 @@
+"""Tests for the single-pass dashboard bundle."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.api.api_v1.endpoints.analytics import get_dashboard_bundle
+from app.schemas.analytics import DashboardWidget, TimeRange
+from app.services.analytics import AnalyticsService
+
+
+class _AsyncIter:
+    """Async iterator over a list, standing in for a Motor cursor."""
+
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+
+def _service(partitions, sessions=(), user_id=None):
+    """Service whose monthly partitions return the given facet results."""
+    db = MagicMock()
+    db.sessions.find = MagicMock(return_value=_AsyncIter(sessions))
+    db.projects.find_one = AsyncMock(return_value={"name": "claudelens"})
+    service = AnalyticsService(db, user_id)
+    service.rolling_service.get_collections_for_range = AsyncMock(
+        return_value=[f"messages_2025_0{i + 1}" for i in range(len(partitions))]
+    )
+    service.rolling_service.aggregate_collections = AsyncMock(return_value=partitions)
+    return service
+
+
+class TestDashboardBundle:
+    """Test cases for AnalyticsService.get_dashboard_bundle."""
+
+    @pytest.mark.asyncio
+    async def test_one_aggregation_for_all_widgets(self):
+        """Test every widget is a facet branch of a single pipeline."""
+        service = _service([])
+
+        bundle = await service.get_dashboard_bundle(
+            list(DashboardWidget), TimeRange.LAST_7_DAYS
+        )
+
+        aggregate = service.rolling_service.aggregate_collections
+        assert aggregate.await_count == 1
+        collections, pipeline = aggregate.await_args.args
+        assert collections == []
+        assert list(pipeline[0]) == ["$match"]
+        branches = pipeline[1]["$facet"]
+        assert set(branches) == {
+            "summary",
+            "summary_previous",
+            "heatmap",
+            "cost",
+            "models",
+            "tokens",
+        }
+        # The outer match covers the previous period used for trends
+        previous_start = branches["summary_previous"][0]["$match"]["timestamp"]
+        assert pipeline[0]["$match"]["timestamp"]["$gte"] == previous_start["$gte"]
+        assert bundle.summary.total_messages == 0
+        assert bundle.activity_heatmap.total_messages == 0
+        assert bundle.token_usage.data_points == []
+
+    @pytest.mark.asyncio
+    async def test_only_requested_widgets(self):
+        """Test unrequested widgets are neither computed nor returned."""
+        service = _service([{"tokens": []}])
+
+        bundle = await service.get_dashboard_bundle(
+            [DashboardWidget.TOKENS], TimeRange.LAST_30_DAYS, group_by="month"
+        )
+
+        pipeline = service.rolling_service.aggregate_collections.await_args.args[1]
+        assert list(pipeline[1]["$facet"]) == ["tokens"]
+        assert bundle.token_usage.group_by == "month"
+        assert bundle.summary is None
+        assert bundle.cost is None
+
+    @pytest.mark.asyncio
+    async def test_partitions_merge_exactly(self):
+        """Test rows split across monthly partitions are combined."""
+        january = {
+            "summary": [{"_id": "s1", "messages": 3, "cost": 0.5}],
+            "summary_previous": [{"_id": None, "messages": 2, "cost": 0.25}],
+            "cost": [
+                {
+                    "_id": "2025-01-31",
+                    "totalCost": 0.5,
+                    "messageCount": 3,
+                    "costByModel": [{"model": "opus", "cost": 0.5}],
+                }
+            ],
+            "models": [
+                {
+                    "_id": "opus",
+                    "count": 3,
+                    "totalCost": 0.5,
+                    "durationSum": 300,
+                    "durationCount": 3,
+                    "inputSum": 30,
+                    "inputCount": 3,
+                    "outputSum": 0,
+                    "outputCount": 0,
+                }
+            ],
+            "tokens": [
+                {
+                    "_id": "2025-01-31",
+                    "inputTokens": 30,
+                    "outputTokens": 60,
+                    "messageCount": 3,
+                }
+            ],
+        }
+        february = {
+            "summary": [
+                {"_id": "s1", "messages": 1, "cost": 0.5},
+                {"_id": "s2", "messages": 5, "cost": None},
+            ],
+            "summary_previous": [],
+            "cost": [
+                {
+                    "_id": "2025-01-31",
+                    "totalCost": 0.25,
+                    "messageCount": 1,
+                    "costByModel": [{"model": None, "cost": 0.25}],
+                }
+            ],
+            "models": [
+                {
+                    "_id": "opus",
+                    "count": 1,
+                    "totalCost": 0.5,
+                    "durationSum": 500,
+                    "durationCount": 1,
+                    "inputSum": 10,
+                    "inputCount": 1,
+                    "outputSum": 8,
+                    "outputCount": 1,
+                }
+            ],
+            "tokens": [
+                {
+                    "_id": "2025-01-31",
+                    "inputTokens": 10,
+                    "outputTokens": 20,
+                    "messageCount": 1,
+                }
+            ],
+        }
+        sessions = [
+            {"sessionId": "s1", "projectId": "p1"},
+            {"sessionId": "s2", "projectId": "p2"},
+        ]
+        service = _service([january, february], sessions)
+
+        bundle = await service.get_dashboard_bundle(
+            [
+                DashboardWidget.SUMMARY,
+                DashboardWidget.COST,
+                DashboardWidget.MODELS,
+                DashboardWidget.TOKENS,
+            ],
+            TimeRange.LAST_90_DAYS,
+        )
+
+        summary = bundle.summary
+        assert summary.total_messages == 9
+        assert summary.total_sessions == 2
+        assert summary.total_projects == 2
+        assert summary.total_cost == 1.0
+        assert summary.messages_trend == 350.0
+        assert summary.most_active_project == "claudelens"
+        service.db.projects.find_one.assert_awaited_once_with(
+            {"_id": "p2"}, {"name": 1}
+        )
+
+        assert len(bundle.cost.data_points) == 1
+        assert bundle.cost.data_points[0].message_count == 4
+        assert bundle.cost.cost_by_model == {"opus": 0.5, "unknown": 0.25}
+
+        [opus] = bundle.model_usage.models
+        assert opus.message_count == 4
+        assert opus.avg_response_time_ms == 200
+        assert opus.avg_tokens_input == 10
+        assert opus.avg_tokens_output == 8
+
+        [tokens] = bundle.token_usage.data_points
+        assert tokens.total_tokens == 120
+        assert bundle.token_usage.avg_input_tokens_per_message == 10
+
+    @pytest.mark.asyncio
+    async def test_project_filter_scopes_cost_and_models(self):
+        """Test a project filter applies to the cost and model branches."""
+        service = _service([])
+        service.db.sessions.distinct = AsyncMock(return_value=["s1"])
+
+        await service.get_dashboard_bundle(
+            [DashboardWidget.COST, DashboardWidget.TOKENS],
+            TimeRange.LAST_7_DAYS,
+            project_id="507f1f77bcf86cd799439011",
+        )
+
+        pipeline = service.rolling_service.aggregate_collections.await_args.args[1]
+        branches = pipeline[1]["$facet"]
+        assert branches["cost"][0]["$match"]["sessionId"] == {"$in": ["s1"]}
+        assert "sessionId" not in branches["tokens"][0]["$match"]
+
+    @pytest.mark.asyncio
+    async def test_summary_filters_on_message_owner(self):
+        """Test the summary branches match the user_id stamped on messages."""
+        user_id = "507f1f77bcf86cd799439011"
+        service = _service([], user_id=user_id)
+
+        await service.get_dashboard_bundle(
+            [DashboardWidget.SUMMARY], TimeRange.LAST_7_DAYS
+        )
+
+        pipeline = service.rolling_service.aggregate_collections.await_args.args[1]
+        branches = pipeline[1]["$facet"]
+        for name in ("summary", "summary_previous"):
+            match = branches[name][0]["$match"]
+            assert match["user_id"] == ObjectId(user_id)
+            assert "sessionId" not in match
+        service.db.projects.find.assert_not_called()
+
+
+class TestDashboardEndpoint:
+    """Test cases for the dashboard bundle endpoint."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("timezone", ["Mars/Olympus", "+5", "UTC; drop"])
+    async def test_invalid_timezone_is_rejected(self, timezone):
+        """Test an unknown timezone is a 400 rather than empty widgets."""
+        with pytest.raises(HTTPException) as exc_info:
+            await get_dashboard_bundle(
+                MagicMock(),
+                "user",
+                [DashboardWidget.ACTIVITY_HEATMAP],
+                TimeRange.LAST_7_DAYS,
+                timezone,
+            )
+
+        assert exc_info.value.status_code == 400
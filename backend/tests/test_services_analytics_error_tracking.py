@@ -233,6 +233,35 @@ class TestAnalyticsServiceErrorTracking:
 
         assert isinstance(result, ErrorDetailsResponse)
 
+    @pytest.mark.asyncio
+    async def test_get_detailed_errors_uses_ingest_classification(
+        self, analytics_service, mock_db
+    ):
+        """Test tool errors are read from the fields stamped at ingest."""
+        stamped_error = {
+            "_id": ObjectId(),
+            "timestamp": datetime.now(timezone.utc),
+            "type": "tool_result",
+            "sessionId": "session-123",
+            "toolName": "Bash",
+            "isError": True,
+            "errorType": "exit_code_error",
+            "errorSeverity": "warning",
+            "toolUseResult": {"stdout": "oops", "exitCode": 1},
+        }
+        aggregate = AsyncMock(side_effect=[[stamped_error], [], []])
+        analytics_service.rolling_service.aggregate_across_collections = aggregate
+
+        result = await analytics_service.get_detailed_errors(error_severity="warning")
+
+        tool_match = aggregate.call_args_list[0].args[0][0]["$match"]
+        assert tool_match["isError"] is True
+        assert tool_match["errorSeverity"] == "warning"
+        assert "$lookup" not in str(aggregate.call_args_list[0].args[0])
+        assert result.errors[0].tool == "Bash"
+        assert result.errors[0].message == "Exit code 1: oops"
+        assert result.error_summary.by_tool == {"Bash": 1}
+
     # get_success_rate tests
     @pytest.mark.asyncio
     async def test_get_success_rate_basic_functionality(
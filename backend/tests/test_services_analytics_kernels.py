@@ -0,0 +1,170 @@
+"""Tests for the analytics numeric kernels."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.schemas.analytics import TimeRange
+from app.services.analytics import AnalyticsService
+from app.services.analytics_kernels import (
+    group_sums,
+    heatmap_bins,
+    min_max,
+    moving_average_forecast,
+    nearest_rank,
+    pearson,
+    rank_fractions,
+    z_scores,
+)
+from app.services.partition_snapshot import PartitionSnapshotStore
+
+
+class TestStatistics:
+    """Test cases for correlation and normalization kernels."""
+
+    def test_pearson(self):
+        """Test correlation of linear, inverse and flat series."""
+        assert pearson([1, 2, 3, 4], [2, 4, 6, 8]) == pytest.approx(1.0)
+        assert pearson([1, 2, 3, 4], [8, 6, 4, 2]) == pytest.approx(-1.0)
+        assert pearson([1, 2, 3], [5, 5, 5]) == 0.0
+        assert pearson([1], [1]) == 0.0
+        assert pearson([1, 2], [1]) == 0.0
+
+    def test_z_scores(self):
+        """Test standard scores use the sample deviation."""
+        assert z_scores([1.0, 2.0, 3.0]) == pytest.approx([-1.0, 0.0, 1.0])
+        assert z_scores([2.0, 2.0]) is None
+        assert z_scores([2.0]) is None
+
+    def test_min_max(self):
+        """Test scaling between extremes."""
+        assert min_max([0.0, 5.0, 10.0]) == [0.0, 0.5, 1.0]
+        assert min_max([3.0, 3.0]) is None
+        assert min_max([]) is None
+
+    def test_rank_fractions(self):
+        """Test both tie rules."""
+        values = [3.0, 1.0, 3.0, 2.0]
+        assert rank_fractions(values) == [1.0, 0.25, 1.0, 0.5]
+        assert rank_fractions(values, "min") == [0.75, 0.25, 0.75, 0.5]
+        assert rank_fractions([]) == []
+
+    def test_nearest_rank(self):
+        """Test mean and nearest-rank percentiles of unsorted values."""
+        mean, (p50, p90) = nearest_rank([50, 10, 40, 20, 30], (0.5, 0.9))
+        assert mean == 30.0
+        assert (p50, p90) == (30.0, 50.0)
+
+        assert nearest_rank([7], (0.5, 0.9)) == (7.0, [7.0, 7.0])
+
+
+class TestForecast:
+    """Test cases for the moving-average forecast."""
+
+    def test_window_and_decay(self):
+        """Test the average of the last week decays every seven days."""
+        daily = [100.0] * 3 + [10.0] * 7
+
+        forecast = moving_average_forecast(daily, 8)
+
+        assert len(forecast) == 8
+        assert forecast[0] == (10.0, 10.0, 10.0)
+        assert forecast[7][0] == pytest.approx(9.5)
+
+    def test_interval(self):
+        """Test the interval spans 1.96 population deviations."""
+        predicted, lower, upper = moving_average_forecast([2.0, 4.0], 1)[0]
+
+        assert predicted == 3.0
+        assert upper == pytest.approx(3.0 + 1.96)
+        assert lower == pytest.approx(3.0 - 1.96)
+
+    def test_single_point(self):
+        """Test a single day assumes 20% deviation and clamps at zero."""
+        predicted, lower, upper = moving_average_forecast([10.0], 1)[0]
+
+        assert predicted == 10.0
+        assert lower == pytest.approx(10.0 - 1.96 * 2.0)
+        assert upper == pytest.approx(10.0 + 1.96 * 2.0)
+        assert moving_average_forecast([0.0, 1.0], 1)[0][1] == 0
+
+
+class TestBinning:
+    """Test cases for grouping and heatmap binning."""
+
+    def test_group_sums_keeps_first_seen_order(self):
+        """Test sums per key in order of appearance."""
+        sums = group_sums(["b", "a", "b"], [1.0, 2.0, 3.0])
+
+        assert list(sums) == ["b", "a"]
+        assert sums == {"b": 4.0, "a": 2.0}
+
+    def test_heatmap_merges_partitions(self):
+        """Test rows for the same cell from two partitions are merged."""
+        heatmap = heatmap_bins(
+            [
+                {"day": 1, "hour": 9, "count": 2, "costSum": 1.0, "costCount": 2},
+                {"day": 1, "hour": 9, "count": 2, "costSum": 3.0, "costCount": 2},
+                {
+                    "day": 0,
+                    "hour": 14,
+                    "count": 3,
+                    "durationSum": 600,
+                    "durationCount": 3,
+                },
+            ]
+        )
+
+        assert heatmap["cells"] == [
+            {
+                "day": 0,
+                "hour": 14,
+                "count": 3,
+                "avg_cost": None,
+                "avg_response_time": 200.0,
+            },
+            {
+                "day": 1,
+                "hour": 9,
+                "count": 4,
+                "avg_cost": 1.0,
+                "avg_response_time": None,
+            },
+        ]
+        assert heatmap["peak_hour"] == 9
+        assert heatmap["peak_day"] == 1
+
+    def test_heatmap_empty(self):
+        """Test no rows give no cells and no peaks."""
+        assert heatmap_bins([]) == {"cells": [], "peak_hour": None, "peak_day": None}
+
+
+class TestServiceHeatmap:
+    """Test the activity heatmap uses the binning kernel."""
+
+    @pytest.mark.asyncio
+    async def test_activity_heatmap(self):
+        """Test partition rows become merged cells with peaks."""
+        service = AnalyticsService(MagicMock())
+        service.rolling_service.get_collections_for_range = AsyncMock(
+            return_value=["messages_2025_01", "messages_2025_02"]
+        )
+        service.rolling_service.aggregate_collections = AsyncMock(
+            return_value=[
+                {"day": 2, "hour": 10, "count": 5, "costSum": 0.5, "costCount": 5},
+                {"day": 2, "hour": 10, "count": 5, "costSum": 1.5, "costCount": 5},
+                {"day": 4, "hour": 22, "count": 1},
+            ]
+        )
+
+        with patch.object(PartitionSnapshotStore, "load", AsyncMock(return_value={})):
+            heatmap = await service.get_activity_heatmap(TimeRange.LAST_30_DAYS)
+
+        assert heatmap.total_messages == 11
+        assert [(c.day_of_week, c.hour, c.count) for c in heatmap.cells] == [
+            (2, 10, 10),
+            (4, 22, 1),
+        ]
+        assert heatmap.cells[0].avg_cost == 0.2
+        assert heatmap.peak_hour == 10
+        assert heatmap.peak_day == 2
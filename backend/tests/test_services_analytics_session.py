@@ -6,7 +6,11 @@ from unittest.mock import AsyncMock, MagicMock
 import pytest
 from bson import ObjectId
 
-from app.schemas.analytics import TimeRange
+from app.schemas.analytics import (
+    BenchmarkEntityType,
+    NormalizationMethod,
+    TimeRange,
+)
 from app.services.analytics import AnalyticsService
 
 
@@ -490,14 +494,15 @@ class TestAnalyticsAggregationBasic:
 
 
 class TestAnalyticsPerformanceMetrics:
-    """Test analytics service performance metrics functionality."""
+    """Test analytics service performance benchmarks."""
 
     @pytest.fixture
     def mock_db(self):
         """Create mock database."""
         db = MagicMock()
         db.messages = AsyncMock()
-        db.sessions = AsyncMock()
+        db.sessions = MagicMock()
+        db.projects = MagicMock()
         return db
 
     @pytest.fixture
@@ -505,248 +510,79 @@ class TestAnalyticsPerformanceMetrics:
         """Create analytics service with mock database."""
         return AnalyticsService(mock_db)
 
-    @pytest.mark.asyncio
-    async def test_calculate_cost_efficiency_basic(self, analytics_service, mock_db):
-        """Test cost efficiency calculation."""
-        # Mock aggregation result
-        mock_result = [
-            {"total_cost": 10.0, "total_messages": 100, "successful_operations": 95}
-        ]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {"timestamp": {"$gte": datetime(2024, 1, 1)}}
-
-        result = await analytics_service._calculate_cost_efficiency(message_filter)
-
-        # 95 successful operations / $10 = 9.5 operations per dollar * 100 = 950.0
-        assert result == 950.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_cost_efficiency_zero_cost(
-        self, analytics_service, mock_db
-    ):
-        """Test cost efficiency with zero cost."""
-        mock_result = [
-            {"total_cost": 0.0, "total_messages": 100, "successful_operations": 95}
-        ]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_cost_efficiency(message_filter)
-
-        assert result == 0.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_cost_efficiency_empty_result(
-        self, analytics_service, mock_db
-    ):
-        """Test cost efficiency with empty result."""
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=[]
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_cost_efficiency(message_filter)
-
-        assert result == 0.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_speed_score_basic(self, analytics_service, mock_db):
-        """Test speed score calculation."""
-        # Mock aggregation result - 1 second average response time
-        mock_result = [{"avg_duration": 1000.0, "count": 50}]  # 1000ms = 1 second
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {"timestamp": {"$gte": datetime(2024, 1, 1)}}
-
-        result = await analytics_service._calculate_speed_score(message_filter)
-
-        # Speed score = 100 - log10(1) * 20 = 100 - 0 * 20 = 100.0
-        assert result == 100.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_speed_score_slow_response(
-        self, analytics_service, mock_db
-    ):
-        """Test speed score with slow response times."""
-        # Mock aggregation result - 10 seconds average response time
-        mock_result = [{"avg_duration": 10000.0, "count": 50}]  # 10000ms = 10 seconds
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_speed_score(message_filter)
-
-        # Speed score = 100 - log10(10) * 20 = 100 - 1 * 20 = 80.0
-        assert result == 80.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_speed_score_empty_result(self, analytics_service, mock_db):
-        """Test speed score with empty result."""
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=[]
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_speed_score(message_filter)
-
-        assert result == 50.0  # Neutral score
-
-    @pytest.mark.asyncio
-    async def test_calculate_speed_score_zero_count(self, analytics_service, mock_db):
-        """Test speed score with zero count."""
-        mock_result = [{"count": 0}]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_speed_score(message_filter)
-
-        assert result == 50.0  # Neutral score
+    @staticmethod
+    def cursor(documents):
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=documents)
+        return cursor
 
     @pytest.mark.asyncio
-    async def test_calculate_quality_score_perfect(self, analytics_service, mock_db):
-        """Test quality score with no errors."""
-        mock_result = [{"total_messages": 100, "error_messages": 0}]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
+    async def test_get_benchmarks_single_pass(self, analytics_service, mock_db):
+        """Test all projects are measured by one aggregation per partition."""
+        project_a, project_b = ObjectId(), ObjectId()
+        mock_db.sessions.find.return_value = self.cursor(
+            [
+                {"sessionId": "s1", "projectId": project_a},
+                {"sessionId": "s2", "projectId": project_b},
+            ]
         )
-
-        message_filter = {"timestamp": {"$gte": datetime(2024, 1, 1)}}
-
-        result = await analytics_service._calculate_quality_score(message_filter)
-
-        assert result == 100.0  # Perfect score
-
-    @pytest.mark.asyncio
-    async def test_calculate_quality_score_with_errors(
-        self, analytics_service, mock_db
-    ):
-        """Test quality score with some errors."""
-        mock_result = [{"total_messages": 100, "error_messages": 5}]  # 5% error rate
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
+        mock_db.projects.find.return_value = self.cursor(
+            [{"_id": project_a, "name": "Alpha"}]
         )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_quality_score(message_filter)
-
-        # Quality score = (1 - 0.05) * 100 = 95.0
-        assert result == 95.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_quality_score_empty_result(
-        self, analytics_service, mock_db
-    ):
-        """Test quality score with empty result."""
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=[]
+        row = {"messages": 10, "cost": 1.0, "successful": 5, "duration": 2000}
+        # One result per partition; s1 spans both
+        aggregate = AsyncMock(
+            return_value=[
+                {
+                    "entity_0": [{"_id": "s1", **row, "timed": 2}],
+                    "entity_1": [{"_id": "s2", **row, "timed": 1}],
+                },
+                {"entity_0": [{"_id": "s1", "messages": 10}], "entity_1": []},
+            ]
         )
+        analytics_service.rolling_service.aggregate_across_collections = aggregate
 
-        message_filter = {}
-
-        result = await analytics_service._calculate_quality_score(message_filter)
-
-        assert result == 100.0  # Perfect score if no data
-
-    @pytest.mark.asyncio
-    async def test_calculate_productivity_score_basic(self, analytics_service, mock_db):
-        """Test productivity score calculation."""
-        mock_result = [
-            {
-                "avg_messages_per_session": 10.0,
-                "avg_tools_per_session": 5.0,
-                "session_count": 20,
-            }
-        ]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
+        result = await analytics_service.get_benchmarks(
+            entity_type=BenchmarkEntityType.PROJECT,
+            entity_ids=[str(project_a), str(project_b)],
+            time_range=TimeRange.LAST_30_DAYS,
+            normalization_method=NormalizationMethod.MIN_MAX,
         )
 
-        message_filter = {"timestamp": {"$gte": datetime(2024, 1, 1)}}
-
-        result = await analytics_service._calculate_productivity_score(message_filter)
-
-        # messages_score = min(100, 10 * 2) = 20
-        # tools_score = min(100, 5 * 5) = 25
-        # productivity = 20 * 0.6 + 25 * 0.4 = 12 + 10 = 22.0
-        assert result == 22.0
-
-    @pytest.mark.asyncio
-    async def test_calculate_productivity_score_capped(
-        self, analytics_service, mock_db
-    ):
-        """Test productivity score with values that hit the caps."""
-        mock_result = [
-            {
-                "avg_messages_per_session": 60.0,  # Would be 120 * 2, capped at 100
-                "avg_tools_per_session": 25.0,  # Would be 125 * 5, capped at 100
-                "session_count": 5,
-            }
-        ]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_productivity_score(message_filter)
-
-        # Both scores capped at 100
-        # productivity = 100 * 0.6 + 100 * 0.4 = 60 + 40 = 100.0
-        assert result == 100.0
+        aggregate.assert_awaited_once()
+        pipeline = aggregate.call_args.args[0]
+        assert pipeline[0]["$match"]["sessionId"] == {"$in": ["s1", "s2"]}
+        assert pipeline[1]["$facet"]["entity_0"][0] == {
+            "$match": {"sessionId": {"$in": ["s1"]}}
+        }
+        assert mock_db.sessions.find.call_count == 1
+
+        alpha, beta = result.benchmarks
+        assert alpha.entity == "Alpha"
+        assert beta.entity == f"Project {str(project_b)[:8]}"
+        # Alpha: 1s average response, Beta: 2s
+        assert alpha.metrics.speed_score == 100.0
+        assert beta.metrics.speed_score == 0.0
+        # Alpha's session spans two partitions: 20 messages
+        assert alpha.metrics.productivity_score == 100.0
+        assert alpha.percentile_ranks.speed == 100.0
+        assert beta.percentile_ranks.speed == 50.0
 
     @pytest.mark.asyncio
-    async def test_calculate_productivity_score_empty_result(
-        self, analytics_service, mock_db
-    ):
-        """Test productivity score with empty result."""
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=[]
+    async def test_get_benchmarks_time_periods(self, analytics_service, mock_db):
+        """Test time periods are measured without session lookups."""
+        aggregate = AsyncMock(return_value=[])
+        analytics_service.rolling_service.aggregate_across_collections = aggregate
+
+        result = await analytics_service.get_benchmarks(
+            entity_type=BenchmarkEntityType.TIME_PERIOD,
+            entity_ids=["2025-01", "2025-02"],
+            time_range=TimeRange.LAST_30_DAYS,
+            normalization_method=NormalizationMethod.Z_SCORE,
         )
 
-        message_filter = {}
-
-        result = await analytics_service._calculate_productivity_score(message_filter)
-
-        assert result == 50.0  # Neutral score
-
-    @pytest.mark.asyncio
-    async def test_calculate_productivity_score_zero_sessions(
-        self, analytics_service, mock_db
-    ):
-        """Test productivity score with zero sessions."""
-        mock_result = [{"session_count": 0}]
-
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=mock_result
-        )
-
-        message_filter = {}
-
-        result = await analytics_service._calculate_productivity_score(message_filter)
-
-        assert result == 50.0  # Neutral score
+        mock_db.sessions.find.assert_not_called()
+        aggregate.assert_awaited_once()
+        assert [b.entity for b in result.benchmarks] == ["2025-01", "2025-02"]
+        # No data: neutral scores everywhere
+        assert all(b.metrics.speed_score == 50.0 for b in result.benchmarks)
@@ -1,5 +1,6 @@
 """Comprehensive tests for analytics service session depth analysis functionality."""
 
+from collections import defaultdict
 from datetime import UTC, datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock
 
@@ -15,6 +16,58 @@ from app.schemas.analytics import (
     TimeRange,
 )
 from app.services.analytics import AnalyticsService
+from app.services.conversation_tree import ConversationTree
+
+
+def sessions_from_messages(messages):
+    """Session documents with the tree fields ingest maintains."""
+    by_session = defaultdict(list)
+    for message in messages:
+        by_session[message["sessionId"]].append(message)
+
+    sessions = []
+    for session_id, session_messages in by_session.items():
+        tree = ConversationTree(session_messages)
+        sessions.append(
+            {
+                "sessionId": session_id,
+                "maxDepth": max(tree.depths().values()),
+                "branchCount": sum(
+                    1
+                    for uuid, kids in tree.children.items()
+                    if uuid in tree and len(kids) > 1
+                ),
+                "totalCost": sum(m.get("costUsd") or 0 for m in session_messages),
+                "totalDurationMs": sum(
+                    m.get("durationMs") or 0 for m in session_messages
+                ),
+                "messageCount": len(session_messages),
+                "userMessageCount": sum(
+                    1 for m in session_messages if m["type"] == "user"
+                ),
+                "respondedCount": sum(
+                    1
+                    for m in session_messages
+                    if m["type"] == "assistant" and m.get("costUsd")
+                ),
+            }
+        )
+    return sessions
+
+
+def mock_sessions(analytics_service, messages):
+    """Serve depth analytics from sessions built out of ``messages``."""
+    sessions = sessions_from_messages(messages)
+
+    def aggregate(pipeline):
+        min_depth = pipeline[0]["$match"]["maxDepth"]["$gte"]
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(
+            return_value=[s for s in sessions if s["maxDepth"] >= min_depth]
+        )
+        return cursor
+
+    analytics_service.db.sessions.aggregate = MagicMock(side_effect=aggregate)
 
 
 class TestAnalyticsServiceSessionDepth:
@@ -277,10 +330,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_messages_simple
     ):
         """Test basic session depth analytics functionality."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_messages_simple
-        )
+        mock_sessions(analytics_service, sample_messages_simple)
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
@@ -325,10 +375,7 @@ class TestAnalyticsServiceSessionDepth:
         mock_sessions_cursor = MockAsyncCursor([{"sessionId": "session1"}])
         analytics_service.db.sessions.find.return_value = mock_sessions_cursor
 
-        # Mock messages aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_messages_simple
-        )
+        mock_sessions(analytics_service, sample_messages_simple)
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
@@ -386,10 +433,7 @@ class TestAnalyticsServiceSessionDepth:
     @pytest.mark.asyncio
     async def test_get_session_depth_analytics_empty_data(self, analytics_service):
         """Test session depth analytics with no matching messages."""
-        # Mock empty messages result
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=[]
-        )
+        mock_sessions(analytics_service, [])
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
@@ -411,10 +455,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_multi_session_messages
     ):
         """Test session depth analytics with minimum depth filter."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_multi_session_messages
-        )
+        mock_sessions(analytics_service, sample_multi_session_messages)
 
         # Call with min_depth=5 (should only include session3 with depth 8)
         result = await analytics_service.get_session_depth_analytics(
@@ -453,10 +494,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_messages_with_sidechains
     ):
         """Test session depth analytics including sidechains."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_messages_with_sidechains
-        )
+        mock_sessions(analytics_service, sample_messages_with_sidechains)
 
         # Call with include_sidechains=True
         result = await analytics_service.get_session_depth_analytics(
@@ -477,10 +515,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_multi_session_messages
     ):
         """Test depth correlation calculations."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_multi_session_messages
-        )
+        mock_sessions(analytics_service, sample_multi_session_messages)
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
@@ -501,10 +536,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_messages_with_branches
     ):
         """Test conversation pattern identification."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_messages_with_branches
-        )
+        mock_sessions(analytics_service, sample_messages_with_branches)
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
@@ -532,10 +564,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_multi_session_messages
     ):
         """Test depth recommendations generation."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_multi_session_messages
-        )
+        mock_sessions(analytics_service, sample_multi_session_messages)
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
@@ -987,10 +1016,7 @@ class TestAnalyticsServiceSessionDepth:
         self, analytics_service, sample_messages_simple
     ):
         """Test session depth analytics with ALL_TIME range."""
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=sample_messages_simple
-        )
+        mock_sessions(analytics_service, sample_messages_simple)
 
         # Call with ALL_TIME range
         result = await analytics_service.get_session_depth_analytics(TimeRange.ALL_TIME)
@@ -999,18 +1025,29 @@ class TestAnalyticsServiceSessionDepth:
         assert isinstance(result, SessionDepthAnalytics)
         assert result.time_range == TimeRange.ALL_TIME
 
-        # Verify aggregation pipeline was called
-        analytics_service.rolling_service.aggregate_across_collections.assert_called_once()
-        pipeline = (
-            analytics_service.rolling_service.aggregate_across_collections.call_args[0][
-                0
-            ]
-        )
+        # Sessions are read in one aggregation without a time bound
+        analytics_service.db.sessions.aggregate.assert_called_once()
+        pipeline = analytics_service.db.sessions.aggregate.call_args[0][0]
+        match_stage = pipeline[0]["$match"]
+        assert "endedAt" not in match_stage
 
-        # First stage should be $match with minimal filter for ALL_TIME
+    @pytest.mark.asyncio
+    async def test_get_session_depth_analytics_matches_active_sessions(
+        self, analytics_service, sample_messages_simple
+    ):
+        """Test sessions are selected when they were active during the range."""
+        mock_sessions(analytics_service, sample_messages_simple)
+
+        await analytics_service.get_session_depth_analytics(TimeRange.LAST_7_DAYS)
+
+        pipeline = analytics_service.db.sessions.aggregate.call_args[0][0]
         match_stage = pipeline[0]["$match"]
-        # For ALL_TIME, there should be no timestamp filter or it should be empty
-        assert "timestamp" not in match_stage or not match_stage.get("timestamp")
+        start = analytics_service._get_time_filter(TimeRange.LAST_7_DAYS)[
+            "timestamp"
+        ]["$gte"]
+        assert match_stage["endedAt"]["$gte"] <= start
+        assert match_stage["endedAt"]["$gte"] >= start - timedelta(minutes=1)
+        assert "startedAt" not in match_stage
 
     @pytest.mark.asyncio
     async def test_get_session_depth_analytics_complex_scenario(
@@ -1169,10 +1206,7 @@ class TestAnalyticsServiceSessionDepth:
 
         complex_messages = session1_msgs + session2_msgs + session3_msgs
 
-        # Mock database aggregation
-        analytics_service.rolling_service.aggregate_across_collections = AsyncMock(
-            return_value=complex_messages
-        )
+        mock_sessions(analytics_service, complex_messages)
 
         # Call the method
         result = await analytics_service.get_session_depth_analytics(
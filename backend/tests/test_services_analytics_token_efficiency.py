@@ -14,6 +14,7 @@ from app.schemas.analytics import (
     TokenFormattedValues,
 )
 from app.services.analytics import AnalyticsService
+from app.services.request_coalescer import get_request_coalescer
 
 
 class TestAnalyticsServiceTokenEfficiency:
@@ -702,7 +703,8 @@ class TestAnalyticsServiceTokenEfficiency:
                 return_value=sample_data
             )
 
-            # Call the method
+            # Call the method; identical calls are memoized, so start fresh
+            get_request_coalescer().clear()
             result = await analytics_service.get_token_efficiency_detailed()
 
             # Verify cache hit rate
@@ -0,0 +1,147 @@
+"""Tests for the single-pass benchmark KPI engine."""
+
+import pytest
+
+from app.schemas.analytics import NormalizationMethod
+from app.services.benchmark_kpis import (
+    complexity_handling,
+    cost_efficiency,
+    entity_kpis,
+    kpi_pipeline,
+    merge_partials,
+    normalize_column,
+    percentile_ranks,
+    productivity_score,
+    quality_score,
+    speed_score,
+)
+
+
+class TestScores:
+    """Test cases for the KPI scoring functions."""
+
+    def test_cost_efficiency(self):
+        """Test cost efficiency calculation."""
+        # 95 successful operations / $10 = 9.5 operations per dollar * 100
+        assert cost_efficiency(10.0, 95) == 950.0
+
+    def test_cost_efficiency_zero_cost(self):
+        """Test cost efficiency with zero cost."""
+        assert cost_efficiency(0.0, 95) == 0.0
+
+    def test_speed_score(self):
+        """Test speed score calculation."""
+        # 100 - log10(1) * 20
+        assert speed_score(1000.0) == 100.0
+        # 100 - log10(10) * 20
+        assert speed_score(10000.0) == 80.0
+        assert speed_score(0.0) == 100.0
+
+    def test_quality_score(self):
+        """Test quality score from error rates."""
+        assert quality_score(100, 0) == 100.0
+        assert quality_score(100, 5) == 95.0
+        assert quality_score(0, 0) == 100.0  # Perfect score if no data
+
+    def test_productivity_score(self):
+        """Test productivity score calculation."""
+        # min(100, 10 * 2) * 0.6 + min(100, 5 * 5) * 0.4
+        assert productivity_score(10.0, 5.0) == 22.0
+        # Both parts capped at 100
+        assert productivity_score(60.0, 25.0) == 100.0
+
+    def test_complexity_handling(self):
+        """Test complexity handling score calculation."""
+        # 20 * 0.4 + 50 * 0.3 + 30 * 0.3
+        assert complexity_handling(2.0, 0.5, 10.0) == pytest.approx(32.0)
+
+
+class TestEngine:
+    """Test cases for the facet pipeline and merging of partials."""
+
+    def test_pipeline_has_a_branch_per_entity(self):
+        """Test every entity is grouped by session in its own branch."""
+        pipeline = kpi_pipeline(
+            {"timestamp": {"$gte": 0}},
+            [{"sessionId": {"$in": ["a"]}}, {"sessionId": {"$in": ["b"]}}],
+        )
+
+        facet = pipeline[1]["$facet"]
+        assert list(facet) == ["entity_0", "entity_1"]
+        assert facet["entity_1"][0] == {"$match": {"sessionId": {"$in": ["b"]}}}
+        assert facet["entity_1"][1]["$group"]["_id"] == "$sessionId"
+
+    def test_merge_sessions_across_partitions(self):
+        """Test partial session rows from two partitions are combined."""
+        merged = merge_partials(
+            [
+                {"entity_0": [{"_id": "s1", "messages": 4, "sidechain": 1}]},
+                {"entity_0": [{"_id": "s1", "messages": 6, "sidechain": 0}]},
+            ],
+            2,
+        )
+
+        assert merged[0]["s1"]["messages"] == 10
+        assert merged[0]["s1"]["sidechain"] == 1
+        assert merged[1] == {}
+
+    def test_session_averages_after_merge(self):
+        """Test session averages use merged sessions, not partition rows."""
+        merged = merge_partials(
+            [
+                {"entity_0": [{"_id": "s1", "messages": 5, "depth": 10}]},
+                {"entity_0": [{"_id": "s1", "messages": 5, "depth": 10}]},
+            ],
+            1,
+        )
+
+        kpis = entity_kpis(merged[0])
+
+        # One session with 10 messages at depth 2
+        assert kpis["productivity_score_raw"] == 12.0
+        assert kpis["complexity_handling_raw"] == pytest.approx(17.0)
+
+    def test_no_sessions_scores_neutral(self):
+        """Test entities without data get neutral scores."""
+        assert entity_kpis({}) == {
+            "cost_efficiency_raw": 0.0,
+            "speed_score_raw": 50.0,
+            "quality_score_raw": 100.0,
+            "productivity_score_raw": 50.0,
+            "complexity_handling_raw": 50.0,
+        }
+
+
+class TestNormalization:
+    """Test cases for column-wise normalization."""
+
+    def test_z_score(self):
+        """Test z-scores map to 0-100 around 50."""
+        assert normalize_column([1.0, 2.0, 3.0], NormalizationMethod.Z_SCORE) == [
+            35.0,
+            50.0,
+            65.0,
+        ]
+        assert normalize_column([4.0, 4.0], NormalizationMethod.Z_SCORE) == [
+            50.0,
+            50.0,
+        ]
+
+    def test_min_max(self):
+        """Test min-max scaling."""
+        assert normalize_column([0.0, 5.0, 10.0], NormalizationMethod.MIN_MAX) == [
+            0.0,
+            50.0,
+            100.0,
+        ]
+
+    def test_percentile_rank_ties(self):
+        """Test ties share the rank of the first equal value."""
+        assert normalize_column(
+            [3.0, 1.0, 3.0, 2.0], NormalizationMethod.PERCENTILE_RANK
+        ) == [75.0, 25.0, 75.0, 50.0]
+        assert percentile_ranks([3.0, 1.0, 3.0, 2.0]) == [100.0, 25.0, 100.0, 50.0]
+
+    def test_empty_column(self):
+        """Test no entities normalize to nothing."""
+        assert normalize_column([], NormalizationMethod.MIN_MAX) == []
@@ -0,0 +1,149 @@
+"""Tests for the content-addressed blob store."""
+
+from collections import Counter
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.blob_store import PREVIEW_CHARS, SEARCH_TEXT_FIELD, BlobStore
+
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+@pytest.fixture
+def mock_db():
+    """Mock database with a blobs collection."""
+    db = MagicMock()
+    db.blobs.bulk_write = AsyncMock()
+    db.blobs.delete_many = AsyncMock()
+    return db
+
+
+@pytest.fixture
+def store(mock_db):
+    """Blob store with a small threshold."""
+    return BlobStore(mock_db, threshold=1024)
+
+
+def _stored_blobs(mock_db):
+    """Blob documents written by the last bulk upsert, keyed by digest."""
+    operations = mock_db.blobs.bulk_write.call_args[0][0]
+    return {
+        op._filter["_id"]: {"_id": op._filter["_id"], **op._doc["$setOnInsert"]}
+        for op in operations
+    }
+
+
+class TestBlobStore:
+    """Test cases for BlobStore."""
+
+    @pytest.mark.asyncio
+    async def test_small_fields_stay_inline(self, store, mock_db):
+        """Test documents below the threshold are not touched."""
+        doc = {"uuid": "a", "toolUseResult": {"stdout": "ok"}, "thinking": "hmm"}
+
+        assert await store.externalize([doc]) == 0
+
+        assert doc == {
+            "uuid": "a",
+            "toolUseResult": {"stdout": "ok"},
+            "thinking": "hmm",
+        }
+        mock_db.blobs.bulk_write.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_large_fields_are_deduplicated(self, store, mock_db):
+        """Test identical large values share one blob with a reference each."""
+        output = "x" * 5000
+        docs = [
+            {"uuid": "a", "toolUseResult": {"stdout": output, "exitCode": 1}},
+            {"uuid": "b", "toolUseResult": {"stdout": output, "exitCode": 1}},
+        ]
+
+        assert await store.externalize(docs) == 2
+
+        digest = docs[0]["blobRefs"]["toolUseResult"]
+        assert docs[1]["blobRefs"]["toolUseResult"] == digest
+        # The preview keeps small scalars and a prefix of long strings
+        assert docs[0]["toolUseResult"] == {
+            "stdout": "x" * PREVIEW_CHARS,
+            "exitCode": 1,
+        }
+
+        operations = mock_db.blobs.bulk_write.call_args[0][0]
+        assert len(operations) == 1
+        assert operations[0]._doc["$inc"] == {"refCount": 2}
+        blob = operations[0]._doc["$setOnInsert"]
+        assert blob["codec"] == "zstd"
+        assert blob["storedSize"] < blob["size"]
+
+    @pytest.mark.asyncio
+    async def test_hydrate_restores_full_values(self, store, mock_db):
+        """Test hydration replaces previews and drops the references."""
+        thinking = "step " * 1000
+        doc = {"uuid": "a", "thinking": thinking, "messageData": {"x": 1}}
+        await store.externalize([doc])
+        mock_db.blobs.find = MagicMock(
+            return_value=async_iter(list(_stored_blobs(mock_db).values()))
+        )
+
+        await store.hydrate([doc])
+
+        assert doc["thinking"] == thinking
+        assert "blobRefs" not in doc
+
+    @pytest.mark.asyncio
+    async def test_full_text_stays_searchable(self, store, mock_db):
+        """Test text past the preview is kept inline for search."""
+        stdout = "a" * PREVIEW_CHARS + " needle " + "b" * 2000
+        doc = {"uuid": "a", "toolUseResult": {"stdout": stdout, "exitCode": 0}}
+
+        await store.externalize([doc])
+
+        assert "needle" not in str(doc["toolUseResult"])
+        assert doc[SEARCH_TEXT_FIELD] == {"toolUseResult": stdout}
+
+        # Hydrated documents carry the value itself instead
+        mock_db.blobs.find = MagicMock(
+            return_value=async_iter(list(_stored_blobs(mock_db).values()))
+        )
+        await store.hydrate([doc])
+        assert "needle" in doc["toolUseResult"]["stdout"]
+        assert SEARCH_TEXT_FIELD not in doc
+
+    @pytest.mark.asyncio
+    async def test_hydrate_only_requested_fields(self, store, mock_db):
+        """Test unrequested fields stay as previews without a query."""
+        doc = {"uuid": "a", "thinking": "t" * 5000}
+        await store.externalize([doc])
+        mock_db.blobs.find = MagicMock()
+
+        await store.hydrate([doc], ["toolUseResult"])
+
+        mock_db.blobs.find.assert_not_called()
+        assert len(doc["thinking"]) == PREVIEW_CHARS
+        assert "thinking" in doc["blobRefs"]
+
+    @pytest.mark.asyncio
+    async def test_release_deletes_unreferenced_blobs(self, store, mock_db):
+        """Test released references are decremented before cleanup."""
+        await store.release(Counter({"abc": 2}))
+
+        operation = mock_db.blobs.bulk_write.call_args[0][0][0]
+        assert operation._doc == {"$inc": {"refCount": -2}}
+        mock_db.blobs.delete_many.assert_awaited_once_with(
+            {"_id": {"$in": ["abc"]}, "refCount": {"$lte": 0}}, session=None
+        )
+
+    def test_refs_of_counts_every_reference(self):
+        """Test references are counted per message."""
+        docs = [
+            {"blobRefs": {"toolUseResult": "a", "messageData": "b"}},
+            {"blobRefs": {"toolUseResult": "a"}},
+            {"uuid": "no-refs"},
+        ]
+
+        assert BlobStore.refs_of(docs) == Counter({"a": 2, "b": 1})
@@ -0,0 +1,165 @@
+"""Tests for conversation tree metadata maintained at ingest."""
+
+from collections import Counter
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.conversation_metadata import (
+    ConversationMetadata,
+    merge_depth_stats,
+)
+
+
+def message(uuid, parent=None, **fields):
+    return {"uuid": uuid, "parentUuid": parent, **fields}
+
+
+@pytest.fixture
+def rolling_service():
+    """Rolling service mock without stored messages."""
+    service = MagicMock()
+    service.find_session_messages = AsyncMock(return_value=[])
+    service.update_session_messages = AsyncMock(return_value=1)
+    return service
+
+
+@pytest.fixture
+def metadata(rolling_service):
+    return ConversationMetadata(rolling_service)
+
+
+class TestAnnotate:
+    """Test cases for ConversationMetadata.annotate."""
+
+    @pytest.mark.asyncio
+    async def test_batch_tree(self, metadata, rolling_service):
+        """Test depths, roots and branch points within one batch."""
+        # Children may precede their parent in the batch
+        docs = [
+            message("c", "b"),
+            message("a"),
+            message("b", "a"),
+            message("d", "b"),
+        ]
+
+        gained = await metadata.annotate("s1", docs)
+
+        assert [d["depth"] for d in docs] == [3, 1, 2, 3]
+        assert {d["rootUuid"] for d in docs} == {"a"}
+        assert docs[2]["childCount"] == 2
+        assert docs[2]["isBranchPoint"] is True
+        assert not any(d.get("treePending") for d in docs)
+        assert gained == Counter()
+        rolling_service.find_session_messages.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_stored_parent(self, metadata, rolling_service):
+        """Test messages continue below a stored parent."""
+        rolling_service.find_session_messages.return_value = [
+            {"uuid": "p", "depth": 4, "rootUuid": "r"}
+        ]
+        docs = [message("x", "p"), message("y", "p")]
+
+        gained = await metadata.annotate("s1", docs)
+
+        assert [d["depth"] for d in docs] == [5, 5]
+        assert all(d["rootUuid"] == "r" for d in docs)
+        assert gained == Counter({"p": 2})
+
+    @pytest.mark.asyncio
+    async def test_missing_parent_is_pending(self, metadata):
+        """Test a message whose parent has not arrived roots its subtree."""
+        docs = [message("x", "later"), message("y", "x")]
+
+        await metadata.annotate("s1", docs)
+
+        assert docs[0]["treePending"] is True
+        assert [d["depth"] for d in docs] == [1, 2]
+        assert all(d["rootUuid"] == "x" for d in docs)
+        assert "treePending" not in docs[1]
+
+
+class TestSettle:
+    """Test cases for ConversationMetadata.settle."""
+
+    @pytest.mark.asyncio
+    async def test_gained_children(self, metadata, rolling_service):
+        """Test stored parents get their new children counted."""
+        await metadata.settle("s1", Counter({"p": 2, "q": 1}), [message("x")])
+
+        calls = rolling_service.update_session_messages.call_args_list
+        filters = [call.args[1] for call in calls]
+        assert {"uuid": {"$in": ["p"]}} in filters
+        assert {"uuid": {"$in": ["q"]}} in filters
+
+    @pytest.mark.asyncio
+    async def test_attaches_pending_subtree(self, metadata, rolling_service):
+        """Test a subtree that arrived early is moved below its parent."""
+        rolling_service.find_session_messages.side_effect = [
+            [{"uuid": "orphan", "parentUuid": "parent"}],
+            [{"uuid": "parent", "depth": 3, "rootUuid": "root"}],
+        ]
+
+        attached = await metadata.settle("s1", Counter(), [message("parent")])
+
+        assert attached == 1
+        shift, unmark, count = rolling_service.update_session_messages.call_args_list
+        assert shift.args[1] == {"rootUuid": "orphan"}
+        assert shift.args[2] == [
+            {"$set": {"depth": {"$add": ["$depth", 3]}, "rootUuid": "root"}}
+        ]
+        assert unmark.args[1:] == ({"uuid": "orphan"}, {"$unset": {"treePending": ""}})
+        assert count.args[1] == {"uuid": "parent"}
+
+
+class TestRebuild:
+    """Test cases for ConversationMetadata.rebuild."""
+
+    @pytest.mark.asyncio
+    async def test_rebuild_session(self, metadata, rolling_service):
+        """Test a session is recomputed and written per collection."""
+        now = datetime(2025, 3, 1, tzinfo=UTC)
+        rolling_service.find_session_messages.return_value = [
+            message("a", timestamp=now),
+            message("b", "a", timestamp=now),
+            message("c", "a", timestamp=now),
+            message("d", "gone", timestamp=now),
+        ]
+        rolling_service.get_message_collection_name.return_value = "messages_2025_03"
+        collection = MagicMock()
+        collection.bulk_write = AsyncMock()
+        rolling_service.db = {"messages_2025_03": collection}
+
+        result = await metadata.rebuild("s1")
+
+        assert result == {"maxDepth": 2, "branchCount": 1}
+        updates = {
+            op._filter["uuid"]: op._doc
+            for op in collection.bulk_write.call_args.args[0]
+        }
+        assert updates["a"]["$set"]["isBranchPoint"] is True
+        assert updates["c"]["$set"]["rootUuid"] == "a"
+        assert updates["d"]["$set"]["treePending"] is True
+
+    @pytest.mark.asyncio
+    async def test_rebuild_empty_session(self, metadata):
+        """Test sessions without messages are skipped."""
+        assert await metadata.rebuild("s1") is None
+
+
+def test_merge_depth_stats():
+    """Test per-collection partials combine into session fields."""
+    merged = merge_depth_stats(
+        [
+            {"maxDepth": 7, "branchCount": 1, "userMessageCount": 3},
+            {"maxDepth": 4, "branchCount": 2, "respondedCount": 2},
+        ]
+    )
+
+    assert merged["maxDepth"] == 7
+    assert merged["branchCount"] == 3
+    assert merged["userMessageCount"] == 3
+    assert merged["respondedCount"] == 2
+    assert merged["totalDurationMs"] == 0
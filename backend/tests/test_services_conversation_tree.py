@@ -0,0 +1,96 @@
+"""Tests for the in-memory conversation tree engine."""
+
+from app.services.conversation_tree import ConversationTree
+
+
+def build_tree(links):
+    """Build a tree from (uuid, parentUuid) pairs."""
+    return ConversationTree(
+        {"uuid": uuid, "parentUuid": parent} for uuid, parent in links
+    )
+
+
+class TestConversationTree:
+    """Test cases for ConversationTree."""
+
+    def test_ancestors_oldest_first_with_depth_limit(self):
+        """Test ancestors are returned root-first and capped at max depth."""
+        tree = build_tree([("a", None), ("b", "a"), ("c", "b"), ("d", "c")])
+
+        assert tree.ancestors("d", 10) == ["a", "b", "c"]
+        assert tree.ancestors("d", 2) == ["b", "c"]
+        assert tree.ancestors("a", 10) == []
+
+    def test_ancestors_stop_at_missing_parent(self):
+        """Test ancestor walk stops when a parent is not in the session."""
+        tree = build_tree([("b", "missing"), ("c", "b")])
+
+        assert tree.ancestors("c", 10) == ["b"]
+
+    def test_descendants_preorder_with_depth_limit(self):
+        """Test descendants are depth-first pre-order and depth limited."""
+        tree = build_tree(
+            [
+                ("root", None),
+                ("c1", "root"),
+                ("c2", "root"),
+                ("g1", "c1"),
+                ("gg1", "g1"),
+            ]
+        )
+
+        assert tree.descendants("root", 10) == ["c1", "g1", "gg1", "c2"]
+        assert tree.descendants("root", 2) == ["c1", "g1", "c2"]
+        assert tree.descendants("root", 0) == []
+
+    def test_depths_with_and_without_sidechains(self):
+        """Test depth calculation honours sidechain exclusion."""
+        tree = ConversationTree(
+            [
+                {"uuid": "m1", "parentUuid": None},
+                {"uuid": "m2", "parentUuid": "m1"},
+                {"uuid": "s1", "parentUuid": "m2", "isSidechain": True},
+                {"uuid": "s2", "parentUuid": "s1"},
+                {"uuid": "orphan", "parentUuid": "missing"},
+            ]
+        )
+
+        assert tree.depths(True) == {"m1": 1, "m2": 2, "s1": 3, "s2": 4, "orphan": 1}
+        assert tree.depths(False) == {
+            "m1": 1,
+            "m2": 2,
+            "s1": 0,
+            "s2": 1,
+            "orphan": 1,
+        }
+
+    def test_branch_metrics(self):
+        """Test max depth, branch count and branch lengths."""
+        tree = build_tree(
+            [("root", None), ("c1", "root"), ("c2", "root"), ("g1", "c1")]
+        )
+
+        assert tree.subtree_depth("root") == 2
+        assert tree.subtree_depth("g1") == 0
+        assert tree.subtree_depth("missing") == 0
+        assert tree.max_depth() == 2
+        assert tree.branch_count() == 1
+        assert sorted(tree.branch_lengths()) == [1, 2]
+
+    def test_deep_thread_does_not_recurse(self):
+        """Test very deep threads are handled without recursion errors."""
+        count = 5000
+        links = [("m0", None)] + [(f"m{i}", f"m{i - 1}") for i in range(1, count)]
+        tree = build_tree(links)
+
+        assert tree.max_depth() == count - 1
+        assert tree.depths()[f"m{count - 1}"] == count
+        assert len(tree.ancestors(f"m{count - 1}", count)) == count - 1
+        assert len(tree.descendants("m0", count)) == count - 1
+
+    def test_cycles_terminate(self):
+        """Test corrupted parent links forming a cycle do not loop forever."""
+        tree = build_tree([("a", "b"), ("b", "a")])
+
+        assert tree.ancestors("a", 10) == ["b"]
+        assert set(tree.depths()) == {"a", "b"}
@@ -1,14 +1,21 @@
 """Tests for ingest service."""
 
 import asyncio
+from collections import Counter
 from datetime import UTC, datetime
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
-from bson import ObjectId
+from bson import Decimal128, ObjectId
+from pymongo.errors import DuplicateKeyError
 
 from app.schemas.ingest import IngestStats, MessageIngest
+from app.services.conversation_metadata import ConversationMetadata
 from app.services.ingest import IngestService
+from app.services.ingest_cache import (
+    get_resolution_cache,
+    invalidate_user_resolutions,
+)
 
 
 @pytest.fixture
@@ -28,7 +35,11 @@ def ingest_service(mock_db):
     service.rolling_service.insert_message = AsyncMock(return_value="mock_id")
     service.rolling_service.find_messages = AsyncMock(return_value=([], 0))
     service.rolling_service.update_one = AsyncMock(return_value=True)
-    service.rolling_service.aggregate_across_collections = AsyncMock(return_value=[])
+    service.rolling_service.aggregate_session = AsyncMock(return_value=[])
+    service.rolling_service.record_session_partitions = AsyncMock()
+    service.rolling_service.find_session_messages = AsyncMock(return_value=[])
+    service.rolling_service.update_session_messages = AsyncMock(return_value=0)
+    service.tree_metadata = ConversationMetadata(service.rolling_service)
     return service
 
 
@@ -57,8 +68,8 @@ class TestIngestService:
         service = IngestService(mock_db, test_user_id)
         assert service.db == mock_db
         assert service.user_id == test_user_id
-        assert service._project_cache == {}
-        assert service._session_cache == {}
+        # Resolutions are shared across service instances
+        assert service._resolutions is get_resolution_cache()
 
     @pytest.mark.asyncio
     async def test_ingest_messages_empty_list(self, ingest_service):
@@ -285,6 +296,79 @@ class TestIngestService:
                 or ingest_service.rolling_service.update_one.called
             )
 
+    @pytest.mark.asyncio
+    async def test_overwrite_releases_replaced_blob_refs(
+        self, ingest_service, sample_message_ingest
+    ):
+        """Test overwriting a message releases the blobs it referenced."""
+        stats = IngestStats(messages_received=1)
+        ingest_service.rolling_service.find_messages = AsyncMock(
+            return_value=([{"uuid": "msg_123", "blobRefs": {"thinking": "abc"}}], 1)
+        )
+        ingest_service.blob_store.release = AsyncMock()
+        new_doc = {"uuid": "msg_123", "_id": ObjectId()}
+
+        with (
+            patch.object(ingest_service, "_ensure_session", return_value=None),
+            patch.object(ingest_service, "_message_to_doc", return_value=[new_doc]),
+        ):
+            await ingest_service._process_session_messages(
+                "test_session", [sample_message_ingest], stats, overwrite_mode=True
+            )
+
+        # The stale reference is cleared on the replacement document
+        assert new_doc["blobRefs"] == {}
+        ingest_service.blob_store.release.assert_awaited_once_with(Counter({"abc": 1}))
+
+    @pytest.mark.asyncio
+    async def test_failed_insert_releases_blob_refs(
+        self, ingest_service, sample_message_ingest
+    ):
+        """Test messages that were not inserted give back their blobs."""
+        stats = IngestStats(messages_received=1)
+        ingest_service.rolling_service.insert_message = AsyncMock(
+            side_effect=Exception("E11000 duplicate key")
+        )
+        ingest_service.blob_store.externalize = AsyncMock()
+        ingest_service.blob_store.release = AsyncMock()
+        new_doc = {"uuid": "msg_123", "blobRefs": {"thinking": "abc"}}
+
+        with (
+            patch.object(ingest_service, "_ensure_session", return_value=None),
+            patch.object(ingest_service, "_get_existing_hashes", return_value=set()),
+            patch.object(ingest_service, "_message_to_doc", return_value=[new_doc]),
+        ):
+            await ingest_service._process_session_messages(
+                "test_session", [sample_message_ingest], stats
+            )
+
+        assert stats.messages_failed == 1
+        ingest_service.blob_store.release.assert_awaited_once_with(Counter({"abc": 1}))
+
+    @pytest.mark.asyncio
+    async def test_overwrite_invalidates_session_topics(
+        self, ingest_service, sample_message_ingest
+    ):
+        """Test overwriting messages drops the session's cached topics."""
+        stats = IngestStats(messages_received=1)
+        ingest_service.db.session_topics.delete_many = AsyncMock()
+
+        with (
+            patch.object(ingest_service, "_ensure_session", return_value=None),
+            patch.object(
+                ingest_service,
+                "_message_to_doc",
+                return_value=[{"uuid": "msg_123", "_id": ObjectId()}],
+            ),
+        ):
+            await ingest_service._process_session_messages(
+                "test_session", [sample_message_ingest], stats, overwrite_mode=True
+            )
+
+        ingest_service.db.session_topics.delete_many.assert_awaited_once_with(
+            {"_id": "test_session"}
+        )
+
     @pytest.mark.asyncio
     async def test_process_session_messages_error_handling(self, ingest_service):
         """Test error handling during message processing."""
@@ -316,6 +400,20 @@ class TestIngestService:
             assert stats.messages_failed == 1
             assert stats.messages_processed == 0
 
+    def test_stamp_ownership(self, ingest_service):
+        """Test that message documents get denormalized tenant fields."""
+        project_id = ObjectId()
+        ingest_service._session_projects[
+            f"{ingest_service.user_id}:session_456"
+        ] = project_id
+
+        docs = [{"uuid": "msg_1"}, {"uuid": "msg_1_tool_0"}]
+        ingest_service._stamp_ownership(docs, "session_456")
+
+        for doc in docs:
+            assert doc["user_id"] == ObjectId(ingest_service.user_id)
+            assert doc["projectId"] == project_id
+
     def test_hash_message(self, ingest_service, sample_message_ingest):
         """Test message hashing for deduplication."""
         hash1 = ingest_service._hash_message(sample_message_ingest)
@@ -394,7 +492,10 @@ class TestIngestService:
 
         assert hashes == {"hash1", "hash2", "hash3"}
         ingest_service.rolling_service.find_messages.assert_called_once_with(
-            {"sessionId": session_id}, skip=0, limit=10000
+            {"sessionId": session_id},
+            skip=0,
+            limit=10000,
+            projection={"_id": 0, "contentHash": 1, "timestamp": 1},
         )
 
     @pytest.mark.asyncio
@@ -409,7 +510,10 @@ class TestIngestService:
 
         assert hashes == set()
         ingest_service.rolling_service.find_messages.assert_called_once_with(
-            {"sessionId": session_id}, skip=0, limit=10000
+            {"sessionId": session_id},
+            skip=0,
+            limit=10000,
+            projection={"_id": 0, "contentHash": 1, "timestamp": 1},
         )
 
     def test_ingest_stats_initialization(self):
@@ -889,8 +993,7 @@ class TestIngestServiceErrorHandling:
 
         # Mock database queries
         ingest_service.db.sessions.find_one = AsyncMock(return_value=None)
-        ingest_service.db.projects.find_one = AsyncMock(return_value=None)
-        ingest_service.db.projects.insert_one = AsyncMock(
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
             side_effect=Exception("Project creation failed")
         )
 
@@ -906,10 +1009,10 @@ class TestIngestServiceErrorHandling:
 
         # Mock database queries - session doesn't exist, project exists
         ingest_service.db.sessions.find_one = AsyncMock(return_value=None)
-        ingest_service.db.projects.find_one = AsyncMock(
-            return_value={"_id": ObjectId(), "name": "Test"}
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
+            return_value={"_id": ObjectId()}
         )
-        ingest_service.db.sessions.insert_one = AsyncMock(
+        ingest_service.db.sessions.find_one_and_update = AsyncMock(
             side_effect=Exception("Session insertion failed")
         )
 
@@ -923,8 +1026,7 @@ class TestIngestServiceErrorHandling:
         project_name = "Test Project"
 
         # Mock database queries - project doesn't exist
-        ingest_service.db.projects.find_one = AsyncMock(return_value=None)
-        ingest_service.db.projects.insert_one = AsyncMock(
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
             side_effect=Exception("Project insertion failed")
         )
 
@@ -1011,7 +1113,7 @@ class TestIngestServiceErrorHandling:
         session_id = "test_session"
 
         # Mock rolling service aggregation to raise an exception
-        ingest_service.rolling_service.aggregate_across_collections = AsyncMock(
+        ingest_service.rolling_service.aggregate_session = AsyncMock(
             side_effect=Exception("Aggregation failed")
         )
 
@@ -1024,7 +1126,7 @@ class TestIngestServiceErrorHandling:
         session_id = "test_session"
 
         # Mock successful aggregation but failed session update
-        ingest_service.rolling_service.aggregate_across_collections = AsyncMock(
+        ingest_service.rolling_service.aggregate_session = AsyncMock(
             return_value=[
                 {
                     "_id": None,
@@ -1254,3 +1356,227 @@ class TestIngestServiceErrorHandling:
             # Cost calculation error should propagate and be raised
             with pytest.raises(ValueError, match="Invalid token count"):
                 ingest_service._add_optional_fields(doc, message)
+
+    def test_message_to_doc_stamps_canonical_tokens(self, ingest_service):
+        """Test tokens and cost are stored on the message but not its tool docs."""
+        message = MessageIngest(
+            uuid="msg_tokens",
+            sessionId="session_1",
+            type="assistant",
+            timestamp=datetime.now(UTC),
+            message={
+                "content": [
+                    {"type": "text", "text": "Reading"},
+                    {"type": "tool_use", "id": "t1", "name": "Read", "input": {}},
+                ]
+            },
+            usage={
+                "input_tokens": 10,
+                "output_tokens": 20,
+                "cache_read_input_tokens": 5,
+            },
+            costUsd=0.25,
+            projectPath="/test/project",
+        )
+
+        docs = ingest_service._message_to_doc(message, "session_1")
+
+        assert docs[0]["tokens"] == {
+            "input": 10,
+            "output": 20,
+            "cache_creation": 0,
+            "cache_read": 5,
+            "total": 35,
+        }
+        assert docs[0]["cost"] == 0.25
+        tool_docs = [d for d in docs if d["type"] == "tool_use"]
+        assert tool_docs
+        assert all("tokens" not in d and "cost" not in d for d in tool_docs)
+
+    def test_message_to_doc_classifies_tool_results(self, ingest_service):
+        """Test tool result documents carry their error classification."""
+        message = MessageIngest(
+            uuid="user_1",
+            sessionId="session_1",
+            type="user",
+            timestamp=datetime.now(UTC),
+            parentUuid="assistant_1",
+            message={
+                "content": [
+                    {"type": "tool_result", "tool_use_id": "t1", "content": "boom"}
+                ]
+            },
+            toolUseResult={"stdout": "", "stderr": "", "exitCode": 2},
+            projectPath="/test/project",
+        )
+
+        docs = ingest_service._message_to_doc(message, "session_1")
+
+        assert docs[0]["type"] == "tool_result"
+        assert docs[0]["isError"] is True
+        assert docs[0]["errorType"] == "exit_code_error"
+        assert docs[0]["errorSeverity"] == "warning"
+
+    @pytest.mark.asyncio
+    async def test_stamp_tool_names(self, ingest_service):
+        """Test tool names come from the batch first, then from one lookup."""
+        docs = [
+            {"uuid": "a_tool_0", "type": "tool_use", "messageData": {"name": "Bash"}},
+            {"uuid": "u_result_0", "type": "tool_result", "parentUuid": "a_tool_0"},
+            {"uuid": "v_result_0", "type": "tool_result", "parentUuid": "b_tool_0"},
+            {"uuid": "w_result_0", "type": "tool_result", "parentUuid": "c_tool_0"},
+        ]
+        ingest_service.rolling_service.find_session_messages = AsyncMock(
+            return_value=[{"uuid": "b_tool_0", "messageData": {"name": "Read"}}]
+        )
+
+        await ingest_service._stamp_tool_names(docs, "session_1")
+
+        assert [d.get("toolName") for d in docs] == [None, "Bash", "Read", "unknown"]
+        call = ingest_service.rolling_service.find_session_messages.call_args
+        assert sorted(call.kwargs["extra_filter"]["uuid"]["$in"]) == [
+            "b_tool_0",
+            "c_tool_0",
+        ]
+
+
+class TestIngestServiceResolution:
+    """Tests for session and project resolution."""
+
+    @pytest.mark.asyncio
+    async def test_session_resolution_shared_across_instances(
+        self, mock_db, sample_message_ingest
+    ):
+        """Test a later service resolves a known session without queries."""
+        user_id = "507f1f77bcf86cd799439011"
+        session_oid, project_oid = ObjectId(), ObjectId()
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={
+                "_id": session_oid,
+                "projectId": project_oid,
+                "user_id": ObjectId(user_id),
+            }
+        )
+
+        first = IngestService(mock_db, user_id)
+        assert await first._ensure_session("s1", sample_message_ingest) is None
+
+        second = IngestService(mock_db, user_id)
+        assert await second._ensure_session("s1", sample_message_ingest) is None
+
+        mock_db.sessions.find_one.assert_awaited_once()
+        assert second._session_projects[f"{user_id}:s1"] == project_oid
+
+    @pytest.mark.asyncio
+    async def test_session_created_with_upsert(
+        self, ingest_service, sample_message_ingest
+    ):
+        """Test new sessions and projects are created atomically."""
+        ingest_service.db.sessions.find_one = AsyncMock(return_value=None)
+
+        async def upsert(query, update, **kwargs):
+            return {**query, **update["$setOnInsert"]}
+
+        ingest_service.db.projects.find_one_and_update = AsyncMock(side_effect=upsert)
+        ingest_service.db.sessions.find_one_and_update = AsyncMock(side_effect=upsert)
+
+        created = await ingest_service._ensure_session("s1", sample_message_ingest)
+
+        assert isinstance(created, ObjectId)
+        query, update = ingest_service.db.sessions.find_one_and_update.call_args[0]
+        assert query == {"sessionId": "s1", "user_id": ObjectId(ingest_service.user_id)}
+        assert "sessionId" not in update["$setOnInsert"]
+        assert ingest_service.db.sessions.find_one_and_update.call_args.kwargs["upsert"]
+
+    @pytest.mark.asyncio
+    async def test_session_upsert_race_not_counted_as_created(
+        self, ingest_service, sample_message_ingest
+    ):
+        """Test a session created concurrently elsewhere is reused."""
+        winner = {"_id": ObjectId(), "projectId": ObjectId()}
+        ingest_service.db.sessions.find_one = AsyncMock(return_value=None)
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
+            return_value={"_id": winner["projectId"]}
+        )
+        ingest_service.db.sessions.find_one_and_update = AsyncMock(return_value=winner)
+
+        created = await ingest_service._ensure_session("s1", sample_message_ingest)
+
+        assert created is None
+        assert ingest_service._resolutions.sessions.get(
+            (ingest_service.user_id, "s1")
+        ) == (winner["_id"], winner["projectId"])
+
+    @pytest.mark.asyncio
+    async def test_project_upsert_duplicate_key_rereads_winner(self, ingest_service):
+        """Test an upsert that lost the unique-index race reuses the winner."""
+        winner = ObjectId()
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
+            side_effect=DuplicateKeyError("E11000 duplicate key")
+        )
+        ingest_service.db.projects.find_one = AsyncMock(return_value={"_id": winner})
+
+        assert await ingest_service._ensure_project("/race", "race") == winner
+        query = ingest_service.db.projects.find_one.call_args[0][0]
+        assert query == {"path": "/race", "user_id": ObjectId(ingest_service.user_id)}
+
+    @pytest.mark.asyncio
+    async def test_upsert_duplicate_key_of_other_user_raises(self, ingest_service):
+        """Test a key held by another user is not silently reused."""
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
+            side_effect=DuplicateKeyError("E11000 duplicate key")
+        )
+        ingest_service.db.projects.find_one = AsyncMock(return_value=None)
+
+        with pytest.raises(DuplicateKeyError):
+            await ingest_service._ensure_project("/taken", "taken")
+
+    @pytest.mark.asyncio
+    async def test_invalidate_user_forgets_resolutions(self, ingest_service):
+        """Test invalidation drops cached projects for that user only."""
+        project_oid = ObjectId()
+        ingest_service.db.projects.find_one_and_update = AsyncMock(
+            return_value={"_id": project_oid}
+        )
+        await ingest_service._ensure_project("/p", "p")
+        cache = ingest_service._resolutions
+        cache.projects.set(("other-user", "/p"), ObjectId())
+
+        invalidate_user_resolutions(ingest_service.user_id)
+
+        assert cache.projects.get((ingest_service.user_id, "/p")) is None
+        assert cache.projects.get(("other-user", "/p")) is not None
+
+    def test_merge_session_stats_combines_partitions(self):
+        """Test per-collection session stats are summed and bounded."""
+        early = datetime(2024, 1, 31, tzinfo=UTC)
+        late = datetime(2024, 2, 1, tzinfo=UTC)
+
+        merged = IngestService._merge_session_stats(
+            [
+                {
+                    "messageCount": 2,
+                    "totalCost": Decimal128("0.5"),
+                    "inputTokens": 10,
+                    "outputTokens": 5,
+                    "toolUseCount": 1,
+                    "startTime": early,
+                    "endTime": early,
+                },
+                {
+                    "messageCount": 3,
+                    "totalCost": 0.25,
+                    "inputTokens": 1,
+                    "outputTokens": 2,
+                    "toolUseCount": 0,
+                    "startTime": late,
+                    "endTime": late,
+                },
+            ]
+        )
+
+        assert merged["messageCount"] == 5
+        assert float(merged["totalCost"]) == 0.75
+        assert merged["inputTokens"] == 11
+        assert merged["startTime"] == early
+        assert merged["endTime"] == late
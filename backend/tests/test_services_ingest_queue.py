@@ -0,0 +1,248 @@
+"""Tests for the durable ingest queue."""
+
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bson import ObjectId
+
+from app.schemas.ingest import IngestStats, MessageIngest
+from app.services.ingest_queue import IngestQueue
+
+USER_ID = "507f1f77bcf86cd799439011"
+
+
+def _message(uuid: str) -> MessageIngest:
+    return MessageIngest(
+        uuid=uuid,
+        type="user",
+        sessionId="session-1",
+        timestamp=datetime(2024, 1, 1, tzinfo=UTC),
+        message={"role": "user", "content": "hello"},
+        _project_path="/projects/demo",
+    )
+
+
+def _entry(message_count: int = 1, attempts: int = 1) -> dict:
+    return {
+        "_id": ObjectId(),
+        "ticket": "ticket-1",
+        "user_id": USER_ID,
+        "overwrite_mode": False,
+        "messages": [
+            {
+                "uuid": f"u{i}",
+                "type": "user",
+                "sessionId": "session-1",
+                "timestamp": "2024-01-01T00:00:00Z",
+            }
+            for i in range(message_count)
+        ],
+        "message_count": message_count,
+        "status": "processing",
+        "attempts": attempts,
+        "locked_at": datetime(2024, 1, 1, tzinfo=UTC),
+    }
+
+
+@pytest.fixture
+def mock_db():
+    """Mock database with an ingest_queue collection."""
+    db = MagicMock()
+    db.ingest_queue.insert_many = AsyncMock()
+    db.ingest_queue.update_one = AsyncMock(return_value=MagicMock(modified_count=1))
+    db.ingest_queue.find_one_and_update = AsyncMock(return_value=None)
+    return db
+
+
+@pytest.fixture
+def queue(mock_db):
+    """Create a queue whose workers are never started."""
+    queue = IngestQueue(mock_db, workers=1, max_attempts=3)
+    queue._ensure_workers = MagicMock()
+    return queue
+
+
+class TestIngestQueue:
+    """Test cases for IngestQueue."""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_persists_batch(self, queue, mock_db):
+        """Test a batch is stored in wire form and a ticket is returned."""
+        ticket = await queue.enqueue(USER_ID, [_message("u1"), _message("u2")])
+
+        docs = mock_db.ingest_queue.insert_many.call_args[0][0]
+        assert len(docs) == 1
+        doc = docs[0]
+        assert doc["ticket"] == ticket
+        assert doc["user_id"] == USER_ID
+        assert doc["status"] == "queued"
+        assert doc["message_count"] == 2
+        # Extra fields are flattened back so the message round-trips
+        assert doc["messages"][0]["_project_path"] == "/projects/demo"
+        restored = MessageIngest(**doc["messages"][0])
+        assert restored.extra_fields == {"_project_path": "/projects/demo"}
+        queue._ensure_workers.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_enqueue_splits_large_batches(self, queue, mock_db):
+        """Test batches above the document size budget span several parts."""
+        with patch("app.services.ingest_queue.QUEUE_DOC_MAX_BYTES", 300):
+            await queue.enqueue(USER_ID, [_message(f"u{i}") for i in range(3)])
+
+        docs = mock_db.ingest_queue.insert_many.call_args[0][0]
+        assert len(docs) == 3
+        assert [d["part"] for d in docs] == [0, 1, 2]
+        assert all(d["parts"] == 3 for d in docs)
+        assert len({d["ticket"] for d in docs}) == 1
+
+    @pytest.mark.asyncio
+    async def test_process_next_empty_queue(self, queue):
+        """Test nothing is processed when no entry is claimable."""
+        assert await queue.process_next() is False
+
+    @pytest.mark.asyncio
+    async def test_process_next_writes_claimed_entries(self, queue, mock_db):
+        """Test claimed entries of one user are written and completed."""
+        first, second = _entry(2), _entry(1)
+        mock_db.ingest_queue.find_one_and_update = AsyncMock(
+            side_effect=[first, second, None]
+        )
+        stats = IngestStats(messages_received=2, messages_processed=2)
+
+        with patch("app.services.ingest.IngestService") as service_class:
+            service_class.return_value.ingest_messages = AsyncMock(return_value=stats)
+            assert await queue.process_next() is True
+
+        # One service instance is shared by the claimed entries
+        service_class.assert_called_once_with(mock_db, USER_ID)
+        assert service_class.return_value.ingest_messages.await_count == 2
+
+        claims = mock_db.ingest_queue.find_one_and_update.call_args_list
+        assert claims[1].args[0]["user_id"] == USER_ID
+
+        updates = mock_db.ingest_queue.update_one.call_args_list
+        # Each lease is renewed right before its entry is written
+        renewals, updates = updates[::2], updates[1::2]
+        for renewal, entry in zip(renewals, [first, second]):
+            assert renewal[0][0]["locked_at"] == entry["locked_at"]
+            assert set(renewal[0][1]["$set"]) == {"locked_at"}
+        assert [u[0][0]["_id"] for u in updates] == [first["_id"], second["_id"]]
+        for update in updates:
+            assert update[0][1]["$set"]["status"] == "completed"
+            assert "messages" in update[0][1]["$unset"]
+
+    @pytest.mark.asyncio
+    async def test_failed_entry_is_retried_with_backoff(self, queue, mock_db):
+        """Test a failed write is requeued until attempts run out."""
+        entry = _entry(attempts=1)
+        mock_db.ingest_queue.find_one_and_update = AsyncMock(side_effect=[entry, None])
+
+        with patch("app.services.ingest.IngestService") as service_class:
+            service_class.return_value.ingest_messages = AsyncMock(
+                side_effect=Exception("write failed")
+            )
+            await queue.process_next()
+
+        update = mock_db.ingest_queue.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "queued"
+        assert update["$set"]["last_error"] == "write failed"
+        assert update["$set"]["available_at"] > datetime.now(UTC)
+
+    @pytest.mark.asyncio
+    async def test_failed_messages_are_retried(self, queue, mock_db):
+        """Test write errors counted in the stats do not complete the entry."""
+        entry = _entry(attempts=1)
+        mock_db.ingest_queue.find_one_and_update = AsyncMock(side_effect=[entry, None])
+        stats = IngestStats(
+            messages_received=1,
+            messages_failed=1,
+            error_details=["Failed to insert messages: connection reset"],
+        )
+
+        with patch("app.services.ingest.IngestService") as service_class:
+            service_class.return_value.ingest_messages = AsyncMock(return_value=stats)
+            await queue.process_next()
+
+        update = mock_db.ingest_queue.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "queued"
+        assert "connection reset" in update["$set"]["last_error"]
+        assert "messages" not in update["$unset"]
+
+    @pytest.mark.asyncio
+    async def test_entry_with_lost_lease_is_skipped(self, queue, mock_db):
+        """Test an entry claimed again by another worker is left to it."""
+        entry = _entry()
+        mock_db.ingest_queue.find_one_and_update = AsyncMock(side_effect=[entry, None])
+        mock_db.ingest_queue.update_one = AsyncMock(
+            return_value=MagicMock(modified_count=0)
+        )
+
+        with patch("app.services.ingest.IngestService") as service_class:
+            service_class.return_value.ingest_messages = AsyncMock()
+            await queue.process_next()
+
+        service_class.return_value.ingest_messages.assert_not_awaited()
+        assert mock_db.ingest_queue.update_one.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_entry_gives_up_after_max_attempts(self, queue, mock_db):
+        """Test an entry is marked failed on its last attempt."""
+        entry = _entry(attempts=3)
+        mock_db.ingest_queue.find_one_and_update = AsyncMock(side_effect=[entry, None])
+
+        with patch("app.services.ingest.IngestService") as service_class:
+            service_class.return_value.ingest_messages = AsyncMock(
+                side_effect=Exception("write failed")
+            )
+            await queue.process_next()
+
+        update = mock_db.ingest_queue.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_get_status_merges_parts(self, queue, mock_db):
+        """Test ticket status combines the stats of all parts."""
+        created = datetime(2024, 1, 1, tzinfo=UTC)
+        parts = [
+            {
+                "ticket": "t",
+                "status": "completed",
+                "message_count": 2,
+                "attempts": 1,
+                "stats": {"messages_received": 2, "messages_processed": 2},
+                "created_at": created,
+                "completed_at": created,
+            },
+            {
+                "ticket": "t",
+                "status": "queued",
+                "message_count": 3,
+                "attempts": 0,
+                "created_at": created,
+            },
+        ]
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=parts)
+        mock_db.ingest_queue.find = MagicMock(return_value=cursor)
+
+        status = await queue.get_status(USER_ID, "t")
+
+        assert mock_db.ingest_queue.find.call_args[0][0] == {
+            "ticket": "t",
+            "user_id": USER_ID,
+        }
+        assert status["status"] == "processing"
+        assert status["messages_total"] == 5
+        assert status["parts_completed"] == 1
+        assert status["stats"].messages_processed == 2
+        assert status["completed_at"] is None
+
+    @pytest.mark.asyncio
+    async def test_get_status_unknown_ticket(self, queue, mock_db):
+        """Test unknown tickets return None."""
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=[])
+        mock_db.ingest_queue.find = MagicMock(return_value=cursor)
+
+        assert await queue.get_status(USER_ID, "missing") is None
@@ -0,0 +1,163 @@
+"""Tests for streamed NDJSON ingestion."""
+
+import gzip
+import json
+import zlib
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+import zstandard
+
+from app.schemas.ingest import IngestStats
+from app.services.ingest_stream import NDJSONDecoder, ingest_ndjson
+
+
+def _line(uuid: str) -> bytes:
+    return (
+        json.dumps(
+            {
+                "uuid": uuid,
+                "sessionId": "session-1",
+                "type": "user",
+                "timestamp": "2024-01-01T00:00:00Z",
+                "message": {"role": "user", "content": "hello"},
+            }
+        ).encode()
+        + b"\n"
+    )
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def _ingest_service():
+    service = Mock()
+
+    async def ingest(messages, overwrite_mode=False):
+        return IngestStats(
+            messages_received=len(messages), messages_processed=len(messages)
+        )
+
+    service.ingest_messages = AsyncMock(side_effect=ingest)
+    return service
+
+
+class TestNDJSONDecoder:
+    """Test cases for NDJSONDecoder."""
+
+    def test_splits_lines_across_chunks(self):
+        """Test lines split over chunk boundaries are reassembled."""
+        decoder = NDJSONDecoder()
+
+        assert decoder.feed(b'{"a": 1}\n{"b"') == [b'{"a": 1}']
+        assert decoder.feed(b": 2}") == []
+        assert decoder.feed(b"\n\n") == [b'{"b": 2}']
+        assert decoder.close() == []
+
+    def test_returns_unterminated_last_line(self):
+        """Test a body without a trailing newline keeps its last line."""
+        decoder = NDJSONDecoder()
+
+        assert decoder.feed(b'{"a": 1}') == []
+        assert decoder.close() == [b'{"a": 1}']
+
+    def test_rejects_oversized_tail_after_newline(self, monkeypatch):
+        """Test the partial line left after a split is size-limited too."""
+        monkeypatch.setattr("app.services.ingest_stream.MAX_LINE_BYTES", 8)
+        decoder = NDJSONDecoder()
+
+        assert decoder.feed(b"{}\n{") == [b"{}"]
+        with pytest.raises(ValueError, match="maximum size"):
+            decoder.feed(b'"a": 1}\n' + b"x" * 16)
+
+    @pytest.mark.parametrize(
+        "encoding,compress",
+        [
+            ("gzip", gzip.compress),
+            ("zstd", lambda data: zstandard.ZstdCompressor().compress(data)),
+        ],
+    )
+    def test_decompresses_body(self, encoding, compress):
+        """Test gzip and zstd bodies decompress incrementally."""
+        body = compress(_line("u1") + _line("u2"))
+        decoder = NDJSONDecoder(encoding)
+
+        lines = []
+        for i in range(0, len(body), 7):
+            lines.extend(decoder.feed(body[i : i + 7]))
+        lines.extend(decoder.close())
+
+        assert [json.loads(line)["uuid"] for line in lines] == ["u1", "u2"]
+
+    def test_rejects_unknown_encoding(self):
+        """Test unsupported content encodings are refused."""
+        with pytest.raises(ValueError, match="Unsupported content encoding"):
+            NDJSONDecoder("br")
+
+
+class TestIngestNDJSON:
+    """Test cases for ingest_ndjson."""
+
+    @pytest.mark.asyncio
+    async def test_writes_micro_batches(self):
+        """Test messages are written in batches with line ranges."""
+        service = _ingest_service()
+        body = b"".join(_line(f"u{i}") for i in range(5))
+
+        records = [
+            r
+            async for r in ingest_ndjson(
+                service, _chunks(body, 50), NDJSONDecoder(), batch_size=2
+            )
+        ]
+
+        batches = [r for r in records if r["type"] == "batch"]
+        assert [(b["first_line"], b["last_line"]) for b in batches] == [
+            (1, 2),
+            (3, 4),
+            (5, 5),
+        ]
+        assert service.ingest_messages.await_count == 3
+        summary = records[-1]
+        assert summary["type"] == "summary"
+        assert summary["lines"] == 5
+        assert summary["stats"]["messages_processed"] == 5
+
+    @pytest.mark.asyncio
+    async def test_reports_invalid_lines(self):
+        """Test invalid lines are reported without failing the stream."""
+        service = _ingest_service()
+        body = _line("u1") + b"not json\n" + b'{"uuid": "x"}\n' + _line("u2")
+
+        records = [
+            r
+            async for r in ingest_ndjson(service, _chunks(body, 1024), NDJSONDecoder())
+        ]
+
+        invalid = [r for r in records if r["type"] == "invalid"]
+        assert [r["line"] for r in invalid] == [2, 3]
+        batch = next(r for r in records if r["type"] == "batch")
+        assert batch["messages"] == 2
+        assert records[-1]["stats"]["messages_failed"] == 2
+        assert records[-1]["stats"]["messages_received"] == 4
+
+    @pytest.mark.asyncio
+    async def test_corrupt_body_keeps_written_batches(self):
+        """Test a corrupt compressed body reports an error after good data."""
+        service = _ingest_service()
+        compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+        valid = compressor.compress(_line("u1")) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        async def chunks():
+            yield valid
+            # Reserved deflate block type
+            yield b"\xff" * 32
+
+        records = [
+            r async for r in ingest_ndjson(service, chunks(), NDJSONDecoder("gzip"))
+        ]
+
+        assert [r["type"] for r in records] == ["error", "batch", "summary"]
+        assert records[-1]["stats"]["messages_processed"] == 1
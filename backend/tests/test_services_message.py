@@ -58,13 +58,13 @@ def message_service(mock_db):
     mock_rolling.aggregate_across_collections = AsyncMock(return_value=[])
     mock_rolling.count_documents = AsyncMock(return_value=0)
 
-    # Patch the RollingMessageService import in message.py
-    with patch("app.services.message.RollingMessageService", return_value=mock_rolling):
-        # Create service (this will use the mocked RollingMessageService)
+    # Patch the MessageRepository import in message.py
+    with patch("app.services.message.MessageRepository", return_value=mock_rolling):
+        # Create service (this will use the mocked MessageRepository)
         service = MessageService(mock_db)
 
-        # Ensure rolling_service is our mock
-        service.rolling_service = mock_rolling
+        # Ensure messages is our mock
+        service.messages = mock_rolling
 
         return service
 
@@ -78,7 +78,7 @@ class TestMessageService:
         user_id = str(ObjectId())
         setup_hierarchical_mocks(mock_db, user_id, [], [])
 
-        message_service.rolling_service.count_documents = AsyncMock(return_value=0)
+        message_service.messages.count_documents = AsyncMock(return_value=0)
         mock_db.messages.find.return_value.sort.return_value.skip.return_value.limit.return_value.__aiter__ = lambda self: async_iter(
             []
         )
@@ -119,7 +119,7 @@ class TestMessageService:
         ]
 
         # Mock rolling service methods
-        message_service.rolling_service.find_messages = AsyncMock(
+        message_service.messages.find_messages = AsyncMock(
             return_value=(mock_data, 2)
         )
 
@@ -151,7 +151,7 @@ class TestMessageService:
         }
 
         # Mock rolling service methods
-        message_service.rolling_service.find_one = AsyncMock(return_value=mock_message)
+        message_service.messages.find_one = AsyncMock(return_value=mock_message)
 
         # Mock hierarchical ownership check
         mock_db.sessions.find_one = AsyncMock(
@@ -185,7 +185,7 @@ class TestMessageService:
         }
 
         # Mock rolling service methods
-        message_service.rolling_service.find_one = AsyncMock(return_value=mock_message)
+        message_service.messages.find_one = AsyncMock(return_value=mock_message)
 
         # Mock hierarchical ownership check
         mock_db.sessions.find_one = AsyncMock(
@@ -218,7 +218,7 @@ class TestMessageService:
         ]
 
         # Mock rolling service methods
-        message_service.rolling_service.find_messages = AsyncMock(
+        message_service.messages.find_messages = AsyncMock(
             return_value=(mock_data, 1)
         )
 
@@ -250,7 +250,7 @@ class TestMessageService:
         ]
 
         # Mock rolling service methods
-        message_service.rolling_service.find_messages = AsyncMock(
+        message_service.messages.find_messages = AsyncMock(
             return_value=(mock_data, 100)
         )
 
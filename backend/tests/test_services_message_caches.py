@@ -0,0 +1,24 @@
+"""Tests for invalidating state derived from deleted messages."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.message_caches import invalidate_deleted_messages
+
+
+@pytest.mark.asyncio
+async def test_invalidate_deleted_messages():
+    """Test closed snapshots and the sessions' topics are outdated."""
+    db = MagicMock()
+    db.sessions.find_one = AsyncMock(
+        return_value={"partitions": ["messages_2024_01", "messages_2024_02"]}
+    )
+    db.partition_snapshots.update_many = AsyncMock()
+    db.session_topics.delete_many = AsyncMock()
+
+    await invalidate_deleted_messages(db, {"sessionId": "s1"})
+
+    snapshot_filter = db.partition_snapshots.update_many.await_args.args[0]
+    assert snapshot_filter == {"_id": {"$in": ["messages_2024_01", "messages_2024_02"]}}
+    db.session_topics.delete_many.assert_awaited_once_with({"_id": "s1"})
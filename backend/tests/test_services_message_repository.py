@@ -0,0 +1,247 @@
+"""Tests for the unified message repository."""
+
+from collections import Counter
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.services.message_repository import (
+    PROJECTIONS,
+    MessageRepository,
+    resolve_projection,
+    sum_partials,
+)
+
+ALL_COLLECTIONS = ["messages_2024_01", "messages_2024_02", "messages_2024_03"]
+
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+@pytest.fixture
+def mock_db():
+    """Mock database whose message collections are created on access."""
+    db = MagicMock()
+    db.list_collection_names = AsyncMock(return_value=ALL_COLLECTIONS + ["sessions"])
+    db.sessions.find_one = AsyncMock(return_value=None)
+    db.sessions.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+
+    collections: dict[str, MagicMock] = {}
+
+    def get_collection(name):
+        if name not in collections:
+            coll = MagicMock()
+            coll.docs = []
+            cursor = MagicMock()
+            cursor.sort.return_value = cursor
+            cursor.skip.return_value = cursor
+            cursor.limit.return_value = cursor
+            cursor.__aiter__ = lambda self, c=coll: async_iter(c.docs)
+            cursor.to_list = AsyncMock(side_effect=lambda length, c=coll: c.docs)
+            coll.cursor = cursor
+            coll.find = MagicMock(return_value=cursor)
+            coll.find_one = AsyncMock(return_value=None)
+            coll.count_documents = AsyncMock(side_effect=lambda f, c=coll: len(c.docs))
+            coll.distinct = AsyncMock(return_value=[])
+            coll.delete_many = AsyncMock(return_value=MagicMock(deleted_count=1))
+            coll.insert_many = AsyncMock(
+                side_effect=lambda docs, ordered: MagicMock(inserted_ids=docs)
+            )
+            collections[name] = coll
+        return collections[name]
+
+    db.__getitem__ = MagicMock(side_effect=get_collection)
+    db.collections = collections
+    return db
+
+
+@pytest.fixture
+def repository(mock_db):
+    """Repository whose collections never need index creation."""
+    repository = MessageRepository(mock_db)
+    repository.ensure_collection_with_indexes = AsyncMock(
+        side_effect=lambda name: mock_db[name]
+    )
+    return repository
+
+
+class TestMessageRepository:
+    """Test cases for MessageRepository."""
+
+    @pytest.mark.asyncio
+    async def test_collections_for_session_uses_partitions(self, repository, mock_db):
+        """Test a single session only reads the collections it spans."""
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_02"]}
+        )
+
+        assert await repository.collections_for({"sessionId": "s1"}) == [
+            "messages_2024_02"
+        ]
+        mock_db.list_collection_names.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_collections_for_timestamp_range(self, repository):
+        """Test a timestamp range only reads the months it covers."""
+        query = {
+            "timestamp": {
+                "$gte": datetime(2024, 2, 1, tzinfo=UTC),
+                "$lt": datetime(2024, 3, 31, tzinfo=UTC),
+            }
+        }
+
+        assert await repository.collections_for(query) == [
+            "messages_2024_02",
+            "messages_2024_03",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_collections_for_unrouted_filter(self, repository):
+        """Test filters without a routing key read every monthly collection."""
+        assert await repository.collections_for({"user_id": "u1"}) == ALL_COLLECTIONS
+
+    @pytest.mark.asyncio
+    async def test_stream_skips_whole_collections(self, repository, mock_db):
+        """Test skip is applied across collections before limit."""
+        mock_db["messages_2024_01"].docs = [{"uuid": "a"}, {"uuid": "b"}]
+        mock_db["messages_2024_02"].docs = [{"uuid": "c"}]
+        mock_db["messages_2024_03"].docs = [{"uuid": "d"}]
+
+        docs = await repository.find({"user_id": "u1"}, skip=2, limit=2)
+
+        assert [d["uuid"] for d in docs] == ["c", "d"]
+        # The first collection was counted but never read
+        mock_db["messages_2024_01"].find.assert_not_called()
+        mock_db["messages_2024_02"].cursor.skip.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_stream_resolves_projection_profile(self, repository, mock_db):
+        """Test profile names are sent to Mongo as their field sets."""
+        await repository.find({"sessionId": "s1"}, "tree")
+
+        mock_db["messages_2024_01"].find.assert_called_once_with(
+            {"sessionId": "s1"}, PROJECTIONS["tree"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_find_messages_accepts_profile(self, repository, mock_db):
+        """Test paginated finds project through the profile."""
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_02"]}
+        )
+
+        await repository.find_messages({"sessionId": "s1"}, projection="list")
+
+        mock_db["messages_2024_02"].find.assert_called_once_with(
+            {"sessionId": "s1"}, PROJECTIONS["list"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_find_first_desc_stops_at_latest_match(self, repository, mock_db):
+        """Test the latest message is taken from the newest collection."""
+        mock_db["messages_2024_03"].find_one = AsyncMock(return_value={"uuid": "z"})
+
+        doc = await repository.find_first({"user_id": "u1"}, sort_order="desc")
+
+        assert doc == {"uuid": "z"}
+        mock_db["messages_2024_01"].find_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_distinct_preserves_first_seen_order(self, repository, mock_db):
+        """Test distinct values are deduplicated across collections."""
+        mock_db["messages_2024_01"].distinct = AsyncMock(return_value=["a", "b"])
+        mock_db["messages_2024_02"].distinct = AsyncMock(return_value=["b", "c"])
+
+        assert await repository.distinct("model", {}) == ["a", "b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_insert_many_records_partitions(self, repository, mock_db):
+        """Test inserts are grouped by month and mapped to their session."""
+        docs = [
+            {"uuid": "a", "sessionId": "s1", "timestamp": datetime(2024, 1, 5)},
+            {"uuid": "b", "sessionId": "s1", "timestamp": datetime(2024, 2, 5)},
+        ]
+        repository.record_session_partitions = AsyncMock()
+
+        assert await repository.insert_many(docs) == 2
+
+        repository.record_session_partitions.assert_awaited_once_with(
+            "s1", {"messages_2024_01", "messages_2024_02"}
+        )
+        mock_db["messages_2024_01"].insert_many.assert_awaited_once_with(
+            [docs[0]], ordered=False
+        )
+
+    @pytest.mark.asyncio
+    async def test_insert_many_releases_blobs_of_rejected_docs(
+        self, repository, mock_db
+    ):
+        """Test rejected and unreached documents give back blob references."""
+        docs = [
+            {"uuid": "a", "timestamp": datetime(2024, 1, 5), "blobRefs": {"t": "x"}},
+            {"uuid": "b", "timestamp": datetime(2024, 1, 6), "blobRefs": {"t": "y"}},
+            {"uuid": "c", "timestamp": datetime(2024, 2, 5), "blobRefs": {"t": "z"}},
+        ]
+        repository.blobs.externalize = AsyncMock()
+        repository.blobs.release = AsyncMock()
+        mock_db["messages_2024_01"].insert_many = AsyncMock(
+            side_effect=BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}]})
+        )
+
+        with pytest.raises(BulkWriteError):
+            await repository.insert_many(docs)
+
+        repository.blobs.release.assert_awaited_once_with(Counter({"y": 1, "z": 1}))
+
+    @pytest.mark.asyncio
+    async def test_delete_many_sums_across_collections(self, repository, mock_db):
+        """Test deletes fan out to every routed collection."""
+        assert await repository.delete_many({"user_id": "u1"}) == 3
+
+        for name in ALL_COLLECTIONS:
+            mock_db[name].delete_many.assert_awaited_once_with({"user_id": "u1"})
+
+    @pytest.mark.asyncio
+    async def test_delete_many_drops_session_topics(self, repository, mock_db):
+        """Test cached topics of sessions losing messages are dropped."""
+        mock_db.session_topics.delete_many = AsyncMock()
+
+        await repository.delete_many({"sessionId": {"$in": ["s1", "s2"]}})
+
+        mock_db.session_topics.delete_many.assert_awaited_once_with(
+            {"_id": {"$in": ["s1", "s2"]}}
+        )
+
+    @pytest.mark.asyncio
+    async def test_delete_many_in_transaction(self, repository, mock_db):
+        """Test the transaction session is passed to every delete."""
+        session = MagicMock()
+
+        await repository.delete_many({"user_id": "u1"}, session=session)
+
+        for name in ALL_COLLECTIONS:
+            mock_db[name].delete_many.assert_awaited_once_with(
+                {"user_id": "u1"}, session=session
+            )
+
+
+def test_sum_partials_converts_decimal128():
+    """Test Decimal128 partials are summed as floats."""
+    decimal = MagicMock()
+    decimal.to_decimal.return_value = 0.5
+
+    assert sum_partials([{"cost": decimal}, {"cost": 1.0}, {}], "cost") == 1.5
+
+
+def test_resolve_projection():
+    """Test profile names resolve while dicts and None pass through."""
+    assert resolve_projection("full") is None
+    assert "messageData" not in resolve_projection("list")
+    assert resolve_projection({"uuid": 1}) == {"uuid": 1}
+    assert resolve_projection(None) is None
+    with pytest.raises(ValueError):
+        resolve_projection("everything")
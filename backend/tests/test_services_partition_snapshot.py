@@ -0,0 +1,265 @@
+"""Tests for columnar snapshots of closed monthly partitions."""
+
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.schemas.analytics import TimeRange
+from app.services.analytics import AnalyticsService
+from app.services.partition_snapshot import (
+    SNAPSHOT_VERSION,
+    ColumnarPartition,
+    ColumnWriter,
+    PartitionSnapshotStore,
+    is_closed,
+)
+
+JAN_1 = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+class _AsyncIter:
+    """Async iterator over a fixed list of documents."""
+
+    def __init__(self, items):
+        self._items = list(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._items:
+            raise StopAsyncIteration
+        return self._items.pop(0)
+
+
+def _messages():
+    """Three messages an hour apart, the second without cost or model."""
+    return [
+        {
+            "timestamp": JAN_1,
+            "type": "assistant",
+            "model": "claude-a",
+            "costUsd": 0.5,
+            "cost": 0.5,
+            "durationMs": 1200,
+            "sessionId": "s1",
+            "tokens": {"total": 30, "input": 10, "output": 20},
+        },
+        {
+            "timestamp": JAN_1 + timedelta(hours=1),
+            "type": "user",
+            "sessionId": "s1",
+        },
+        {
+            "timestamp": JAN_1 + timedelta(hours=2),
+            "type": "assistant",
+            "model": "claude-b",
+            "costUsd": 1.0,
+            "cost": 1.0,
+            "sessionId": "s2",
+        },
+    ]
+
+
+@pytest.fixture
+def partition(tmp_path):
+    """Snapshot of ``_messages`` written and memory-mapped from disk."""
+    writer = ColumnWriter("messages_2025_01")
+    for doc in _messages():
+        writer.append(doc)
+    writer.write(str(tmp_path / "messages_2025_01"))
+    return ColumnarPartition(str(tmp_path / "messages_2025_01"))
+
+
+class TestColumns:
+    """Test cases for writing and scanning snapshot columns."""
+
+    def test_round_trip(self, partition):
+        """Test values, dictionary strings and missing values survive."""
+        rows = list(
+            partition.scan(("type", "model", "cost", "durationMs", "tokens.total"))
+        )
+
+        assert partition.rows == 3
+        assert rows == [
+            ("assistant", "claude-a", 0.5, 1200.0, 30),
+            ("user", None, None, None, 0),
+            ("assistant", "claude-b", 1.0, None, 0),
+        ]
+        assert list(partition.column("hasCostUsd")) == [1, 0, 1]
+
+    def test_row_range(self, partition):
+        """Test time bounds are inclusive and found by binary search."""
+        assert partition.row_range() == range(0, 3)
+        assert partition.row_range(JAN_1 + timedelta(minutes=30)) == range(1, 3)
+        assert partition.row_range(end=JAN_1 + timedelta(hours=1)) == range(0, 2)
+        assert partition.row_range(JAN_1 + timedelta(days=1)) == range(3, 3)
+
+    def test_empty_partition(self, tmp_path):
+        """Test a collection without documents scans to nothing."""
+        ColumnWriter("messages_2025_02").write(str(tmp_path / "empty"))
+
+        partition = ColumnarPartition(str(tmp_path / "empty"))
+
+        assert list(partition.scan(("timestamp", "model"))) == []
+
+    def test_is_closed(self):
+        """Test only months before the current one are closed."""
+        now = datetime(2025, 3, 15, tzinfo=UTC)
+
+        assert is_closed("messages_2025_02", now)
+        assert not is_closed("messages_2025_03", now)
+        assert not is_closed("sessions", now)
+
+
+class TestStore:
+    """Test cases for the snapshot registry."""
+
+    def test_is_current(self):
+        """Test a write after the build outdates the snapshot."""
+        built_at = datetime(2025, 2, 1, tzinfo=UTC)
+        entry = {"version": SNAPSHOT_VERSION, "built_at": built_at}
+
+        assert PartitionSnapshotStore._is_current(entry)
+        assert PartitionSnapshotStore._is_current(
+            {**entry, "invalidated_at": built_at - timedelta(seconds=1)}
+        )
+        assert not PartitionSnapshotStore._is_current(
+            {**entry, "invalidated_at": built_at + timedelta(seconds=1)}
+        )
+        assert not PartitionSnapshotStore._is_current({**entry, "version": 0})
+
+    @pytest.mark.asyncio
+    async def test_invalidate_closed_only(self):
+        """Test writes to the current month leave the registry alone."""
+        db = MagicMock()
+        db.partition_snapshots.update_many = AsyncMock()
+        store = PartitionSnapshotStore(db)
+        current = f"messages_{datetime.now(UTC).strftime('%Y_%m')}"
+
+        await store.invalidate([current])
+        db.partition_snapshots.update_many.assert_not_called()
+
+        await store.invalidate([current, "messages_2025_01", "messages_2025_01"])
+        query, update = db.partition_snapshots.update_many.call_args.args
+        assert query == {"_id": {"$in": ["messages_2025_01"]}}
+        assert "invalidated_at" in update["$set"]
+
+    @pytest.mark.asyncio
+    async def test_invalidate_never_raises(self):
+        """Test a registry failure does not fail the write."""
+        db = MagicMock()
+        db.partition_snapshots.update_many = AsyncMock(side_effect=Exception("down"))
+
+        await PartitionSnapshotStore(db).invalidate(["messages_2025_01"])
+
+    @pytest.mark.asyncio
+    async def test_build_and_load(self, tmp_path):
+        """Test a built snapshot is registered, replaced and loaded."""
+        db = MagicMock()
+        cursor = MagicMock()
+        cursor.sort = MagicMock(side_effect=lambda *args: _AsyncIter(_messages()))
+        db.__getitem__.return_value.find = MagicMock(return_value=cursor)
+        old_path = tmp_path / "messages_2025_01-old"
+        old_path.mkdir()
+        db.partition_snapshots.find_one_and_update = AsyncMock(
+            return_value={"path": str(old_path)}
+        )
+        store = PartitionSnapshotStore(db, root=str(tmp_path))
+
+        rows = await store.build("messages_2025_01")
+
+        assert rows == 3
+        assert not old_path.exists()
+        query, update = db.partition_snapshots.find_one_and_update.call_args.args
+        assert query == {"_id": "messages_2025_01"}
+        entry = {"_id": "messages_2025_01", **update["$set"]}
+        assert entry["version"] == SNAPSHOT_VERSION
+
+        db.partition_snapshots.find = MagicMock(
+            return_value=_AsyncIter(
+                [
+                    entry,
+                    {**entry, "_id": "messages_2025_02", "version": 0},
+                ]
+            )
+        )
+        loaded = await store.load(["messages_2025_01", "messages_2025_02"])
+
+        assert list(loaded) == ["messages_2025_01"]
+        assert loaded["messages_2025_01"].rows == 3
+
+    @pytest.mark.asyncio
+    async def test_missing_files_fall_back_to_mongo(self, tmp_path):
+        """Test a registered snapshot without files here is left out."""
+        db = MagicMock()
+        db.partition_snapshots.find = MagicMock(
+            return_value=_AsyncIter(
+                [
+                    {
+                        "_id": "messages_2025_01",
+                        "path": str(tmp_path / "messages_2025_01-1"),
+                        "version": SNAPSHOT_VERSION,
+                        "built_at": JAN_1,
+                    }
+                ]
+            )
+        )
+
+        loaded = await PartitionSnapshotStore(db, root=str(tmp_path)).load(
+            ["messages_2025_01"]
+        )
+
+        assert loaded == {}
+
+    @pytest.mark.asyncio
+    async def test_disabled_without_storage_path(self):
+        """Test snapshots are neither built nor read without shared storage."""
+        db = MagicMock()
+        db.list_collection_names = AsyncMock(return_value=["messages_2025_01"])
+
+        with patch("app.services.partition_snapshot.settings") as settings:
+            settings.SNAPSHOT_STORAGE_PATH = None
+            store = PartitionSnapshotStore(db)
+
+            assert await store.refresh() == []
+            assert await store.load(["messages_2025_01"]) == {}
+        db.list_collection_names.assert_not_called()
+        db.partition_snapshots.find.assert_not_called()
+
+
+class TestAnalyticsOnSnapshots:
+    """Test analytics combine snapshot scans with live aggregation."""
+
+    @pytest.mark.asyncio
+    async def test_cost_analytics_merges_periods(self, partition):
+        """Test a day split between a snapshot and MongoDB is merged."""
+        service = AnalyticsService(MagicMock())
+        service.rolling_service.get_collections_for_range = AsyncMock(
+            return_value=["messages_2025_01", "messages_2025_02"]
+        )
+        service.rolling_service.aggregate_collections = AsyncMock(
+            return_value=[
+                {
+                    "_id": "2025-01-01",
+                    "totalCost": 2.0,
+                    "messageCount": 1,
+                    "costByModel": [{"model": "claude-a", "cost": 2.0}],
+                }
+            ]
+        )
+        load = AsyncMock(return_value={"messages_2025_01": partition})
+
+        with patch.object(PartitionSnapshotStore, "load", load):
+            analytics = await service.get_cost_analytics(TimeRange.ALL_TIME, "day")
+
+        service.rolling_service.aggregate_collections.assert_awaited_once()
+        assert service.rolling_service.aggregate_collections.call_args.args[0] == [
+            "messages_2025_02"
+        ]
+        assert len(analytics.data_points) == 1
+        point = analytics.data_points[0]
+        assert point.cost == 3.5
+        assert point.message_count == 3
+        assert point.cost_by_model == {"claude-a": 2.5, "claude-b": 1.0}
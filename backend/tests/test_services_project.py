@@ -24,6 +24,9 @@ def mock_db():
     db.projects = MagicMock()
     db.sessions = MagicMock()
     db.messages = MagicMock()
+    # Messages live in a single monthly collection backed by ``db.messages``
+    db.list_collection_names = AsyncMock(return_value=["messages_2024_01"])
+    db.__getitem__.return_value = db.messages
 
     # Add mock client for transactions (but not functional)
     # This tells ProjectDeletionService that client isn't available
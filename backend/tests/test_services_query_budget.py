@@ -0,0 +1,175 @@
+"""Tests for per-request query budgets."""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from pymongo.errors import ExecutionTimeout
+
+from app.services.query_budget import (
+    aggregate_options,
+    budget_for_path,
+    current_budget,
+    find_options,
+    get_query_metrics,
+    kill_operations,
+    query_budget,
+)
+from app.services.request_coalescer import RequestCoalescer
+from app.services.rolling_message_service import RollingMessageService
+
+
+@pytest.fixture(autouse=True)
+def clear_metrics():
+    """Start every test with empty counters."""
+    get_query_metrics().clear()
+    yield
+    get_query_metrics().clear()
+
+
+def _collection(result=None, error=None):
+    """Mock collection whose aggregation returns ``result`` or raises."""
+    collection = MagicMock()
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=result, side_effect=error)
+    cursor.close = AsyncMock()
+    collection.aggregate = MagicMock(return_value=cursor)
+    return collection
+
+
+class TestQueryBudget:
+    """Test cases for budgets and their query options."""
+
+    def test_no_budget_adds_no_options(self):
+        """Test queries outside a request are unchanged."""
+        assert current_budget() is None
+        assert aggregate_options() == {}
+        assert find_options() == {}
+
+    def test_options_carry_remaining_time(self):
+        """Test maxTimeMS is the time left, never zero."""
+        with query_budget("/api/v1/analytics", 2.0) as budget:
+            options = aggregate_options()
+            assert 0 < options["maxTimeMS"] <= 2000
+            assert options["comment"] == budget.comment
+            assert find_options()["max_time_ms"] <= 2000
+
+            budget.deadline = 0
+            assert budget.expired()
+            assert aggregate_options()["maxTimeMS"] == 1
+        assert current_budget() is None
+
+    def test_longest_prefix_wins(self):
+        """Test per-endpoint budgets override their section's."""
+        budgets = {"/api/v1/analytics": 30.0, "/api/v1/analytics/benchmarks": 60.0}
+        with patch("app.services.query_budget.settings") as settings:
+            settings.QUERY_BUDGETS = budgets
+
+            assert budget_for_path("/api/v1/analytics/benchmarks/compare") == (
+                "/api/v1/analytics/benchmarks",
+                60.0,
+            )
+            assert budget_for_path("/api/v1/analytics/summary") == (
+                "/api/v1/analytics",
+                30.0,
+            )
+            assert budget_for_path("/api/v1/sessions") is None
+
+    @pytest.mark.asyncio
+    async def test_kill_operations_by_comment(self):
+        """Test own operations tagged with the comment are killed."""
+        db = MagicMock()
+        admin = db.client.admin
+        admin.aggregate.return_value.to_list = AsyncMock(
+            return_value=[{"opid": 7}, {"opid": 9}]
+        )
+        admin.command = AsyncMock()
+
+        assert await kill_operations(db, "claudelens:abc") == 2
+
+        pipeline = admin.aggregate.call_args.args[0]
+        assert pipeline[0] == {"$currentOp": {"ownOps": True}}
+        assert pipeline[1] == {"$match": {"command.comment": "claudelens:abc"}}
+        admin.command.assert_any_await("killOp", op=9)
+
+
+class TestRollingServiceBudget:
+    """Test budgets propagate through rolling collection queries."""
+
+    @pytest.mark.asyncio
+    async def test_timed_out_partitions_give_partial_results(self):
+        """Test other partitions still return and the timeout is recorded."""
+        collections = {
+            "messages_2025_01": _collection(error=ExecutionTimeout("time limit")),
+            "messages_2025_02": _collection(result=[{"count": 3}]),
+        }
+        db = MagicMock()
+        db.__getitem__.side_effect = collections.__getitem__
+        service = RollingMessageService(db)
+
+        with query_budget("/api/v1/analytics", 5.0) as budget:
+            results = await service.aggregate_collections(
+                list(collections), [{"$match": {}}]
+            )
+
+        assert results == [{"count": 3}]
+        assert budget.partial
+        assert budget.timed_out == {"messages_2025_01"}
+        kwargs = collections["messages_2025_02"].aggregate.call_args.kwargs
+        assert kwargs["comment"] == budget.comment
+        assert 0 < kwargs["maxTimeMS"] <= 5000
+        assert get_query_metrics().snapshot()["/api/v1/analytics"]["timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancellation_releases_cursors(self):
+        """Test a cancelled request closes its cursors and kills its queries."""
+        started = asyncio.Event()
+
+        async def hang(_):
+            started.set()
+            await asyncio.sleep(60)
+
+        collection = _collection()
+        cursor = collection.aggregate.return_value
+        cursor.to_list = AsyncMock(side_effect=hang)
+        db = MagicMock()
+        db.__getitem__.return_value = collection
+        service = RollingMessageService(db)
+
+        with patch(
+            "app.services.query_budget.kill_operations", AsyncMock()
+        ) as kill, query_budget("/api/v1/analytics", 5.0) as budget:
+            task = asyncio.create_task(
+                service.aggregate_collections(["messages_2025_01"], [])
+            )
+            await started.wait()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            await asyncio.sleep(0)
+
+        cursor.close.assert_awaited_once()
+        kill.assert_awaited_once_with(db, budget.comment)
+
+
+class TestCoalescedBudget:
+    """Test partial results interact correctly with memoization."""
+
+    @pytest.mark.asyncio
+    async def test_partial_results_not_memoized(self):
+        """Test a timed-out computation is shared but recomputed next time."""
+        coalescer = RequestCoalescer(ttl=60)
+        key = ("user", "endpoint", "{}")
+
+        async def partial():
+            current_budget().record_timeout("messages_2025_01")
+            return "partial"
+
+        with query_budget("/api/v1/analytics", 5.0) as budget:
+            assert await coalescer.run(key, partial) == "partial"
+        assert budget.partial
+        assert len(coalescer) == 0
+
+        with query_budget("/api/v1/analytics", 5.0):
+            assert await coalescer.run(key, AsyncMock(return_value="full")) == "full"
+        assert len(coalescer) == 1
@@ -0,0 +1,266 @@
+"""Tests for single-flight coalescing of analytics and search requests."""
+
+import asyncio
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.schemas.analytics import TimeRange
+from app.schemas.search import SearchFilters
+from app.services.analytics import AnalyticsService
+from app.services.query_budget import current_budget, query_budget
+from app.services.request_coalescer import (
+    ALL_USERS,
+    RequestCoalescer,
+    coalesced,
+    get_request_coalescer,
+    normalize_params,
+)
+from app.services.search import SearchService
+
+KEY = ("user", "endpoint", "{}")
+
+
+class _Service:
+    """Minimal service with a coalesced method counting its runs."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.runs = 0
+        self.release = asyncio.Event()
+
+    @coalesced
+    async def report(self, time_range, limit=10):
+        self.runs += 1
+        await self.release.wait()
+        return {"range": time_range, "limit": limit, "run": self.runs}
+
+
+class TestRequestCoalescer:
+    """Test cases for sharing and memoizing computations."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_computation(self):
+        """Test identical concurrent calls run the computation once."""
+        coalescer = RequestCoalescer(ttl=5)
+        release = asyncio.Event()
+        runs = []
+
+        async def compute():
+            runs.append(True)
+            await release.wait()
+            return "result"
+
+        calls = [asyncio.create_task(coalescer.run(KEY, compute)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*calls)
+
+        assert len(runs) == 1
+        assert results == ["result"] * 5
+
+    @pytest.mark.asyncio
+    async def test_results_memoized_until_ttl(self, monkeypatch):
+        """Test a finished result is reused until it expires."""
+        coalescer = RequestCoalescer(ttl=5)
+        now = [100.0]
+        monkeypatch.setattr("time.monotonic", lambda: now[0])
+        compute = AsyncMock(side_effect=[1, 2])
+
+        assert await coalescer.run(KEY, compute) == 1
+        now[0] += 5
+        assert await coalescer.run(KEY, compute) == 1
+        now[0] += 0.1
+        assert await coalescer.run(KEY, compute) == 2
+
+    @pytest.mark.asyncio
+    async def test_zero_ttl_only_coalesces(self):
+        """Test memoization can be disabled."""
+        coalescer = RequestCoalescer(ttl=0)
+        compute = AsyncMock(side_effect=[1, 2])
+
+        assert await coalescer.run(KEY, compute) == 1
+        assert await coalescer.run(KEY, compute) == 2
+        assert len(coalescer) == 0
+
+    @pytest.mark.asyncio
+    async def test_failures_shared_but_not_memoized(self):
+        """Test every waiter sees the error and the next call retries."""
+        coalescer = RequestCoalescer(ttl=5)
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise ValueError("boom")
+
+        calls = [asyncio.create_task(coalescer.run(KEY, fail)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*calls, return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert await coalescer.run(KEY, AsyncMock(return_value=3)) == 3
+
+    @pytest.mark.asyncio
+    async def test_cancelled_only_when_every_waiter_leaves(self):
+        """Test one disconnect keeps the computation for the others."""
+        coalescer = RequestCoalescer(ttl=5)
+        started = asyncio.Event()
+        release = asyncio.Event()
+        cancelled = []
+
+        async def compute():
+            started.set()
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "done"
+
+        first = asyncio.create_task(coalescer.run(KEY, compute))
+        second = asyncio.create_task(coalescer.run(KEY, compute))
+        await started.wait()
+
+        first.cancel()
+        await asyncio.sleep(0)
+        assert not cancelled
+
+        release.set()
+        assert await second == "done"
+
+        release.clear()
+        started.clear()
+        other = ("user", "other", "{}")
+        third = asyncio.create_task(coalescer.run(other, compute))
+        await started.wait()
+        third.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await third
+        await asyncio.sleep(0)
+        assert cancelled == [True]
+
+    @pytest.mark.asyncio
+    async def test_discard_user(self):
+        """Test results of one user can be dropped."""
+        coalescer = RequestCoalescer(ttl=5)
+        await coalescer.run(("a", "e", "{}"), AsyncMock(return_value=1))
+        await coalescer.run(("b", "e", "{}"), AsyncMock(return_value=1))
+
+        coalescer.discard_user("a")
+
+        assert len(coalescer) == 1
+
+    @pytest.mark.asyncio
+    async def test_discard_user_drops_unscoped_results(self):
+        """Test results computed across all users are dropped on any write."""
+        coalescer = RequestCoalescer(ttl=5)
+        await coalescer.run((ALL_USERS, "e", "{}"), AsyncMock(return_value=1))
+
+        coalescer.discard_user("a")
+
+        assert len(coalescer) == 0
+
+    @pytest.mark.asyncio
+    async def test_computation_has_its_own_budget(self):
+        """Test a shared computation does not run out the first caller's time."""
+        coalescer = RequestCoalescer(ttl=5)
+        seen = []
+
+        async def compute():
+            budget = current_budget()
+            seen.append(budget)
+            budget.record_timeout("messages_2025_01")
+            return "partial"
+
+        with query_budget("/api/v1/analytics", 30.0) as caller:
+            assert await coalescer.run(KEY, compute) == "partial"
+
+        [budget] = seen
+        assert budget is not caller
+        assert budget.endpoint == caller.endpoint
+        assert budget.comment != caller.comment
+        # The caller still learns its result is partial, and it is not reused
+        assert caller.timed_out == {"messages_2025_01"}
+        assert len(coalescer) == 0
+
+
+class TestCoalescedMethods:
+    """Test cases for the service method decorator."""
+
+    def test_normalize_params(self):
+        """Test parameter types and ordering normalize stably."""
+        filters = SearchFilters(start_date=datetime(2025, 1, 1, tzinfo=UTC))
+
+        first = normalize_params(
+            {"filters": filters, "time_range": TimeRange.LAST_7_DAYS}
+        )
+        second = normalize_params(
+            {"time_range": TimeRange.LAST_7_DAYS, "filters": filters}
+        )
+
+        assert first == second
+        assert "2025-01-01" in first
+        assert normalize_params({"ids": {"b", "a"}}) == '{"ids": ["a", "b"]}'
+
+    @pytest.mark.asyncio
+    async def test_keyed_per_user_and_params(self):
+        """Test positional and keyword calls share a key, users do not."""
+        alice, bob = _Service("alice"), _Service("bob")
+        for service in (alice, bob):
+            service.release.set()
+
+        assert (await alice.report("7d"))["run"] == 1
+        assert (await alice.report(time_range="7d", limit=10))["run"] == 1
+        assert (await alice.report("7d", limit=5))["run"] == 2
+        assert (await bob.report("7d"))["run"] == 1
+
+    @pytest.mark.asyncio
+    async def test_analytics_burst_runs_one_aggregation(self):
+        """Test a burst of identical dashboard requests hits MongoDB once."""
+        services = [AnalyticsService(MagicMock(), "u1") for _ in range(4)]
+        aggregate = AsyncMock(return_value=[])
+        for service in services:
+            service.rolling_service.aggregate_across_collections = aggregate
+
+        results = await asyncio.gather(
+            *(s.get_token_efficiency_detailed() for s in services)
+        )
+
+        assert aggregate.await_count == 1
+        assert all(result is results[0] for result in results)
+
+    @pytest.mark.asyncio
+    async def test_unscoped_services_share_all_users_key(self):
+        """Test services without a user are keyed apart from every user."""
+        service = _Service(None)
+        service.release.set()
+        get_request_coalescer().clear()
+
+        await service.report("7d")
+
+        [key] = get_request_coalescer()._results
+        assert key[0] == ALL_USERS
+
+    @pytest.mark.asyncio
+    async def test_shared_searches_are_each_logged(self):
+        """Test a search served from a shared result still reaches the log."""
+        get_request_coalescer().clear()
+        services = [SearchService(MagicMock(), "u1") for _ in range(2)]
+        for service in services:
+            service.rolling_service.get_collections_for_range = AsyncMock(
+                return_value=[]
+            )
+            service._log_search = AsyncMock()
+
+        for service in services:
+            await service.search_messages("needle", None, 0, 10)
+
+        services[1].rolling_service.get_collections_for_range.assert_not_called()
+        for service in services:
+            service._log_search.assert_awaited_once()
+
+    def test_global_instance(self):
+        """Test the process-wide coalescer is reused."""
+        assert get_request_coalescer() is get_request_coalescer()
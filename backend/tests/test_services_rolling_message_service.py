@@ -0,0 +1,247 @@
+"""Tests for session partition routing in RollingMessageService."""
+
+from datetime import UTC, datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.rolling_message_service import RollingMessageService
+
+ALL_COLLECTIONS = [
+    "messages_2024_01",
+    "messages_2024_02",
+    "messages_2024_03",
+    "sessions",
+]
+
+
+@pytest.fixture
+def mock_db():
+    """Mock database whose message collections are created on access."""
+    db = MagicMock()
+    db.list_collection_names = AsyncMock(return_value=ALL_COLLECTIONS)
+    db.sessions.find_one = AsyncMock(return_value=None)
+    db.sessions.update_one = AsyncMock()
+
+    collections: dict[str, MagicMock] = {}
+
+    def get_collection(name):
+        if name not in collections:
+            coll = MagicMock()
+            cursor = MagicMock()
+            cursor.sort.return_value = cursor
+            cursor.to_list = AsyncMock(return_value=[])
+            coll.find = MagicMock(return_value=cursor)
+            coll.find_one = AsyncMock(return_value=None)
+            coll.count_documents = AsyncMock(return_value=0)
+            coll.aggregate = MagicMock(return_value=cursor)
+            collections[name] = coll
+        return collections[name]
+
+    db.__getitem__ = MagicMock(side_effect=get_collection)
+    db.collections = collections
+    return db
+
+
+class TestSessionPartitions:
+    """Test cases for the session-to-partition map."""
+
+    @pytest.mark.asyncio
+    async def test_session_query_routed_to_partitions(self, mock_db):
+        """Test session-scoped finds only touch the session's collections."""
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_02"]}
+        )
+
+        await RollingMessageService(mock_db).find_messages({"sessionId": "s1"})
+
+        assert set(mock_db.collections) == {"messages_2024_02"}
+        mock_db.list_collection_names.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_unmapped_session_reads_every_collection(self, mock_db):
+        """Test sessions without a partition map search all months."""
+        await RollingMessageService(mock_db).count_documents({"sessionId": "s1"})
+
+        assert set(mock_db.collections) == {
+            "messages_2024_01",
+            "messages_2024_02",
+            "messages_2024_03",
+        }
+
+    @pytest.mark.asyncio
+    async def test_session_and_range_use_mapped_months_in_range(self, mock_db):
+        """Test a timestamp range narrows the session's partition map."""
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_01", "messages_2024_03"]}
+        )
+        query = {
+            "sessionId": "s1",
+            "timestamp": {"$gte": datetime(2024, 2, 1, tzinfo=UTC)},
+        }
+
+        assert await RollingMessageService(mock_db).collections_for(query) == [
+            "messages_2024_03"
+        ]
+
+    @pytest.mark.asyncio
+    async def test_record_partitions_on_mapped_session(self, mock_db):
+        """Test new partitions are added to an existing map."""
+        mock_db.sessions.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+
+        await RollingMessageService(mock_db).record_session_partitions(
+            "s1", {"messages_2024_03", "messages_2024_02"}
+        )
+
+        mock_db.sessions.update_one.assert_awaited_once_with(
+            {"sessionId": "s1", "partitions": {"$exists": True}},
+            {
+                "$addToSet": {
+                    "partitions": {"$each": ["messages_2024_02", "messages_2024_03"]}
+                }
+            },
+        )
+        assert mock_db.collections == {}
+
+    @pytest.mark.asyncio
+    async def test_record_partitions_backfills_legacy_session(self, mock_db):
+        """Test a session without a map discovers its older partitions."""
+        mock_db.sessions.update_one = AsyncMock(return_value=MagicMock(matched_count=0))
+        mock_db.sessions.find_one = AsyncMock(return_value={"_id": 1})
+        mock_db["messages_2024_01"].find_one = AsyncMock(return_value={"_id": 1})
+
+        await RollingMessageService(mock_db).record_session_partitions(
+            "s1", ["messages_2024_03"]
+        )
+
+        backfill = mock_db.sessions.update_one.call_args_list[1]
+        assert backfill.args[1]["$addToSet"]["partitions"]["$each"] == [
+            "messages_2024_01",
+            "messages_2024_03",
+        ]
+        # The target partition itself is not probed
+        mock_db["messages_2024_03"].find_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_record_partitions_skips_probe_without_session(self, mock_db):
+        """Test messages of a session with no document do not probe months."""
+        mock_db.sessions.update_one = AsyncMock(return_value=MagicMock(matched_count=0))
+
+        await RollingMessageService(mock_db).record_session_partitions(
+            "s1", ["messages_2024_03"]
+        )
+
+        mock_db.list_collection_names.assert_not_called()
+        assert mock_db.collections == {}
+        mock_db.sessions.update_one.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_aggregate_session_returns_partials(self, mock_db):
+        """Test session aggregations run once per mapped collection."""
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_01", "messages_2024_02"]}
+        )
+        for name, total in [("messages_2024_01", 2), ("messages_2024_02", 3)]:
+            mock_db[name].aggregate.return_value.to_list = AsyncMock(
+                return_value=[{"_id": None, "messageCount": total}]
+            )
+
+        result = await RollingMessageService(mock_db).aggregate_session(
+            "s1", [{"$match": {"sessionId": "s1"}}]
+        )
+
+        assert sorted(r["messageCount"] for r in result) == [2, 3]
+
+
+class TestProjections:
+    """Test cases for projected reads and their covering indexes."""
+
+    @pytest.mark.asyncio
+    async def test_find_messages_passes_projection(self, mock_db):
+        """Test the projection reaches every collection queried."""
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_01", "messages_2024_02"]}
+        )
+        projection = {"_id": 0, "contentHash": 1, "timestamp": 1}
+
+        await RollingMessageService(mock_db).find_messages(
+            {"sessionId": "s1"}, projection=projection
+        )
+
+        for name in ["messages_2024_01", "messages_2024_02"]:
+            mock_db[name].find.assert_called_once_with({"sessionId": "s1"}, projection)
+
+    @pytest.mark.asyncio
+    async def test_indexes_cover_tree_profile(self, mock_db):
+        """Test session indexes hold every field of the covered profiles."""
+        from app.services.message_repository import PROJECTIONS
+
+        collection = mock_db["messages_2024_01"]
+        collection.create_indexes = AsyncMock()
+
+        await RollingMessageService(mock_db).create_indexes(collection)
+
+        index_keys = [
+            [field for field, _ in model.document["key"].items()]
+            for model in collection.create_indexes.call_args[0][0]
+        ]
+        fields = {f for f, v in PROJECTIONS["tree"].items() if v}
+        assert any(
+            keys[0] == "sessionId" and fields <= set(keys) for keys in index_keys
+        )
+
+    @pytest.mark.asyncio
+    async def test_sessions_collections_union_partitions(self, mock_db):
+        """Test unmapped sessions widen the search to every collection."""
+        service = RollingMessageService(mock_db)
+
+        mapped = await service.get_sessions_collections(
+            [
+                {"partitions": ["messages_2024_02"]},
+                {"partitions": ["messages_2024_01", "messages_2024_02"]},
+            ]
+        )
+        widened = await service.get_sessions_collections(
+            [{"partitions": ["messages_2024_02"]}, {}]
+        )
+
+        assert mapped == ["messages_2024_01", "messages_2024_02"]
+        assert widened == ALL_COLLECTIONS[:3]
+
+
+class TestStreamMessages:
+    """Test cases for streaming messages across collections."""
+
+    @pytest.mark.asyncio
+    async def test_timed_out_collection_is_skipped(self, mock_db):
+        """Test a collection out of time is recorded and the rest streamed."""
+        from pymongo.errors import ExecutionTimeout
+
+        from app.services.query_budget import query_budget
+
+        async def documents(docs, error=None):
+            for doc in docs:
+                yield doc
+            if error:
+                raise error
+
+        streams = {
+            "messages_2024_01": documents([{"n": 1}], ExecutionTimeout("limit")),
+            "messages_2024_02": documents([{"n": 2}, {"n": 3}]),
+        }
+        for name, stream in streams.items():
+            cursor = mock_db[name].find.return_value
+            cursor.batch_size.return_value.__aiter__ = lambda self, s=stream: s
+
+        with query_budget("/api/v1/analytics", 5.0) as budget:
+            docs = [
+                doc
+                async for doc in RollingMessageService(mock_db).stream_messages(
+                    list(streams), {"sessionId": "s1"}, {"n": 1}
+                )
+            ]
+
+        assert docs == [{"n": 1}, {"n": 2}, {"n": 3}]
+        assert budget.timed_out == {"messages_2024_01"}
+        kwargs = mock_db["messages_2024_02"].find.call_args.kwargs
+        assert kwargs["comment"] == budget.comment
@@ -375,7 +375,10 @@ class TestSearchServicePipelineBuilding:
 
         assert "$or" in conditions
         or_conditions = conditions["$or"]
-        assert len(or_conditions) == 3  # message.content, toolUseResult, content
+        # content, message.content, toolUseResult and the blob search text
+        fields = {field for condition in or_conditions for field in condition}
+        assert "searchText.toolUseResult" in fields
+        assert len(or_conditions) == 6
 
         # All should have regex patterns for code detection
         for condition in or_conditions:
@@ -651,6 +654,10 @@ class TestSearchServiceSuggestionsAndStats:
         search_service.db.messages.distinct = AsyncMock(
             return_value=["test-model", "claude-test"]
         )
+        search_service.db.list_collection_names = AsyncMock(
+            return_value=["messages_2024_01"]
+        )
+        search_service.db.__getitem__.return_value = search_service.db.messages
 
         suggestions = await search_service.get_suggestions(partial_query, limit)
 
@@ -684,6 +691,10 @@ class TestSearchServiceSuggestionsAndStats:
         search_service.db.search_logs.find = MagicMock(return_value=mock_cursor)
         search_service.db.projects.find = MagicMock(return_value=mock_cursor)
         search_service.db.messages.distinct = AsyncMock(return_value=[])
+        search_service.db.list_collection_names = AsyncMock(
+            return_value=["messages_2024_01"]
+        )
+        search_service.db.__getitem__.return_value = search_service.db.messages
 
         suggestions = await search_service.get_suggestions(partial_query, 10)
 
@@ -720,6 +731,25 @@ class TestSearchServiceSuggestionsAndStats:
         assert recent[0]["result_count"] == 10
         assert "timestamp" in recent[0]
 
+    @pytest.mark.asyncio
+    async def test_get_recent_searches_not_memoized(self, search_service):
+        """Test a search logged between calls shows up right away."""
+        mock_cursor = MagicMock()
+        mock_cursor.sort = MagicMock(return_value=mock_cursor)
+        mock_cursor.limit = MagicMock(return_value=mock_cursor)
+        mock_cursor.to_list = AsyncMock(
+            side_effect=[
+                [],
+                [{"query": "just ran", "timestamp": datetime.now(UTC)}],
+            ]
+        )
+        search_service.db.search_logs.find = MagicMock(return_value=mock_cursor)
+
+        assert await search_service.get_recent_searches(5) == []
+        recent = await search_service.get_recent_searches(5)
+
+        assert [r["query"] for r in recent] == ["just ran"]
+
     @pytest.mark.asyncio
     async def test_get_search_stats(self, search_service):
         """Test getting search statistics."""
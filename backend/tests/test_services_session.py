@@ -45,6 +45,9 @@ def mock_db():
     db.messages.find_one = AsyncMock()
     db.messages.count_documents = AsyncMock()
     db.messages.distinct = AsyncMock()
+    # Messages live in a single monthly collection backed by ``db.messages``
+    db.list_collection_names = AsyncMock(return_value=["messages_2024_01"])
+    db.__getitem__.return_value = db.messages
 
     return db
 
@@ -115,6 +118,27 @@ class TestSessionService:
         assert total == 1
         assert sessions[0].session_id == "session-123"
 
+    @pytest.mark.asyncio
+    async def test_list_sessions_filters_by_tenant(self, session_service, mock_db):
+        """Test that listing uses the denormalized user_id instead of $in lists."""
+        user_id = str(ObjectId())
+        project_id = ObjectId()
+
+        mock_db.sessions.count_documents = AsyncMock(return_value=0)
+        mock_cursor = MagicMock()
+        mock_cursor.sort.return_value.skip.return_value.limit.return_value.__aiter__ = (
+            lambda self: async_iter([])
+        )
+        mock_db.sessions.find.return_value = mock_cursor
+
+        await session_service.list_sessions(
+            user_id, {"projectId": project_id}, 0, 10, "started_at", "desc"
+        )
+
+        query = mock_db.sessions.find.call_args[0][0]
+        assert query == {"user_id": ObjectId(user_id), "projectId": project_id}
+        mock_db.projects.find.assert_not_called()
+
     @pytest.mark.asyncio
     async def test_get_session_by_object_id(self, session_service, mock_db):
         """Test getting a session by MongoDB ObjectId."""
@@ -252,7 +276,7 @@ class TestSessionService:
 
         # Mock messages
         mock_cursor = MagicMock()
-        mock_cursor.sort.return_value.skip.return_value.limit.return_value.__aiter__ = (
+        mock_cursor.sort.return_value.limit.return_value.__aiter__ = (
             lambda self: async_iter(mock_messages)
         )
         mock_db.messages.find.return_value = mock_cursor
@@ -324,3 +348,150 @@ class TestSessionService:
         assert len(sessions) == 1
         assert sessions[0].total_cost == 123.456
         assert isinstance(sessions[0].total_cost, float)
+
+    @pytest.mark.asyncio
+    async def test_get_message_thread_uses_in_memory_tree(
+        self, session_service, mock_db
+    ):
+        """Test thread retrieval fetches tree fields once, then hydrates."""
+        user_id = str(ObjectId())
+        project_id = ObjectId()
+        session_oid = ObjectId()
+        now = datetime.now(UTC)
+
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={
+                "_id": session_oid,
+                "sessionId": "session-123",
+                "projectId": project_id,
+                "startedAt": now,
+                "endedAt": now,
+            }
+        )
+        mock_db.projects.find_one = AsyncMock(
+            return_value={"_id": project_id, "user_id": ObjectId(user_id)}
+        )
+
+        links = [("m1", None), ("m2", "m1"), ("m3", "m2"), ("m4", "m3")]
+        tree_docs = [{"uuid": u, "parentUuid": p} for u, p in links]
+        full_docs = [
+            {
+                "_id": ObjectId(),
+                "uuid": u,
+                "parentUuid": p,
+                "type": "user",
+                "sessionId": "session-123",
+                "content": u,
+                "timestamp": now,
+            }
+            for u, p in links
+        ]
+        session_service.messages.find_session_messages = AsyncMock(
+            side_effect=[tree_docs, full_docs[:3]]
+        )
+
+        thread = await session_service.get_message_thread(
+            user_id, str(session_oid), "m2", 1
+        )
+
+        assert thread["target"].uuid == "m2"
+        assert [m.uuid for m in thread["ancestors"]] == ["m1"]
+        assert [m.uuid for m in thread["descendants"]] == ["m3"]
+
+        # Only the depth-limited thread is hydrated
+        hydrate_call = session_service.messages.find_session_messages.call_args
+        assert set(hydrate_call.kwargs["extra_filter"]["uuid"]["$in"]) == {
+            "m1",
+            "m2",
+            "m3",
+        }
+
+    @pytest.mark.asyncio
+    async def test_get_message_thread_unknown_message(self, session_service, mock_db):
+        """Test thread retrieval returns None for a message not in the session."""
+        user_id = str(ObjectId())
+        project_id = ObjectId()
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={"_id": ObjectId(), "sessionId": "s", "projectId": project_id}
+        )
+        mock_db.projects.find_one = AsyncMock(
+            return_value={"_id": project_id, "user_id": ObjectId(user_id)}
+        )
+        session_service.messages.find_session_messages = AsyncMock(
+            return_value=[]
+        )
+
+        thread = await session_service.get_message_thread(
+            user_id, str(ObjectId()), "missing", 5
+        )
+
+        assert thread is None
+
+    @pytest.mark.asyncio
+    async def test_generate_summary_reads_head_window(self, session_service, mock_db):
+        """Test summary generation uses a projected head window."""
+        user_id = str(ObjectId())
+        project_id = ObjectId()
+        session_oid = ObjectId()
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={
+                "_id": session_oid,
+                "sessionId": "session-123",
+                "projectId": project_id,
+            }
+        )
+        mock_db.projects.find_one = AsyncMock(
+            return_value={"_id": project_id, "user_id": ObjectId(user_id)}
+        )
+        mock_db.sessions.update_one = AsyncMock()
+
+        rolling = session_service.messages
+        rolling.count_session_messages = AsyncMock(return_value=500)
+        rolling.find_session_messages = AsyncMock(
+            side_effect=[
+                [{"uuid": "last", "timestamp": datetime.now(UTC)}],
+                [{"type": "user", "content": "How do I fix this bug?"}],
+            ]
+        )
+
+        summary = await session_service.generate_summary(user_id, str(session_oid))
+
+        assert summary == "How do I fix this bug?"
+        head_call = rolling.find_session_messages.call_args_list[1]
+        assert head_call.kwargs["limit"] == 3
+        assert head_call.kwargs["projection"] == {"type": 1, "content": 1}
+        update = mock_db.sessions.update_one.call_args[0][1]["$set"]
+        assert update["summaryContentHash"]
+
+    @pytest.mark.asyncio
+    async def test_generate_summary_skips_unchanged_content(
+        self, session_service, mock_db
+    ):
+        """Test an unchanged conversation returns the stored summary."""
+        user_id = str(ObjectId())
+        project_id = ObjectId()
+        last = {"uuid": "last", "timestamp": datetime(2024, 1, 1, tzinfo=UTC)}
+        content_hash = session_service._summary_content_hash(42, last)
+        mock_db.sessions.find_one = AsyncMock(
+            return_value={
+                "_id": ObjectId(),
+                "sessionId": "session-123",
+                "projectId": project_id,
+                "summary": "Existing summary",
+                "summaryContentHash": content_hash,
+            }
+        )
+        mock_db.projects.find_one = AsyncMock(
+            return_value={"_id": project_id, "user_id": ObjectId(user_id)}
+        )
+        mock_db.sessions.update_one = AsyncMock()
+
+        rolling = session_service.messages
+        rolling.count_session_messages = AsyncMock(return_value=42)
+        rolling.find_session_messages = AsyncMock(return_value=[last])
+
+        summary = await session_service.generate_summary(user_id, str(ObjectId()))
+
+        assert summary == "Existing summary"
+        assert rolling.find_session_messages.await_count == 1
+        mock_db.sessions.update_one.assert_not_called()
@@ -0,0 +1,145 @@
+"""Tests for the materialized admin statistics snapshots."""
+
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from bson import ObjectId
+
+from app.services.stats_snapshot import (
+    SYSTEM_STATS_ID,
+    StatsSnapshotService,
+    empty_storage_delta,
+)
+
+USER_ID = "507f1f77bcf86cd799439011"
+
+
+@pytest.fixture
+def mock_db():
+    """Mock database with the collections used by the snapshot service."""
+    db = MagicMock()
+    db.users.update_one = AsyncMock()
+    db.system_stats.update_one = AsyncMock()
+    db.system_stats.replace_one = AsyncMock()
+    db.system_stats.find_one = AsyncMock(return_value=None)
+    return db
+
+
+class TestStatsSnapshotService:
+    """Test cases for StatsSnapshotService."""
+
+    @pytest.mark.asyncio
+    async def test_record_ingest_increments_user_and_system(self, mock_db):
+        """Test ingest deltas are applied to both snapshots."""
+        delta = empty_storage_delta()
+        delta["sessions"] = {"count": 1, "bytes": 200}
+        delta["messages"] = {"count": 3, "bytes": 900}
+
+        await StatsSnapshotService(mock_db).record_ingest(USER_ID, delta)
+
+        user_filter, user_update = mock_db.users.update_one.call_args[0]
+        assert user_filter == {"_id": ObjectId(USER_ID)}
+        assert user_update["$inc"] == {
+            "total_disk_usage": 1100,
+            "project_count": 0,
+            "session_count": 1,
+            "message_count": 3,
+        }
+        assert "storage_dirty" not in user_update["$set"]
+
+        system_filter, system_update = mock_db.system_stats.update_one.call_args[0]
+        assert system_filter == {"_id": SYSTEM_STATS_ID}
+        assert system_update["$inc"]["breakdown.messages_count"] == 3
+        assert system_update["$inc"]["breakdown.messages_bytes"] == 900
+        assert system_update["$inc"]["total_document_count"] == 4
+        assert mock_db.system_stats.update_one.call_args[1]["upsert"] is True
+
+    @pytest.mark.asyncio
+    async def test_record_ingest_skips_empty_delta(self, mock_db):
+        """Test a batch that wrote nothing does not touch the snapshots."""
+        await StatsSnapshotService(mock_db).record_ingest(
+            USER_ID, empty_storage_delta()
+        )
+
+        mock_db.users.update_one.assert_not_called()
+        mock_db.system_stats.update_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_record_deletion_marks_user_dirty(self, mock_db):
+        """Test deletions decrement counts and flag the owner for recompute."""
+        await StatsSnapshotService(mock_db).record_deletion(
+            USER_ID, projects=1, sessions=2, messages=10
+        )
+
+        _, user_update = mock_db.users.update_one.call_args[0]
+        assert user_update["$inc"]["project_count"] == -1
+        assert user_update["$inc"]["session_count"] == -2
+        assert user_update["$inc"]["message_count"] == -10
+        assert user_update["$set"]["storage_dirty"] is True
+
+    @pytest.mark.asyncio
+    async def test_record_ingest_never_raises(self, mock_db):
+        """Test snapshot failures do not fail the triggering write."""
+        mock_db.users.update_one.side_effect = Exception("connection lost")
+        delta = empty_storage_delta()
+        delta["messages"] = {"count": 1, "bytes": 100}
+
+        await StatsSnapshotService(mock_db).record_ingest(USER_ID, delta)
+
+    @pytest.mark.asyncio
+    async def test_reconcile_system_uses_collection_stats(self, mock_db):
+        """Test reconciliation reads collStats instead of documents."""
+        mock_db.list_collection_names = AsyncMock(
+            return_value=[
+                "projects",
+                "sessions",
+                "messages_2024_01",
+                "messages_2024_02",
+            ]
+        )
+        coll_stats = {
+            "projects": {"count": 2, "size": 400},
+            "sessions": {"count": 5, "size": 1000},
+            "messages_2024_01": {"count": 10, "size": 5000},
+            "messages_2024_02": {"count": 20, "size": 8000},
+        }
+        mock_db.command = AsyncMock(side_effect=lambda cmd, name: coll_stats[name])
+
+        result = await StatsSnapshotService(mock_db).reconcile_system()
+
+        assert result["breakdown"] == {
+            "projects_count": 2,
+            "projects_bytes": 400,
+            "sessions_count": 5,
+            "sessions_bytes": 1000,
+            "messages_count": 30,
+            "messages_bytes": 13000,
+        }
+        assert result["total_disk_usage"] == 14400
+        assert result["total_document_count"] == 37
+        snapshot = mock_db.system_stats.replace_one.call_args[0][1]
+        assert snapshot["_id"] == SYSTEM_STATS_ID
+        assert "reconciled_at" in snapshot
+
+    @pytest.mark.asyncio
+    async def test_get_system_metrics_reads_snapshot(self, mock_db):
+        """Test an existing snapshot is returned without scanning collections."""
+        mock_db.system_stats.find_one = AsyncMock(
+            return_value={
+                "_id": SYSTEM_STATS_ID,
+                "total_disk_usage": 1500,
+                "total_document_count": 12,
+                "breakdown": {"messages_count": 10, "messages_bytes": 1200},
+                "reconciled_at": "2024-01-01",
+                "updated_at": "2024-01-02",
+            }
+        )
+        mock_db.list_collection_names = AsyncMock()
+
+        result = await StatsSnapshotService(mock_db).get_system_metrics()
+
+        assert result["total_disk_usage"] == 1500
+        assert result["breakdown"]["messages_count"] == 10
+        assert result["breakdown"]["sessions_count"] == 0
+        assert result["calculated_at"] == "2024-01-02"
+        mock_db.list_collection_names.assert_not_called()
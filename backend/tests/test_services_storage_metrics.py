@@ -0,0 +1,178 @@
+"""Tests for storage metrics recalculation."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bson import ObjectId
+
+from app.services.storage_metrics import STORAGE_JOB_ID, StorageMetricsService
+
+USER_A = ObjectId()
+USER_B = ObjectId()
+
+
+class _AsyncIter:
+    """Async iterator over a fixed list of documents."""
+
+    def __init__(self, items):
+        self._items = list(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._items:
+            raise StopAsyncIteration
+        return self._items.pop(0)
+
+
+@pytest.fixture
+def mock_db():
+    """Mock database with in-memory checkpoint partials."""
+    db = MagicMock()
+    partials: dict[str, dict] = {}
+
+    async def replace_partial(filter_, doc, upsert=False):
+        partials[filter_["_id"]] = doc
+
+    db.storage_job_partials.replace_one = AsyncMock(side_effect=replace_partial)
+    db.storage_job_partials.delete_many = AsyncMock()
+    db.storage_job_partials.find = MagicMock(
+        side_effect=lambda query: _AsyncIter(
+            p for p in partials.values() if p["job_id"] == query["job_id"]
+        )
+    )
+    db.storage_jobs.find_one = AsyncMock(return_value=None)
+    db.storage_jobs.replace_one = AsyncMock()
+    db.storage_jobs.update_one = AsyncMock()
+    db.users.distinct = AsyncMock(return_value=[USER_A, USER_B])
+    db.users.bulk_write = AsyncMock()
+    db.list_collection_names = AsyncMock(
+        return_value=["projects", "sessions", "messages_2024_01", "messages_2024_02"]
+    )
+
+    owners = {
+        "projects": [{"_id": USER_A, "count": 1, "bytes": 100}],
+        "sessions": [{"_id": USER_A, "count": 2, "bytes": 300}],
+        "messages_2024_01": [{"_id": USER_A, "count": 5, "bytes": 1000}],
+        "messages_2024_02": [{"_id": USER_A, "count": 3, "bytes": 600}],
+    }
+    collections: dict[str, MagicMock] = {}
+
+    def get_collection(name):
+        if name not in collections:
+            coll = MagicMock()
+            cursor = MagicMock()
+            cursor.to_list = AsyncMock(return_value=owners[name])
+            coll.aggregate = MagicMock(return_value=cursor)
+            collections[name] = coll
+        return collections[name]
+
+    db.__getitem__ = MagicMock(side_effect=get_collection)
+    db.collections = collections
+    return db
+
+
+@pytest.fixture
+def mock_connection_manager():
+    """Patch websocket progress broadcasts."""
+    with patch("app.services.storage_metrics.connection_manager") as manager:
+        manager.broadcast_storage_progress = AsyncMock()
+        yield manager
+
+
+class TestBatchUpdateAllUsers:
+    """Test cases for the all-users storage recalculation job."""
+
+    @pytest.mark.asyncio
+    async def test_scans_each_collection_once(self, mock_db, mock_connection_manager):
+        """Test every collection is aggregated once, grouped by owner."""
+        result = await StorageMetricsService(mock_db).batch_update_all_users()
+
+        assert result["users_updated"] == 2
+        assert result["collections_scanned"] == 4
+        assert set(mock_db.collections) == {
+            "projects",
+            "sessions",
+            "messages_2024_01",
+            "messages_2024_02",
+        }
+        for coll in mock_db.collections.values():
+            coll.aggregate.assert_called_once()
+            pipeline = coll.aggregate.call_args[0][0]
+            assert pipeline[-1]["$group"]["_id"] == "$user_id"
+
+        operations = mock_db.users.bulk_write.call_args[0][0]
+        updates = {op._filter["_id"]: op._doc["$set"] for op in operations}
+        assert updates[USER_A]["project_count"] == 1
+        assert updates[USER_A]["session_count"] == 2
+        assert updates[USER_A]["message_count"] == 8
+        assert updates[USER_A]["total_disk_usage"] == 2000
+        # Users without any data are reset to zero
+        assert updates[USER_B]["message_count"] == 0
+        assert updates[USER_B]["total_disk_usage"] == 0
+
+        final_event = mock_connection_manager.broadcast_storage_progress.call_args
+        assert final_event.kwargs["completed"] is True
+        assert final_event.args[1:3] == (4, 4)
+
+    @pytest.mark.asyncio
+    async def test_resumes_from_checkpoint(self, mock_db, mock_connection_manager):
+        """Test an unfinished job skips collections it already scanned."""
+        job_id = str(ObjectId())
+        mock_db.storage_jobs.find_one = AsyncMock(
+            return_value={
+                "_id": STORAGE_JOB_ID,
+                "job_id": job_id,
+                "status": "running",
+                "collections": [
+                    "projects",
+                    "sessions",
+                    "messages_2024_01",
+                    "messages_2024_02",
+                ],
+                "completed": ["projects", "sessions", "messages_2024_01"],
+            }
+        )
+
+        result = await StorageMetricsService(mock_db).batch_update_all_users()
+
+        assert result["job_id"] == job_id
+        assert set(mock_db.collections) == {"messages_2024_02"}
+        mock_db.storage_jobs.replace_one.assert_not_called()
+        mock_db.storage_job_partials.delete_many.assert_awaited_with({"job_id": job_id})
+
+
+class TestRollingMessagesMetrics:
+    """Test cases for estimated per-user message metrics."""
+
+    @pytest.mark.asyncio
+    async def test_estimate_reports_largest_average(self):
+        """Test the estimate names its maximum as an average, not a max."""
+        db = MagicMock()
+        db.list_collection_names = AsyncMock(
+            return_value=["messages_2024_01", "messages_2024_02"]
+        )
+        counts = {"messages_2024_01": 4, "messages_2024_02": 1}
+        averages = {"messages_2024_01": 100, "messages_2024_02": 400}
+
+        def get_collection(name):
+            coll = MagicMock()
+            coll.count_documents = AsyncMock(return_value=counts[name])
+            return coll
+
+        db.__getitem__ = MagicMock(side_effect=get_collection)
+        db.command = AsyncMock(
+            side_effect=lambda cmd, name: {"avgObjSize": averages[name]}
+        )
+
+        metrics = await StorageMetricsService(db)._calculate_rolling_messages_metrics(
+            USER_A
+        )
+
+        assert metrics == {
+            "total_size": 800,
+            "document_count": 5,
+            "avg_size": 160,
+            "max_avg_size": 400,
+        }
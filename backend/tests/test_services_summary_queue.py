@@ -0,0 +1,72 @@
+"""Tests for the background summary queue."""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.summary_queue import SummaryQueue
+
+
+@pytest.fixture
+def summary_queue():
+    """Create a summary queue with a mock database."""
+    return SummaryQueue(MagicMock(), workers=1)
+
+
+class TestSummaryQueue:
+    """Test cases for SummaryQueue."""
+
+    @pytest.mark.asyncio
+    async def test_enqueue_generates_summary_in_background(self, summary_queue):
+        """Test queued sessions are summarized by a worker."""
+        with patch(
+            "app.services.session.SessionService.generate_summary",
+            new_callable=AsyncMock,
+        ) as mock_generate:
+            assert summary_queue.enqueue("user-1", "session-1") is True
+            await summary_queue.join()
+
+            mock_generate.assert_awaited_once_with("user-1", "session-1")
+            assert summary_queue.pending_count == 0
+
+        await summary_queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_enqueue_deduplicates_pending_sessions(self, summary_queue):
+        """Test a session already waiting in the queue is not added twice."""
+        with patch(
+            "app.services.session.SessionService.generate_summary",
+            new_callable=AsyncMock,
+        ) as mock_generate:
+            assert summary_queue.enqueue("user-1", "session-1") is True
+            assert summary_queue.enqueue("user-1", "session-1") is False
+            assert summary_queue.enqueue("user-1", "session-2") is True
+            await summary_queue.join()
+
+            assert mock_generate.await_count == 2
+
+        await summary_queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_worker_survives_generation_errors(self, summary_queue):
+        """Test a failing summary does not stop later ones."""
+        with patch(
+            "app.services.session.SessionService.generate_summary",
+            new_callable=AsyncMock,
+            side_effect=[Exception("boom"), "ok"],
+        ) as mock_generate:
+            summary_queue.enqueue("user-1", "session-1")
+            summary_queue.enqueue("user-1", "session-2")
+            await summary_queue.join()
+
+            assert mock_generate.await_count == 2
+
+        await summary_queue.stop()
+
+    @pytest.mark.asyncio
+    async def test_enqueue_rejects_when_full(self):
+        """Test enqueue returns False once the queue is at capacity."""
+        queue = SummaryQueue(MagicMock(), workers=1, max_size=1)
+        with patch.object(queue, "_ensure_workers"):
+            assert queue.enqueue("user-1", "session-1") is True
+            assert queue.enqueue("user-1", "session-2") is False
@@ -0,0 +1,111 @@
+"""Tests for canonical token and cost fields."""
+
+from decimal import Decimal
+
+from bson import Decimal128
+
+from app.services.token_fields import (
+    canonical_cost,
+    canonical_tokens,
+    stamp_canonical_fields,
+)
+
+
+class TestCanonicalTokens:
+    """Test cases for canonical_tokens."""
+
+    def test_usage_fields(self):
+        """Test all four counters are read from usage and totalled."""
+        doc = {
+            "usage": {
+                "input_tokens": 3,
+                "output_tokens": 7,
+                "cache_creation_input_tokens": 100,
+                "cache_read_input_tokens": 200,
+            }
+        }
+
+        assert canonical_tokens(doc) == {
+            "input": 3,
+            "output": 7,
+            "cache_creation": 100,
+            "cache_read": 200,
+            "total": 310,
+        }
+
+    def test_usage_source_precedence(self):
+        """Test top-level usage wins over metadata and messageData usage."""
+        doc = {
+            "usage": {"input_tokens": 1},
+            "metadata": {"usage": {"input_tokens": 50}},
+            "messageData": {"usage": {"input_tokens": 90}},
+        }
+
+        assert canonical_tokens(doc)["input"] == 1
+
+    def test_metadata_usage(self):
+        """Test usage sent at the top level of the message is used."""
+        doc = {"metadata": {"usage": {"input_tokens": 4, "output_tokens": 6}}}
+
+        assert canonical_tokens(doc)["total"] == 10
+
+    def test_legacy_counters(self):
+        """Test legacy counters are used when usage has no value."""
+        doc = {"tokensInput": 12, "outputTokens": 8}
+
+        tokens = canonical_tokens(doc)
+
+        assert tokens["input"] == 12
+        assert tokens["output"] == 8
+        assert tokens["total"] == 20
+
+    def test_missing_and_invalid_values(self):
+        """Test documents without usable counts resolve to zeros."""
+        doc = {"usage": {"input_tokens": "invalid", "output_tokens": None}}
+
+        assert canonical_tokens(doc) == {
+            "input": 0,
+            "output": 0,
+            "cache_creation": 0,
+            "cache_read": 0,
+            "total": 0,
+        }
+
+
+class TestCanonicalCost:
+    """Test cases for canonical_cost."""
+
+    def test_converts_stored_types(self):
+        """Test Decimal128, Decimal and numbers become floats."""
+        assert canonical_cost(Decimal128("0.125")) == 0.125
+        assert canonical_cost(Decimal("1.5")) == 1.5
+        assert canonical_cost(2) == 2.0
+
+    def test_none(self):
+        """Test a missing cost stays missing."""
+        assert canonical_cost(None) is None
+
+
+class TestStampCanonicalFields:
+    """Test cases for stamp_canonical_fields."""
+
+    def test_stamps_tokens_and_cost(self):
+        """Test both canonical fields are set from the document."""
+        doc = {
+            "usage": {"input_tokens": 3, "output_tokens": 7},
+            "costUsd": Decimal128("0.25"),
+        }
+
+        stamp_canonical_fields(doc)
+
+        assert doc["tokens"]["total"] == 10
+        assert doc["cost"] == 0.25
+
+    def test_no_cost_without_cost_usd(self):
+        """Test documents without a cost get tokens but no cost field."""
+        doc = {"costUsd": None}
+
+        stamp_canonical_fields(doc)
+
+        assert doc["tokens"]["total"] == 0
+        assert "cost" not in doc
@@ -0,0 +1,60 @@
+"""Tests for tool result error classification."""
+
+from app.services.tool_errors import ToolError, classify_tool_result, error_fields
+
+
+class TestClassifyToolResult:
+    """Test cases for classify_tool_result."""
+
+    def test_explicit_error(self):
+        """Test an error in the tool output is critical."""
+        doc = {"toolUseResult": {"error": "File does not exist"}}
+
+        assert classify_tool_result(doc) == ToolError(
+            "execution_error", "critical", "File does not exist"
+        )
+
+    def test_stderr_with_indicator(self):
+        """Test stderr is an error only when it reads like one."""
+        failing = {"toolUseResult": {"stderr": "fatal: not a git repository"}}
+        noisy = {"toolUseResult": {"stderr": "npm WARN deprecated", "exitCode": 1}}
+
+        assert classify_tool_result(failing).error_type == "stderr_error"
+        assert classify_tool_result(noisy) is None
+
+    def test_non_zero_exit_code(self):
+        """Test a non-zero exit code quotes stdout."""
+        doc = {"toolUseResult": {"stdout": "3 tests failed", "exitCode": 1}}
+
+        assert classify_tool_result(doc) == ToolError(
+            "exit_code_error", "warning", "Exit code 1: 3 tests failed"
+        )
+
+    def test_is_error_flag(self):
+        """Test the tool result's own error flag is honoured."""
+        doc = {
+            "toolUseResult": "Error: old_string not found",
+            "messageData": {"type": "tool_result", "is_error": True},
+            "content": "old_string not found",
+        }
+
+        assert classify_tool_result(doc) == ToolError(
+            "tool_error", "warning", "old_string not found"
+        )
+
+    def test_success(self):
+        """Test successful results are not errors."""
+        doc = {"toolUseResult": {"stdout": "ok", "exitCode": 0}}
+
+        assert classify_tool_result(doc) is None
+        assert error_fields(doc) == {"isError": False}
+
+    def test_error_fields(self):
+        """Test the fields stamped onto failed results."""
+        doc = {"toolUseResult": {"error": "boom"}}
+
+        assert error_fields(doc) == {
+            "isError": True,
+            "errorType": "execution_error",
+            "errorSeverity": "critical",
+        }
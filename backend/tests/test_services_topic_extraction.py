@@ -0,0 +1,303 @@
+"""Tests for compiled topic matching and cached session topics."""
+
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from bson import ObjectId
+
+from app.schemas.analytics import TimeRange, TopicCategory
+from app.services.analytics import AnalyticsService
+from app.services.topic_extraction import (
+    WATERMARK_LAG,
+    SessionTopics,
+    SessionTopicStore,
+    TopicMatcher,
+)
+
+RULES = {
+    "Web": {
+        "keywords": ["react", "css"],
+        "file_extensions": [".js", ".tsx"],
+        "category": TopicCategory.WEB_DEVELOPMENT,
+        "weight": 1.0,
+    },
+    "Testing": {
+        "keywords": ["test", "unit test"],
+        "file_extensions": [".test.js"],
+        "category": TopicCategory.TESTING_QA,
+        "weight": 1.0,
+    },
+}
+
+T0 = datetime(2025, 1, 1, tzinfo=UTC)
+
+
+def _message(session_id, content, minutes, **fields):
+    return {
+        "sessionId": session_id,
+        "type": "user",
+        "content": content,
+        "createdAt": T0 + timedelta(minutes=minutes),
+        **fields,
+    }
+
+
+class TestTopicMatcher:
+    """Test cases for the Aho-Corasick topic matcher."""
+
+    def test_keywords_match_whole_words(self):
+        """Test keywords inside other words are not matched."""
+        matcher = TopicMatcher(RULES)
+
+        matches = set(matcher.scan("React tests; a CSS unit test, reactive"))
+
+        assert matches == {
+            ("Web", "react", False),
+            ("Web", "css", False),
+            ("Testing", "unit test", False),
+            ("Testing", "test", False),
+        }
+
+    def test_extensions_report_file_paths(self):
+        """Test extensions match at the end of file names only."""
+        matcher = TopicMatcher(RULES)
+
+        matches = set(
+            matcher.scan("edit src/app.test.js and ui/App.tsx, not data.json or .js")
+        )
+
+        assert matches == {
+            ("Web", "src/app.test.js", True),
+            ("Testing", "src/app.test.js", True),
+            ("Testing", "test", False),
+            ("Web", "ui/app.tsx", True),
+        }
+
+    def test_version_follows_rules(self):
+        """Test cached state is tied to the rules it was built from."""
+        changed = {**RULES, "Docs": {"keywords": ["readme"]}}
+
+        assert TopicMatcher(RULES).version == TopicMatcher(dict(RULES)).version
+        assert TopicMatcher(RULES).version != TopicMatcher(changed).version
+
+
+class TestSessionTopics:
+    """Test cases for per-session topic state."""
+
+    def test_fold_messages_and_round_trip(self):
+        """Test matches, tools and watermark survive storage."""
+        matcher = TopicMatcher(RULES)
+        topics = SessionTopics("s1", matcher.version)
+
+        topics.add_message(
+            _message(
+                "s1",
+                [{"type": "text", "text": "React"}, {"type": "image"}],
+                1,
+                _id="m1",
+                cwd="/src/react",
+            ),
+            matcher,
+        )
+        topics.add_message(
+            _message(
+                "s1",
+                None,
+                2,
+                _id="m2",
+                type="tool_use",
+                messageData={"name": "mcp.search"},
+            ),
+            matcher,
+        )
+        restored = SessionTopics.from_document(topics.to_document())
+
+        assert restored.terms == {"Web": {"react"}}
+        assert restored.tool_usage == {"mcp.search": 1}
+        assert restored.message_count == 2
+        assert restored.watermark == T0 + timedelta(minutes=2)
+        assert not restored.is_new(_message("s1", "", 1, _id="m1"))
+        assert not restored.is_new(_message("s1", "", 2, _id="m2"))
+        assert restored.is_new(_message("s1", "", 3, _id="m3"))
+
+    def test_late_commits_behind_the_watermark_are_new(self):
+        """Test messages stamped before the watermark but written after it."""
+        matcher = TopicMatcher(RULES)
+        topics = SessionTopics("s1", matcher.version)
+        topics.add_message(_message("s1", "react", 1, _id="m1"), matcher)
+        topics.add_message(_message("s1", "css", 2, _id="m2"), matcher)
+        topics.add_message(_message("s1", "css", 2, _id="m3"), matcher)
+
+        restored = SessionTopics.from_document(topics.to_document())
+
+        assert set(restored.recent_ids) == {"m1", "m2", "m3"}
+        assert not restored.is_new(_message("s1", "", 2, _id="m3"))
+        assert restored.is_new(_message("s1", "", 2, _id="m4"))
+        assert restored.is_new(_message("s1", "", 1, _id="m5"))
+        lag_minutes = WATERMARK_LAG.total_seconds() / 60
+        assert not restored.is_new(_message("s1", "", 1 - lag_minutes, _id="m6"))
+
+    def test_recent_ids_are_pruned_behind_the_lag(self):
+        """Test only ids within the lag of the watermark are stored."""
+        matcher = TopicMatcher(RULES)
+        topics = SessionTopics("s1", matcher.version)
+        topics.add_message(_message("s1", "react", 1, _id="m1"), matcher)
+        later = 2 + WATERMARK_LAG.total_seconds() / 60
+        topics.add_message(_message("s1", "css", later, _id="m2"), matcher)
+
+        assert [pair[0] for pair in topics.to_document()["recentIds"]] == ["m2"]
+
+    @pytest.mark.asyncio
+    async def test_store_invalidate(self):
+        """Test sessions are dropped by a session id filter."""
+        db = MagicMock()
+        db.session_topics.delete_many = AsyncMock()
+
+        await SessionTopicStore(db).invalidate("s1")
+        await SessionTopicStore(db).invalidate()
+
+        assert db.session_topics.delete_many.await_args_list[0].args == ({"_id": "s1"},)
+        assert db.session_topics.delete_many.await_args_list[1].args == ({},)
+
+
+@pytest.fixture
+def topic_service():
+    """Analytics service whose topic cache and message stream are in memory."""
+    db = MagicMock()
+    service = AnalyticsService(db, None)
+    service._get_topic_rules = lambda: RULES
+    service.rolling_service.get_sessions_collections = AsyncMock(
+        return_value=["messages_2025_01"]
+    )
+    service.streamed = []
+    service.queries = []
+
+    async def stream_messages(collections, query, projection):
+        service.queries.append(query)
+        for message in service.streamed:
+            yield message
+
+    service.rolling_service.stream_messages = stream_messages
+
+    cache: dict[str, dict] = {}
+
+    async def load(self, session_ids, version):
+        return {
+            sid: SessionTopics.from_document(cache[sid])
+            for sid in session_ids
+            if sid in cache and cache[sid]["version"] == version
+        }
+
+    async def save(self, topics):
+        for t in topics:
+            cache[t.session_id] = t.to_document()
+
+    with patch.object(SessionTopicStore, "load", load), patch.object(
+        SessionTopicStore, "save", save
+    ), patch("app.services.analytics._topic_matcher", None):
+        yield service
+
+
+class TestSessionTopicCache:
+    """Test cases for incremental topic extraction."""
+
+    @pytest.mark.asyncio
+    async def test_only_new_messages_are_scanned(self, topic_service):
+        """Test a session update scans messages since the watermark."""
+        session = {"sessionId": "s1", "partitions": ["messages_2025_01"]}
+        topic_service.streamed = [
+            _message("s1", "react css src/app.tsx", 1, _id="m1"),
+            _message("s1", "more react", 2, _id="m2"),
+        ]
+
+        first = await topic_service._get_session_topics([{**session, "updatedAt": T0}])
+        assert first["s1"].message_count == 2
+        assert "createdAt" not in topic_service.queries[0]
+
+        # Session updated after the cache: only newer messages are folded in
+        topic_service.streamed = [
+            _message("s1", "more react", 2, _id="m2"),
+            _message("s1", "unit test for it", 3, _id="m3"),
+        ]
+        updated = datetime.now(UTC) + timedelta(minutes=1)
+        second = await topic_service._get_session_topics(
+            [{**session, "updatedAt": updated}]
+        )
+        assert topic_service.queries[1]["createdAt"] == {
+            "$gte": T0 + timedelta(minutes=2) - WATERMARK_LAG
+        }
+        assert second["s1"].message_count == 3
+        assert second["s1"].terms == {
+            "Web": {"react", "css"},
+            "Testing": {"unit test", "test"},
+        }
+
+        # Session unchanged since: no messages are read
+        await topic_service._get_session_topics([{**session, "updatedAt": T0}])
+        assert len(topic_service.queries) == 2
+
+    @pytest.mark.asyncio
+    async def test_extract_session_topics(self, topic_service):
+        """Test topics above the threshold are extracted with their keywords."""
+        topic_service._resolve_session_id = AsyncMock(return_value="s1")
+        topic_service.db.sessions.find_one = AsyncMock(
+            return_value={"sessionId": "s1", "updatedAt": T0}
+        )
+        topic_service.streamed = [
+            _message("s1", "react and css in src/app.tsx plus a test", 1)
+        ]
+
+        response = await topic_service.extract_session_topics("s1", 0.3)
+
+        [web] = response.topics
+        assert web.name == "Web"
+        assert web.relevance_score == pytest.approx(2.8 / 5)
+        assert web.keywords == ["css", "react", "src/app.tsx"]
+        assert response.suggested_topics == ["Testing"]
+
+    @pytest.mark.asyncio
+    async def test_topic_suggestions_count_sessions(self, topic_service):
+        """Test popular topics and combinations come from session topics."""
+        sessions = [
+            {"sessionId": "s1", "updatedAt": T0},
+            {"sessionId": "s2", "updatedAt": T0},
+        ]
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(side_effect=[sessions, []])
+        topic_service.db.sessions.find = MagicMock(return_value=cursor)
+        topic_service.streamed = [
+            _message("s1", "react css a.js b.js", 1),
+            _message("s1", "unit test test", 1),
+            _message("s2", "react css c.js", 1),
+            _message("s2", "x.test.js y.test.js", 2),
+        ]
+
+        response = await topic_service.get_topic_suggestions(TimeRange.LAST_7_DAYS)
+
+        assert [(t.name, t.session_count) for t in response.popular_topics] == [
+            ("Testing", 2),
+            ("Web", 2),
+        ]
+        assert response.popular_topics[0].trend == "trending"
+        [combination] = response.topic_combinations
+        assert combination.topics == ["Testing", "Web"]
+        assert combination.frequency == 2
+        assert combination.confidence == 1.0
+        session_filter = topic_service.db.sessions.find.call_args_list[0].args[0]
+        assert "$gte" in session_filter["startedAt"]
+
+    @pytest.mark.asyncio
+    async def test_topic_suggestions_scoped_to_user(self, topic_service):
+        """Test both periods only read the current user's sessions."""
+        user_id = "507f1f77bcf86cd799439011"
+        topic_service.user_id = user_id
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(side_effect=[[{"sessionId": "s1"}], []])
+        topic_service.db.sessions.find = MagicMock(return_value=cursor)
+
+        await topic_service.get_topic_suggestions(TimeRange.LAST_7_DAYS)
+
+        filters = [c.args[0] for c in topic_service.db.sessions.find.call_args_list]
+        assert len(filters) == 2
+        assert all(f["user_id"] == ObjectId(user_id) for f in filters)
@@ -249,6 +249,11 @@ async def test_delete_user(user_service, mock_db):
     mock_db.projects.delete_many = AsyncMock(return_value=MagicMock(deleted_count=2))
     mock_db.sessions.delete_many = AsyncMock(return_value=MagicMock(deleted_count=5))
     mock_db.messages.delete_many = AsyncMock(return_value=MagicMock(deleted_count=50))
+    # Messages are deleted from every monthly collection
+    mock_db.list_collection_names = AsyncMock(
+        return_value=["messages_2024_01", "messages_2024_02"]
+    )
+    mock_db.__getitem__.return_value = mock_db.messages
 
     success = await user_service.delete_user(user_id)
     assert success is True
@@ -257,7 +262,8 @@ async def test_delete_user(user_service, mock_db):
     mock_db.users.delete_one.assert_called_once_with({"_id": ObjectId(user_id)})
     mock_db.projects.delete_many.assert_called_once()
     mock_db.sessions.delete_many.assert_called_once()
-    mock_db.messages.delete_many.assert_called_once()
+    assert mock_db.messages.delete_many.call_count == 2
+    mock_db.messages.delete_many.assert_called_with({"user_id": ObjectId(user_id)})
 
 
 @pytest.mark.asyncio
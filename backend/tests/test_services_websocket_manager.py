@@ -337,6 +337,27 @@ class TestConnectionManager:
             assert session_id in manager.session_connections
             assert websockets[i] in manager.session_connections[session_id]
 
+    @pytest.mark.asyncio
+    async def test_storage_progress_only_reaches_admins(self, manager):
+        """Test storage job progress is sent to admin connections only."""
+        admin, user = (MagicMock(spec=WebSocket) for _ in range(2))
+        for websocket in (admin, user):
+            websocket.accept = AsyncMock()
+            websocket.send_text = AsyncMock()
+        await manager.connect(admin, None, is_admin=True)
+        await manager.connect(user, None)
+        admin.send_text.reset_mock()
+        user.send_text.reset_mock()
+
+        await manager.broadcast_storage_progress("job-1", 1, 2)
+
+        sent_data = json.loads(admin.send_text.call_args[0][0])
+        assert sent_data["type"] == "storage_progress"
+        user.send_text.assert_not_called()
+
+        await manager.disconnect(admin)
+        assert admin not in manager.admin_connections
+
     @pytest.mark.asyncio
     async def test_broadcast_to_empty_connections(self, manager):
         """Test broadcasting to empty connection sets."""
@@ -362,9 +383,13 @@ class TestRealtimeStatsService:
 
     @pytest.fixture
     def mock_db(self):
-        """Create mock database."""
+        """Create mock database whose session maps to ``db.messages``."""
         db = MagicMock()
         db.messages = MagicMock()
+        db.sessions.find_one = AsyncMock(
+            return_value={"partitions": ["messages_2024_01"]}
+        )
+        db.__getitem__.return_value = db.messages
         return db
 
     @pytest.fixture
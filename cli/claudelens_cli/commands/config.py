@@ -104,6 +104,10 @@ def set(key: str, value: str):
             parsed_value = paths
         elif key in ["sync_interval", "batch_size"]:
             parsed_value = int(value)
+        elif key == "watch_latency":
+            parsed_value = float(value)
+        elif key == "sync_database":
+            parsed_value = str(value).lower() in ("true", "1", "yes", "on")
         elif key == "sync_types":
             parsed_value = value.split(",") if isinstance(value, str) else value
         elif key == "exclude_projects":
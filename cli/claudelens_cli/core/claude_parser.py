@@ -1,10 +1,15 @@
 """Parser for Claude conversation messages."""
+import asyncio
 import json
 import sqlite3
-from datetime import datetime
+from collections.abc import AsyncIterator
+from datetime import UTC, datetime
 from pathlib import Path
 from typing import Any
 
+# Keyset position in the SQLite store: (timestamp in epoch milliseconds, uuid)
+DatabasePosition = tuple[int, str]
+
 
 class ClaudeMessageParser:
     """Parses and validates Claude message format."""
@@ -165,65 +170,99 @@ class ClaudeMessageParser:
 
 
 class ClaudeDatabaseReader:
-    """Reads messages from Claude's SQLite database."""
-
-    def __init__(self, db_path: Path):
+    """Reads messages from Claude's SQLite database.
+
+    Rows are read in pages ordered by ``(timestamp, uuid)`` and each page
+    continues after the last key of the previous one, so memory stays
+    bounded by the page size and a stored position resumes exactly where a
+    previous read stopped. SQLite calls run in a worker thread.
+    """
+
+    QUERY = """
+        SELECT
+            b.uuid,
+            b.parent_uuid,
+            b.session_id,
+            b.timestamp,
+            b.message_type,
+            b.cwd,
+            b.user_type,
+            b.version,
+            b.isSidechain,
+            u.message as user_message,
+            u.tool_use_result,
+            a.message as assistant_message,
+            a.cost_usd,
+            a.duration_ms,
+            a.model,
+            c.summary
+        FROM base_messages b
+        LEFT JOIN user_messages u ON b.uuid = u.uuid
+        LEFT JOIN assistant_messages a ON b.uuid = a.uuid
+        LEFT JOIN conversation_summaries c ON b.uuid = c.leaf_uuid
+        WHERE b.timestamp > ? OR (b.timestamp = ? AND b.uuid > ?)
+        ORDER BY b.timestamp ASC, b.uuid ASC
+        LIMIT ?
+    """
+
+    def __init__(self, db_path: Path, page_size: int = 1000):
         self.db_path = db_path
+        self.page_size = page_size
+
+    async def read_pages(
+        self, after: DatabasePosition | None = None
+    ) -> AsyncIterator[tuple[list[dict[str, Any]], DatabasePosition]]:
+        """Yield ``(messages, position)`` pages following ``after``.
+
+        ``position`` is the key of the last row of the page, including rows
+        that did not convert to a message; store it to resume later.
+        """
+        conn = await asyncio.to_thread(self._connect)
+        try:
+            position = after or (-1, "")
+            while True:
+                rows = await asyncio.to_thread(self._fetch_page, conn, position)
+                if not rows:
+                    return
+                position = (rows[-1]["timestamp"], rows[-1]["uuid"])
+                messages = [m for m in map(self._row_to_message, rows) if m]
+                yield messages, position
+                if len(rows) < self.page_size:
+                    return
+        finally:
+            await asyncio.to_thread(conn.close)
 
     async def read_messages(
         self, after_timestamp: datetime | None = None
-    ) -> list[dict[str, Any]]:
-        """Read messages from SQLite database.
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Yield messages from the SQLite database in timestamp order.
 
         Joins data from multiple tables to reconstruct full messages.
         """
-        conn = sqlite3.connect(str(self.db_path))
+        after = None
+        if after_timestamp:
+            # Skip every row at or before the timestamp
+            after = (int(after_timestamp.timestamp() * 1000), "\uffff")
+
+        async for messages, _ in self.read_pages(after):
+            for message in messages:
+                yield message
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database read-only for use from worker threads."""
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+        )
         conn.row_factory = sqlite3.Row
+        return conn
 
-        try:
-            query = """
-            SELECT
-                b.uuid,
-                b.parent_uuid,
-                b.session_id,
-                b.timestamp,
-                b.message_type,
-                b.cwd,
-                b.user_type,
-                b.version,
-                b.isSidechain,
-                u.message as user_message,
-                u.tool_use_result,
-                a.message as assistant_message,
-                a.cost_usd,
-                a.duration_ms,
-                a.model,
-                c.summary
-            FROM base_messages b
-            LEFT JOIN user_messages u ON b.uuid = u.uuid
-            LEFT JOIN assistant_messages a ON b.uuid = a.uuid
-            LEFT JOIN conversation_summaries c ON b.uuid = c.leaf_uuid
-            """
-
-            params = []
-            if after_timestamp:
-                query += " WHERE b.timestamp > ?"
-                params.append(int(after_timestamp.timestamp() * 1000))
-
-            query += " ORDER BY b.timestamp ASC"
-
-            cursor = conn.execute(query, params)
-            messages = []
-
-            for row in cursor:
-                message = self._row_to_message(dict(row))
-                if message:
-                    messages.append(message)
-
-            return messages
-
-        finally:
-            conn.close()
+    def _fetch_page(
+        self, conn: sqlite3.Connection, after: DatabasePosition
+    ) -> list[dict[str, Any]]:
+        """Fetch the rows following a keyset position."""
+        timestamp, uuid = after
+        cursor = conn.execute(self.QUERY, (timestamp, timestamp, uuid, self.page_size))
+        return [dict(row) for row in cursor]
 
     def _row_to_message(self, row: dict[str, Any]) -> dict[str, Any] | None:
         """Convert SQLite row to message format."""
@@ -237,7 +276,9 @@ class ClaudeDatabaseReader:
             "type": row["message_type"],
             "parentUuid": row["parent_uuid"],
             "sessionId": row["session_id"],
-            "timestamp": datetime.fromtimestamp(row["timestamp"] / 1000).isoformat(),
+            "timestamp": datetime.fromtimestamp(
+                row["timestamp"] / 1000, UTC
+            ).isoformat(),
             "cwd": row["cwd"],
             "userType": row["user_type"],
             "version": row["version"],
@@ -29,9 +29,17 @@ class CLIConfig(BaseModel):
     batch_size: int = Field(
         default=100, description="Number of messages to sync in one batch"
     )
+    watch_latency: float = Field(
+        default=2.0,
+        description="Maximum seconds between a file change and its upload in watch mode",
+    )
     log_level: str = Field(default="INFO", description="Logging level")
     sync_types: list[str] = Field(
-        default=["projects", "todos", "database"], description="Data types to sync"
+        default=["projects", "todos"], description="Data types to sync"
+    )
+    sync_database: bool = Field(
+        default=False,
+        description="Also sync Claude's SQLite store (__store.db); off unless enabled",
     )
     exclude_projects: list[str] = Field(
         default_factory=list, description="Project paths to exclude from sync"
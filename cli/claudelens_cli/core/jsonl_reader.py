@@ -0,0 +1,185 @@
+"""Fast reading and parsing of Claude JSONL conversation files."""
+import hashlib
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from claudelens_cli.core.claude_parser import ClaudeMessageParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# Projects with less data than this are parsed in-process; starting worker
+# processes costs more than it saves
+POOL_MIN_BYTES = 8 * 1024 * 1024
+
+# Leading bytes hashed into a file's identity
+IDENTITY_BYTES = 4096
+
+_parser = ClaudeMessageParser()
+
+
+class ParsedMessage(NamedTuple):
+    """A parsed message with its position and raw-content hash."""
+
+    message: dict[str, Any]
+    line_number: int
+    hash: str
+
+
+class ParsedFile(NamedTuple):
+    """Messages parsed from one file.
+
+    ``end_offset`` is the byte offset just past the last complete line, so a
+    later read can resume from there, passing back ``pending_summary``: a
+    summary line whose leaf message was not read yet. ``identity`` tells
+    whether the file read up to ``end_offset`` is still the same file.
+    """
+
+    path: str
+    messages: list[ParsedMessage]
+    errors: list[str]
+    end_offset: int
+    pending_summary: dict[str, Any] | None = None
+    identity: str | None = None
+
+
+def loads(raw: bytes) -> Any:
+    """Decode JSON with orjson when available.
+
+    Falls back to the standard library for input orjson rejects, such as
+    NaN literals or integers beyond 64 bits.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def hash_line(raw: bytes, summary: str | None = None) -> str:
+    """Stable hash of a JSONL line, without decoding or re-serializing it.
+
+    Claude never rewrites a line once written, so the raw bytes identify the
+    message. An attached session summary is part of what gets uploaded and is
+    mixed in so a new summary is synced.
+    """
+    digest = hashlib.blake2b(raw, digest_size=32)
+    if summary is not None:
+        digest.update(b"\n")
+        digest.update(summary.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def file_identity(path: str | Path, offset: int) -> str:
+    """Inode and hash of the leading bytes of a file read up to ``offset``.
+
+    Claude only appends to conversation files, so a different inode or a
+    different start means the file was replaced, even by a longer one.
+    """
+    with open(path, "rb") as f:
+        inode = os.fstat(f.fileno()).st_ino
+        head = f.read(min(offset, IDENTITY_BYTES))
+    return f"{inode}:{hashlib.blake2b(head, digest_size=8).hexdigest()}"
+
+
+def iter_lines(path: str | Path, start_offset: int = 0):
+    """Yield ``(line_number, end, raw, terminated)`` for each line of a file.
+
+    The file is memory-mapped so lines are sliced out of one large read
+    instead of decoded one at a time. ``end`` is the offset just past the
+    line and ``terminated`` tells whether it ended with a newline. Line
+    numbers count from ``start_offset``.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size <= start_offset:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start_offset
+            line_number = 0
+            while pos < size:
+                line_number += 1
+                newline = mm.find(b"\n", pos)
+                if newline == -1:
+                    yield line_number, size, mm[pos:size], False
+                    return
+                yield line_number, newline + 1, mm[pos:newline], True
+                pos = newline + 1
+
+
+def parse_file(
+    path: str,
+    start_offset: int = 0,
+    pending_summary: dict[str, Any] | None = None,
+) -> ParsedFile:
+    """Read, decode and normalize every message of a JSONL file.
+
+    Summary lines are attached to their leaf message as in the upload format;
+    ``pending_summary`` carries one over from an earlier read of the file.
+    A trailing line without a newline that fails to decode is assumed to be
+    still being written: it is left out and not reported as an error.
+
+    Runs in worker processes, so it only takes and returns picklable values.
+    """
+    messages: list[ParsedMessage] = []
+    errors: list[str] = []
+    end_offset = start_offset
+
+    for line_number, end, raw, terminated in iter_lines(path, start_offset):
+        line = raw.strip()
+        if not line:
+            end_offset = end
+            continue
+
+        try:
+            message = loads(line)
+        except ValueError as e:
+            if not terminated:
+                break
+            errors.append(f"Error parsing line {line_number} in {path}: {e}")
+            end_offset = end
+            continue
+        end_offset = end
+
+        try:
+            if message.get("type") == "summary":
+                # Attach to the next message with a matching leafUuid
+                pending_summary = {
+                    "summary": message.get("summary"),
+                    "leafUuid": message.get("leafUuid"),
+                }
+                continue
+
+            parsed = _parser.parse_jsonl_message(message)
+            if not parsed:
+                continue
+
+            summary = None
+            if pending_summary and parsed.get("uuid") == pending_summary.get(
+                "leafUuid"
+            ):
+                summary = pending_summary["summary"]
+                parsed["summary"] = summary
+                parsed["leafUuid"] = pending_summary["leafUuid"]
+                pending_summary = None
+
+            messages.append(
+                ParsedMessage(parsed, line_number, hash_line(line, summary))
+            )
+        except Exception as e:
+            errors.append(f"Error processing message: {e}")
+
+    return ParsedFile(
+        str(path),
+        messages,
+        errors,
+        end_offset,
+        pending_summary,
+        file_identity(path, end_offset),
+    )
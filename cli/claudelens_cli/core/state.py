@@ -3,12 +3,27 @@ import hashlib
 import json
 from datetime import UTC, datetime
 from pathlib import Path
+from typing import Any
 
 from pydantic import BaseModel, Field
 from rich.console import Console
 
 console = Console()
 
+# State written before messages were keyed by the hash of their JSONL line
+LEGACY_HASH_VERSION = "1.0.0"
+STATE_VERSION = "1.1.0"
+
+
+class FileCursor(BaseModel):
+    """How far a JSONL file has been read, for tailing in watch mode."""
+
+    offset: int = 0
+    # File identity when read (see jsonl_reader.file_identity)
+    identity: str | None = None
+    # Summary line read but not yet attached to its leaf message
+    pending_summary: dict[str, Any] | None = None
+
 
 class ProjectState(BaseModel):
     """State for a single project."""
@@ -17,8 +32,12 @@ class ProjectState(BaseModel):
     last_file: str | None = None
     last_line: int | None = None
     synced_sessions: set[str] = Field(default_factory=set)  # Session UUIDs
-    synced_messages: set[str] = Field(default_factory=set)  # Message UUIDs
+    synced_messages: set[str] = Field(default_factory=set)  # Line hashes
+    # Parsed-content hashes recorded by older versions, rekeyed as seen
+    legacy_messages: set[str] = Field(default_factory=set)
     message_count: int = 0
+    # Read position of each JSONL file, for tailing in watch mode
+    file_cursors: dict[str, FileCursor] = Field(default_factory=dict)
 
     class Config:
         json_encoders = {datetime: lambda v: v.isoformat(), set: lambda v: list(v)}
@@ -27,9 +46,11 @@ class ProjectState(BaseModel):
 class SyncState(BaseModel):
     """Overall sync state."""
 
-    version: str = "1.0.0"
+    version: str = STATE_VERSION
     last_sync: datetime | None = None
     projects: dict[str, ProjectState] = Field(default_factory=dict)
+    # Last (timestamp ms, uuid) uploaded from each SQLite store
+    database_positions: dict[str, tuple[int, str]] = Field(default_factory=dict)
 
     class Config:
         json_encoders = {
@@ -55,6 +76,8 @@ class StateManager:
                 # Convert ISO strings back to datetime
                 if data.get("last_sync"):
                     data["last_sync"] = datetime.fromisoformat(data["last_sync"])
+                legacy = data.get("version", LEGACY_HASH_VERSION) == LEGACY_HASH_VERSION
+                data["version"] = STATE_VERSION
                 for project_data in data.get("projects", {}).values():
                     project_data["last_sync"] = datetime.fromisoformat(
                         project_data["last_sync"]
@@ -65,6 +88,16 @@ class StateManager:
                     project_data["synced_messages"] = set(
                         project_data.get("synced_messages", [])
                     )
+                    project_data["legacy_messages"] = set(
+                        project_data.get("legacy_messages", [])
+                    )
+                    if legacy:
+                        # Old hashes no longer match; keep them to compare
+                        # against until each message is seen again
+                        project_data["legacy_messages"] |= project_data[
+                            "synced_messages"
+                        ]
+                        project_data["synced_messages"] = set()
                 return SyncState(**data)
             except Exception as e:
                 console.print(f"[yellow]Warning: Could not load state: {e}[/yellow]")
@@ -105,16 +138,63 @@ class StateManager:
             project_state.synced_sessions.update(new_sessions)
         if new_messages:
             project_state.synced_messages.update(new_messages)
-            project_state.message_count = len(project_state.synced_messages)
+            project_state.message_count = len(project_state.synced_messages) + len(
+                project_state.legacy_messages
+            )
 
         self.state.last_sync = datetime.now(UTC)
         self.save()
 
-    def is_message_synced(self, project_path: str, message_id: str) -> bool:
-        """Check if a message has already been synced."""
+    def get_file_cursor(self, project_path: str, file_path: str) -> FileCursor:
+        """Get how far a file has been read; unread files start at 0."""
         project_state = self.get_project_state(project_path)
-        if project_state:
-            return message_id in project_state.synced_messages
+        if project_state and file_path in project_state.file_cursors:
+            return project_state.file_cursors[file_path]
+        return FileCursor()
+
+    def update_file_cursors(
+        self, project_path: str, cursors: dict[str, FileCursor]
+    ) -> None:
+        """Record how far files have been read."""
+        if project_path not in self.state.projects:
+            self.state.projects[project_path] = ProjectState(
+                last_sync=datetime.now(UTC)
+            )
+        self.state.projects[project_path].file_cursors.update(cursors)
+        self.save()
+
+    def get_database_position(self, db_path: str) -> tuple[int, str] | None:
+        """Get the high-water mark of a SQLite store."""
+        return self.state.database_positions.get(db_path)
+
+    def update_database_position(self, db_path: str, position: tuple[int, str]) -> None:
+        """Record the last row uploaded from a SQLite store."""
+        self.state.database_positions[db_path] = position
+        self.state.last_sync = datetime.now(UTC)
+        self.save()
+
+    def is_message_synced(
+        self, project_path: str, message_id: str, message: dict | None = None
+    ) -> bool:
+        """Check if a message has already been synced.
+
+        ``message_id`` is the hash of the message's JSONL line. Projects synced
+        by older versions recorded ``hash_message`` of the parsed message
+        instead; when ``message`` is given it is checked against those, and a
+        match is rekeyed to ``message_id`` so it is only hashed twice once.
+        The rekeyed hash is persisted with the next save.
+        """
+        project_state = self.get_project_state(project_path)
+        if not project_state:
+            return False
+        if message_id in project_state.synced_messages:
+            return True
+        if project_state.legacy_messages and message is not None:
+            legacy_hash = self.hash_message(message)
+            if legacy_hash in project_state.legacy_messages:
+                project_state.legacy_messages.discard(legacy_hash)
+                project_state.synced_messages.add(message_id)
+                return True
         return False
 
     def is_session_synced(self, project_path: str, session_id: str) -> bool:
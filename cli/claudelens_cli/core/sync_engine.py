@@ -1,14 +1,16 @@
 """Core sync engine for ClaudeLens CLI."""
 import asyncio
+import gzip
 import json
 import re
 from collections import defaultdict
-from collections.abc import AsyncIterator, Callable
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import UTC, datetime
 from pathlib import Path
-from typing import TYPE_CHECKING, TypedDict
+from typing import TypedDict
 
-import aiofiles
 import httpx
 from rich.console import Console
 from rich.progress import (
@@ -20,18 +22,30 @@ from rich.progress import (
     TextColumn,
     TimeRemainingColumn,
 )
-from watchdog.events import DirModifiedEvent, FileModifiedEvent, FileSystemEventHandler
-from watchdog.observers import Observer
 
-from claudelens_cli.core.claude_parser import ClaudeMessageParser
+from claudelens_cli.core.claude_parser import ClaudeDatabaseReader, ClaudeMessageParser
 from claudelens_cli.core.config import ConfigManager
-from claudelens_cli.core.state import ProjectState, StateManager
+from claudelens_cli.core.jsonl_reader import (
+    POOL_MIN_BYTES,
+    ParsedFile,
+    file_identity,
+    parse_file,
+)
+from claudelens_cli.core.state import FileCursor, ProjectState, StateManager
+from claudelens_cli.core.watcher import BatchedFileWatcher
 
-if TYPE_CHECKING:
-    from watchdog.observers.api import BaseObserver
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None  # type: ignore[assignment]
 
 console = Console()
 
+# Streaming NDJSON ingest endpoint, and the JSON batch endpoint used when a
+# server predates it
+STREAM_INGEST_PATH = "/api/v1/ingest/stream"
+BATCH_INGEST_PATH = "/api/v1/ingest/batch"
+
 
 class ProjectInfo(TypedDict):
     """Type definition for project information."""
@@ -89,6 +103,15 @@ class SyncStats:
         return result
 
 
+def _cursor(parsed_file: ParsedFile) -> FileCursor:
+    """Where the next read of a parsed file resumes."""
+    return FileCursor(
+        offset=parsed_file.end_offset,
+        identity=parsed_file.identity,
+        pending_summary=parsed_file.pending_summary,
+    )
+
+
 class SyncEngine:
     """Main sync engine for Claude conversations."""
 
@@ -105,11 +128,16 @@ class SyncEngine:
         self.state = state
         self.parser = ClaudeMessageParser()
         self.http_client: httpx.AsyncClient | None = None
-        self._observer: BaseObserver | None = None
         self.debug = debug
         self.overwrite_mode = overwrite_mode
         self.force = force
         self.show_progress = show_progress
+        # Cleared if the server does not offer the streaming ingest endpoint
+        self._stream_ingest = True
+        # Worker processes for parsing large projects, started on first use
+        self._parse_pool: ProcessPoolExecutor | None = None
+        # Projects created on the server during this run
+        self._known_projects: set[str] = set()
 
     async def _get_http_client(self) -> httpx.AsyncClient:
         """Get or create HTTP client."""
@@ -135,6 +163,12 @@ class SyncEngine:
             await self.http_client.aclose()
             self.http_client = None
 
+    def _close_parse_pool(self):
+        """Stop the parsing worker processes."""
+        if self._parse_pool:
+            self._parse_pool.shutdown(cancel_futures=True)
+            self._parse_pool = None
+
     def sync_once(
         self,
         project_filter: Path | None = None,
@@ -181,10 +215,14 @@ class SyncEngine:
                     project_path, stats, dry_run, progress_callback
                 )
 
+            if not project_filter:
+                await self._sync_databases(stats, dry_run, progress_callback)
+
             return stats.to_dict()
 
         finally:
             await self._close_http_client()
+            self._close_parse_pool()
 
     async def _async_sync_once_with_progress(
         self,
@@ -367,10 +405,29 @@ class SyncEngine:
                         completed=True,
                     )
 
+                # Phase 4: Messages from Claude's SQLite stores
+                if not project_filter and self._database_paths():
+                    database_task = progress.add_task(
+                        "[cyan]Syncing Claude database...", total=None
+                    )
+                    await self._sync_databases(
+                        stats,
+                        dry_run,
+                        lambda msg: progress.update(
+                            database_task, description=f"[cyan]{msg}"
+                        ),
+                    )
+                    progress.update(
+                        database_task,
+                        description="[green]Synced Claude database",
+                        completed=True,
+                    )
+
                 return stats.to_dict()
 
             finally:
                 await self._close_http_client()
+                self._close_parse_pool()
 
     async def _sync_project_with_progress(
         self,
@@ -436,6 +493,7 @@ class SyncEngine:
         # Create or update project in backend
         if not dry_run:
             await self._ensure_project_exists(project_path)
+            self._known_projects.add(project_key)
 
         if self.debug:
             console.print(
@@ -448,41 +506,24 @@ class SyncEngine:
 
         all_messages = {}  # uuid -> (message, file_path, line_number)
         session_messages = defaultdict(list)  # session_id -> list of messages
+        message_hashes: dict[str, str] = {}  # uuid -> hash of the raw line
         duplicate_count = 0
 
-        for jsonl_file in jsonl_files:
+        parsed_files = await self._parse_files(jsonl_files)
+
+        for jsonl_file, parsed_file in zip(jsonl_files, parsed_files, strict=True):
             # Skip file modification check for now - we need to read all files
             # to properly handle forked conversations
+            for error in parsed_file.errors:
+                console.print(f"[red]{error}[/red]")
 
-            line_number = 0
-            pending_summary = None
-
-            async for message, line_num in self._read_jsonl_messages(
-                jsonl_file, start_line=0
-            ):
-                line_number = line_num
-
+            # Summaries are already attached to their leaf messages by the reader
+            for message, line_number, message_hash in parsed_file.messages:
                 # Store the original project path
                 message["_project_path"] = str(project_path)
                 if not message.get("cwd"):
                     message["cwd"] = str(project_path)
 
-                # Handle summaries
-                if message.get("type") == "summary":
-                    pending_summary = {
-                        "summary": message.get("summary"),
-                        "leafUuid": message.get("leafUuid"),
-                    }
-                    continue
-
-                # Attach pending summary if this is the leaf message
-                if pending_summary and message.get("uuid") == pending_summary.get(
-                    "leafUuid"
-                ):
-                    message["summary"] = pending_summary["summary"]
-                    message["leafUuid"] = pending_summary["leafUuid"]
-                    pending_summary = None
-
                 # Store message indexed by UUID
                 uuid = message.get("uuid")
                 session_id = message.get("sessionId")
@@ -491,6 +532,7 @@ class SyncEngine:
                     # If we've seen this UUID before, keep the first occurrence
                     if uuid not in all_messages:
                         all_messages[uuid] = (message, jsonl_file.name, line_number)
+                        message_hashes[uuid] = message_hash
                         session_messages[session_id].append(message)
                     else:
                         # This is a shared message from a forked conversation
@@ -553,6 +595,7 @@ class SyncEngine:
                 stats,
                 dry_run,
                 progress_callback,
+                message_hashes,
             )
             sessions_processed += 1
 
@@ -570,6 +613,85 @@ class SyncEngine:
         # Store duplicate count for reporting
         stats.duplicate_messages += duplicate_count
 
+        # Remember where each file ends so watch mode can tail from there
+        if not dry_run:
+            self.state.update_file_cursors(
+                project_key,
+                {
+                    str(jsonl_file): _cursor(parsed_file)
+                    for jsonl_file, parsed_file in zip(
+                        jsonl_files, parsed_files, strict=True
+                    )
+                },
+            )
+
+    def _database_paths(self) -> list[Path]:
+        """Claude SQLite stores to sync, when database sync is enabled."""
+        if not self.config.config.sync_database:
+            return []
+        return [
+            claude_dir / "__store.db"
+            for claude_dir in self.config.config.claude_dirs
+            if (claude_dir / "__store.db").exists()
+        ]
+
+    async def _sync_databases(
+        self,
+        stats: SyncStats,
+        dry_run: bool,
+        progress_callback: Callable[[str], None] | None = None,
+    ):
+        """Upload messages added to Claude's SQLite stores since the last sync.
+
+        Each store is read page by page from its high-water mark, and pages
+        are uploaded as they arrive. The mark advances after every uploaded
+        page, so an interrupted or failed sync resumes from the last page
+        sent. A store that fails is counted as an error and the others are
+        still synced.
+        """
+        batch_size = self.config.config.batch_size
+        for db_path in self._database_paths():
+            db_key = str(db_path)
+            after = None if self.force else self.state.get_database_position(db_key)
+            reader = ClaudeDatabaseReader(db_path, page_size=batch_size * 10)
+
+            if self.debug:
+                console.print(
+                    f"[cyan]DEBUG: Reading {db_path} after position {after}[/cyan]"
+                )
+
+            try:
+                async for raw_messages, position in reader.read_pages(after):
+                    messages = []
+                    for raw in raw_messages:
+                        message = self.parser.parse_jsonl_message(raw)
+                        if not message or not message.get("sessionId"):
+                            continue
+                        # Columns the JSONL parser does not carry over
+                        if raw.get("model") and not message.get("model"):
+                            message["model"] = raw["model"]
+                        if raw.get("summary"):
+                            message["summary"] = raw["summary"]
+                        messages.append(message)
+
+                    for start in range(0, len(messages), batch_size):
+                        batch = messages[start : start + batch_size]
+                        if dry_run:
+                            stats.messages_synced += len(batch)
+                            continue
+                        response_stats = await self._upload_batch(batch)
+                        self._record_upload_stats(stats, response_stats, len(batch))
+
+                    if not dry_run and not self.force:
+                        self.state.update_database_position(db_key, position)
+
+                    if progress_callback:
+                        progress_callback(f"Synced {stats.messages_synced} messages")
+            except Exception as e:
+                # Unreadable store or an upload that failed after its retries
+                console.print(f"[red]Error syncing {db_path}: {e}[/red]")
+                stats.errors += 1
+
     async def _sync_session_messages(
         self,
         session_id: str,
@@ -579,8 +701,13 @@ class SyncEngine:
         stats: SyncStats,
         dry_run: bool,
         progress_callback: Callable[[str], None] | None = None,
+        message_hashes: dict[str, str] | None = None,
     ) -> dict:
-        """Sync messages for a specific session. Returns session-level statistics."""
+        """Sync messages for a specific session. Returns session-level statistics.
+
+        ``message_hashes`` maps UUIDs to hashes computed while reading; other
+        messages are hashed from their parsed content.
+        """
         batch = []
         batch_hashes = set()
         session_stats = {
@@ -592,13 +719,15 @@ class SyncEngine:
 
         for message in messages:
             # Generate hash
-            message_hash = self.state.hash_message(message)
+            message_hash = (message_hashes or {}).get(
+                message.get("uuid", "")
+            ) or self.state.hash_message(message)
 
             # Skip if already synced (only in non-dry-run mode and not force mode)
             if (
                 not dry_run
                 and not self.force
-                and self.state.is_message_synced(project_key, message_hash)
+                and self.state.is_message_synced(project_key, message_hash, message)
             ):
                 stats.messages_skipped += 1
                 session_stats["skipped_messages"] += 1
@@ -617,28 +746,7 @@ class SyncEngine:
             if len(batch) >= self.config.config.batch_size:
                 if not dry_run:
                     response_stats = await self._upload_batch(batch)
-                    if response_stats:
-                        # Update counts based on actual server response
-                        # When using force + overwrite, count updates as synced
-                        if self.force and self.overwrite_mode:
-                            total_processed = response_stats.get(
-                                "messages_processed", 0
-                            ) + response_stats.get("messages_updated", 0)
-                            stats.messages_synced += total_processed
-                        else:
-                            stats.messages_synced += response_stats.get(
-                                "messages_processed", 0
-                            )
-                            stats.messages_updated += response_stats.get(
-                                "messages_updated", 0
-                            )
-                        stats.messages_skipped += response_stats.get(
-                            "messages_skipped", 0
-                        )
-                        stats.errors += response_stats.get("messages_failed", 0)
-                    else:
-                        # Fallback to counting all as synced if no stats returned
-                        stats.messages_synced += len(batch)
+                    self._record_upload_stats(stats, response_stats, len(batch))
 
                     # Update state only when actually syncing and not in force mode
                     if not self.force:
@@ -662,26 +770,7 @@ class SyncEngine:
         if batch:
             if not dry_run:
                 response_stats = await self._upload_batch(batch)
-                if response_stats:
-                    # Update counts based on actual server response
-                    # When using force + overwrite, count updates as synced
-                    if self.force and self.overwrite_mode:
-                        total_processed = response_stats.get(
-                            "messages_processed", 0
-                        ) + response_stats.get("messages_updated", 0)
-                        stats.messages_synced += total_processed
-                    else:
-                        stats.messages_synced += response_stats.get(
-                            "messages_processed", 0
-                        )
-                        stats.messages_updated += response_stats.get(
-                            "messages_updated", 0
-                        )
-                    stats.messages_skipped += response_stats.get("messages_skipped", 0)
-                    stats.errors += response_stats.get("messages_failed", 0)
-                else:
-                    # Fallback to counting all as synced if no stats returned
-                    stats.messages_synced += len(batch)
+                self._record_upload_stats(stats, response_stats, len(batch))
 
                 # Update state only when actually syncing and not in force mode
                 if not self.force:
@@ -696,73 +785,60 @@ class SyncEngine:
 
         return session_stats
 
-    async def _read_jsonl_messages(
-        self, file_path: Path, start_line: int = 0
-    ) -> AsyncIterator[tuple[dict, int]]:
-        """Read messages from JSONL file."""
-        async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-            line_number = 0
-            pending_summary = None
-
-            async for line in f:
-                line_number += 1
-
-                if line_number <= start_line:
-                    continue
+    def _record_upload_stats(
+        self, stats: SyncStats, response_stats: dict | None, batch_len: int
+    ) -> None:
+        """Add the server's counts for an uploaded batch to ``stats``."""
+        if response_stats:
+            # Update counts based on actual server response
+            # When using force + overwrite, count updates as synced
+            if self.force and self.overwrite_mode:
+                total_processed = response_stats.get(
+                    "messages_processed", 0
+                ) + response_stats.get("messages_updated", 0)
+                stats.messages_synced += total_processed
+            else:
+                stats.messages_synced += response_stats.get("messages_processed", 0)
+                stats.messages_updated += response_stats.get("messages_updated", 0)
+            stats.messages_skipped += response_stats.get("messages_skipped", 0)
+            stats.errors += response_stats.get("messages_failed", 0)
+        else:
+            # Fallback to counting all as synced if no stats returned
+            stats.messages_synced += batch_len
 
-                line = line.strip()
-                if not line:
-                    continue
+    async def _parse_files(self, files: list[Path]) -> list[ParsedFile]:
+        """Read and parse JSONL files off the event loop.
 
-                try:
-                    message = json.loads(line)
+        Projects with enough data are fanned out across worker processes;
+        smaller ones are parsed in one thread. Results keep the order of
+        ``files``.
+        """
+        total_bytes = sum(f.stat().st_size for f in files if f.exists())
+        paths = [str(f) for f in files]
 
-                    if self.debug:
-                        console.print(
-                            f"[cyan]DEBUG: Line {line_number} - Message type: {message.get('type')}[/cyan]"
+        if len(files) > 1 and total_bytes >= POOL_MIN_BYTES:
+            loop = asyncio.get_running_loop()
+            try:
+                if not self._parse_pool:
+                    self._parse_pool = ProcessPoolExecutor()
+                return list(
+                    await asyncio.gather(
+                        *(
+                            loop.run_in_executor(self._parse_pool, parse_file, path)
+                            for path in paths
                         )
-
-                    # Handle summary messages specially
-                    if message.get("type") == "summary":
-                        # Store summary to attach to the next message with matching leafUuid
-                        pending_summary = {
-                            "summary": message.get("summary"),
-                            "leafUuid": message.get("leafUuid"),
-                        }
-                        if self.debug:
-                            console.print(
-                                f"[cyan]DEBUG: Found summary for leafUuid: {pending_summary.get('leafUuid')}[/cyan]"
-                            )
-                        # Don't count summaries as they're not sent to the server
-                        continue
-
-                    # Parse and validate message
-                    parsed = self.parser.parse_jsonl_message(message)
-                    if parsed:
-                        # Attach pending summary if this is the leaf message
-                        if pending_summary and parsed.get(
-                            "uuid"
-                        ) == pending_summary.get("leafUuid"):
-                            parsed["summary"] = pending_summary["summary"]
-                            parsed["leafUuid"] = pending_summary["leafUuid"]
-                            pending_summary = None
-                            if self.debug:
-                                console.print(
-                                    f"[cyan]DEBUG: Attached summary to message {parsed.get('uuid')}[/cyan]"
-                                )
-
-                        if self.debug and "toolUseResult" in parsed:
-                            console.print(
-                                f"[cyan]DEBUG: Message has toolUseResult: {type(parsed['toolUseResult'])}[/cyan]"
-                            )
-
-                        yield parsed, line_number
-                except json.JSONDecodeError as e:
+                    )
+                )
+            except (BrokenProcessPool, OSError) as e:
+                # Platforms without working multiprocessing parse in-process
+                if self.debug:
                     console.print(
-                        f"[red]Error parsing line {line_number} in {file_path}: {e}[/red]"
+                        f"[yellow]DEBUG: Parse pool unavailable ({e}), "
+                        "parsing in-process[/yellow]"
                     )
-                except Exception as e:
-                    console.print(f"[red]Error processing message: {e}[/red]")
+                self._close_parse_pool()
+
+        return await asyncio.to_thread(lambda: [parse_file(path) for path in paths])
 
     def _extract_project_name(self, project_path: Path) -> str:
         """Extract a human-readable project name from the project directory.
@@ -856,11 +932,20 @@ class SyncEngine:
 
         for attempt in range(retry_count):
             try:
-                response = await client.post(
-                    "/api/v1/ingest/batch",  # API v1 endpoint
-                    json={"messages": messages, "overwrite_mode": self.overwrite_mode},
-                    timeout=60.0,
-                )
+                path = STREAM_INGEST_PATH if self._stream_ingest else BATCH_INGEST_PATH
+                response = await self._post_batch(client, path, messages)
+
+                if self._stream_ingest and response.status_code in (404, 405):
+                    # Older server without streaming ingest
+                    if self.debug:
+                        console.print(
+                            "[cyan]DEBUG: Streaming ingest unavailable, "
+                            "using batch endpoint[/cyan]"
+                        )
+                    self._stream_ingest = False
+                    response = await self._post_batch(
+                        client, BATCH_INGEST_PATH, messages
+                    )
 
                 # Handle redirects manually for nginx issues
                 if response.status_code in (301, 302, 307, 308):
@@ -871,19 +956,12 @@ class SyncEngine:
 
                         parsed = urlparse(location)
                         new_path = parsed.path
-                        response = await client.post(
-                            new_path,
-                            json={
-                                "messages": messages,
-                                "overwrite_mode": self.overwrite_mode,
-                            },
-                            timeout=60.0,
-                        )
+                        response = await self._post_batch(client, new_path, messages)
 
                 if response.status_code == 200:
                     # Parse response to check actual results
                     try:
-                        result = response.json()
+                        result = self._parse_ingest_response(response)
                         if "stats" in result:
                             response_stats = result["stats"]
                             messages_failed = response_stats.get("messages_failed", 0)
@@ -973,6 +1051,60 @@ class SyncEngine:
 
         raise Exception(f"Failed to upload batch after {retry_count} attempts")
 
+    async def _post_batch(
+        self, client: httpx.AsyncClient, path: str, messages: list[dict]
+    ) -> httpx.Response:
+        """POST messages to an ingest endpoint in the format it expects."""
+        if path.rstrip("/").endswith("/stream"):
+            body, encoding = self._encode_ndjson(messages)
+            return await client.post(
+                path,
+                content=body,
+                params={"overwrite_mode": str(self.overwrite_mode).lower()},
+                headers={
+                    "Content-Type": "application/x-ndjson",
+                    "Content-Encoding": encoding,
+                },
+                timeout=60.0,
+            )
+
+        return await client.post(
+            path,
+            json={"messages": messages, "overwrite_mode": self.overwrite_mode},
+            timeout=60.0,
+        )
+
+    def _encode_ndjson(self, messages: list[dict]) -> tuple[bytes, str]:
+        """Serialize messages as NDJSON, compressed with zstd when available."""
+        body = b"".join(
+            json.dumps(msg, separators=(",", ":")).encode() + b"\n" for msg in messages
+        )
+        if zstd is not None:
+            return zstd.ZstdCompressor(level=3).compress(body), "zstd"
+        return gzip.compress(body, compresslevel=6), "gzip"
+
+    def _parse_ingest_response(self, response: httpx.Response) -> dict:
+        """Normalize batch and streaming ingest responses to ``{"stats": ...}``."""
+        content_type = response.headers.get("content-type", "")
+        if "ndjson" not in content_type:
+            return response.json()
+
+        stats: dict = {}
+        error_details: list[str] = []
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["type"] == "summary":
+                stats = record["stats"]
+            elif record["type"] == "invalid":
+                error_details.append(f"Line {record['line']}: {record['error']}")
+            elif record["type"] == "error" or record.get("error"):
+                error_details.append(str(record["error"]))
+
+        stats.setdefault("error_details", []).extend(error_details)
+        return {"stats": stats}
+
     def watch(self, project_filter: Path | None = None, dry_run: bool = False):
         """Watch for changes and sync continuously."""
         # Initial sync
@@ -983,10 +1115,13 @@ class SyncEngine:
 
         _show_sync_stats(stats)
 
-        # Set up file watcher
-        event_handler = ClaudeFileHandler(self, project_filter, dry_run)
-        self._observer = Observer()
+        try:
+            asyncio.run(self._async_watch(project_filter, dry_run))
+        except KeyboardInterrupt:
+            pass
 
+    async def _async_watch(self, project_filter: Path | None, dry_run: bool):
+        """Tail changed files until cancelled."""
         # Determine paths to watch
         if project_filter:
             watch_paths = [project_filter]
@@ -995,81 +1130,136 @@ class SyncEngine:
                 claude_dir / "projects" for claude_dir in self.config.config.claude_dirs
             ]
 
-        # Schedule observer for each path
         for watch_path in watch_paths:
-            if watch_path.exists():
-                self._observer.schedule(event_handler, str(watch_path), recursive=True)
-                console.print(f"[green]Watching {watch_path}[/green]")
-            else:
+            if not watch_path.exists():
                 console.print(
                     f"[yellow]Warning: Watch path does not exist: {watch_path}[/yellow]"
                 )
 
-        # Start watching
-        self._observer.start()
+        async def on_changes(files: set[Path]):
+            await self._sync_changed_files(files, project_filter, dry_run)
+
+        watcher = BatchedFileWatcher(
+            watch_paths, on_changes, batch_delay=self.config.config.watch_latency
+        )
+        watcher.start()
         console.print("\n[green]Watching for changes...[/green]")
 
         try:
-            while True:
-                asyncio.run(asyncio.sleep(1))
-        except KeyboardInterrupt:
-            self._observer.stop()
+            await asyncio.Event().wait()
+        finally:
+            watcher.stop()
+            await self._close_http_client()
 
-        self._observer.join()
+    def _project_for_file(
+        self, file_path: Path, project_filter: Path | None
+    ) -> Path | None:
+        """The project directory a changed JSONL file belongs to, if any."""
+        project_path = file_path.parent
+        if project_filter:
+            return project_path if project_path == project_filter else None
+        for claude_dir in self.config.config.claude_dirs:
+            if project_path.parent == claude_dir / "projects":
+                return project_path
+        return None
 
+    async def _sync_changed_files(
+        self, files: set[Path], project_filter: Path | None, dry_run: bool
+    ):
+        """Upload the lines appended to changed JSONL files.
 
-class ClaudeFileHandler(FileSystemEventHandler):
-    """File system event handler for Claude files."""
+        Each file is read from the cursor recorded when it was last synced,
+        and new messages from all files go out in shared batches. Cursors only
+        advance once every batch is uploaded, so a failed upload is retried
+        from the same place on the next change.
+        """
+        stats = SyncStats()
+        changed = []  # (project_path, project_key, file_path, cursor)
+        for file_path in sorted(files):
+            project_path = self._project_for_file(file_path, project_filter)
+            if project_path is None or not file_path.exists():
+                continue
+            project_key = str(project_path).rstrip("/")
+            cursor = self.state.get_file_cursor(project_key, str(file_path))
+            if cursor.offset and (
+                file_path.stat().st_size < cursor.offset
+                or file_identity(file_path, cursor.offset) != cursor.identity
+            ):
+                # Truncated or replaced; read it again from the start
+                cursor = FileCursor()
+            changed.append((project_path, project_key, file_path, cursor))
 
-    def __init__(
-        self, sync_engine: SyncEngine, project_filter: Path | None, dry_run: bool
-    ):
-        self.sync_engine = sync_engine
-        self.project_filter = project_filter
-        self.dry_run = dry_run
-        self._pending_files: set[Path] = set()
-        self._sync_task: asyncio.Task[None] | None = None
-
-    def on_modified(self, event: DirModifiedEvent | FileModifiedEvent):
-        """Handle file modification events."""
-        if event.is_directory:
+        if not changed:
             return
 
-        file_path = Path(str(event.src_path))
+        parsed_files = await asyncio.to_thread(
+            lambda: [
+                parse_file(str(f), cursor.offset, cursor.pending_summary)
+                for _, _, f, cursor in changed
+            ]
+        )
+
+        pending: list[tuple[str, dict, str]] = []  # (project_key, message, hash)
+        for (project_path, project_key, _, _), parsed_file in zip(
+            changed, parsed_files, strict=True
+        ):
+            for error in parsed_file.errors:
+                console.print(f"[red]{error}[/red]")
 
-        # Only process JSONL files
-        if file_path.suffix != ".jsonl":
-            return
+            if not dry_run and project_key not in self._known_projects:
+                await self._ensure_project_exists(project_path)
+                self._known_projects.add(project_key)
 
-        # Add to pending files
-        self._pending_files.add(file_path)
+            for message, _, message_hash in parsed_file.messages:
+                if not message.get("uuid") or not message.get("sessionId"):
+                    continue
+                message["_project_path"] = str(project_path)
+                if not message.get("cwd"):
+                    message["cwd"] = str(project_path)
 
-        # Schedule sync (debounced)
-        if self._sync_task:
-            self._sync_task.cancel()
+                if (
+                    not dry_run
+                    and not self.force
+                    and self.state.is_message_synced(
+                        project_key, message_hash, message
+                    )
+                ):
+                    stats.messages_skipped += 1
+                    continue
+                pending.append((project_key, message, message_hash))
 
-        self._sync_task = asyncio.create_task(self._debounced_sync())
+        batch_size = self.config.config.batch_size
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start : start + batch_size]
+            if dry_run:
+                stats.messages_synced += len(batch)
+                continue
 
-    async def _debounced_sync(self):
-        """Sync after a delay to batch changes."""
-        await asyncio.sleep(2)  # Wait 2 seconds for more changes
+            response_stats = await self._upload_batch([m for _, m, _ in batch])
+            self._record_upload_stats(stats, response_stats, len(batch))
 
-        if self._pending_files:
-            console.print(
-                f"\n[yellow]Changes detected in {len(self._pending_files)} files[/yellow]"
-            )
+            if not self.force:
+                batch_hashes: dict[str, set[str]] = defaultdict(set)
+                for project_key, _, message_hash in batch:
+                    batch_hashes[project_key].add(message_hash)
+                for project_key, hashes in batch_hashes.items():
+                    self.state.update_project_state(project_key, new_messages=hashes)
 
-            # Sync changed files
-            stats = await self.sync_engine._async_sync_once(
-                self.project_filter, self.dry_run
-            )
+        if not dry_run:
+            cursors: dict[str, dict[str, FileCursor]] = defaultdict(dict)
+            for (_, project_key, file_path, _), parsed_file in zip(
+                changed, parsed_files, strict=True
+            ):
+                cursors[project_key][str(file_path)] = _cursor(parsed_file)
+            for project_key, file_cursors in cursors.items():
+                self.state.update_file_cursors(project_key, file_cursors)
 
-            # Build completion message
+        if stats.messages_synced or stats.messages_updated:
             completion_msg = (
-                f"[green]Sync completed: {stats['messages_synced']} new messages"
+                f"[green]Synced {stats.messages_synced} new messages "
+                f"from {len(changed)} files"
             )
-            if stats.get("messages_updated", 0) > 0:
-                completion_msg += f", {stats['messages_updated']} updated"
+            if stats.messages_updated > 0:
+                completion_msg += f", {stats.messages_updated} updated"
             completion_msg += "[/green]"
             console.print(completion_msg)
-            self._pending_files.clear()
@@ -1,7 +1,6 @@
 """File watching utilities for continuous sync."""
 import asyncio
-from collections.abc import Callable
-from datetime import UTC, datetime, timedelta
+from collections.abc import Awaitable, Callable
 from pathlib import Path
 
 from rich.console import Console
@@ -18,12 +17,21 @@ console = Console()
 
 
 class BatchedFileWatcher:
-    """Watches files and batches changes for efficient processing."""
+    """Watches files and batches changes for efficient processing.
+
+    Changes are collected for at most ``batch_delay`` seconds after the first
+    one, so files that are written continuously are still processed within
+    that delay instead of waiting for writes to stop. Changes arriving while
+    a batch is processed form the next batch.
+
+    ``start`` must be called from the event loop that runs ``callback``;
+    watchdog events are handed to it from the observer thread.
+    """
 
     def __init__(
         self,
         watch_paths: list[Path],
-        callback: Callable[[set[Path]], None],
+        callback: Callable[[set[Path]], Awaitable[None]],
         batch_delay: float = 2.0,
         file_pattern: str = "*.jsonl",
     ):
@@ -34,11 +42,12 @@ class BatchedFileWatcher:
 
         self._observer = Observer()
         self._pending_files: set[Path] = set()
-        self._last_event_time: datetime | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
         self._process_task: asyncio.Task | None = None
 
     def start(self):
         """Start watching files."""
+        self._loop = asyncio.get_running_loop()
         handler = _FileChangeHandler(self._on_file_change, self.file_pattern)
 
         for path in self.watch_paths:
@@ -58,31 +67,23 @@ class BatchedFileWatcher:
             self._process_task.cancel()
 
     def _on_file_change(self, file_path: Path):
-        """Handle file change event."""
-        self._pending_files.add(file_path)
-        self._last_event_time = datetime.now(UTC)
-
-        # Schedule processing
-        if self._process_task:
-            self._process_task.cancel()
+        """Handle file change event from the observer thread."""
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._add_pending, file_path)
 
-        self._process_task = asyncio.create_task(self._process_batch())
-
-    async def _process_batch(self):
-        """Process batch of file changes after delay."""
-        await asyncio.sleep(self.batch_delay)
+    def _add_pending(self, file_path: Path):
+        """Queue a changed file and make sure a batch is scheduled."""
+        self._pending_files.add(file_path)
+        if not self._process_task or self._process_task.done():
+            self._process_task = asyncio.create_task(self._process_batches())
 
-        # Check if more events came in
-        if self._last_event_time and datetime.now(
-            UTC
-        ) - self._last_event_time < timedelta(seconds=self.batch_delay):
-            # More events might be coming, wait more
+    async def _process_batches(self):
+        """Process batches of file changes until none are pending."""
+        while self._pending_files:
             await asyncio.sleep(self.batch_delay)
 
-        # Process the batch
-        if self._pending_files:
-            files_to_process = self._pending_files.copy()
-            self._pending_files.clear()
+            files_to_process = self._pending_files
+            self._pending_files = set()
 
             try:
                 await self.callback(files_to_process)
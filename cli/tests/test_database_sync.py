@@ -0,0 +1,167 @@
+"""Tests for reading and syncing Claude's SQLite store."""
+import json
+import sqlite3
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from claudelens_cli.core.claude_parser import ClaudeDatabaseReader
+from claudelens_cli.core.config import CLIConfig
+from claudelens_cli.core.state import StateManager
+from claudelens_cli.core.sync_engine import SyncEngine, SyncStats
+
+# 2025-01-01T00:00:00Z in milliseconds
+T0 = 1735689600000
+
+SCHEMA = """
+    CREATE TABLE base_messages (
+        uuid TEXT PRIMARY KEY, parent_uuid TEXT, session_id TEXT,
+        timestamp INTEGER, message_type TEXT, cwd TEXT, user_type TEXT,
+        version TEXT, isSidechain INTEGER
+    );
+    CREATE TABLE user_messages (uuid TEXT, message TEXT, tool_use_result TEXT);
+    CREATE TABLE assistant_messages (
+        uuid TEXT, message TEXT, cost_usd REAL, duration_ms INTEGER, model TEXT
+    );
+    CREATE TABLE conversation_summaries (leaf_uuid TEXT, summary TEXT);
+"""
+
+
+def _store(path, rows):
+    """Create a store with user messages given as ``(uuid, timestamp)``."""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    _add(conn, rows)
+    conn.close()
+    return path
+
+
+def _add(conn, rows):
+    for uuid, timestamp in rows:
+        conn.execute(
+            "INSERT INTO base_messages VALUES (?, NULL, 's1', ?, 'user', '/work',"
+            " 'external', '1.0', 0)",
+            (uuid, timestamp),
+        )
+        conn.execute(
+            "INSERT INTO user_messages VALUES (?, ?, NULL)",
+            (uuid, json.dumps({"role": "user", "content": f"message {uuid}"})),
+        )
+    conn.commit()
+
+
+async def _pages(reader, after=None):
+    return [
+        ([m["uuid"] for m in messages], position)
+        async for messages, position in reader.read_pages(after)
+    ]
+
+
+class TestClaudeDatabaseReader:
+    """Test cases for keyset pagination over the store."""
+
+    @pytest.mark.asyncio
+    async def test_pages_split_rows_sharing_a_timestamp(self, tmp_path):
+        """Test every row is read once when a page ends inside a timestamp."""
+        db = _store(
+            tmp_path / "__store.db",
+            [("e", T0 + 2), ("c", T0 + 1), ("a", T0), ("b", T0 + 1), ("d", T0 + 1)],
+        )
+
+        pages = await _pages(ClaudeDatabaseReader(db, page_size=2))
+
+        assert pages == [
+            (["a", "b"], (T0 + 1, "b")),
+            (["c", "d"], (T0 + 1, "d")),
+            (["e"], (T0 + 2, "e")),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_resumes_after_a_position(self, tmp_path):
+        """Test reading from a stored position returns only later rows."""
+        db = _store(tmp_path / "__store.db", [("a", T0), ("b", T0 + 1), ("c", T0 + 1)])
+
+        pages = await _pages(ClaudeDatabaseReader(db), (T0 + 1, "b"))
+
+        assert pages == [(["c"], (T0 + 1, "c"))]
+
+    @pytest.mark.asyncio
+    async def test_timestamps_are_utc(self, tmp_path, monkeypatch):
+        """Test row timestamps do not depend on the local timezone."""
+        monkeypatch.setenv("TZ", "America/New_York")
+        time.tzset()
+        try:
+            db = _store(tmp_path / "__store.db", [("a", T0)])
+            [message] = [m async for m in ClaudeDatabaseReader(db).read_messages()]
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+
+        assert message["timestamp"] == "2025-01-01T00:00:00+00:00"
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    """Sync engine with database sync enabled over two Claude directories."""
+    config = MagicMock()
+    config.config.claude_dirs = [tmp_path / "first", tmp_path / "second"]
+    config.config.batch_size = 2
+    config.config.sync_database = True
+    engine = SyncEngine(config, StateManager(tmp_path / "state"))
+    engine._upload_batch = AsyncMock(return_value=None)
+    for claude_dir in config.config.claude_dirs:
+        claude_dir.mkdir()
+    return engine
+
+
+def _uploaded(engine) -> list[str]:
+    return [
+        message["uuid"]
+        for call in engine._upload_batch.await_args_list
+        for message in call.args[0]
+    ]
+
+
+class TestSyncDatabases:
+    """Test cases for uploading the store from its high-water mark."""
+
+    def test_off_by_default(self):
+        """Test the store is only synced when explicitly enabled."""
+        assert CLIConfig().sync_database is False
+        assert "database" not in CLIConfig().sync_types
+
+    @pytest.mark.asyncio
+    async def test_next_sync_starts_at_the_high_water_mark(self, db_engine, tmp_path):
+        """Test rows already uploaded are not read again."""
+        db = _store(tmp_path / "first" / "__store.db", [("a", T0), ("b", T0 + 1)])
+        await db_engine._sync_databases(SyncStats(), dry_run=False)
+
+        conn = sqlite3.connect(db)
+        _add(conn, [("c", T0 + 1)])
+        conn.close()
+        await db_engine._sync_databases(SyncStats(), dry_run=False)
+
+        assert _uploaded(db_engine) == ["a", "b", "c"]
+        assert db_engine.state.get_database_position(str(db)) == (T0 + 1, "c")
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_is_counted_and_keeps_the_position(
+        self, db_engine, tmp_path
+    ):
+        """Test a store whose upload fails leaves the others to sync."""
+        failing = _store(tmp_path / "first" / "__store.db", [("a", T0)])
+        working = _store(tmp_path / "second" / "__store.db", [("b", T0)])
+
+        async def upload(batch):
+            if batch[0]["uuid"] == "a":
+                raise Exception("Failed to upload batch after 3 attempts")
+
+        db_engine._upload_batch.side_effect = upload
+        stats = SyncStats()
+
+        await db_engine._sync_databases(stats, dry_run=False)
+
+        assert stats.errors == 1
+        assert db_engine.state.get_database_position(str(failing)) is None
+        assert db_engine.state.get_database_position(str(working)) == (T0, "b")
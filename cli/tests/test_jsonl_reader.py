@@ -0,0 +1,229 @@
+"""Tests for reading and parsing JSONL conversation files."""
+import json
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from claudelens_cli.core import jsonl_reader
+from claudelens_cli.core.jsonl_reader import (
+    file_identity,
+    hash_line,
+    iter_lines,
+    loads,
+    parse_file,
+)
+from claudelens_cli.core.sync_engine import SyncEngine
+
+
+def _line(uuid: str, **fields) -> bytes:
+    """One JSONL message line, newline included."""
+    message = {
+        "uuid": uuid,
+        "type": "user",
+        "timestamp": "2025-01-01T00:00:00Z",
+        "sessionId": "s1",
+        "message": {"role": "user", "content": f"message {uuid}"},
+        **fields,
+    }
+    return json.dumps(message).encode() + b"\n"
+
+
+def _summary(leaf_uuid: str, text: str) -> bytes:
+    return (
+        json.dumps({"type": "summary", "summary": text, "leafUuid": leaf_uuid}).encode()
+        + b"\n"
+    )
+
+
+class TestIterLines:
+    """Test cases for memory-mapped line iteration."""
+
+    def test_offsets_and_unterminated_tail(self, tmp_path):
+        """Test each line reports its end offset and whether it is complete."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(b"first\nsecond\nthird")
+
+        lines = list(iter_lines(path))
+
+        assert lines == [
+            (1, 6, b"first", True),
+            (2, 13, b"second", True),
+            (3, 18, b"third", False),
+        ]
+
+    def test_start_offset(self, tmp_path):
+        """Test reading resumes at an offset with line numbers from there."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(b"first\nsecond\n")
+
+        assert list(iter_lines(path, 6)) == [(1, 13, b"second", True)]
+        assert list(iter_lines(path, 13)) == []
+
+    def test_empty_file(self, tmp_path):
+        """Test an empty file yields nothing without being mapped."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(b"")
+
+        assert list(iter_lines(path)) == []
+
+
+class TestParseFile:
+    """Test cases for parsing a whole file."""
+
+    def test_messages_hashes_and_end_offset(self, tmp_path):
+        """Test messages are parsed with their line numbers and raw hashes."""
+        path = tmp_path / "session.jsonl"
+        lines = [_line("u1"), b"\n", _line("u2")]
+        path.write_bytes(b"".join(lines))
+
+        parsed = parse_file(str(path))
+
+        assert [m.message["uuid"] for m in parsed.messages] == ["u1", "u2"]
+        assert [m.line_number for m in parsed.messages] == [1, 3]
+        assert parsed.messages[0].hash == hash_line(lines[0].strip())
+        assert parsed.end_offset == path.stat().st_size
+        assert parsed.errors == []
+
+    def test_unterminated_trailing_line_is_left_for_later(self, tmp_path):
+        """Test a line still being written is neither parsed nor an error."""
+        path = tmp_path / "session.jsonl"
+        complete = _line("u1")
+        path.write_bytes(complete + _line("u2")[:20])
+
+        parsed = parse_file(str(path))
+
+        assert [m.message["uuid"] for m in parsed.messages] == ["u1"]
+        assert parsed.errors == []
+        assert parsed.end_offset == len(complete)
+
+    def test_corrupt_complete_line_is_an_error(self, tmp_path):
+        """Test a broken line followed by a newline is reported and skipped."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(b"{broken\n" + _line("u1"))
+
+        parsed = parse_file(str(path))
+
+        assert [m.message["uuid"] for m in parsed.messages] == ["u1"]
+        assert len(parsed.errors) == 1
+        assert "line 1" in parsed.errors[0]
+        assert parsed.end_offset == path.stat().st_size
+
+    def test_summary_attached_to_leaf(self, tmp_path):
+        """Test a summary line is attached to its leaf and changes its hash."""
+        path = tmp_path / "session.jsonl"
+        leaf = _line("u2")
+        path.write_bytes(_summary("u2", "Fixing tests") + _line("u1") + leaf)
+
+        parsed = parse_file(str(path))
+
+        first, second = parsed.messages
+        assert "summary" not in first.message
+        assert second.message["summary"] == "Fixing tests"
+        assert second.message["leafUuid"] == "u2"
+        assert second.hash == hash_line(leaf.strip(), "Fixing tests")
+        assert second.hash != hash_line(leaf.strip())
+
+    def test_resume_from_end_offset(self, tmp_path):
+        """Test a later read from ``end_offset`` only returns appended lines."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(_line("u1"))
+        first = parse_file(str(path))
+
+        with open(path, "ab") as f:
+            f.write(_line("u2"))
+        second = parse_file(str(path), first.end_offset)
+
+        assert [m.message["uuid"] for m in second.messages] == ["u2"]
+        assert second.end_offset == path.stat().st_size
+
+    def test_summary_carried_to_a_later_read(self, tmp_path):
+        """Test a summary whose leaf is not written yet is handed back."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(_line("u1") + _summary("u2", "Fixing tests"))
+        first = parse_file(str(path))
+
+        assert first.pending_summary == {
+            "summary": "Fixing tests",
+            "leafUuid": "u2",
+        }
+
+        leaf = _line("u2")
+        with open(path, "ab") as f:
+            f.write(leaf)
+        second = parse_file(str(path), first.end_offset, first.pending_summary)
+
+        [message] = second.messages
+        assert message.message["summary"] == "Fixing tests"
+        assert message.hash == hash_line(leaf.strip(), "Fixing tests")
+        assert second.pending_summary is None
+
+
+class TestFileIdentity:
+    """Test cases for telling appended files from replaced ones."""
+
+    def test_stable_while_appending(self, tmp_path):
+        """Test appending leaves the identity of the read part unchanged."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(_line("u1"))
+        parsed = parse_file(str(path))
+
+        with open(path, "ab") as f:
+            f.write(_line("u2"))
+
+        assert parsed.identity == file_identity(path, parsed.end_offset)
+
+    def test_changes_when_replaced_by_a_longer_file(self, tmp_path):
+        """Test a file replaced by a longer one is not taken for the same."""
+        path = tmp_path / "session.jsonl"
+        path.write_bytes(_line("u1"))
+        parsed = parse_file(str(path))
+
+        replacement = tmp_path / "replacement.jsonl"
+        replacement.write_bytes(_line("u3") + _line("u4"))
+        replacement.replace(path)
+
+        assert path.stat().st_size > parsed.end_offset
+        assert parsed.identity != file_identity(path, parsed.end_offset)
+
+
+class TestLoads:
+    """Test cases for JSON decoding."""
+
+    def test_falls_back_to_json(self):
+        """Test input orjson rejects still decodes."""
+        assert loads(b'{"a": 1}') == {"a": 1}
+        assert loads(b'{"n": NaN}')["n"] != 0
+        assert loads(b'{"big": 18446744073709551616}')["big"] == 2**64
+
+    def test_without_orjson(self, monkeypatch):
+        """Test decoding works when orjson is not installed."""
+        monkeypatch.setattr(jsonl_reader, "orjson", None)
+
+        assert loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+class TestParsePool:
+    """Test cases for parsing projects across worker processes."""
+
+    @pytest.mark.asyncio
+    async def test_falls_back_in_process(self, tmp_path):
+        """Test a broken process pool parses the files in-process instead."""
+        paths = []
+        for name in ("a", "b"):
+            path = tmp_path / f"{name}.jsonl"
+            path.write_bytes(_line(name))
+            paths.append(path)
+        engine = SyncEngine(MagicMock(), MagicMock())
+        pool = MagicMock()
+        pool.submit.side_effect = BrokenProcessPool("no fork")
+
+        with patch("claudelens_cli.core.sync_engine.POOL_MIN_BYTES", 0), patch(
+            "claudelens_cli.core.sync_engine.ProcessPoolExecutor",
+            return_value=pool,
+        ):
+            parsed = await engine._parse_files(paths)
+
+        assert [p.messages[0].message["uuid"] for p in parsed] == ["a", "b"]
+        assert engine._parse_pool is None
+        pool.shutdown.assert_called_once()
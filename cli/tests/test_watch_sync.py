@@ -0,0 +1,216 @@
+"""Tests for batching file changes and tailing files in watch mode."""
+import asyncio
+import json
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from claudelens_cli.core.jsonl_reader import parse_file
+from claudelens_cli.core.state import StateManager
+from claudelens_cli.core.sync_engine import SyncEngine
+from claudelens_cli.core.watcher import BatchedFileWatcher
+
+
+def _line(uuid: str) -> bytes:
+    message = {
+        "uuid": uuid,
+        "type": "user",
+        "timestamp": "2025-01-01T00:00:00Z",
+        "sessionId": "s1",
+        "message": {"role": "user", "content": f"message {uuid}"},
+    }
+    return json.dumps(message).encode() + b"\n"
+
+
+class TestBatchedFileWatcher:
+    """Test cases for batching file changes."""
+
+    @pytest.mark.asyncio
+    async def test_changes_within_the_delay_form_one_batch(self):
+        """Test changes are flushed together once, after the batch delay."""
+        batches: list[set[Path]] = []
+
+        async def callback(files):
+            batches.append(files)
+
+        watcher = BatchedFileWatcher([], callback, batch_delay=0.05)
+        watcher._add_pending(Path("a.jsonl"))
+        watcher._add_pending(Path("b.jsonl"))
+        watcher._add_pending(Path("a.jsonl"))
+
+        assert batches == []
+        await watcher._process_task
+
+        assert batches == [{Path("a.jsonl"), Path("b.jsonl")}]
+
+    @pytest.mark.asyncio
+    async def test_continuous_writes_do_not_postpone_the_flush(self):
+        """Test a file changing all the time is flushed after one delay."""
+        batches: list[set[Path]] = []
+
+        async def callback(files):
+            batches.append(files)
+
+        watcher = BatchedFileWatcher([], callback, batch_delay=0.2)
+        watcher._add_pending(Path("a.jsonl"))
+        for _ in range(4):
+            await asyncio.sleep(0.06)
+            watcher._add_pending(Path("a.jsonl"))
+
+        # The first batch went out 0.2s after the first change
+        assert batches == [{Path("a.jsonl")}]
+        await watcher._process_task
+        assert batches == [{Path("a.jsonl")}, {Path("a.jsonl")}]
+
+    @pytest.mark.asyncio
+    async def test_changes_during_a_batch_form_the_next(self):
+        """Test changes arriving while the callback runs are not lost."""
+        batches: list[set[Path]] = []
+        watcher: BatchedFileWatcher
+
+        async def callback(files):
+            batches.append(files)
+            if len(batches) == 1:
+                watcher._add_pending(Path("b.jsonl"))
+                raise RuntimeError("upload failed")
+
+        watcher = BatchedFileWatcher([], callback, batch_delay=0.01)
+        watcher._add_pending(Path("a.jsonl"))
+        await watcher._process_task
+
+        assert batches == [{Path("a.jsonl")}, {Path("b.jsonl")}]
+
+
+@pytest.fixture
+def tail_engine(tmp_path):
+    """Sync engine over a Claude directory in ``tmp_path`` with uploads mocked."""
+    config = MagicMock()
+    config.config.claude_dirs = [tmp_path]
+    config.config.batch_size = 100
+    engine = SyncEngine(config, StateManager(tmp_path / "state"))
+    engine._ensure_project_exists = AsyncMock()
+    engine._upload_batch = AsyncMock(return_value=None)
+    project = tmp_path / "projects" / "-work-app"
+    project.mkdir(parents=True)
+    return engine, project / "session.jsonl"
+
+
+def _uploaded(engine) -> list[str]:
+    return [
+        message["uuid"]
+        for call in engine._upload_batch.await_args_list
+        for message in call.args[0]
+    ]
+
+
+class TestSyncChangedFiles:
+    """Test cases for uploading lines appended to changed files."""
+
+    @pytest.mark.asyncio
+    async def test_only_appended_lines_are_read(self, tail_engine):
+        """Test each change resumes where the previous one stopped."""
+        engine, path = tail_engine
+        path.write_bytes(_line("u1"))
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        with open(path, "ab") as f:
+            f.write(_line("u2") + _line("u3")[:10])
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        assert _uploaded(engine) == ["u1", "u2"]
+        cursor = engine.state.get_file_cursor(str(path.parent), str(path))
+        assert cursor.offset == len(_line("u1") + _line("u2"))
+
+    @pytest.mark.asyncio
+    async def test_failed_upload_keeps_the_cursor(self, tail_engine):
+        """Test lines are read again after an upload that failed."""
+        engine, path = tail_engine
+        path.write_bytes(_line("u1"))
+        engine._upload_batch.side_effect = [RuntimeError("offline"), None]
+
+        with pytest.raises(RuntimeError):
+            await engine._sync_changed_files({path}, None, dry_run=False)
+        assert engine.state.get_file_cursor(str(path.parent), str(path)).offset == 0
+
+        await engine._sync_changed_files({path}, None, dry_run=False)
+        assert _uploaded(engine) == ["u1", "u1"]
+
+    @pytest.mark.asyncio
+    async def test_summary_reaches_a_leaf_in_a_later_read(self, tail_engine):
+        """Test a summary is kept in state until its leaf is written."""
+        engine, path = tail_engine
+        summary = {"type": "summary", "summary": "Fixing tests", "leafUuid": "u2"}
+        path.write_bytes(_line("u1") + json.dumps(summary).encode() + b"\n")
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        # Cursors survive a restart of the watcher
+        engine.state = StateManager(engine.state.state_dir)
+        with open(path, "ab") as f:
+            f.write(_line("u2"))
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        leaf = engine._upload_batch.await_args_list[-1].args[0][0]
+        assert leaf["uuid"] == "u2"
+        assert leaf["summary"] == "Fixing tests"
+
+    @pytest.mark.asyncio
+    async def test_replaced_file_is_read_from_the_start(self, tail_engine):
+        """Test a file replaced by a longer one is not read from the middle."""
+        engine, path = tail_engine
+        path.write_bytes(_line("u1"))
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        replacement = path.with_name("replacement.jsonl")
+        replacement.write_bytes(_line("u5") + _line("u6"))
+        replacement.replace(path)
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        assert _uploaded(engine) == ["u1", "u5", "u6"]
+
+    @pytest.mark.asyncio
+    async def test_files_outside_projects_are_ignored(self, tail_engine, tmp_path):
+        """Test changes outside a project directory are not uploaded."""
+        engine, _ = tail_engine
+        stray = tmp_path / "stray.jsonl"
+        stray.write_bytes(_line("u1"))
+
+        await engine._sync_changed_files({stray}, None, dry_run=False)
+
+        engine._upload_batch.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_messages_synced_by_older_versions_are_skipped(self, tail_engine):
+        """Test state keyed by parsed-message hashes still marks messages synced."""
+        engine, path = tail_engine
+        path.write_bytes(_line("u1"))
+        project_key = str(path.parent)
+        [parsed] = parse_file(str(path)).messages
+        message = {
+            **parsed.message,
+            "_project_path": project_key,
+            "cwd": parsed.message.get("cwd") or project_key,
+        }
+        state_dir = engine.state.state_dir
+        state_dir.mkdir()
+        (state_dir / "sync_state.json").write_text(
+            json.dumps(
+                {
+                    "version": "1.0.0",
+                    "projects": {
+                        project_key: {
+                            "last_sync": "2025-01-01T00:00:00+00:00",
+                            "synced_messages": [StateManager.hash_message(message)],
+                        }
+                    },
+                }
+            )
+        )
+        engine.state = StateManager(state_dir)
+
+        await engine._sync_changed_files({path}, None, dry_run=False)
+
+        assert _uploaded(engine) == []
+        project_state = StateManager(state_dir).get_project_state(project_key)
+        assert project_state.synced_messages == {parsed.hash}
+        assert project_state.legacy_messages == set()
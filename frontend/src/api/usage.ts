@@ -29,7 +29,9 @@ export interface UsageMetrics {
       total_size: number;
       document_count: number;
       avg_size: number;
-      max_size: number;
+      // Estimated from collection averages; max_size only on legacy storage
+      max_avg_size?: number;
+      max_size?: number;
     };
     projects: {
       total_size: number;